@@ -0,0 +1,200 @@
+"""Check and time slime.api against in-process stand-ins of GloBI and BacDive.
+
+The globi_* sources and bacdive are pointed at stand-in servers of
+:mod:`slime.testing` serving synthetic tables, with a delay per request and
+per row. They are fetched in one request per source, then in pages with
+different numbers of requests in flight, and the joined files must hold
+the served table. A run where every third request fails is then resumed
+to check that only the missing pages are fetched again, a server that caps
+its pages must be detected, and the rate limit must space requests out.
+
+Usage: python benchmarks/bench_api.py [--rows 20000] [--sources 4]
+    [--page-size 2000] [--concurrency 1 4]
+"""
+
+import argparse
+import csv
+import io
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from slime.api import ExtractError, fetch_all
+from slime.globi import API_COLUMNS
+from slime.testing import StandInAPI
+
+GLOBI_SOURCES = sorted(p.name for p in (ROOT_DIR / "sources").glob("globi_*"))
+BACDIVE_COLUMNS = ["nutritionType", "scientificName", "strain"]
+
+
+def globi_rows(n_rows, seed=0):
+    rng = random.Random(seed)
+    return [
+        [
+            f"NCBI:{rng.randrange(5000)}",
+            f"Consumer, {i % 5000}",
+            "Arthropoda | Araneae",
+            "",
+            "",
+            "eats",
+            f"NCBI:{rng.randrange(20000)}",
+            f'Resource "{i % 20000}"',
+            "",
+            "",
+            "",
+            f"{rng.uniform(-90, 90):.4f}",
+            f"{rng.uniform(-180, 180):.4f}",
+            f"Study {rng.randrange(1000)}\nsecond line",
+            "",
+            "synthetic",
+        ]
+        for i in range(n_rows)
+    ]
+
+
+def bacdive_rows(n_rows):
+    return [
+        [["heterotroph", "autotroph"][i % 2], f"Bacterium {i}", f"strain/{i}"]
+        for i in range(n_rows)
+    ]
+
+
+def as_csv(columns, rows):
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def connections(globi, bacdive):
+    return {
+        "globi": {"host": globi.url, "extra": None},
+        "bacdive": {"host": f"{bacdive.url}/api", "extra": None},
+    }
+
+
+def check(stats, expected):
+    for source_id, s in stats.items():
+        text = Path(s["path"]).read_text(encoding="utf-8")
+        assert text == expected[source_id], source_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--page-size", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--row-seconds", type=float, default=2e-5)
+    args = parser.parse_args()
+
+    globi_data = globi_rows(args.rows)
+    bacdive_data = bacdive_rows(args.rows)
+    sources = GLOBI_SOURCES[: args.sources] + ["bacdive"]
+    expected = {
+        source_id: as_csv(API_COLUMNS, globi_data)
+        for source_id in GLOBI_SOURCES[: args.sources]
+    }
+    expected["bacdive"] = as_csv(BACDIVE_COLUMNS, bacdive_data)
+    delays = {"latency": args.latency, "row_seconds": args.row_seconds}
+
+    def serve(**kwargs):
+        return (
+            StandInAPI(API_COLUMNS, globi_data, **delays, **kwargs),
+            StandInAPI(BACDIVE_COLUMNS, bacdive_data, **delays, **kwargs),
+        )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        runs = [("single", args.rows + 1, 1)]
+        runs += [("paged", args.page_size, c) for c in args.concurrency]
+        print("mode\tpage size\tin flight\trequests\tseconds\trows/s")
+        for mode, page_size, concurrency in runs:
+            globi, bacdive = serve()
+            with globi, bacdive:
+                start = time.perf_counter()
+                stats = fetch_all(
+                    sources,
+                    tmpdir / f"{mode}-{concurrency}",
+                    connections=connections(globi, bacdive),
+                    page_size=page_size,
+                    concurrency=concurrency,
+                    rate=0,
+                )
+                seconds = time.perf_counter() - start
+                assert globi.max_in_flight <= concurrency
+                requests = globi.requests + bacdive.requests
+            check(stats, expected)
+            rows = sum(s["rows"] for s in stats.values())
+            print(
+                f"{mode}\t{page_size}\t{concurrency}\t{requests}"
+                f"\t{seconds:.2f}\t{rows / seconds:.0f}"
+            )
+
+        # Every third request fails and is not retried: the run stops early
+        outputdir = tmpdir / "resumed"
+        globi, bacdive = serve(fail_every=3)
+        with globi, bacdive:
+            try:
+                fetch_all(
+                    sources,
+                    outputdir,
+                    connections=connections(globi, bacdive),
+                    page_size=args.page_size,
+                    rate=0,
+                    retries=0,
+                )
+                raise AssertionError("the failing run completed")
+            except ExtractError:
+                pass
+            failed_requests = globi.requests + bacdive.requests
+            globi.fail_every = bacdive.fail_every = 0
+            stats = fetch_all(
+                sources,
+                outputdir,
+                connections=connections(globi, bacdive),
+                page_size=args.page_size,
+                rate=0,
+            )
+            requests = globi.requests + bacdive.requests - failed_requests
+        check(stats, expected)
+        resumed = sum(s["resumed"] for s in stats.values())
+        fetched = sum(s["fetched"] for s in stats.values())
+        assert resumed > 0 and fetched == requests, (resumed, fetched, requests)
+        print(f"resumed\t{resumed} pages from the checkpoints, fetched {fetched}")
+
+        # Pages cut short by the server must not pass for the end of the table
+        globi, bacdive = serve(max_limit=args.page_size // 2)
+        with globi, bacdive:
+            try:
+                fetch_all(
+                    sources[:1],
+                    tmpdir / "capped",
+                    connections=connections(globi, bacdive),
+                    page_size=args.page_size,
+                    rate=0,
+                )
+                raise AssertionError("capped pages went unnoticed")
+            except ExtractError as e:
+                print(f"capped\t{e}")
+
+        globi, bacdive = StandInAPI(API_COLUMNS, globi_data[:100]), None
+        with globi:
+            start = time.perf_counter()
+            fetch_all(
+                sources[:1],
+                tmpdir / "rate",
+                connections={"globi": {"host": globi.url}},
+                page_size=10,
+                rate=20,
+            )
+            seconds = time.perf_counter() - start
+        assert seconds >= (globi.requests - 1) / 20, seconds
+        print(f"rate\t{globi.requests} requests at 20/s in {seconds:.2f}s")
@@ -0,0 +1,254 @@
+"""Check and time slime.backbone on a synthetic NCBI taxdump.
+
+The taxdump holds a random tree with synonyms, homonyms (names of several
+taxa, told apart by the rank filter) and synonyms that are the scientific
+name of another taxon. Names of several sources, with case and spacing
+variants, are resolved under two ancestors with the backbone, and with
+dictionaries and a walk up the parents of each candidate, which is what
+checking the lineage of every match amounts to. Tiny OTT and GBIF dumps
+check the other readers, and :func:`slime.taxa.resolve_column` must resolve
+offline with a resolver that refuses to be called. A backbone without names
+must match nothing, and one whose names were hashed by another version of
+pandas must be built again when loaded.
+
+Usage: python benchmarks/bench_backbone.py [--taxa 500000] [--sources 5]
+    [--names 200000]
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from slime.backbone import build_backbone, load_backbones
+from slime.taxa import new_stats, normalize_names, resolve_column, taxon_annotations
+
+RANKS = ["superkingdom", "phylum", "class", "order", "family", "genus", "species"]
+UNDER = ["Taxon 2", "Taxon 5"]
+
+
+def taxonomy(n_taxa, seed=0):
+    """Return parents, scientific names and synonyms of a random tree."""
+    rng = random.Random(seed)
+    parents = {1: 1}
+    for i in range(2, n_taxa + 1):
+        # Few taxa near the root, then a wide and fairly deep tree
+        parents[i] = 1 if i < 10 else rng.randrange(2, i)
+    names = {i: f"Taxon {i}" for i in parents}
+    names[1] = "root"
+    for i in range(1000, n_taxa + 1, 1000):
+        names[i] = f"Homonym {i // 5000}"
+    synonyms = [(i, f"Synonym {i}") for i in range(3, n_taxa + 1, 3)]
+    synonyms += [(i, f"Taxon {i + 1}") for i in range(10, n_taxa, 97)]
+    return parents, names, synonyms
+
+
+def write_ncbi(directory, parents, names, synonyms):
+    directory.mkdir(parents=True, exist_ok=True)
+    depth = {1: 0}
+    with open(directory / "nodes.dmp", "w") as f:
+        for i, parent in parents.items():
+            depth[i] = 0 if i == 1 else depth[parent] + 1
+            rank = RANKS[min(depth[i], len(RANKS) - 1)]
+            f.write(f"{i}\t|\t{parent}\t|\t{rank}\t|\tXX\t|\t0\t|\n")
+    with open(directory / "names.dmp", "w") as f:
+        for i, name in names.items():
+            f.write(f"{i}\t|\t{name}\t|\t\t|\tscientific name\t|\n")
+        for i, name in synonyms:
+            f.write(f"{i}\t|\t{name}\t|\t\t|\tsynonym\t|\n")
+            f.write(f"{i}\t|\t{name} common\t|\t\t|\tcommon name\t|\n")
+
+
+def write_ott(directory):
+    directory.mkdir(parents=True, exist_ok=True)
+    rows = [("805080", "", "life", "no rank"), ("304358", "805080", "Eukaryota", "")]
+    rows += [("1", "304358", "Araneae", "order"), ("2", "1", "Salticidae", "family")]
+    with open(directory / "taxonomy.tsv", "w") as f:
+        f.write("uid\t|\tparent_uid\t|\tname\t|\trank\t|\tsourceinfo\t|\n")
+        for row in rows:
+            f.write("\t|\t".join(row) + "\t|\tncbi:1\t|\n")
+    with open(directory / "synonyms.tsv", "w") as f:
+        f.write("name\t|\tuid\t|\ttype\t|\tuniqname\t|\n")
+        f.write("Attidae\t|\t2\t|\tsynonym\t|\tAttidae\t|\n")
+
+
+def write_gbif(path, empty=False):
+    columns = [
+        "taxonID",
+        "parentNameUsageID",
+        "acceptedNameUsageID",
+        "scientificName",
+        "canonicalName",
+        "taxonRank",
+        "taxonomicStatus",
+    ]
+    rows = [
+        ("1", "", "", "Animalia", "Animalia", "kingdom", "accepted"),
+        ("54", "1", "", "Arthropoda", "Arthropoda", "phylum", "accepted"),
+        ("216", "54", "", "Insecta", "Insecta", "class", "accepted"),
+        ("99", "", "216", "Hexapoda Latreille", "Hexapoda", "class", "synonym"),
+    ]
+    if empty:
+        rows = []
+    with open(path, "w") as f:
+        for row in [columns] + rows:
+            f.write("\t".join(row) + "\n")
+
+
+def queries(names, synonyms, n_names, seed):
+    rng = random.Random(seed)
+    pool = rng.sample(list(names.values()), 2000) + [n for _, n in synonyms[:500]]
+    pool += ["Homonym 3", "Unknown taxon", None]
+    variants = [str.upper, lambda n: n.replace(" ", "  "), lambda n: f" {n}"]
+    values = [rng.choice(pool) for _ in range(n_names)]
+    return [
+        rng.choice(variants)(v) if v is not None and rng.random() < 0.2 else v
+        for v in values
+    ]
+
+
+class NaiveTaxonomy:
+    """Name dictionaries and parent walks, one name at a time."""
+
+    def __init__(self, parents, names, synonyms):
+        self.parents = parents
+        self.scientific, self.synonyms = {}, {}
+        for i, name in names.items():
+            self.scientific.setdefault(name.lower(), []).append(i)
+        for i, name in synonyms:
+            self.synonyms.setdefault(name.lower(), []).append(i)
+
+    def is_under(self, taxon, ancestors):
+        while True:
+            if taxon in ancestors:
+                return True
+            if self.parents[taxon] == taxon:
+                return False
+            taxon = self.parents[taxon]
+
+    def valid(self, key, ancestors):
+        """Taxa a name may resolve to: scientific names under an ancestor first."""
+        for found in (self.scientific, self.synonyms):
+            taxa = [t for t in found.get(key, []) if self.is_under(t, ancestors)]
+            if taxa:
+                return taxa
+        return []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--taxa", type=int, default=500_000)
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--names", type=int, default=200_000)
+    args = parser.parse_args()
+
+    parents, names, synonyms = taxonomy(args.taxa)
+    sources = [
+        queries(names, synonyms, args.names, seed) for seed in range(args.sources)
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        write_ncbi(tmpdir / "taxdump", parents, names, synonyms)
+        write_ott(tmpdir / "ott")
+        write_gbif(tmpdir / "Taxon.tsv")
+
+        start = time.perf_counter()
+        build_backbone("NCBI", tmpdir / "taxdump", tmpdir / "backbone")
+        build_s = time.perf_counter() - start
+        build_backbone("OTT", tmpdir / "ott", tmpdir / "backbone")
+        build_backbone("GBIF", tmpdir / "Taxon.tsv", tmpdir / "backbone")
+        start = time.perf_counter()
+        backbones = load_backbones(tmpdir / "backbone")
+        load_s = time.perf_counter() - start
+        ncbi = backbones["NCBI"]
+        assert len(ncbi) == args.taxa, len(ncbi)
+
+        start = time.perf_counter()
+        results = [ncbi.find(values, under=UNDER) for values in sources]
+        find_s = (time.perf_counter() - start) / args.sources
+
+        start = time.perf_counter()
+        naive = NaiveTaxonomy(parents, names, synonyms)
+        ancestors = {i for name in UNDER for i in naive.scientific[name.lower()]}
+        expected = []
+        for values in sources:
+            keys = normalize_names(values).reindex(range(len(values)))
+            valid = {None: []}
+            for k in keys.where(keys.notna(), None):
+                if k not in valid:
+                    valid[k] = naive.valid(k, ancestors)
+            expected.append([valid[k] for k in keys.where(keys.notna(), None)])
+        naive_s = (time.perf_counter() - start) / args.sources
+
+        for result, valid in zip(results, expected):
+            ids = ncbi.id[result]
+            for node, taxon, taxa in zip(result, ids, valid):
+                assert (node >= 0) == bool(taxa), (taxon, taxa)
+                assert node < 0 or taxon in taxa, (taxon, taxa)
+        assert ncbi.lineage(ncbi.nodes_of([7])[0]) == ["root", "Taxon 7"]
+        for taxon in random.Random(1).sample(range(1, args.taxa + 1), 1000):
+            [node] = ncbi.nodes_of([taxon])
+            path = ncbi.lineage(node)
+            assert path[-1] == names[taxon] and len(path) == ncbi.depth[node] + 1
+
+        ott = backbones["OTT"].matches(["attidae", "araneae"], ranks=["Eukaryota"])
+        assert ott["attidae"]["current_name"] == "Salticidae", ott
+        gbif = backbones["GBIF"].matches(["hexapoda", "insecta", "animalia"])
+        assert gbif["hexapoda"]["id"] == "GBIF:216", gbif
+        assert backbones["GBIF"].matches(["hexapoda"], include_synonym=False) == {}
+
+        def refuse(names, target, include_synonym):
+            raise AssertionError("the backbone must resolve offline")
+
+        stats = new_stats()
+        names = sources[0][:1000]
+        column = resolve_column(
+            names,
+            ["OTT", "NCBI"],
+            ranks=UNDER,
+            backbones=backbones,
+            resolver=refuse,
+            stats=stats,
+        )
+        assert column.str.get("id").notna().any()
+        # Only names with a match are hits
+        n_found = column.dropna().index.map(normalize_names(names)).nunique()
+        assert stats["hits"] == n_found, (stats, n_found)
+        assert stats["hits"] + stats["misses"] == stats["lookups"], stats
+        write_gbif(tmpdir / "Empty.tsv", empty=True)
+        build_backbone("GBIF", tmpdir / "Empty.tsv", tmpdir / "empty")
+        empty = load_backbones(tmpdir / "empty")["GBIF"]
+        assert len(empty) == 0 and (empty.find(["insecta"]) == -1).all()
+        assert empty.matches(["insecta"], ranks=["Animalia"]) == {}
+
+        metadata_path = tmpdir / "backbone" / "GBIF" / "backbone.json"
+        metadata = json.loads(metadata_path.read_text())
+        metadata_path.write_text(json.dumps({**metadata, "pandas": "0.0"}))
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            rebuilt = load_backbones(tmpdir / "backbone", targets=["GBIF"])["GBIF"]
+        assert caught and rebuilt.metadata["pandas"] == metadata["pandas"]
+        assert rebuilt.matches(["hexapoda"])["hexapoda"]["id"] == "GBIF:216"
+
+        # filter_on_ranks given as one name, quoted or not
+        for source_id in ("lavigne_asilidae", "rainford_hexapoda"):
+            for _, options in taxon_annotations(ROOT_DIR / "sources" / source_id):
+                assert all(len(rank) > 1 for rank in options["ranks"]), options
+
+        size = sum(p.stat().st_size for p in (tmpdir / "backbone" / "NCBI").iterdir())
+        found = sum((r >= 0).sum() for r in results) / args.sources
+        print(f"backbone\t{len(ncbi)} taxa\t{size / 2**20:.1f} MiB")
+        print(f"build\t{build_s:.2f}s")
+        print(f"load (memory-mapped)\t{load_s * 1000:.1f}ms")
+        print(
+            f"resolve {args.names} names under {len(UNDER)} ancestors"
+            f"\t{find_s * 1000:.0f}ms backbone\t{naive_s * 1000:.0f}ms naive"
+            f"\t{found:.0f} found"
+        )
@@ -0,0 +1,168 @@
+"""Wall time, peak memory and output rows of every source cleaner.
+
+Synthetic inputs shaped like each source's raw file (see
+``benchmarks/synthetic.py``: text blocks, ``;``/``|``/`` + `` separated
+values, workbooks) are generated at several scale factors of ``--rows``.
+Each cleaner runs in a fresh interpreter with an empty workbook cache, so
+workbooks are parsed every time; the fastest of ``--repeat`` runs is kept.
+Peak memory is the largest RSS sampled while the cleaner runs: the
+high-water mark of the child is inherited from this process on Linux.
+Every generator must work: a missing dependency fails the run.
+
+Results are compared with the baselines file: a case is flagged when it is
+slower or uses more memory than its baseline by more than ``--tolerance``,
+or when its number of output rows changed (the generators are
+deterministic). The command exits with status 1 when a case is flagged, and
+``--update`` stores the results as the new baselines. Baselines depend on
+the machine, so keep one file per machine.
+
+Usage: python benchmarks/bench_cleaners.py [--rows 2000] [--scales 1 4 16]
+    [--sources betsi pantheon] [--repeat 3] [--tolerance 0.3] [--update]
+    [--baselines benchmarks/baselines.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.synthetic import GENERATORS, WORKBOOK_GENERATORS
+
+BASELINES = ROOT_DIR / "benchmarks" / "baselines.json"
+# FAPROTAX is generated in groups of 50 members
+ROW_UNITS = {"faprotax": 50}
+# Differences below this many seconds are noise
+MIN_SECONDS = 0.05
+
+
+def run_case(source_id, filepath, outputdir, result_path):
+    """Clean one file in this interpreter and write its measures as JSON."""
+    from slime.cleanse import run_source
+    from slime.metrics import RssSampler
+    from slime.tables import read_table
+
+    start = time.perf_counter()
+    with RssSampler() as sampler:
+        output = run_source(source_id, filepath, outputdir)
+    seconds = time.perf_counter() - start
+    result = {
+        "seconds": seconds,
+        "peak_mib": sampler.peak,
+        "rows": len(read_table(output)),
+    }
+    Path(result_path).write_text(json.dumps(result))
+
+
+def measure(source_id, filepath, tmpdir, repeat):
+    runs = []
+    for i in range(repeat):
+        workdir = Path(tempfile.mkdtemp(dir=tmpdir))
+        result_path = workdir / "result.json"
+        subprocess.run(
+            [sys.executable, __file__, "--child", source_id, str(filepath)]
+            + [str(workdir / "out"), str(result_path)],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            env={**os.environ, "SLIME_CACHE_DIR": str(workdir / "cache")},
+        )
+        runs.append(json.loads(result_path.read_text()))
+    return min(runs, key=lambda r: r["seconds"])
+
+
+def compare(results, baselines, tolerance):
+    """Return the (case, message) pairs of the results that regressed."""
+    flagged = []
+    for case, result in results.items():
+        base = baselines.get(case)
+        if base is None:
+            continue
+        if result["rows"] != base["rows"]:
+            flagged.append((case, f"{result['rows']} rows, baseline {base['rows']}"))
+        if (
+            result["seconds"] > base["seconds"] * (1 + tolerance)
+            and result["seconds"] - base["seconds"] > MIN_SECONDS
+        ):
+            flagged.append(
+                (case, f"{result['seconds']:.2f}s, baseline {base['seconds']:.2f}s")
+            )
+        if result["peak_mib"] > base["peak_mib"] * (1 + tolerance):
+            flagged.append(
+                (
+                    case,
+                    f"peak {result['peak_mib']:.0f} MiB,"
+                    f" baseline {base['peak_mib']:.0f} MiB",
+                )
+            )
+    return flagged
+
+
+def read_baselines(path):
+    path = Path(path)
+    if not path.exists():
+        return {}, None
+    data = json.loads(path.read_text())
+    return data["cases"], data.get("machine")
+
+
+def machine():
+    return f"{platform.node()} {platform.machine()} Python {platform.python_version()}"
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        run_case(*sys.argv[2:6])
+        sys.exit()
+
+    generators = {**GENERATORS, **WORKBOOK_GENERATORS}
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--sources", nargs="+", choices=sorted(generators))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--baselines", default=BASELINES)
+    parser.add_argument("--update", action="store_true")
+    args = parser.parse_args()
+
+    baselines, baseline_machine = read_baselines(args.baselines)
+    if baseline_machine and baseline_machine != machine():
+        print(f"baselines were measured on {baseline_machine}", file=sys.stderr)
+    results = {}
+    print("source\tscale\trows in\trows out\tseconds\tpeak MiB\tbaseline s")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for source_id in args.sources or sorted(generators):
+            write, filename = generators[source_id]
+            for scale in args.scales:
+                n_rows = max(args.rows * scale // ROW_UNITS.get(source_id, 1), 1)
+                filepath = Path(tmpdir) / "raw" / f"{source_id}-{scale}" / filename
+                filepath.parent.mkdir(parents=True)
+                write(filepath, n_rows)
+                case = f"{source_id}@{args.rows * scale}"
+                results[case] = result = measure(
+                    source_id, filepath, tmpdir, args.repeat
+                )
+                base = baselines.get(case, {}).get("seconds")
+                print(
+                    f"{source_id}\t{scale}\t{args.rows * scale}\t{result['rows']}"
+                    f"\t{result['seconds']:.3f}\t{result['peak_mib']:.0f}"
+                    f"\t{'-' if base is None else f'{base:.3f}'}"
+                )
+
+    flagged = compare(results, baselines, args.tolerance)
+    for case, message in flagged:
+        print(f"REGRESSION {case}: {message}")
+    if args.update:
+        baselines.update(results)
+        Path(args.baselines).write_text(
+            json.dumps({"machine": machine(), "cases": baselines}, indent=2) + "\n"
+        )
+        print(f"baselines written to {args.baselines}")
+    sys.exit(1 if flagged and not args.update else 0)
@@ -0,0 +1,76 @@
+"""Compare one interpreter per clean.py against the in-process cleanse runner.
+
+Usage: python benchmarks/bench_cleanse_startup.py [--rows N] [--workers N]
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.synthetic import GENERATORS
+
+
+def make_inputs(tmpdir, n_rows):
+    jobs = {}
+    for source_id, (write, filename) in GENERATORS.items():
+        path = Path(tmpdir) / "raw" / source_id / filename
+        path.parent.mkdir(parents=True)
+        write(path, n_rows)
+        jobs[source_id] = path
+    return jobs
+
+
+def run_subprocesses(jobs, outputdir):
+    for source_id, filepath in jobs.items():
+        subprocess.run(
+            [
+                sys.executable,
+                ROOT_DIR / "sources" / source_id / "clean.py",
+                "--integraph_filepath",
+                filepath,
+                "--integraph_outputdir",
+                Path(outputdir) / source_id,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+
+def run_in_process(jobs, outputdir, workers):
+    subprocess.run(
+        [sys.executable, "-m", "slime.cleanse", "--outputdir", outputdir]
+        + ["--workers", str(workers)]
+        + [f"{source_id}={path}" for source_id, path in jobs.items()],
+        check=True,
+        cwd=ROOT_DIR,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jobs = make_inputs(tmpdir, args.rows)
+        print(f"{len(jobs)} sources, {args.rows} rows each")
+        t = timed(run_subprocesses, jobs, Path(tmpdir) / "out_cli")
+        print(f"one interpreter per source: {t:.2f}s")
+        t = timed(run_in_process, jobs, Path(tmpdir) / "out_serial", 1)
+        print(f"in-process, serial:         {t:.2f}s")
+        t = timed(run_in_process, jobs, Path(tmpdir) / "out_pool", args.workers)
+        print(f"in-process, {args.workers} workers:     {t:.2f}s")
@@ -0,0 +1,100 @@
+"""Check and time slime.dedup on overlapping synthetic GloBI extracts.
+
+A pool of GloBI records is drawn once; each globi_* source gets a sample of
+it (so sources overlap) plus some of its own records repeated, with stray
+whitespace that the canonical keys ignore. The deduplicated tables are
+compared with ``drop_duplicates`` over the concatenation of all sources,
+then the run is timed for several chunk sizes.
+
+Usage: python benchmarks/bench_dedup.py [--sources 10] [--rows 100000]
+    [--pool 300000] [--chunksizes 10000 100000]
+"""
+
+import argparse
+import csv
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from slime.dedup import DEFAULT_KEYS, ROLES, dedup_all
+from slime.globi import API_COLUMNS
+from slime.tables import read_table
+
+GLOBI_SOURCES = sorted(p.name for p in (ROOT_DIR / "sources").glob("globi_*"))
+
+
+def write_sources(tmpdir, n_sources, n_rows, pool_size, seed=0):
+    rng = random.Random(seed)
+    pool = [
+        {
+            "source_taxon_external_id": f"NCBI:{rng.randrange(5000)}",
+            "source_taxon_name": f"Consumer {i % 5000}",
+            "interaction_type": rng.choice(["eats", "preysOn", "parasiteOf"]),
+            "target_taxon_external_id": f"NCBI:{rng.randrange(20000)}",
+            "target_taxon_name": f"Resource {i % 20000}",
+            "latitude": f"{rng.uniform(-90, 90):.4f}",
+            "study_citation": f"Study {rng.randrange(1000)}",
+            "study_source_citation": "synthetic",
+        }
+        for i in range(pool_size)
+    ]
+    jobs = {}
+    for source_id in GLOBI_SOURCES[:n_sources]:
+        path = tmpdir / "extracted" / source_id / "interactions.csv"
+        path.parent.mkdir(parents=True)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(API_COLUMNS), restval="")
+            writer.writeheader()
+            rows = rng.sample(pool, n_rows)
+            rows += rng.sample(rows, n_rows // 20)
+            for row in rows:
+                if rng.random() < 0.1:
+                    row = {**row, "target_taxon_name": f" {row['target_taxon_name']} "}
+                writer.writerow(row)
+        jobs[source_id] = path
+    return jobs
+
+
+def expected_rows(jobs):
+    columns = [c for role in ROLES for c in DEFAULT_KEYS["globi"].get(role, [])]
+    frames = [
+        pd.read_csv(path, dtype=str, keep_default_na=False).assign(source=source_id)
+        for source_id, path in jobs.items()
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    keys = df[columns].apply(lambda c: c.str.strip())
+    return df[~keys.duplicated()].groupby("source").size()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sources", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--pool", type=int, default=300_000)
+    parser.add_argument("--chunksizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        jobs = write_sources(tmpdir, args.sources, args.rows, args.pool)
+        expected = expected_rows(jobs)
+        print("chunksize\trows\tkept\tseconds\trows/s")
+        for chunksize in args.chunksizes:
+            outputdir = tmpdir / f"dedup-{chunksize}"
+            start = time.perf_counter()
+            stats = dedup_all(jobs, outputdir, chunksize=chunksize)
+            seconds = time.perf_counter() - start
+            rows = sum(s["rows"] for s in stats.values())
+            kept = sum(s["kept"] for s in stats.values())
+            print(f"{chunksize}\t{rows}\t{kept}\t{seconds:.2f}\t{rows / seconds:.0f}")
+            for source_id, s in stats.items():
+                assert len(read_table(s["path"])) == s["kept"], source_id
+                assert s["kept"] == expected.get(source_id, 0), source_id
+        print("same records as drop_duplicates over all sources")
@@ -0,0 +1,137 @@
+"""Write volume and time of slime.delta compared with reloading whole graphs.
+
+Loads a source into the in-process stand-in store, changes a share of its
+triples, and updates the store with the delta and with a full reload. Both
+must leave the named graph equal to the new file. Small sorted runs
+(``--memory-mb``) force the external merge sort to spill to disk.
+
+Two sources are compared: synthetic statements with IRIs only, and the
+output of the compiled mapping of ``--mapping-source`` on a synthetic table
+of ``--rows`` rows, where every statement has a blank node (the stand-in
+scopes them per request like GraphDB). The delta path must be taken for
+both.
+
+Full reloads send gzipped batches and deltas plain SPARQL updates, so the
+number of statements written is the figure to compare.
+
+Usage: python benchmarks/bench_delta.py [--triples 500000]
+    [--changed 0.001 0.01 0.1] [--memory-mb 8]
+    [--mapping-source globi_coleoptera] [--rows 20000]
+"""
+
+import argparse
+import gzip
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from bench_triplify import column_roles, synthetic_table
+
+from slime.delta import MAX_RATIO, delta_all
+from slime.load import skolem_base, skolemize
+from slime.materialize import na_values, workbook_path
+from slime.rebuild import graph_iri
+from slime.testing import StandInStore
+from slime.triplify import compile_workbook, triples
+
+OBO = "http://purl.obolibrary.org/obo/"
+
+
+def statements(n_triples, changed=0.0, seed=0):
+    rng = random.Random(seed)
+    graph = graph_iri("bench")
+    out = []
+    for i in range(n_triples):
+        version = "v2" if changed and rng.random() < changed else "v1"
+        out.append(
+            f"<{graph}/occurrence/{i // 5}> <{OBO}RO_000{i % 5}>"
+            f' "{version} value \\"{i}\\""'
+        )
+    return out
+
+
+def mapping_statements(plan, n_rows, changed=0.0, seed=0):
+    """Statements of the compiled mapping, with the text of some rows changed."""
+    df = synthetic_table(plan, n_rows)
+    rng = random.Random(seed)
+    rows = [i for i in range(n_rows) if changed and rng.random() < changed]
+    for column, role in column_roles(plan).items():
+        if role == "text":
+            df.loc[rows, column] = df.loc[rows, column] + " v2"
+    return sorted(triples(df, plan, na_values()))
+
+
+def write_nquads(path, source_id, statements):
+    graph = graph_iri(source_id)
+    with gzip.open(path, "wt") as f:
+        f.writelines(f"{s} <{graph}> .\n" for s in reversed(statements))
+
+
+def compare(source_id, old, versions, tmpdir, run_bytes):
+    """Update the store from ``old`` to each new version, by delta and reload."""
+    graph = graph_iri(source_id)
+    write_nquads(tmpdir / "old.nq.gz", source_id, old)
+    for changed, new in versions:
+        write_nquads(tmpdir / "new.nq.gz", source_id, new)
+        expected = {skolemize(s, skolem_base(graph)) for s in new}
+        for full in (False, True):
+            options = dict(
+                headers={},
+                snapshots=tmpdir / f"snapshots-{source_id}-{changed}-{full}",
+                load_dir=tmpdir / "loads",
+                run_bytes=run_bytes,
+            )
+            with StandInStore() as store:
+                delta_all({source_id: tmpdir / "old.nq.gz"}, url=store.url, **options)
+                start = time.perf_counter()
+                stats = delta_all(
+                    {source_id: tmpdir / "new.nq.gz"},
+                    url=store.url,
+                    full=full,
+                    **options,
+                )[source_id]
+                elapsed = time.perf_counter() - start
+                assert store.graphs[graph] == expected
+            if not full and stats["written"] <= MAX_RATIO * stats["statements"]:
+                assert stats["mode"] == "delta", stats["mode"]
+            print(
+                f"{source_id}\t{changed}\t{stats['mode']}\t{stats['deleted']}"
+                f"\t{stats['inserted']}\t{stats['written']}"
+                f"\t{stats['bytes'] / 2**20:.2f}"
+                f"\t{elapsed:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--triples", type=int, default=500_000)
+    parser.add_argument("--changed", type=float, nargs="+", default=[0.001, 0.01, 0.1])
+    parser.add_argument("--memory-mb", type=float, default=8)
+    parser.add_argument("--mapping-source", default="globi_coleoptera")
+    parser.add_argument("--rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    run_bytes = int(args.memory_mb * 2**20)
+    plan = compile_workbook(workbook_path(args.mapping_source))
+    print("source\tchanged\tmode\tdeleted\tinserted\twritten\tMiB sent\tseconds")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        compare(
+            "bench",
+            statements(args.triples),
+            [(c, statements(args.triples, c, seed=1)) for c in args.changed],
+            tmpdir,
+            run_bytes,
+        )
+        compare(
+            args.mapping_source,
+            mapping_statements(plan, args.rows),
+            [(c, mapping_statements(plan, args.rows, c, 1)) for c in args.changed],
+            tmpdir,
+            run_bytes,
+        )
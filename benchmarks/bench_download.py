@@ -0,0 +1,212 @@
+"""Check slime.download against a stand-in dataset host.
+
+Files are served by :class:`slime.testing.StandInFiles`. A download cut
+halfway through must be resumed with a range request for the missing bytes
+only, and restarted when the file changed in between. Unchanged files must
+be revalidated without a body. A 503 or 429 answer, or an unreachable
+host, must give the cached copy with a warning, and a 404 or a 503 for a
+URL never fetched must fail. The least recently used blobs must be evicted
+first, without touching partial downloads or blobs still open by a caller,
+and processes fetching different URLs into the same cache at once must all
+keep their index entry.
+
+Usage: python benchmarks/bench_download.py [--size-mb 8] [--processes 4]
+    [--files 32]
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+import urllib.error
+import warnings
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from slime.download import fetch, load_index, url_key
+from slime.testing import StandInFiles
+
+
+def content(size, seed):
+    return random.Random(seed).randbytes(size)
+
+
+def fetch_many(urls, cache_dir):
+    for url in urls:
+        fetch(url, cache_dir).close()
+
+
+def fetch_bytes(url, cache_dir, **kwargs):
+    with fetch(url, cache_dir, **kwargs) as blob:
+        return blob.read()
+
+
+def fetch_path(url, cache_dir, **kwargs):
+    with fetch(url, cache_dir, **kwargs) as blob:
+        return Path(blob.name)
+
+
+def check_resume(host, cache_dir, size):
+    host.files["/dump.zip"] = data = content(size, 0)
+    url = host.url + "/dump.zip"
+    host.cut.add("/dump.zip")
+    try:
+        fetch(url, cache_dir)
+    except http.client.IncompleteRead:
+        pass
+    else:
+        raise AssertionError("the cut download must fail")
+    part = cache_dir / "blobs" / f"{url_key(url)}.part"
+    assert part.stat().st_size == size // 2, part.stat().st_size
+
+    start = time.perf_counter()
+    assert fetch_bytes(url, cache_dir) == data
+    resume_s = time.perf_counter() - start
+    assert host.log[-1] == ("/dump.zip", 206, size - size // 2), host.log[-1]
+    assert not part.exists()
+    assert fetch_bytes(url, cache_dir) == data
+    assert host.log[-1] == ("/dump.zip", 304, 0), host.log[-1]
+
+    # The file changes between the cut and the next fetch
+    host.cut.add("/dump.zip")
+    host.files["/dump.zip"] = content(size, 1)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        # The cached copy is served while the new one is partial
+        assert fetch_bytes(url, cache_dir) == data
+    assert "IncompleteRead" in str(caught[0].message), caught
+    host.files["/dump.zip"] = data = content(size, 2)
+    assert fetch_bytes(url, cache_dir) == data
+    assert host.log[-1] == ("/dump.zip", 200, size), host.log[-1]
+    return resume_s
+
+
+def check_unavailable(host, cache_dir):
+    host.files["/data.csv"] = data = content(1024, 3)
+    url = host.url + "/data.csv"
+    host.errors["/data.csv"] = 503
+    try:
+        fetch(url, cache_dir)
+    except urllib.error.HTTPError as e:
+        assert e.code == 503
+    else:
+        raise AssertionError("a 503 without a cached copy must fail")
+    assert fetch_bytes(url, cache_dir) == data
+    for status in (503, 429):
+        host.errors["/data.csv"] = status
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            assert fetch_bytes(url, cache_dir) == data
+        assert host.log[-1] == ("/data.csv", status, 0), host.log[-1]
+        assert any(str(status) in str(w.message) for w in caught), caught
+    host.errors["/data.csv"] = 404
+    try:
+        fetch(url, cache_dir)
+    except urllib.error.HTTPError as e:
+        assert e.code == 404
+    else:
+        raise AssertionError("a 404 must fail even with a cached copy")
+    # Nothing listens on port 9 of the host
+    down = "http://127.0.0.1:9/data.csv"
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        try:
+            fetch(down, cache_dir)
+        except urllib.error.URLError:
+            pass
+        else:
+            raise AssertionError("an unreachable host without a cached copy")
+    assert not caught, caught
+
+
+def check_pinned(host, cache_dir, size):
+    """A blob still open by a caller is not evicted by other fetches."""
+    urls = []
+    for i in range(3):
+        host.files[f"/pinned{i}"] = content(size, 20 + i)
+        urls.append(f"{host.url}/pinned{i}")
+    with fetch(urls[0], cache_dir, max_bytes=size) as blob:
+        for url in urls[1:]:
+            fetch(url, cache_dir, max_bytes=size).close()
+        assert Path(blob.name).exists()
+        assert blob.read() == content(size, 20)
+    fetch(urls[2], cache_dir, max_bytes=size).close()
+    assert not Path(blob.name).exists()
+
+
+def check_eviction(host, cache_dir, size):
+    urls = []
+    for i in range(4):
+        host.files[f"/file{i}"] = content(size, 10 + i)
+        urls.append(f"{host.url}/file{i}")
+    stray = cache_dir / "blobs" / "other.part"
+    paths = []
+    for url in urls[:3]:
+        paths.append(fetch_path(url, cache_dir, max_bytes=3 * size))
+        time.sleep(0.01)
+    stray.parent.mkdir(parents=True, exist_ok=True)
+    stray.write_bytes(b"x" * size)
+    # A hit makes file0 the most recently used, so file1 is evicted
+    fetch(urls[0], cache_dir, max_bytes=3 * size).close()
+    time.sleep(0.01)
+    fetch(urls[3], cache_dir, max_bytes=3 * size).close()
+    assert paths[0].exists() and paths[2].exists() and not paths[1].exists()
+    assert stray.exists()
+    index = load_index(cache_dir)
+    assert urls[1] not in index and {urls[0], urls[2], urls[3]} <= set(index), index
+
+
+def check_concurrent(host, cache_dir, n_files, processes):
+    urls = []
+    for i in range(n_files):
+        host.files[f"/part{i}.csv"] = content(4096, 100 + i)
+        urls.append(f"{host.url}/part{i}.csv")
+    # Every URL is fetched by two processes
+    groups = [urls[i::processes] + urls[::-1][i::processes] for i in range(processes)]
+    ctx = multiprocessing.get_context("fork")
+    start = time.perf_counter()
+    workers = [ctx.Process(target=fetch_many, args=(g, cache_dir)) for g in groups]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+        assert w.exitcode == 0, w.exitcode
+    seconds = time.perf_counter() - start
+    index = load_index(cache_dir)
+    missing = set(urls) - set(index)
+    assert not missing, f"{len(missing)} index entries lost"
+    blobs = cache_dir / "blobs"
+    assert not [p for p in blobs.iterdir() if ".part" in p.suffixes]
+    for i, url in enumerate(urls):
+        assert (blobs / index[url]["sha256"]).read_bytes() == content(4096, 100 + i)
+    return seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--files", type=int, default=32)
+    args = parser.parse_args()
+    size = int(args.size_mb * 2**20)
+
+    with tempfile.TemporaryDirectory() as tmpdir, StandInFiles({}) as host:
+        tmpdir = Path(tmpdir)
+        resume_s = check_resume(host, tmpdir / "resume", size)
+        check_unavailable(host, tmpdir / "unavailable")
+        check_pinned(host, tmpdir / "pinned", 2**16)
+        check_eviction(host, tmpdir / "evict", 2**16)
+        concurrent_s = check_concurrent(
+            host, tmpdir / "concurrent", args.files, args.processes
+        )
+
+    print(f"resume {size / 2**20:.0f} MiB cut halfway\t{resume_s:.2f}s")
+    print(
+        f"{args.processes} processes x {2 * args.files // args.processes} fetches"
+        f"\t{concurrent_s:.2f}s\tno index entry lost"
+    )
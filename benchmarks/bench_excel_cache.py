@@ -0,0 +1,84 @@
+"""Cold and warm ingestion times of the workbook cache.
+
+A truncated Arrow entry and a truncated pickle entry (a sheet mixing numbers
+and text) must be read again from the workbook and replaced, and writing
+entries must not leave temporary files behind.
+
+Usage: python benchmarks/bench_excel_cache.py [--rows 50000]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.synthetic import DIETS, species
+from slime.excel import read_excel
+
+
+def write_workbook(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    df = pd.DataFrame(
+        {
+            "Taxon": [species(rng) for _ in range(n_rows)],
+            "Family": [f"Family{rng.randint(0, 50)}" for _ in range(n_rows)],
+            "Diet": [rng.choice(DIETS + [np.nan]) for _ in range(n_rows)],
+            "Richness": [rng.randint(1, 5000) for _ in range(n_rows)],
+            "Code": [rng.choice([1, 2, "3&4", np.nan]) for _ in range(n_rows)],
+        }
+    )
+    with pd.ExcelWriter(path) as writer:
+        df.to_excel(writer, sheet_name="data", index=False)
+        df.head(10).to_excel(writer, sheet_name="other", index=False)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "workbook.xlsx"
+        cache_dir = Path(tmpdir) / "cache"
+        write_workbook(path, args.rows)
+        expected, t_pandas = timed(pd.read_excel, path, sheet_name="data")
+        cold, t_cold = timed(read_excel, path, "data", cache_dir=cache_dir)
+        warm, t_warm = timed(read_excel, path, "data", cache_dir=cache_dir)
+        pd.testing.assert_frame_equal(cold, expected)
+        pd.testing.assert_frame_equal(warm, expected)
+        size = sum(p.stat().st_size for p in cache_dir.iterdir()) / 2**20
+
+        # The Code column mixes numbers and text, so "data" is pickled
+        columns = ["Taxon", "Richness"]
+        plain = pd.read_excel(path, sheet_name="data", usecols=columns)
+        read_excel(path, "data", cache_dir=cache_dir, usecols=columns)
+        entries = sorted(cache_dir.iterdir())
+        assert sorted(p.suffix for p in entries) == [".arrow", ".pkl"], entries
+        for entry in entries:
+            entry.write_bytes(entry.read_bytes()[: entry.stat().st_size // 2])
+        for _ in range(2):
+            pd.testing.assert_frame_equal(
+                read_excel(path, "data", cache_dir=cache_dir), expected
+            )
+            pd.testing.assert_frame_equal(
+                read_excel(path, "data", cache_dir=cache_dir, usecols=columns), plain
+            )
+        assert sorted(cache_dir.iterdir()) == entries, list(cache_dir.iterdir())
+        print(f"{args.rows} rows, cache entry {size:.1f} MiB")
+        print(f"pd.read_excel:     {t_pandas:7.3f}s")
+        print(f"cache miss (cold): {t_cold:7.3f}s")
+        print(f"cache hit (warm):  {t_warm:7.3f}s  speed-up: x{t_pandas / t_warm:.0f}")
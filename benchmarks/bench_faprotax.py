@@ -0,0 +1,205 @@
+"""Check and time the FAPROTAX group resolution against the file-order algorithm.
+
+The dependency-order resolution keeps the rules of the file-order one
+(duplicates kept, a subtracted member removes its first occurrence) and
+only differs for groups that reference a group defined after them, directly
+or through another group: file order expands those with the referenced
+group's own members only. Hence:
+
+- fixtures where groups only reference earlier ones must give the output of
+  the file-order algorithm at every scale;
+- a fixture with forward references and overlapping add_groups must give
+  every group the members of its definition expanded recursively, the
+  file-order output must be that of the file-order algorithm run in
+  dependency order, and only the groups with forward references may
+  differ from the file-order output;
+- the real FAPROTAX.txt (``--faprotax``, or fetched into the download
+  cache) is held to the same two conditions, and the check fails on any
+  other difference. Without network access and ``--faprotax``, the run fails
+  unless ``--offline`` skips the real file;
+- a fixture with a cycle must fail with the groups of the cycle.
+
+Usage: python benchmarks/bench_faprotax.py [--groups N] [--scales 1 10 100]
+    [--faprotax FAPROTAX.txt | --offline]
+"""
+
+import argparse
+import copy
+import graphlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.synthetic import write_faprotax
+from slime.cleanse import load_cleaner
+from slime.download import fetch_source_file
+
+
+def legacy_resolve_groups(group_members, add_groups, subtract_groups):
+    """Group resolution as implemented before dependency ordering."""
+    group_members = copy.deepcopy(group_members)
+    for group in group_members:
+        for addgroup in add_groups[group]:
+            group_members[group] += group_members[addgroup]
+        for subtractgroup in subtract_groups[group]:
+            for member in group_members[subtractgroup]:
+                if member in group_members[group]:
+                    group_members[group].remove(member)
+    return {
+        group: [(m["scientificName"], m["reference"]) for m in members]
+        for group, members in group_members.items()
+    }
+
+
+def legacy_in_dependency_order(group_members, add_groups, subtract_groups):
+    dependencies = {g: add_groups[g] + subtract_groups[g] for g in group_members}
+    order = graphlib.TopologicalSorter(dependencies).static_order()
+    reordered = {g: group_members[g] for g in order}
+    return legacy_resolve_groups(reordered, add_groups, subtract_groups)
+
+
+def forward_groups(order, add_groups, subtract_groups):
+    """Groups whose file-order resolution sees a group not expanded yet."""
+    rank = {g: i for i, g in enumerate(order)}
+    affected = set()
+    for group in order:
+        for ref in add_groups[group] + subtract_groups[group]:
+            if rank[ref] > rank[group] or ref in affected:
+                affected.add(group)
+    return affected
+
+
+def expected_rows(path):
+    """Rows of the cleaned table, from the definitions expanded recursively."""
+    blocks = Path(path).read_text().split("\n\n")[1:]
+    definitions = {}
+    for block in filter(None, blocks):
+        head, *lines = block.splitlines()
+        definitions[head.split("\t")[0]] = lines
+    resolved = {}
+
+    def members(group):
+        if group not in resolved:
+            found = []
+            for line in definitions[group]:
+                if not line.startswith(("add_group:", "subtract_group:")):
+                    name = line.split("\t")[0].strip("*").split("*")[-1]
+                    found.append((name, line.split("\t")[-1].lstrip("# ")))
+            for line in definitions[group]:
+                if line.startswith("add_group:"):
+                    found += members(line.split(":")[1])
+            for line in definitions[group]:
+                if line.startswith("subtract_group:"):
+                    for member in members(line.split(":")[1]):
+                        if member in found:
+                            found.remove(member)
+            resolved[group] = found
+        return resolved[group]
+
+    return [(g, *member) for g in definitions for member in members(g)]
+
+
+def run(clean, resolver, path):
+    module = sys.modules[clean.__module__]
+    module.resolve_groups = resolver
+    start = time.perf_counter()
+    df = clean(path)
+    return df, time.perf_counter() - start
+
+
+def check_file(clean, resolve_groups, path):
+    """Compare the output with the file-order algorithm on any FAPROTAX file."""
+    calls = []
+
+    def recording(group_members, add_groups, subtract_groups):
+        calls.append((list(group_members), add_groups, subtract_groups))
+        return resolve_groups(group_members, add_groups, subtract_groups)
+
+    df, t = run(clean, recording, path)
+    legacy, t_legacy = run(clean, legacy_resolve_groups, path)
+    reordered, _ = run(clean, legacy_in_dependency_order, path)
+    assert df.equals(reordered), f"{path.name}: output differs in dependency order"
+    order, add_groups, subtract_groups = calls[0]
+    affected = forward_groups(order, add_groups, subtract_groups)
+    by_group = dict(list(legacy.groupby("functionalGroup", sort=False)))
+    differ = {
+        group
+        for group, rows in df.groupby("functionalGroup", sort=False)
+        if group not in by_group
+        or not rows.reset_index(drop=True).equals(
+            by_group[group].reset_index(drop=True)
+        )
+    }
+    differ |= set(by_group) - set(df["functionalGroup"])
+    assert differ <= affected, f"{path.name}: {sorted(differ - affected)} differ"
+    return df, t, t_legacy, affected, differ
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, default=90)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    real = parser.add_mutually_exclusive_group()
+    real.add_argument("--faprotax", type=Path, help="FAPROTAX.txt to check")
+    real.add_argument("--offline", action="store_true", help="skip FAPROTAX.txt")
+    args = parser.parse_args()
+
+    clean = load_cleaner(ROOT_DIR / "sources" / "faprotax")
+    resolve_groups = sys.modules[clean.__module__].resolve_groups
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for scale in args.scales:
+            path = Path(tmpdir) / f"FAPROTAX_x{scale}.txt"
+            write_faprotax(path, args.groups * scale)
+            legacy, t_legacy = run(clean, legacy_resolve_groups, path)
+            df, t = run(clean, resolve_groups, path)
+            assert df.equals(legacy), f"output differs at scale x{scale}"
+            print(
+                f"x{scale:<4} {len(df):>9} rows  file order: {t_legacy:7.2f}s  "
+                f"dependency order: {t:7.2f}s"
+            )
+
+        path = Path(tmpdir) / "FAPROTAX_forward.txt"
+        write_faprotax(path, args.groups, forward=True)
+        df, _, _, affected, differ = check_file(clean, resolve_groups, path)
+        assert affected
+        rows = list(
+            df[["functionalGroup", "scientificName", "reference"]].itertuples(
+                index=False, name=None
+            )
+        )
+        assert rows == expected_rows(path), "forward references resolved wrongly"
+        print(
+            f"forward {len(df):>7} rows  {len(affected)} groups with forward "
+            f"references, {len(differ)} differ from file order"
+        )
+
+        path = Path(tmpdir) / "FAPROTAX_cycle.txt"
+        write_faprotax(path, args.groups, forward=True, cycle=True)
+        try:
+            run(clean, resolve_groups, path)
+        except graphlib.CycleError as e:
+            assert {"group_0", "group_1"} <= set(e.args[1]), e.args
+        else:
+            raise AssertionError("a cycle of add_groups must fail")
+
+        if not args.offline:
+            path = args.faprotax
+            if path is None:
+                try:
+                    path = fetch_source_file("faprotax", tmpdir)
+                except OSError as e:
+                    sys.exit(
+                        f"could not fetch FAPROTAX.txt ({e}): pass --faprotax "
+                        "FAPROTAX.txt, or --offline to skip the real file"
+                    )
+            df, t, t_legacy, affected, differ = check_file(clean, resolve_groups, path)
+            print(
+                f"{path.name} {len(df):>5} rows  file order: {t_legacy:7.2f}s  "
+                f"dependency order: {t:7.2f}s  {len(affected)} groups with "
+                f"forward references, {len(differ)} differ from file order"
+            )
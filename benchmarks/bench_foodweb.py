@@ -0,0 +1,151 @@
+"""Check and time slime.foodweb on a synthetic metaweb and occurrence matrix.
+
+Writes a snapshot with the tables slime.foodweb reads (a metaweb between
+species and genera, their lineage and labels) and a long sites × taxa
+matrix naming species and genera by CURIE or by name. The food webs of a
+sample of sites are compared with a direct evaluation of the metaweb on the
+taxa present, then the reconstruction is timed for growing numbers of sites
+and workers.
+
+Usage: python benchmarks/bench_foodweb.py [--sites 1000 10000] [--taxa 5000]
+    [--per-site 60] [--workers 1 4]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import pandas as pd
+import pyarrow as pa
+
+from slime.foodweb import reconstruct
+from slime.query import expand
+from slime.tables import read_table, to_arrow, write_table
+
+OBO = "http://purl.obolibrary.org/obo/"
+GENUS_SIZE = 10
+
+
+def taxon(i):
+    return f"{OBO}NCBITaxon_{i}"
+
+
+def write_snapshot(path, n_taxa, n_edges, seed=0):
+    """Species are 0..n_taxa-1 and genera n_taxa + species // GENUS_SIZE."""
+    rng = random.Random(seed)
+    n_genera = n_taxa // GENUS_SIZE + 1
+    species = [taxon(i) for i in range(n_taxa)]
+    genera = [taxon(n_taxa + i) for i in range(n_genera)]
+    lineage = [(s, s) for s in species] + [(g, g) for g in genera]
+    lineage += [(s, genera[i // GENUS_SIZE]) for i, s in enumerate(species)]
+    labels = [(s, f"Species {i}") for i, s in enumerate(species)]
+    labels += [(g, f"Genus {i}") for i, g in enumerate(genera)]
+    edges = set()
+    while len(edges) < n_edges:
+        consumer = rng.choice(species)
+        resource = rng.choice(species) if rng.random() < 0.8 else rng.choice(genera)
+        edges.add((consumer, f"{OBO}RO_0002470", resource))
+    edges = sorted(edges)
+    half = len(edges) // 2
+    columns = ["matchId", "interactionId", "resourceId"]
+    provenance = {"reference": None, "source": "https://purl.slime.org/bench"}
+    tables = {
+        "interactions": pd.DataFrame(edges[:half], columns=columns).assign(
+            **provenance, inferred=False
+        ),
+        "potential_interactions": pd.DataFrame(edges[half:], columns=columns).assign(
+            **provenance, inferred=True
+        ),
+        "lineage": pd.DataFrame(lineage, columns=["matchId", "ancestor"]),
+        "labels": pd.DataFrame(labels, columns=["iri", "label"]),
+    }
+    path.mkdir(parents=True, exist_ok=True)
+    for name, df in tables.items():
+        table = to_arrow(df).combine_chunks()
+        with pa.OSFile(str(path / f"{name}.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    return tables
+
+
+def write_occurrences(path, n_sites, n_taxa, per_site, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for site in range(n_sites):
+        for i in rng.sample(range(n_taxa), per_site):
+            if rng.random() < 0.05:
+                name = f"Genus {i // GENUS_SIZE}"
+            elif rng.random() < 0.1:
+                name = f"Species {i}"
+            else:
+                name = f"NCBITaxon:{i}"
+            rows.append((f"site{site}", name, rng.randint(1, 20)))
+    write_table(pd.DataFrame(rows, columns=["site", "taxon", "value"]), path, "parquet")
+
+
+def expected_webs(tables, occurrences, sites):
+    """Evaluate the metaweb on the taxa of each site, one pair at a time."""
+    labels = dict(zip(tables["labels"]["label"], tables["labels"]["iri"]))
+    below = {}
+    for node, ancestor in tables["lineage"].itertuples(index=False):
+        below.setdefault(ancestor, set()).add(node)
+    edges = set()
+    for name in ("interactions", "potential_interactions"):
+        edges |= set(zip(tables[name]["matchId"], tables[name]["resourceId"]))
+
+    def nodes(name):
+        iri = expand(name) if ":" in name else labels[name]
+        return below.get(iri, set())
+
+    links = set()
+    for site, group in occurrences[occurrences["site"].isin(sites)].groupby("site"):
+        taxa = list(group["taxon"].unique())
+        for consumer in taxa:
+            for resource in taxa:
+                if any(
+                    (c, r) in edges for c in nodes(consumer) for r in nodes(resource)
+                ):
+                    links.add((site, consumer, resource))
+    return links
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sites", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--taxa", type=int, default=5000)
+    parser.add_argument("--edges", type=int, default=100_000)
+    parser.add_argument("--per-site", type=int, default=60)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--check", type=int, default=50, help="sites checked")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        tables = write_snapshot(tmpdir / "snapshot", args.taxa, args.edges)
+        print("sites\tworkers\tlinks\tseconds\tsites/s")
+        for n_sites in args.sites:
+            path = tmpdir / f"occurrences-{n_sites}.parquet"
+            write_occurrences(path, n_sites, args.taxa, args.per_site)
+            for workers in args.workers:
+                outputdir = tmpdir / f"webs-{n_sites}-{workers}"
+                stats = reconstruct(path, tmpdir / "snapshot", outputdir, workers)
+                print(
+                    f"{n_sites}\t{workers}\t{stats['links']}\t{stats['seconds']:.2f}"
+                    f"\t{n_sites / stats['seconds']:.0f}"
+                )
+            occurrences = read_table(path).astype(str)
+            sample = [f"site{i}" for i in range(min(args.check, n_sites))]
+            webs = read_table(stats["path"]).astype(str)
+            webs = webs[webs["site"].isin(sample)]
+            found = set(webs.itertuples(index=False, name=None))
+            expected = expected_webs(tables, occurrences, sample)
+            assert found == expected, len(found ^ expected)
+            summary = pd.read_csv(outputdir / "sites.csv", index_col=0)
+            assert summary["links"].sum() == stats["links"]
+        print(f"same food webs as the direct evaluation on {len(sample)} sites")
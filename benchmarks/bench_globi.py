@@ -0,0 +1,125 @@
+"""Check slime.globi against per-source extraction from the GloBI API.
+
+A synthetic GloBI dump (``synthetic.write_globi_dump``) holds records of the
+taxa of every globi_* source, with NCBI or GBIF lineages, lineages nesting
+two sources, records of no source and several interaction types. Each
+source is extracted as before, with its own ``sourceTaxon`` query to a
+stand-in of the GloBI API serving the dump (:class:`slime.testing.
+StandInGloBI`), and all of them with one pass of :func:`slime.globi.
+split_dump`. Both must give every source the same table, and a source
+that no record matches must still get a table with the header of the API.
+
+The stand-in applies the same matching rules as the split, so it cannot
+catch a rule that GloBI applies differently. With ``--dump`` (a real GloBI
+dump) and ``--recorded`` (the tables of a few sources fetched from the real
+API with ``python -m slime.api`` on the day the dump was taken), the split
+of the real dump is compared with the recorded tables too.
+
+Usage: python benchmarks/bench_globi.py [--rows 50000] [--latency 0.05]
+    [--dump interactions.tsv.gz --recorded recorded]
+"""
+
+import argparse
+import csv
+import gzip
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import pandas as pd
+from synthetic import write_globi_dump
+
+from slime.api import fetch_all
+from slime.globi import (
+    API_COLUMNS,
+    compare_tables,
+    globi_sources,
+    recorded_tables,
+    split_dump,
+)
+from slime.testing import StandInGloBI
+
+
+def read_records(path):
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f, delimiter="\t", quoting=csv.QUOTE_NONE))
+
+
+def read_output(path):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def check_recorded(dump, recorded_dir, outputdir, queries):
+    """Compare the split of a real dump with tables recorded from the API."""
+    recorded = recorded_tables(recorded_dir)
+    recorded = {s: p for s, p in recorded.items() if s in queries}
+    assert recorded, f"no table of a globi_* source in {recorded_dir}"
+    outputs = split_dump(dump, outputdir, {s: queries[s] for s in recorded})
+    print("source\tapi rows\tdump rows\tonly api\tonly dump")
+    for source_id, api_path in recorded.items():
+        diff = compare_tables(api_path, outputs[source_id][0])
+        print(
+            f"{source_id}\t{diff['api_rows']}\t{diff['dump_rows']}"
+            f"\t{len(diff['only_api'])}\t{len(diff['only_dump'])}"
+        )
+        assert not diff["only_api"] and not diff["only_dump"], source_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--dump", help="a real GloBI interactions dump")
+    parser.add_argument("--recorded", help="tables recorded from the GloBI API")
+    args = parser.parse_args()
+
+    queries = globi_sources()
+    names = {q["taxon_id"]: q["taxon_name"] for q in queries.values()}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        dump = tmpdir / "interactions.tsv.gz"
+        write_globi_dump(dump, queries, args.rows)
+
+        with StandInGloBI(read_records(dump), names, latency=args.latency) as api:
+            start = time.perf_counter()
+            stats = fetch_all(
+                list(queries),
+                tmpdir / "api",
+                connections={"globi": {"host": api.url}},
+                rate=0,
+            )
+            api_s = time.perf_counter() - start
+            requests = api.requests
+
+        # A taxon that is in no record of the dump
+        unmatched = {"taxon_id": "NCBI:0", "taxon_name": None, "interaction_types": {}}
+        start = time.perf_counter()
+        outputs = split_dump(dump, tmpdir / "dump", {**queries, "unmatched": unmatched})
+        split_s = time.perf_counter() - start
+
+        nested = 0
+        for source_id in queries:
+            expected = read_output(stats[source_id]["path"])
+            found = read_output(outputs[source_id][0])
+            assert found.columns.tolist() == list(API_COLUMNS), source_id
+            pd.testing.assert_frame_equal(found, expected, obj=source_id)
+            diff = compare_tables(stats[source_id]["path"], outputs[source_id][0])
+            assert not diff["only_api"] and not diff["only_dump"], source_id
+            nested += len(found)
+        rows = sum(s["rows"] for s in stats.values())
+        assert nested == rows and rows > 0
+        empty = read_output(outputs["unmatched"][0])
+        assert empty.empty and empty.columns.tolist() == list(API_COLUMNS)
+
+        print(f"dump\t{args.rows} records\t{len(queries)} sources\t{rows} source rows")
+        print(f"per-source API queries\t{requests} requests\t{api_s:.2f}s")
+        print(f"one pass over the dump\t{split_s:.2f}s")
+
+        if args.dump and args.recorded:
+            check_recorded(args.dump, args.recorded, tmpdir / "recorded", queries)
+        else:
+            print("no --dump and --recorded: not compared with the real API")
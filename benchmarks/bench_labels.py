@@ -0,0 +1,171 @@
+"""Check and time slime.labels on a synthetic ontology with an import.
+
+The ontology has classes with labels, exact and related synonyms (some
+shared with the label of another class) and deprecated classes, and
+imports a second ontology by a file URL. Each source annotator used to parse
+the OWL file and search its labels; this is compared with building the
+index once, then loading it (memory-mapped) and matching each source's
+distinct labels in one batch. Exact matches are checked against a
+dictionary built from the parsed graph, and prefix searches against a scan
+of all keys.
+
+Usage: python benchmarks/bench_labels.py [--classes 20000] [--sources 10]
+    [--labels 200000]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from slime.labels import (
+    LABEL_PROPERTIES,
+    build_label_index,
+    label_entries,
+    load_label_index,
+    match_labels,
+    parse_with_imports,
+)
+from slime.terms import normalize_terms
+
+SFWO = "http://purl.obolibrary.org/obo/SFWO_"
+IMPORTED = "http://purl.obolibrary.org/obo/ENVO_"
+OBO_IN_OWL = "http://www.geneontology.org/formats/oboInOwl#"
+OWL = "http://www.w3.org/2002/07/owl#"
+RDFS = "http://www.w3.org/2000/01/rdf-schema#"
+WORDS = ["bacterivore", "fungivore", "predator", "detritivore", "omnivore"]
+
+
+def write_ontology(path, prefix, n_classes, imports=(), seed=0):
+    import rdflib
+
+    rng = random.Random(seed)
+    graph = rdflib.Graph()
+    ontology = rdflib.URIRef(f"{prefix}ontology")
+    graph.add((ontology, rdflib.RDF.type, rdflib.URIRef(OWL + "Ontology")))
+    for location in imports:
+        graph.add((ontology, rdflib.URIRef(OWL + "imports"), rdflib.URIRef(location)))
+    for i in range(n_classes):
+        cls = rdflib.URIRef(f"{prefix}{i:07d}")
+        word = WORDS[i % len(WORDS)]
+        graph.add((cls, rdflib.RDF.type, rdflib.URIRef(OWL + "Class")))
+        graph.add((cls, rdflib.URIRef(RDFS + "label"), rdflib.Literal(f"{word} {i}")))
+        synonym = rdflib.Literal(f"{word.capitalize()}_{i}-variant")
+        graph.add((cls, rdflib.URIRef(OBO_IN_OWL + "hasExactSynonym"), synonym))
+        # Related synonyms that are the label of another class must lose
+        other = rng.randrange(n_classes)
+        related = rdflib.Literal(f"{WORDS[other % len(WORDS)]}  {other}")
+        graph.add((cls, rdflib.URIRef(OBO_IN_OWL + "hasRelatedSynonym"), related))
+        if i % 50 == 0:
+            graph.add((cls, rdflib.URIRef(OWL + "deprecated"), rdflib.Literal(True)))
+    graph.serialize(path, format="xml")
+
+
+def expected_matches(graph):
+    """Best IRI of each normalized key, from a scan of the graph."""
+    import rdflib
+
+    deprecated = set(graph.subjects(rdflib.URIRef(OWL + "deprecated"), None))
+    best = {}
+    for predicate, (_, rank) in LABEL_PROPERTIES.items():
+        for s, o in graph.subject_objects(rdflib.URIRef(predicate)):
+            [key] = keys_of([str(o)])
+            entry = (rank + 10 * (s in deprecated), str(s))
+            best[key] = min(best.get(key, entry), entry)
+    return {key: iri for key, (_, iri) in best.items()}
+
+
+def source_labels(n_labels, n_classes, seed):
+    rng = random.Random(seed)
+    labels = [
+        f"{WORDS[i % len(WORDS)]} {i}"
+        for i in (rng.randrange(n_classes) for _ in range(200))
+    ]
+    labels += ["not a term", "Bacterivore_3-VARIANT", None]
+    return [rng.choice(labels) for _ in range(n_labels)]
+
+
+def keys_of(labels):
+    distinct = sorted({v for v in labels if v is not None})
+    keys = dict(zip(distinct, normalize_terms(distinct)))
+    return [keys.get(v) for v in labels]
+
+
+def per_source_parse(path, labels):
+    """What each annotator did: parse the ontology, then search its labels."""
+    graph, _ = parse_with_imports(path)
+    entries = label_entries(graph).drop_duplicates("key")
+    lookup = dict(zip(entries["key"], entries["iri"]))
+    return [lookup.get(k) for k in keys_of(labels)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classes", type=int, default=20_000)
+    parser.add_argument("--sources", type=int, default=10)
+    parser.add_argument("--labels", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        imported = tmpdir / "imported.owl"
+        write_ontology(imported, IMPORTED, args.classes // 4, seed=1)
+        ontology = tmpdir / "sfwo.owl"
+        write_ontology(ontology, SFWO, args.classes, [imported.as_uri()])
+        sources = [
+            source_labels(args.labels, args.classes, seed)
+            for seed in range(args.sources)
+        ]
+
+        start = time.perf_counter()
+        before = [per_source_parse(ontology, labels) for labels in sources[:2]]
+        parse_s = (time.perf_counter() - start) / 2
+
+        start = time.perf_counter()
+        path = build_label_index(ontology, tmpdir / "labels")
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        index = load_label_index(ontology, tmpdir / "labels")
+        load_s = time.perf_counter() - start
+        start = time.perf_counter()
+        results = [match_labels(labels, index) for labels in sources]
+        match_s = (time.perf_counter() - start) / args.sources
+
+        graph, imports = parse_with_imports(ontology)
+        assert len(imports) == 2, imports
+        expected = expected_matches(graph)
+        found = match_labels(list(expected), index)
+        assert found.tolist() == list(expected.values())
+        for result, old in zip(results, before):
+            assert result.tolist() == old
+        for labels, result in zip(sources, results):
+            assert result.tolist() == [expected.get(k) for k in keys_of(labels)]
+        keys = sorted(expected)
+        for prefix in ("bacterivore 1", "Fungivore_", "predator 19", "zz"):
+            normalized = normalize_terms([prefix]).iloc[0]
+            start, stop = index.prefix_range(normalized)
+            found = set(index.keys[start:stop].to_pylist())
+            assert found == {k for k in keys if k.startswith(normalized)}, prefix
+        start = time.perf_counter()
+        for i in range(1000):
+            index.prefix(f"{WORDS[i % 5]} {i}")
+        prefix_ms = time.perf_counter() - start
+
+        print(f"index\t{len(index)} labels\t{path.stat().st_size / 2**20:.1f} MiB")
+        print(f"parse and search per source\t{parse_s:.2f}s")
+        print(f"build once\t{build_s:.2f}s")
+        print(f"load (memory-mapped)\t{load_s * 1000:.1f}ms")
+        print(f"match {args.labels} labels per source\t{match_s * 1000:.1f}ms")
+        print(f"prefix search\t{prefix_ms:.2f}ms per search")
+        total_before = parse_s * args.sources
+        total_after = build_s + load_s + match_s * args.sources
+        print(
+            f"{args.sources} sources\t{total_before:.1f}s before"
+            f"\t{total_after:.1f}s with the index"
+            f" ({total_after - build_s:.2f}s once built)"
+        )
@@ -0,0 +1,136 @@
+"""Throughput of slime.load against the in-process stand-in store.
+
+Writes synthetic gzipped N-Quads files for several sources, loads them with
+different worker counts and batch sizes and checks that every named graph
+holds exactly the triples of its file. A load interrupted by failing
+uploads is then resumed to check that only the missing batches are sent
+again and that the previous graph stays in place until the swap. Most
+statements have blank nodes, which the stand-in scopes to one request like
+GraphDB: a file loaded in one batch and in many small ones must give the
+same graph.
+
+Usage: python benchmarks/bench_load.py [--triples 200000] [--sources 4]
+    [--workers 1 4] [--batch-mb 1 8]
+"""
+
+import argparse
+import gzip
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from slime.load import LoadError, load_all, skolem_base, skolemize
+from slime.rebuild import graph_iri
+from slime.testing import StandInStore
+
+
+def write_nquads(path, source_id, n_triples):
+    """Write a source's quads and return its expected (skolemized) statements."""
+    graph = graph_iri(source_id)
+    statements = set()
+    with gzip.open(path, "wt") as f:
+        for i in range(n_triples):
+            s = f"_:{source_id}occurrence{i // 4}"
+            if i % 4 == 0:
+                t = f"{s} <http://purl.obolibrary.org/obo/RO_0002350> <{graph}/taxon/{i}>"
+            elif i % 4 == 1:
+                # Blank objects, shared by occurrences far apart in the file
+                o = f"_:{source_id}site{i % 1000}"
+                t = f"{s} <http://purl.obolibrary.org/obo/RO_0001025> {o}"
+            else:
+                t = f'{s} <http://purl.obolibrary.org/obo/IAO_0000136> "value \\"{i}\\""'
+            statements.add(skolemize(t, skolem_base(graph)))
+            f.write(f"{t} <{graph}> .\n")
+    return statements
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--triples", type=int, default=200_000)
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--batch-mb", type=float, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jobs, expected = {}, {}
+        for i in range(args.sources):
+            source_id = f"bench{i}"
+            jobs[source_id] = Path(tmpdir) / f"{source_id}.nq.gz"
+            expected[graph_iri(source_id)] = write_nquads(
+                jobs[source_id], source_id, args.triples
+            )
+        total = args.sources * args.triples
+
+        print("workers\tbatch MiB\tseconds\ttriples/s")
+        for workers in args.workers:
+            for batch_mb in args.batch_mb:
+                with StandInStore() as store:
+                    start = time.perf_counter()
+                    load_all(
+                        jobs,
+                        url=store.url,
+                        workers=workers,
+                        batch_bytes=int(batch_mb * 2**20),
+                        headers={},
+                        load_dir=Path(tmpdir) / "loads",
+                    )
+                    elapsed = time.perf_counter() - start
+                    assert store.graphs == expected
+                print(f"{workers}\t{batch_mb}\t{elapsed:.2f}\t{total / elapsed:.0f}")
+
+        # Blank nodes shared by several batches stay one node
+        graphs = []
+        for batch_bytes in (2**30, 2**14):
+            with StandInStore() as store:
+                stats = load_all(
+                    jobs,
+                    url=store.url,
+                    batch_bytes=batch_bytes,
+                    headers={},
+                    load_dir=Path(tmpdir) / "loads",
+                )
+                graphs.append(store.graphs)
+        assert graphs[0] == graphs[1] == expected
+        assert not any("_:" in t for g in graphs[1].values() for t in g)
+        with StandInStore() as store:
+            # Without skolemization, the store splits the nodes of two requests
+            graph, text = next(iter(expected)), "_:a <urn:p> <urn:o> .\n"
+            for _ in range(2):
+                store.update(f"INSERT DATA {{ GRAPH <{graph}> {{ {text} }} }}")
+            assert len(store.graphs[graph]) == 2
+        batches = sum(s["batches"] for s in stats.values())
+        print(f"\nsame graphs from 1 and {batches} batches with shared blank nodes")
+
+        # Every third upload fails and is not retried: the load stops half way
+        with StandInStore(fail_every=3) as store:
+            old = {graph: {"<urn:old> <urn:old> <urn:old>"} for graph in expected}
+            store.graphs.update(old)
+            options = dict(
+                url=store.url,
+                workers=2,
+                batch_bytes=2**18,
+                headers={},
+                load_dir=Path(tmpdir) / "loads",
+            )
+            try:
+                load_all(jobs, retries=0, **options)
+            except LoadError:
+                pass
+            unchanged = [g for g in expected if store.graphs[g] == old[g]]
+            assert unchanged, "all graphs were swapped despite failures"
+            sent = store.uploads
+            store.fail_every = 0
+            stats = load_all(jobs, **options)
+            assert store.graphs == expected
+            resumed = sum(s["resumed"] for s in stats.values())
+            batches = sum(s["batches"] for s in stats.values())
+            print(
+                f"\ninterrupted after {sent} uploads, resumed {resumed}/{batches}"
+                f" batches, {store.uploads - sent} uploads to finish,"
+                f" {len(unchanged)} graphs untouched until their swap"
+            )
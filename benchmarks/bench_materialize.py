@@ -0,0 +1,86 @@
+"""Throughput and peak memory of slime.materialize over chunk sizes and workers.
+
+Materializes several copies of a synthetic betsi table with betsi's trait
+mapping. Needs morph-kgc and mapeathor.
+
+Usage: python benchmarks/bench_materialize.py [--rows 200000] [--sources 8]
+    [--chunksizes 10000 50000 100000] [--workers 1 2 4]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.synthetic import write_betsi_annotated
+from slime.materialize import rml_mapping
+
+# Run in a fresh interpreter so that ru_maxrss only covers one configuration
+RUN = """
+import resource, sys, time
+from slime.materialize import materialize_all
+n_sources, data, mapping, outputdir, chunksize, workers = sys.argv[1:]
+jobs = {f"betsi{i}": data for i in range(int(n_sources))}
+start = time.perf_counter()
+stats = materialize_all(
+    jobs, outputdir, workers=int(workers), chunksize=int(chunksize),
+    mappings=dict.fromkeys(jobs, mapping),
+)
+elapsed = time.perf_counter() - start
+triples = sum(s["triples"] for s in stats.values())
+peak = max(
+    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+) / 1024
+print(f"{elapsed:.2f} {triples} {peak:.0f}")
+"""
+
+
+def measure(n_sources, data, mapping, outputdir, chunksize, workers):
+    result = subprocess.run(
+        [sys.executable, "-c", RUN, str(n_sources), data, mapping, outputdir]
+        + [str(chunksize), str(workers)],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT_DIR,
+    )
+    elapsed, triples, peak = result.stdout.split()
+    return float(elapsed), int(triples), float(peak)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--sources", type=int, default=8)
+    parser.add_argument(
+        "--chunksizes", type=int, nargs="+", default=[10_000, 50_000, 100_000]
+    )
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=sorted({1, 2, os.cpu_count()})
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        data = Path(tmpdir) / "integraph_data.tsv"
+        write_betsi_annotated(data, args.rows)
+        mapping = rml_mapping("betsi", workdir=tmpdir)
+        print(f"{args.sources} sources x {args.rows} rows")
+        print(
+            f"{'chunksize':>9} {'workers':>7} {'seconds':>8} {'triples/s':>10} peak RSS"
+        )
+        for chunksize in args.chunksizes:
+            for workers in args.workers:
+                outputdir = Path(tmpdir) / f"out-{chunksize}-{workers}"
+                elapsed, triples, peak = measure(
+                    args.sources, data, mapping, outputdir, chunksize, workers
+                )
+                print(
+                    f"{chunksize:>9} {workers:>7} {elapsed:>8.1f}"
+                    f" {triples / elapsed:>10.0f} {peak:>5.0f} MiB"
+                )
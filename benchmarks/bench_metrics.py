@@ -0,0 +1,95 @@
+"""Check the memory figures and row counts of slime.metrics.
+
+A stage that allocates a large buffer is followed by a stage that allocates
+a small one: the second must report its own peak RSS, not the high-water
+mark left by the first. A synthetic leptraits file is cleaned in one go and
+chunked: both records must hold the rows of the raw table and of the
+cleansed one, and their ratio. Stages of several threads that overlap must
+count the rows of each thread apart.
+
+Usage: python benchmarks/bench_metrics.py [--large-mb 400] [--threads 4]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import pandas as pd
+
+from benchmarks.synthetic import write_leptraits
+from slime import metrics
+from slime.cleanse import SOURCES_DIR, get_chunk_cleaner, load_cleaner, run_source
+
+
+def allocate(mib):
+    buffer = bytearray(mib * 2**20)
+    # Touch every page so that it is resident
+    buffer[:: 2**12] = b"x" * len(buffer[:: 2**12])
+    return len(buffer)
+
+
+def count_rows(n, barrier):
+    with metrics.stage(f"thread{n}", "cleanse"):
+        barrier.wait()
+        for _ in range(n):
+            metrics.count("rows_in", 3)
+        barrier.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--large-mb", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        metrics.configure(tmpdir / "metrics.jsonl")
+        with metrics.stage("large", "cleanse"):
+            allocate(args.large_mb)
+        with metrics.stage("small", "cleanse"):
+            allocate(args.large_mb // 10)
+
+        raw = tmpdir / "leptraits.csv"
+        write_leptraits(raw, 5000)
+        outputs = {}
+        for chunked in (False, True):
+            path = run_source("leptraits", raw, tmpdir / str(chunked), chunked=chunked)
+            outputs[chunked] = len(pd.read_csv(path))
+        module = get_chunk_cleaner(load_cleaner(SOURCES_DIR / "leptraits"))
+        rows_in = len(pd.read_csv(raw, **module.READ_OPTIONS))
+
+        barrier = threading.Barrier(args.threads)
+        threads = [
+            threading.Thread(target=count_rows, args=(n, barrier))
+            for n in range(1, args.threads + 1)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        with open(tmpdir / "metrics.jsonl") as f:
+            records = [json.loads(line) for line in f]
+    cleanse = {r["chunked"]: r for r in records if r["source"] == "leptraits"}
+    records = {r["source"]: r for r in records}
+
+    large, small = records["large"], records["small"]
+    assert large["peak_rss_mib"] > small["peak_rss_mib"] + args.large_mb / 2
+    assert small["max_rss_mib"] >= large["peak_rss_mib"] - 1
+    for chunked, record in cleanse.items():
+        assert record["rows_in"] == rows_in, record
+        assert record["rows_out"] == outputs[chunked], record
+        assert record["amplification"] == outputs[chunked] / rows_in, record
+    for n in range(1, args.threads + 1):
+        assert records[f"thread{n}"]["rows_in"] == 3 * n, records[f"thread{n}"]
+    print("stage\tpeak RSS (MiB)\tprocess high-water mark (MiB)")
+    for name in ("large", "small"):
+        r = records[name]
+        print(f"{name}\t{r['peak_rss_mib']:.0f}\t{r['max_rss_mib']:.0f}")
@@ -0,0 +1,238 @@
+"""Check slime.potential against the SLIMER query and time lookups.
+
+Builds a small SFWO-like ontology (trophic restrictions on single taxa,
+material entities and unionOf lists, inherited through diet class
+hierarchies) and synthetic source N-Quads whose organisms have these diet
+classes. The edge table must equal the answers of the
+``get.potential.interactions`` query, with GraphDB's RDFS inference spelled
+out as property paths, run by pyoxigraph. Then the time to answer a batch of
+consumers is compared between the query and a Parquet lookup. pyoxigraph
+evaluates the property paths slowly, so keep the data small.
+
+Usage: python benchmarks/bench_potential.py [--organisms 300] [--taxa 30]
+    [--batch 20]
+"""
+
+import argparse
+import gzip
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from slime.potential import (
+    COLUMNS,
+    potential_interactions,
+    read_edges,
+    read_ontology,
+    write_parquet,
+)
+from slime.rebuild import graph_iri
+
+OBO = "http://purl.obolibrary.org/obo/"
+SFWO = "http://purl.org/sfwo/SFWO_"
+PREFIXES = f"""
+@prefix obo: <{OBO}> .
+@prefix sfwo: <{SFWO}> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+"""
+
+QUERY = """
+PREFIX obo: <http://purl.obolibrary.org/obo/>
+PREFIX owl: <http://www.w3.org/2002/07/owl#>
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX dwc: <http://rs.tdwg.org/dwc/terms/>
+SELECT DISTINCT ?matchId ?interactionId ?resourceId ?reference ?source WHERE {
+  %s
+  ?organism obo:RO_0002350 [rdf:type ?matchId] .
+  GRAPH ?source { ?organism rdf:type obo:CARO_0001010 . }
+  ?organism rdf:type/rdfs:subClassOf* ?owner .
+  ?owner rdfs:subClassOf ?restriction .
+  ?restriction rdf:type owl:Restriction .
+  ?restriction owl:onProperty ?interactionId .
+  ?interactionId rdfs:subPropertyOf* obo:RO_0002437 .
+  {
+    ?restriction owl:someValuesFrom ?target .
+    ?target owl:unionOf [rdf:rest*/rdf:first ?item] .
+    { ?item owl:someValuesFrom ?resourceId . }
+    UNION
+    { ?item rdfs:subClassOf* obo:BFO_0000040 . BIND(?item AS ?resourceId) }
+  }
+  UNION
+  {
+    { ?restriction owl:someValuesFrom ?resourceId .
+      ?resourceId rdfs:subClassOf* obo:BFO_0000040 . }
+    UNION
+    { ?restriction owl:someValuesFrom [owl:someValuesFrom ?resourceId] .
+      ?resourceId rdfs:subClassOf* obo:NCBITaxon_131567 . }
+  }
+  ?resourceId rdfs:label ?resourceName .
+  ?interactionId rdfs:label ?interactionName .
+  OPTIONAL {
+    ?occurrence obo:OBI_0000293 ?organism .
+    ?occurrence dwc:associatedReferences ?reference .
+  }
+  FILTER(?matchId != obo:CARO_0001010)
+  FILTER(?matchId != obo:PCO_0000059)
+  FILTER(?resourceId != obo:PCO_0000059)
+  FILTER(?resourceId != obo:NCBITaxon_131567)
+  FILTER(?resourceId != obo:BFO_0000040)
+}
+"""
+
+
+def write_ontology(path, n_diets=40, seed=0):
+    rng = random.Random(seed)
+    lines = [PREFIXES]
+    lines.append('obo:RO_0002437 rdfs:label "biotically interacts with" .')
+    lines.append(
+        'obo:RO_0002470 rdfs:subPropertyOf obo:RO_0002437 ; rdfs:label "eats" .'
+    )
+    lines.append(
+        'obo:RO_0002439 rdfs:subPropertyOf obo:RO_0002470 ; rdfs:label "preys on" .'
+    )
+    lines.append('obo:RO_0002454 rdfs:label "has host" .')  # not trophic
+    for i in range(2, 12):
+        lines.append(
+            f"obo:NCBITaxon_{i} rdfs:subClassOf obo:NCBITaxon_131567 ;"
+            f' rdfs:label "taxon {i}" .'
+        )
+    lines.append('obo:NCBITaxon_131567 rdfs:label "cellular organisms" .')
+    for i in range(5):
+        lines.append(
+            f"obo:ENVO_{i} rdfs:subClassOf obo:BFO_0000040 ;"
+            f' rdfs:label "material {i}" .'
+        )
+    lines.append("obo:ENVO_9 rdfs:subClassOf obo:ENVO_0 .")  # unlabelled
+    properties = ["obo:RO_0002470", "obo:RO_0002439", "obo:RO_0002454"]
+    for d in range(n_diets):
+        parent = f" rdfs:subClassOf sfwo:{rng.randrange(d):07d} ;" if d else ""
+        kind = rng.randrange(4)
+        prop = rng.choice(properties)
+        if kind == 0:
+            target = f"[ a owl:Restriction ; owl:onProperty obo:RO_0002350 ; owl:someValuesFrom obo:NCBITaxon_{rng.randrange(2, 12)} ]"
+        elif kind == 1:
+            target = f"obo:ENVO_{rng.choice([0, 1, 2, 3, 4, 9])}"
+        elif kind == 2:
+            items = " ".join(
+                (
+                    f"[ a owl:Restriction ; owl:onProperty obo:RO_0002350 ; owl:someValuesFrom obo:NCBITaxon_{rng.randrange(2, 12)} ]"
+                    if rng.random() < 0.5
+                    else f"obo:ENVO_{rng.randrange(5)}"
+                )
+                for _ in range(rng.randrange(1, 4))
+            )
+            target = f"[ owl:unionOf ( {items} ) ]"
+        else:
+            target = None
+        restriction = (
+            f" rdfs:subClassOf [ a owl:Restriction ; owl:onProperty {prop} ;"
+            f" owl:someValuesFrom {target} ] ;"
+            if target
+            else ""
+        )
+        lines.append(f'sfwo:{d:07d}{parent}{restriction} rdfs:label "diet {d}" .')
+    Path(path).write_text("\n".join(lines) + "\n")
+
+
+def write_source(path, source_id, n_organisms, n_taxa, n_diets=40, seed=0):
+    rng = random.Random(seed)
+    graph = f"<{graph_iri(source_id)}>"
+    rdf_type = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+    with gzip.open(path, "wt") as f:
+        for i in range(n_organisms):
+            occ, org, tax = (f"_:occ{i}", f"_:org{i}", f"_:tax{i}")
+            diet = f"<{SFWO}{rng.randrange(n_diets):07d}>"
+            taxon = f"<{OBO}NCBITaxon_{1000 + rng.randrange(n_taxa)}>"
+            f.write(f"{occ} <{OBO}OBI_0000293> {org} {graph} .\n")
+            f.write(f"{org} {rdf_type} <{OBO}CARO_0001010> {graph} .\n")
+            f.write(f"{org} {rdf_type} {diet} {graph} .\n")
+            f.write(f"{org} <{OBO}RO_0002350> {tax} {graph} .\n")
+            f.write(f"{tax} {rdf_type} <{OBO}PCO_0000059> {graph} .\n")
+            f.write(f"{tax} {rdf_type} {taxon} {graph} .\n")
+            if rng.random() < 0.7:
+                reference = f'"ref {rng.randrange(50)} \\"et al.\\""'
+                f.write(
+                    f"{occ} <http://rs.tdwg.org/dwc/terms/associatedReferences>"
+                    f" {reference} {graph} .\n"
+                )
+
+
+def query_edges(store, consumers=None):
+    values = ""
+    if consumers is not None:
+        values = "VALUES ?matchId { %s }" % " ".join(f"<{c}>" for c in consumers)
+    rows = set()
+    # GraphDB's default graph is the union of all graphs
+    solutions = store.query(QUERY % values, use_default_graph_as_union=True)
+    for solution in solutions:
+        reference = solution["reference"]
+        rows.add(
+            (
+                solution["matchId"].value,
+                solution["interactionId"].value,
+                solution["resourceId"].value,
+                reference.value if reference is not None else None,
+                solution["source"].value,
+            )
+        )
+    return rows
+
+
+def table_rows(edges):
+    return {
+        tuple(None if v != v else v for v in row)
+        for row in edges[COLUMNS[:5]].itertuples(index=False)
+    }
+
+
+if __name__ == "__main__":
+    import pyoxigraph
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--organisms", type=int, default=300)
+    parser.add_argument("--taxa", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        write_ontology(tmpdir / "sfwo.ttl")
+        jobs = {}
+        for i, source_id in enumerate(["bench_a", "bench_b"]):
+            jobs[source_id] = tmpdir / f"{source_id}.nq.gz"
+            write_source(jobs[source_id], source_id, args.organisms, args.taxa, seed=i)
+
+        start = time.perf_counter()
+        edges = potential_interactions(jobs, read_ontology(tmpdir / "sfwo.ttl"))
+        write_parquet(edges, tmpdir / "edges.parquet", row_group_size=10_000)
+        build = time.perf_counter() - start
+        print(f"edge table: {len(edges)} edges in {build:.2f}s")
+
+        store = pyoxigraph.Store()
+        store.load(str(tmpdir / "sfwo.ttl"), "text/turtle")
+        for path in jobs.values():
+            with gzip.open(path, "rb") as f:
+                store.load(f, "application/n-quads")
+        expected = query_edges(store)
+        assert table_rows(edges) == expected, table_rows(edges) ^ expected
+        print(f"same {len(expected)} edges as the SLIMER query")
+
+        consumers = sorted(edges["consumer"].unique())[: args.batch]
+        start = time.perf_counter()
+        queried = query_edges(store, consumers)
+        sparql = time.perf_counter() - start
+        start = time.perf_counter()
+        looked_up = read_edges(tmpdir / "edges.parquet", consumers)
+        lookup = time.perf_counter() - start
+        assert table_rows(looked_up) == queried
+        print(
+            f"{len(consumers)} consumers: query {sparql:.2f}s,"
+            f" Parquet lookup {lookup:.3f}s"
+        )
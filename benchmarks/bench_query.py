@@ -0,0 +1,356 @@
+"""Check slime.query against the SLIMER queries and time batches of taxa.
+
+Builds a small ontology (diet, guild and trophic group hierarchies, diet
+restrictions on guilds, resources), a taxonomy of labelled NCBITaxon classes
+and synthetic source N-Quads with organisms, occurrences, diets, guilds,
+trophic groups and interactions. The answers of a snapshot of these sources
+must equal those of the ``get.diets``, ``get.guilds``,
+``get.trophic.groups`` and ``get.interactions`` queries run by pyoxigraph,
+with GraphDB's RDFS inference and ``sesame:directType`` spelled out as
+property paths, formatted like ``format.result.df``. Then the time to
+answer a batch of taxa is compared. pyoxigraph evaluates the property paths
+slowly, so keep the data small.
+
+Usage: python benchmarks/bench_query.py [--organisms 200] [--taxa 40]
+    [--batch 20]
+"""
+
+import argparse
+import gzip
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import pandas as pd
+
+from slime.query import Snapshot, expand, export_snapshot, format_result
+from slime.rebuild import graph_iri
+
+OBO = "http://purl.obolibrary.org/obo/"
+SFWO = "http://purl.org/sfwo/SFWO_"
+RDF_TYPE = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+REFERENCES = "<http://rs.tdwg.org/dwc/terms/associatedReferences>"
+PREFIXES = f"""
+@prefix obo: <{OBO}> .
+@prefix sfwo: <{SFWO}> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+"""
+N_DIETS, N_GUILDS, N_GROUPS = 12, 8, 5
+
+HEADER = """
+PREFIX obo: <http://purl.obolibrary.org/obo/>
+PREFIX owl: <http://www.w3.org/2002/07/owl#>
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX dwc: <http://rs.tdwg.org/dwc/terms/>
+PREFIX SFWO: <http://purl.org/sfwo/SFWO_>
+SELECT DISTINCT ?queryName ?queryId ?matchName ?matchId %s ?reference ?source
+    ?inferred WHERE {
+  %s
+  ?organism obo:RO_0002350 ?taxon .
+  ?taxon rdf:type ?matchId .
+  FILTER NOT EXISTS {
+    ?taxon rdf:type ?other .
+    ?other rdfs:subClassOf+ ?matchId .
+    FILTER(?other != ?matchId)
+  }
+  ?matchId rdfs:subClassOf* ?queryId .
+  ?matchId rdfs:label ?matchName .
+  GRAPH ?source { ?organism rdf:type obo:CARO_0001010 . }
+  %s
+  FILTER(?matchId != obo:CARO_0001010)
+}
+"""
+BY_NAME = "?queryId rdfs:label ?queryName ."
+QUERIES = {
+    "diets": (
+        "?dietId ?dietName",
+        """
+        {
+          GRAPH ?graph { ?occurrence obo:OBI_0000293 ?organism . }
+          ?organism obo:RO_0000086 ?diet .
+          ?diet rdf:type/rdfs:subClassOf* ?dietId .
+          OPTIONAL { ?occurrence dwc:associatedReferences ?reference . }
+          BIND(false AS ?inferred)
+        }
+        UNION
+        {
+          ?organism rdf:type/rdfs:subClassOf* ?owner .
+          ?owner rdfs:subClassOf ?restriction .
+          ?restriction owl:onProperty obo:RO_0000086 .
+          ?restriction owl:someValuesFrom ?dietId .
+          BIND(true AS ?inferred)
+        }
+        ?dietId rdfs:subClassOf* obo:PATO_0000056 .
+        ?dietId rdfs:label ?dietName .
+        FILTER(?dietId != obo:PATO_0000056)
+        FILTER(?dietId != SFWO:0000475)
+        """,
+    ),
+    "guilds": (
+        "?guildId ?guildName",
+        """
+        {
+          ?organism rdf:type ?guildId .
+          OPTIONAL {
+            ?occurrence obo:OBI_0000293 ?organism .
+            ?occurrence dwc:associatedReferences ?reference .
+          }
+          BIND(false AS ?inferred)
+        }
+        UNION
+        {
+          ?organism rdf:type/rdfs:subClassOf+ ?guildId .
+          FILTER NOT EXISTS { ?organism rdf:type ?guildId . }
+          BIND(true AS ?inferred)
+        }
+        ?guildId rdfs:subClassOf* obo:CARO_0001010 .
+        ?guildId rdfs:label ?guildName .
+        FILTER(?guildId != obo:CARO_0001010)
+        FILTER(?guildId != obo:OBI_0100026)
+        """,
+    ),
+    "trophic_groups": (
+        "?trophicGroupId ?trophicGroupName",
+        """
+        ?organism obo:RO_0002350 ?group .
+        ?group rdf:type/rdfs:subClassOf* ?trophicGroupId .
+        ?trophicGroupId rdfs:subClassOf* SFWO:0000127 .
+        ?trophicGroupId rdfs:label ?trophicGroupName .
+        FILTER(?trophicGroupId != SFWO:0000127)
+        BIND(false AS ?inferred)
+        """,
+    ),
+    "interactions": (
+        "?interactionId ?interactionName ?resourceId ?resourceName",
+        """
+        ?interaction obo:RO_0002233 ?organism .
+        ?interaction obo:RO_0002233 ?target .
+        ?organism ?interactionId ?target .
+        { ?target obo:RO_0002350 [rdf:type ?resourceId] . }
+        UNION
+        { ?target rdf:type ?resourceId . }
+        ?resourceId rdfs:label ?resourceName .
+        ?interactionId rdfs:label ?interactionName .
+        ?data obo:IAO_0000136 ?interaction .
+        OPTIONAL { ?data dwc:associatedReferences ?reference . }
+        FILTER(?organism != ?target)
+        FILTER(?resourceId != obo:PCO_0000059)
+        FILTER(?resourceId != obo:BFO_0000040)
+        BIND(false AS ?inferred)
+        """,
+    ),
+}
+
+
+def write_ontology(path, seed=0):
+    rng = random.Random(seed)
+    lines = [PREFIXES]
+    lines.append('obo:CARO_0001010 rdfs:label "organism" .')
+    lines.append('obo:PATO_0000056 rdfs:label "diet" .')
+    lines.append('sfwo:0000475 rdfs:subClassOf obo:PATO_0000056 ; rdfs:label "x" .')
+    lines.append('sfwo:0000127 rdfs:label "trophic group" .')
+    lines.append('obo:OBI_0100026 rdfs:subClassOf obo:CARO_0001010 ; rdfs:label "o" .')
+    lines.append('obo:RO_0002470 rdfs:label "eats" .')
+    lines.append('obo:RO_0002454 rdfs:label "has host" .')
+    for i in range(4):
+        lines.append(
+            f'obo:ENVO_{i} rdfs:subClassOf obo:BFO_0000040 ; rdfs:label "material {i}" .'
+        )
+    for d in range(N_DIETS):
+        parent = f"sfwo:1{rng.randrange(d):06d}" if d else "obo:PATO_0000056"
+        lines.append(
+            f'sfwo:1{d:06d} rdfs:subClassOf {parent} ; rdfs:label "diet {d}" .'
+        )
+    for g in range(N_GUILDS):
+        parent = f"sfwo:2{rng.randrange(g):06d}" if g else "obo:CARO_0001010"
+        restriction = ""
+        if rng.random() < 0.6:
+            diet = rng.choice([f"sfwo:1{rng.randrange(N_DIETS):06d}", "sfwo:0000475"])
+            restriction = (
+                " rdfs:subClassOf [ a owl:Restriction ;"
+                f" owl:onProperty obo:RO_0000086 ; owl:someValuesFrom {diet} ] ;"
+            )
+        lines.append(
+            f"sfwo:2{g:06d} rdfs:subClassOf {parent} ;{restriction}"
+            f' rdfs:label "guild {g}" .'
+        )
+    for t in range(N_GROUPS):
+        parent = f"sfwo:3{rng.randrange(t):06d}" if t else "sfwo:0000127"
+        lines.append(
+            f'sfwo:3{t:06d} rdfs:subClassOf {parent} ; rdfs:label "group {t}" .'
+        )
+    Path(path).write_text("\n".join(lines) + "\n")
+
+
+def write_taxonomy(path, n_taxa, seed=0):
+    """Write a random tree of 2 * n_taxa labelled taxa, the last n_taxa leaves."""
+    rng = random.Random(seed)
+    label = "<http://www.w3.org/2000/01/rdf-schema#label>"
+    subclass = "<http://www.w3.org/2000/01/rdf-schema#subClassOf>"
+    with open(path, "w") as f:
+        for i in range(n_taxa * 2):
+            taxon = f"<{OBO}NCBITaxon_{i}>"
+            f.write(f'{taxon} {label} "Taxon {i}" .\n')
+            if i:
+                parent = rng.randrange(i) if i < n_taxa else rng.randrange(n_taxa)
+                f.write(f"{taxon} {subclass} <{OBO}NCBITaxon_{parent}> .\n")
+
+
+def write_source(path, source_id, n_organisms, n_taxa, seed=0):
+    rng = random.Random(seed)
+    graph = f"<{graph_iri(source_id)}>"
+
+    def triple(s, p, o):
+        f.write(f"{s} {p} {o} {graph} .\n")
+
+    def obo(term):
+        return f"<{OBO}{term}>"
+
+    with gzip.open(path, "wt") as f:
+        organisms = []
+        for i in range(n_organisms):
+            occ, org, tax = (
+                f"_:{source_id}occ{i}",
+                f"_:{source_id}org{i}",
+                f"_:tax{i}",
+            )
+            organisms.append(org)
+            triple(org, RDF_TYPE, obo("CARO_0001010"))
+            triple(org, obo("RO_0002350"), tax)
+            triple(tax, RDF_TYPE, obo("PCO_0000059"))
+            taxon = n_taxa + rng.randrange(n_taxa)
+            triple(tax, RDF_TYPE, obo(f"NCBITaxon_{taxon}"))
+            if rng.random() < 0.1:  # a redundant superclass
+                triple(tax, RDF_TYPE, obo("NCBITaxon_0"))
+            if rng.random() < 0.8:
+                triple(occ, obo("OBI_0000293"), org)
+                if rng.random() < 0.7:
+                    triple(occ, REFERENCES, f'"ref {rng.randrange(30)} \\"et al.\\""')
+            if rng.random() < 0.6:
+                quality = f"_:{source_id}q{i}"
+                triple(org, obo("RO_0000086"), quality)
+                triple(quality, RDF_TYPE, f"<{SFWO}1{rng.randrange(N_DIETS):06d}>")
+            if rng.random() < 0.6:
+                triple(org, RDF_TYPE, f"<{SFWO}2{rng.randrange(N_GUILDS):06d}>")
+            if rng.random() < 0.3:
+                group = f"_:{source_id}g{i}"
+                triple(org, obo("RO_0002350"), group)
+                triple(group, RDF_TYPE, f"<{SFWO}3{rng.randrange(N_GROUPS):06d}>")
+        for i in range(n_organisms // 2):
+            interaction = f"_:{source_id}i{i}"
+            org = rng.choice(organisms)
+            if rng.random() < 0.7:
+                target = rng.choice(organisms)
+            else:
+                target = f"_:{source_id}res{i}"
+                triple(target, RDF_TYPE, obo(f"ENVO_{rng.randrange(4)}"))
+            predicate = rng.choice(["RO_0002470", "RO_0002454"])
+            triple(interaction, obo("RO_0002233"), org)
+            triple(interaction, obo("RO_0002233"), target)
+            triple(org, obo(predicate), target)
+            data = f"_:{source_id}d{i}"
+            triple(data, obo("IAO_0000136"), interaction)
+            if rng.random() < 0.5:
+                triple(data, REFERENCES, f'"ref {rng.randrange(30)}"')
+
+
+def query_answer(store, question, taxid=None, sci_name=None):
+    if sci_name is not None:
+        names = " ".join(f'"{name}"' for name in sci_name)
+        values = f"VALUES ?queryName {{ {names} }} {BY_NAME}"
+    else:
+        values = "VALUES ?queryId { %s }" % " ".join(f"<{expand(t)}>" for t in taxid)
+    columns, pattern = QUERIES[question]
+    query = HEADER % (columns, values, pattern)
+    if sci_name is not None:
+        query = query.replace("?queryName ?queryId", "?queryName", 1)
+    else:
+        query = query.replace("?queryName ?queryId", "?queryId", 1)
+    names = ["queryName", "queryId", "matchName", "matchId"]
+    names += columns.replace("?", "").split() + ["reference", "source", "inferred"]
+    rows = []
+    for solution in store.query(query, use_default_graph_as_union=True):
+        row = []
+        for name in names:
+            try:
+                term = solution[name]
+            except (KeyError, IndexError):
+                term = None
+            row.append(term.value if term is not None else None)
+        rows.append(row)
+    df = pd.DataFrame(rows, columns=names)
+    targets = [c for c in names[4:-3] if c.endswith("Id")]
+    return format_result(df, ["queryId", "matchId", *targets, "source"])
+
+
+def answer_rows(df):
+    rows = set()
+    for row in df.itertuples(index=False):
+        rows.add(
+            tuple(
+                tuple(sorted(map(str, v))) if isinstance(v, list) else str(v)
+                for v in row
+            )
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    import pyoxigraph
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--organisms", type=int, default=200)
+    parser.add_argument("--taxa", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        write_ontology(tmpdir / "sfwo.ttl")
+        write_taxonomy(tmpdir / "taxonomy.nt", args.taxa)
+        jobs = {}
+        for i, source_id in enumerate(["bench_a", "bench_b"]):
+            jobs[source_id] = tmpdir / f"{source_id}.nq.gz"
+            write_source(jobs[source_id], source_id, args.organisms, args.taxa, seed=i)
+
+        start = time.perf_counter()
+        sizes = export_snapshot(
+            jobs, tmpdir / "snapshot", tmpdir / "sfwo.ttl", [tmpdir / "taxonomy.nt"]
+        )
+        print(f"snapshot exported in {time.perf_counter() - start:.2f}s: {sizes}")
+        snapshot = Snapshot(tmpdir / "snapshot")
+
+        store = pyoxigraph.Store()
+        store.load(str(tmpdir / "sfwo.ttl"), "text/turtle")
+        store.load(str(tmpdir / "taxonomy.nt"), "application/n-triples")
+        for path in jobs.values():
+            with gzip.open(path, "rb") as f:
+                store.load(f, "application/n-quads")
+
+        rng = random.Random(0)
+        taxid = [f"NCBITaxon:{rng.randrange(args.taxa * 2)}" for _ in range(args.batch)]
+        sci_name = [f"Taxon {rng.randrange(args.taxa)}" for _ in range(args.batch)]
+        print("question\tmode\trows\tSPARQL s\tsnapshot s")
+        for question in QUERIES:
+            for mode, kwargs in (
+                ("taxid", {"taxid": taxid}),
+                ("name", {"sci_name": sci_name}),
+            ):
+                start = time.perf_counter()
+                expected = query_answer(store, question, **kwargs)
+                sparql = time.perf_counter() - start
+                start = time.perf_counter()
+                answer = snapshot.answer(question, **kwargs)
+                local = time.perf_counter() - start
+                assert list(answer.columns) == list(expected.columns)
+                assert answer_rows(answer) == answer_rows(expected), answer_rows(
+                    answer
+                ) ^ answer_rows(expected)
+                print(f"{question}\t{mode}\t{len(answer)}\t{sparql:.2f}\t{local:.3f}")
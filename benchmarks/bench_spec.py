@@ -0,0 +1,234 @@
+"""Compare the compiled cleansing specs with the clean.py code they replace.
+
+For each source whose cleansing is declared in ``[transform.cleanse]``, a
+synthetic raw file is cleaned by the former clean.py implementation (kept
+below) and by the plan compiled from the spec. The outputs must hold the
+same rows and columns; rainford_hexapoda's is only compared after resetting
+the index, as the spec melts the stages instead of concatenating three
+copies. Plans that support chunked reads are also checked against their
+chunked output. Times and traced peak memory of both are printed.
+
+Usage: python benchmarks/bench_spec.py [--rows 100000] [--sources pantheon]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.synthetic import GENERATORS, WORKBOOK_GENERATORS
+from slime.cleanse import clean_file
+from slime.excel import read_excel
+from slime.spec import load_spec
+from slime.tables import read_table
+
+
+def legacy_bactotraits(f_in):
+    df = pd.read_csv(f_in, header=[2], sep=";", encoding_errors="ignore")
+    df = df.rename(
+        columns={
+            "TT_heterotroph": "heterotroph",
+            "TT_autotroph": "autotroph",
+            "TT_organotroph": "organotroph",
+            "TT_lithotroph": "lithotroph",
+            "TT_chemotroph": "chemotroph",
+            "TT_phototroph": "phototroph",
+            "TT_copiotroph_diazotroph": "diazotroph",
+            "TT_methylotroph": "methylotroph",
+            "TT_oligotroph": "oligotroph",
+        }
+    )
+    df["copiotroph"] = df["diazotroph"]
+    return df
+
+
+def legacy_betsi(f_in):
+    df = pd.read_csv(
+        f_in,
+        sep=";",
+        usecols=["taxon_name", "trait_name", "attribute_trait", "source_fauna"],
+        encoding_errors="ignore",
+    )
+    return df[df["trait_name"] == "Diet"]
+
+
+def legacy_gossner_arthropoda(f_in):
+    guild_dict = {
+        "h": "herbivore",
+        "c": "carnivore",
+        "f": "fungivore",
+        "d": "detritivore",
+        "o": "omnivore",
+    }
+    df = pd.read_csv(f_in, sep="\t", encoding_errors="replace")
+    df["Feeding_guild"] = df["Feeding_guild"].str.replace("[\\(\\)]", "", regex=True)
+    df["Feeding_guild"] = df["Feeding_guild"].str.split("-")
+    df = df.explode("Feeding_guild")
+    df["Feeding_guild"] = df["Feeding_guild"].map(guild_dict)
+    return df
+
+
+def legacy_adl_protista(f_in):
+    df = pd.read_csv(f_in, sep="\t")
+    df["taxid"] = df["taxid"].str.replace("_", ":")
+    df["consumer_name"] = df["full.taxonomic.path"].apply(
+        lambda x: x.split(";")[-2].strip()
+    )
+    df = df.drop(df[df.consumer_name == "Incertae Sedis"].index)
+    df["trophic.group"] = df["trophic.group"].str.split("|")
+    df = (
+        df.assign(trophic_group=df["trophic.group"])
+        .explode("trophic.group")
+        .drop(columns=["trophic_group"])
+        .dropna(subset=["trophic.group"])
+    )
+    df["trophic.group"] = df["trophic.group"].apply(
+        lambda x: str(x) + "e" if x.endswith("phag") or x.endswith("or") else str(x)
+    )
+    return df
+
+
+def legacy_pantheon(f_in):
+    df = pd.read_csv(f_in, encoding="latin1")
+    df["consumer_name"] = df["Genus"] + " " + df["Species"]
+    df = df.drop(df[df["Diet"] == "Not in paper"].index)
+    df["Diet"] = df["Diet"].astype(str).str[:-4].str.split(" + ", regex=False)
+    df = df.explode("Diet")
+    df["Diet"] = df["Diet"].str.capitalize()
+    return df
+
+
+def legacy_rainford_hexapoda(f_in):
+    diet_dict = {
+        "1": "fungivore",
+        "2": "detritivore",
+        "3": "phytophage",
+        "4": "predator",
+        "5": "parasitoid",
+        "6": "ectoparasite",
+        "7": "non-feeding",
+        "8": "nectarivore",
+    }
+    df = read_excel(f_in)
+    df.columns = [
+        "Taxon",
+        "Tip name",
+        "Extant richness",
+        "Larval diet",
+        "PS State",
+        "Adult diet",
+    ]
+    df = df.drop(0)
+
+    df_larval = df.drop(columns=["PS State", "Adult diet"]).rename(
+        columns={"Larval diet": "diet"}
+    )
+    df_larval["stage"] = "larval"
+    df_ps = df.drop(columns=["Larval diet", "Adult diet"]).rename(
+        columns={"PS State": "diet"}
+    )
+    df_ps["stage"] = "PS"
+    df_adult = df.drop(columns=["Larval diet", "PS State"]).rename(
+        columns={"Adult diet": "diet"}
+    )
+    df_adult["stage"] = "adult"
+
+    df_per_stage = [df_larval, df_ps, df_adult]
+    for df in df_per_stage:
+        df["diet"] = (
+            df["diet"]
+            .astype(str)
+            .str.replace(r"\([^()]*\)", "", regex=True)
+            .str.strip()
+        )
+        df["diet"] = df["diet"].str.split("&")
+    df_per_stage = [df.explode("diet") for df in df_per_stage]
+
+    df = pd.concat(df_per_stage, ignore_index=True)
+    df["diet"] = df["diet"].replace(diet_dict)
+    df["Taxon"] = df["Taxon"].str.split(" ").str[-1]
+    df["Taxon"] = df["Taxon"].replace("\n", " ", regex=False)
+    df["Taxon"] = df["Taxon"].replace(
+        "Collembola_Brachystomellidae", "Brachystomellidae", regex=False
+    )
+    return df
+
+
+LEGACY = {
+    "adl_protista": legacy_adl_protista,
+    "bactotraits": legacy_bactotraits,
+    "betsi": legacy_betsi,
+    "global_ants": legacy_pantheon,
+    "gossner_arthropoda": legacy_gossner_arthropoda,
+    "pantheon": legacy_pantheon,
+    "rainford_hexapoda": legacy_rainford_hexapoda,
+}
+# Sources whose output has a different index and column order
+UNORDERED = {"rainford_hexapoda"}
+
+
+def measure(func, *args):
+    """Time a run, then trace the memory of another (tracing slows pandas down)."""
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def same_table(expected, found, unordered=False):
+    if unordered:
+        expected = expected.reset_index(drop=True)
+        found = found[list(expected.columns)].reset_index(drop=True)
+    return set(expected.columns) == set(found.columns) and expected.astype(str).equals(
+        found[list(expected.columns)].astype(str)
+    )
+
+
+if __name__ == "__main__":
+    generators = {**GENERATORS, **WORKBOOK_GENERATORS}
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--sources", nargs="+", choices=sorted(LEGACY))
+    args = parser.parse_args()
+
+    print("source\trows\tcode s\tspec s\tcode MiB\tspec MiB\tchunked")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        for source_id in args.sources or sorted(LEGACY):
+            write, filename = generators[source_id]
+            filepath = tmpdir / source_id / filename
+            filepath.parent.mkdir()
+            # Workbooks are slow to write: use fewer rows
+            n_rows = args.rows if source_id in GENERATORS else args.rows // 20
+            write(filepath, n_rows)
+            plan = load_spec(ROOT_DIR / "sources" / source_id)
+            if source_id in WORKBOOK_GENERATORS:
+                # Time the cleaning rather than the first parse of the workbook
+                plan.read(filepath)
+                read_excel(filepath)
+            expected, code_s, code_mib = measure(LEGACY[source_id], filepath)
+            found, spec_s, spec_mib = measure(plan, filepath)
+            assert same_table(expected, found, source_id in UNORDERED), source_id
+            chunked = "-"
+            if plan.READ_OPTIONS is not None:
+                whole = clean_file(plan, filepath, tmpdir / "whole" / source_id)
+                parts = clean_file(
+                    plan, filepath, tmpdir / "chunked" / source_id, chunked=True
+                )
+                assert read_table(whole).equals(read_table(parts)), source_id
+                chunked = "same"
+            print(
+                f"{source_id}\t{len(found)}\t{code_s:.3f}\t{spec_s:.3f}"
+                f"\t{code_mib:.0f}\t{spec_mib:.0f}\t{chunked}"
+            )
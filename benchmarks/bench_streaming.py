@@ -0,0 +1,102 @@
+"""Check the chunked cleanse mode and measure its peak memory.
+
+Every source that can be streamed is cleaned from a synthetic raw file of a
+few chunks, in one go and chunked: both outputs must be byte for byte the
+same (the BactoTraits file has missing values in a few blocks only, so that
+blocks infer different dtypes). Then both modes are run on a BETSI-shaped
+file of ``--rows`` rows, each in a fresh interpreter, and the peak RSS of
+the cleanse is sampled while it runs.
+
+Usage: python benchmarks/bench_streaming.py [--rows 10000000] [--chunks 5]
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.synthetic import GENERATORS, write_betsi
+from slime.cleanse import (
+    SOURCES_DIR,
+    clean_file,
+    get_chunk_cleaner,
+    load_cleaner,
+    read_chunksize,
+)
+
+RUN = """
+import sys, time
+from slime.cleanse import run_source
+from slime.metrics import RssSampler
+start = time.perf_counter()
+with RssSampler() as sampler:
+    out = run_source("betsi", sys.argv[1], sys.argv[2], chunked=sys.argv[3] == "1")
+elapsed = time.perf_counter() - start
+with open(out) as f:
+    n_rows = sum(1 for _ in f) - 1
+print(f"{elapsed:.2f} {sampler.peak:.0f} {n_rows}")
+"""
+
+
+def streamed_sources():
+    for source_id in GENERATORS:
+        source_dir = SOURCES_DIR / source_id
+        chunksize = read_chunksize(source_dir)
+        if chunksize and get_chunk_cleaner(load_cleaner(source_dir)):
+            yield source_id, chunksize
+
+
+def check_same_output(tmpdir, n_chunks):
+    print("source\trows\tchunksize\tbytes")
+    for source_id, chunksize in streamed_sources():
+        write, filename = GENERATORS[source_id]
+        n_rows = n_chunks * chunksize + chunksize // 3
+        filepath = Path(tmpdir) / source_id / filename
+        filepath.parent.mkdir(parents=True)
+        write(filepath, n_rows)
+        clean = load_cleaner(SOURCES_DIR / source_id)
+        whole, chunked = (
+            clean_file(clean, filepath, Path(tmpdir) / source_id / mode, **kwargs)
+            for mode, kwargs in (("whole", {}), ("chunked", {"chunked": True}))
+        )
+        expected = whole.read_bytes()
+        assert chunked.read_bytes() == expected, source_id
+        print(f"{source_id}\t{n_rows}\t{chunksize}\t{len(expected)}")
+
+
+def measure(filepath, outputdir, chunked):
+    result = subprocess.run(
+        [sys.executable, "-c", RUN, filepath, outputdir, "1" if chunked else "0"],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT_DIR,
+    )
+    elapsed, peak, n_rows = result.stdout.split()
+    return float(elapsed), float(peak), int(n_rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--chunks", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        check_same_output(tmpdir, args.chunks)
+
+        filepath = Path(tmpdir) / "BETSI.csv"
+        write_betsi(filepath, args.rows)
+        size = filepath.stat().st_size / 2**20
+        print(f"{args.rows} rows, {size:.0f} MiB")
+        for chunked in (False, True):
+            outputdir = Path(tmpdir) / ("chunked" if chunked else "full")
+            elapsed, peak, n_rows = measure(filepath, outputdir, chunked)
+            mode = "chunked" if chunked else "full"
+            print(
+                f"{mode:<8} {elapsed:7.2f}s  peak RSS {peak:7.0f} MiB  {n_rows} rows out"
+            )
@@ -0,0 +1,122 @@
+"""Check and time the cleansed table formats of slime.tables.
+
+Synthetic raw files of a few sources are cleaned in every format, whole and
+chunked. CSV outputs must keep the name of the raw file (the one inteGraph
+reads), columnar outputs must have the suffix of their format and never a .csv
+one, and all must hold the rows of the CSV output. The clean.py entry point
+run by inteGraph must refuse a columnar format. A raw file with a header and
+no rows must still give a file with the columns of the source in every format,
+as must a writer closed before anything was written and the deduplication of
+an empty table.
+
+Usage: python benchmarks/bench_tables.py [--rows 200000] [--sources betsi]
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.synthetic import GENERATORS
+from slime.cleanse import load_cleaner, main, run_source
+from slime.dedup import dedup_source
+from slime.tables import FORMATS, TableWriter, format_of, output_name, read_table
+
+
+def as_text(df):
+    return df.reset_index(drop=True).astype(str)
+
+
+def check_empty(tmpdir, source_id, raw_path, columns):
+    """Clean a raw file without rows, then deduplicate its output."""
+    empty_raw = tmpdir / "empty" / raw_path.name
+    empty_raw.parent.mkdir(parents=True, exist_ok=True)
+    with open(raw_path, "rb") as f, open(empty_raw, "wb") as out:
+        out.write(f.readline())
+    for output_format in FORMATS:
+        for chunked in (False, True):
+            outputdir = tmpdir / "empty" / f"{output_format}-{chunked}"
+            path = run_source(
+                source_id,
+                empty_raw,
+                outputdir,
+                chunked=chunked,
+                output_format=output_format,
+            )
+            df = read_table(path)
+            assert len(df) == 0 and df.columns.tolist() == columns, (output_format, df)
+            copy = tmpdir / "empty" / f"dedup-{output_format}-{chunked}" / path.name
+            dedup_source(source_id, path, copy, None, None)
+            assert read_table(copy).columns.tolist() == columns, output_format
+
+
+def check_unwritten(tmpdir):
+    for output_format in FORMATS:
+        path = tmpdir / output_name("unwritten.csv", output_format)
+        with TableWriter(path, output_format, ["site", "consumer"]):
+            pass
+        df = read_table(path)
+        assert len(df) == 0 and df.columns.tolist() == ["site", "consumer"], df
+        assert format_of(path) == output_format
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--sources", nargs="+", default=["betsi", "pantheon"])
+    args = parser.parse_args()
+
+    print("source\tformat\tchunked\tMiB\tclean s\tread s")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        check_unwritten(tmpdir)
+        for source_id in args.sources:
+            write, filename = GENERATORS[source_id]
+            raw_path = tmpdir / "raw" / source_id / filename
+            raw_path.parent.mkdir(parents=True, exist_ok=True)
+            write(raw_path, args.rows)
+            expected = None
+            for output_format in FORMATS:
+                for chunked in (False, True):
+                    outputdir = tmpdir / source_id / f"{output_format}-{chunked}"
+                    start = time.perf_counter()
+                    path = run_source(
+                        source_id,
+                        raw_path,
+                        outputdir,
+                        chunked=chunked,
+                        output_format=output_format,
+                    )
+                    clean_s = time.perf_counter() - start
+                    assert path.name == output_name(raw_path.name, output_format)
+                    assert format_of(path) == output_format, path
+                    assert output_format == "csv" or path.suffix != ".csv", path
+                    start = time.perf_counter()
+                    df = read_table(path)
+                    read_s = time.perf_counter() - start
+                    if expected is None:
+                        expected = as_text(df)
+                    assert as_text(df).equals(expected), (output_format, chunked)
+                    size = path.stat().st_size / 2**20
+                    print(
+                        f"{source_id}\t{output_format}\t{chunked}\t{size:.1f}"
+                        f"\t{clean_s:.2f}\t{read_s:.2f}"
+                    )
+            check_empty(tmpdir, source_id, raw_path, expected.columns.tolist())
+
+        clean = load_cleaner(ROOT_DIR / "sources" / args.sources[0])
+        argv = ["--integraph_filepath", str(raw_path)]
+        argv += ["--integraph_outputdir", str(tmpdir / "integraph")]
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                main(clean, argv + ["--output_format", "parquet"])
+        except SystemExit:
+            pass
+        else:
+            raise AssertionError("the inteGraph entry point must only write CSV")
@@ -0,0 +1,105 @@
+"""Check and time slime.taxa with a stand-in resolver.
+
+The taxon column of betsi is filled with names drawn from a small pool, in
+spelling variants, and the last ``[transform] chunksize`` rows with names
+that do not resolve. The table is resolved twice through the same cache
+file, opened anew for the second run, with a resolver that sleeps per batch
+like the Global Names verifier: the second run must be answered from the
+cache alone and be faster than the first. Every name must map to
+the taxon of the resolver, and unresolved names (including a chunk where
+nothing resolves) to no taxon.
+
+Usage: python benchmarks/bench_taxa.py [--rows 20000] [--names 2000]
+    [--seconds-per-batch 0.2]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import pandas as pd
+
+from slime.cleanse import SOURCES_DIR, read_chunksize
+from slime.taxa import TaxonCache, hit_rate, normalize_names, resolve_table
+
+SOURCE_DIR = SOURCES_DIR / "betsi"
+
+
+def stand_in_resolver(known, seconds_per_batch):
+    """Resolve the names of ``known`` ({normalized name: taxon id}) after a delay."""
+
+    def resolve(names, target, include_synonym):
+        time.sleep(seconds_per_batch)
+        return {
+            name: {
+                "id": f"{target}:{known[name]}",
+                "matched_name": name,
+                "current_name": name.capitalize(),
+                "rank": "species",
+                "lineage": "Eukaryota|Metazoa|Arthropoda",
+            }
+            for name in names
+            if name in known
+        }
+
+    return resolve
+
+
+def synthetic_table(n_rows, n_names, chunksize, seed=0):
+    rng = random.Random(seed)
+    pool = [f"Taxon species{i}" for i in range(n_names)]
+    variants = [str.upper, lambda n: n.replace(" ", "  "), lambda n: f" {n} "]
+    names = [rng.choice(pool) for _ in range(n_rows - chunksize)]
+    names = [rng.choice(variants)(n) if rng.random() < 0.3 else n for n in names]
+    names += [f"Unknown {i}" for i in range(chunksize)]
+    return pd.DataFrame({"taxon_name": names}), pool
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--names", type=int, default=2000)
+    parser.add_argument("--seconds-per-batch", type=float, default=0.2)
+    args = parser.parse_args()
+
+    chunksize = read_chunksize(SOURCE_DIR)
+    df, pool = synthetic_table(args.rows, args.names, chunksize)
+    known = dict(zip(normalize_names(pool), range(len(pool))))
+    resolver = stand_in_resolver(known, args.seconds_per_batch)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print("run\tlookups\thit rate\tseconds")
+        seconds = {}
+        for run in ("cold", "warm"):
+            # A new process would only have the SQLite file
+            with TaxonCache(Path(tmpdir) / "taxa.sqlite") as cache:
+                start = time.perf_counter()
+                stats, taxa = resolve_table(SOURCE_DIR, df, cache, resolver=resolver)
+                seconds[run] = time.perf_counter() - start
+            print(
+                f"{run}\t{stats['lookups']}\t{hit_rate(stats):.1%}"
+                f"\t{seconds[run]:.2f}"
+            )
+        assert stats["misses"] == 0, stats
+        # Without resolver latency there is nothing for the cache to save
+        assert not args.seconds_per_batch or seconds["warm"] < seconds["cold"]
+        print(f"speed-up\tx{seconds['cold'] / seconds['warm']:.1f}")
+
+        # A chunk where no name resolves
+        with TaxonCache(Path(tmpdir) / "taxa.sqlite") as cache:
+            unresolved = df.tail(chunksize)
+            _, empty = resolve_table(SOURCE_DIR, unresolved, cache, resolver=resolver)
+            assert len(empty) == unresolved["taxon_name"].nunique()
+            assert empty["taxon_id"].isna().all(), empty
+
+    expected = normalize_names(taxa["name"]).map(known)
+    resolved = taxa["taxon_id"].notna().to_numpy()
+    assert (resolved == expected.notna().to_numpy()).all()
+    ids = taxa["taxon_id"][resolved].str.split(":").str[1].astype(int)
+    assert (ids.to_numpy() == expected[resolved].to_numpy()).all()
@@ -0,0 +1,144 @@
+"""Check and time slime.terms on the mapping files of the tree.
+
+Every source must map its own labels, trait terms and taxon names apart, to
+the IRIs of its own file, and leave the labels only other sources map
+unmapped. A small tree where two sources map a label to different IRIs, and a
+trait term and a taxon share a label, checks the conflicts report and that the
+two kinds stay separate; one of these sources also maps two variants of a
+label to different IRIs, which must be reported as a conflict within the
+source. A tree without mapping files must give an empty index. Mapping a large
+column with the index is timed against reading the source's YAML file and
+mapping normalized labels with a dict.
+
+Usage: python benchmarks/bench_terms.py [--rows 1000000]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from slime.terms import (
+    MAPPING_FILES,
+    build_index,
+    map_terms,
+    mapping_files,
+    normalize_terms,
+    read_entries,
+    read_index,
+)
+
+
+def check_tree(index, entries):
+    sources = entries["source"].unique()
+    for (source, kind), group in entries.groupby(["source", "kind"]):
+        own = group.drop_duplicates("key")
+        found = map_terms(own["term"], source, kind, index)
+        assert (found.to_numpy() == own["iri"].to_numpy()).all(), (source, kind)
+        other = "taxon" if kind == "term" else "term"
+        clash = set(own["key"]) & set(entries["key"][entries["kind"] == other])
+        unrelated = own[~own["key"].isin(clash)]
+        assert map_terms(unrelated["term"], source, other, index).isna().all()
+        # Labels of the other sources only
+        elsewhere = entries[
+            (entries["kind"] == kind) & ~entries["key"].isin(own["key"])
+        ]
+        assert map_terms(elsewhere["term"], source, kind, index).isna().all()
+        assert map_terms(elsewhere["term"], None, kind, index).notna().all()
+    return len(sources)
+
+
+def write_tree(directory):
+    files = {
+        ("a", "mapping.yml"): {"Predator": "SFWO:1", "Dead_organic material": "E:1"},
+        ("b", "mapping.yml"): {
+            "predator": "SFWO:2",
+            "Herbivore": "SFWO:3",
+            "herbivore": "SFWO:4",
+        },
+        ("c", "mapping.yml"): {"PREDATOR": "SFWO:1"},
+        ("c", "taxon_mapping.yml"): {"Predator": "NCBITaxon:9"},
+    }
+    for (source, name), mapping in files.items():
+        path = directory / source / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(yaml.safe_dump(mapping))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        build_index(tmpdir / "terms.arrow")
+        index, _ = read_index(tmpdir / "terms.arrow")
+        entries = read_entries(mapping_files())
+        n_sources = check_tree(index, entries)
+
+        write_tree(tmpdir / "sources")
+        conflicts = build_index(tmpdir / "small.arrow", tmpdir / "sources")
+        small, _ = read_index(tmpdir / "small.arrow")
+        assert conflicts[["kind", "key"]].drop_duplicates().values.tolist() == [
+            ["term", "herbivore"],
+            ["term", "predator"],
+        ], conflicts
+        scopes = conflicts.groupby(["key", "source"])["scope"].first().to_dict()
+        assert scopes == {
+            ("herbivore", "b"): "source",
+            ("predator", "a"): "sources",
+            ("predator", "b"): "sources",
+            ("predator", "c"): "sources",
+        }, scopes
+        labels = ["predator", "dead organic material", "Herbivore"]
+        assert map_terms(labels, "a", index=small).tolist() == ["SFWO:1", "E:1", None]
+        assert map_terms(labels, "b", index=small).tolist() == [
+            "SFWO:2",
+            None,
+            "SFWO:3",
+        ]
+        assert map_terms(labels, index=small).tolist() == ["SFWO:1", "E:1", "SFWO:3"]
+        assert map_terms(labels, "c", "taxon", small).tolist() == [
+            "NCBITaxon:9",
+            None,
+            None,
+        ]
+        assert map_terms(["Herbivore"], "b", "taxon", small).isna().all()
+
+        (tmpdir / "none").mkdir()
+        assert build_index(tmpdir / "none.arrow", tmpdir / "none").empty
+        none, _ = read_index(tmpdir / "none.arrow")
+        assert len(none) == 0 and map_terms(labels, index=none).isna().all()
+
+    source, kind = entries.groupby(["source", "kind"]).size().idxmax()
+    path = ROOT_DIR / "sources" / source
+    name = {v: k for k, v in MAPPING_FILES.items()}[kind]
+    rng = np.random.default_rng(0)
+    pool = entries["term"][entries["source"] == source].tolist() + ["unmapped"]
+    column = pd.Series(rng.choice(pool, args.rows))
+
+    start = time.perf_counter()
+    found = map_terms(column, source, kind, index)
+    index_s = time.perf_counter() - start
+    start = time.perf_counter()
+    with open(path / name) as f:
+        mapping = yaml.safe_load(f)
+    own = dict(zip(normalize_terms(list(mapping)), mapping.values()))
+    expected = normalize_terms(column).map(own)
+    dict_s = time.perf_counter() - start
+    assert (found.fillna("") == expected.fillna("").to_numpy()).all()
+
+    print(f"{len(index)} merged labels\t{n_sources} sources checked")
+    print(
+        f"map {args.rows} labels of {source} ({kind})\t{index_s:.2f}s index"
+        f"\t{dict_s:.2f}s YAML and dict"
+    )
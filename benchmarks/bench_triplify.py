@@ -0,0 +1,165 @@
+"""Check the compiled triplifier against morph-kgc and compare their speed.
+
+For every Mapeathor workbook in sources/, a synthetic annotated table is
+built from the columns the workbook uses (with missing values, characters
+that need percent-encoding and literals that need escaping), then the set
+of triples produced by slime.triplify must equal the set morph-kgc produces
+from the mapeathor RML translation. morph-kgc writes the values of blank
+node templates as they are, so columns used in blank node labels only hold
+letters and digits there; the encoding of other values in labels is checked
+on its own (distinct values, labels rdflib can parse). Throughput is then
+measured on a larger table for one workbook. Needs morph-kgc and mapeathor.
+
+Usage: python benchmarks/bench_triplify.py [--rows 2000] [--bench-rows 200000]
+    [--bench-source globi_coleoptera]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import pandas as pd
+
+from slime.cleanse import SOURCES_DIR
+from slime.materialize import (
+    materialize_source,
+    na_values,
+    rml_mapping,
+    triplify_source,
+    workbook_path,
+)
+from slime.triplify import compile_workbook, encode_label, references, triples
+
+IDS = ["1", "42", "a b", "x/y?z", "é", "100%", "", "nan"]
+TEXTS = ["Plain", 'with "quotes"', "back\\slash", "two\nlines", "ünïcödé", "", "nan"]
+ROLE_ORDER = ["iri", "label", "id", "text"]
+
+
+def column_roles(plan):
+    roles = {}
+    for rule in plan["rules"]:
+        for term in (rule["subject"], rule["object"]):
+            role = "text" if term["kind"] == "literal" else "id"
+            if term["kind"] == "iri_ref":
+                role = "iri"
+            elif term["kind"] == "bnode":
+                role = "label"
+            for col in references(term):
+                # Full IRIs first, then values that morph-kgc writes as they are
+                roles[col] = min(roles.get(col, role), role, key=ROLE_ORDER.index)
+        if rule["predicate"][0] == "col":
+            roles[rule["predicate"][1]] = "iri"
+    return roles
+
+
+def synthetic_table(plan, n_rows, seed=0):
+    rng = random.Random(seed)
+    columns = {}
+    for col, role in column_roles(plan).items():
+        if role == "iri":
+            values = [
+                f"http://purl.obolibrary.org/obo/RO_{rng.randrange(100):07d}"
+                for _ in range(n_rows)
+            ]
+            for i in rng.sample(range(n_rows), n_rows // 20):
+                values[i] = rng.choice(["", "nan"])
+        elif role == "label":
+            values = [f"{rng.choice(IDS[:2])}{i}" for i in range(n_rows)]
+            for i in rng.sample(range(n_rows), n_rows // 20):
+                values[i] = rng.choice(["", "nan"])
+        elif role == "text":
+            values = [f"{rng.choice(TEXTS)}{i % 7}" for i in range(n_rows)]
+            for i in rng.sample(range(n_rows), n_rows // 20):
+                values[i] = rng.choice(["", "nan"])
+        else:
+            values = [f"{rng.choice(IDS)}{i}" for i in range(n_rows)]
+            for i in rng.sample(range(n_rows), n_rows // 20):
+                values[i] = rng.choice(["", "nan"])
+        columns[col] = values
+    return pd.DataFrame(columns)
+
+
+def check_labels():
+    """Blank node labels of any value are distinct and parse as N-Triples."""
+    import rdflib
+
+    values = pd.Series([v + t for v in IDS for t in TEXTS] + ["a_20b", "a b"])
+    labels = encode_label(values.drop_duplicates())
+    assert labels.is_unique, labels[labels.duplicated()]
+    data = "".join(f"_:x{label} <http://x/p> _:y{label} .\n" for label in labels)
+    graph = rdflib.Graph().parse(data=data, format="nt")
+    assert len(set(graph.subjects())) == len(labels)
+
+
+def read_triples(path):
+    import gzip
+
+    with gzip.open(path, "rt") as f:
+        return {line.rstrip(" .\n") for line in f}
+
+
+def check_source(source_id, tmpdir, n_rows):
+    plan = compile_workbook(workbook_path(source_id))
+    data = Path(tmpdir) / f"{source_id}.tsv"
+    synthetic_table(plan, n_rows).to_csv(data, sep="\t", index=False)
+    mapping = rml_mapping(source_id, workdir=tmpdir)
+    expected = Path(tmpdir) / f"{source_id}.morph.nt.gz"
+    materialize_source(source_id, data, expected, mapping, n_rows)
+    df = pd.read_csv(data, sep="\t", dtype=str, keep_default_na=False)
+    got = {t.rstrip(" .") for t in triples(df, plan, na_values())}
+    want = read_triples(expected)
+    return got == want, len(want), got ^ want
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--bench-rows", type=int, default=200_000)
+    parser.add_argument("--bench-source", default="globi_coleoptera")
+    args = parser.parse_args()
+
+    source_ids = sorted(p.parent.name for p in SOURCES_DIR.glob("*/source.cfg"))
+    check_labels()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        failures = 0
+        for source_id in source_ids:
+            same, n_triples, diff = check_source(source_id, tmpdir, args.rows)
+            print(f"{source_id:<24} {n_triples:>7} triples  {'ok' if same else 'DIFF'}")
+            if not same:
+                failures += 1
+                for t in sorted(diff)[:5]:
+                    print(f"    {t}")
+        assert failures == 0, f"{failures} sources differ"
+
+        source_id = args.bench_source
+        plan = compile_workbook(workbook_path(source_id))
+        data = Path(tmpdir) / "bench.tsv"
+        synthetic_table(plan, args.bench_rows).to_csv(data, sep="\t", index=False)
+        mapping = rml_mapping(source_id, workdir=tmpdir)
+        print(f"\n{source_id}, {args.bench_rows} rows")
+        for name, run in (
+            (
+                "morph-kgc",
+                lambda out: materialize_source(
+                    source_id, data, out, mapping, args.bench_rows
+                ),
+            ),
+            (
+                "plan",
+                lambda out: triplify_source(
+                    source_id, data, out, plan, args.bench_rows
+                ),
+            ),
+        ):
+            start = time.perf_counter()
+            stats = run(Path(tmpdir) / f"bench-{name}.nt.gz")
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:<10} {elapsed:7.2f}s  {stats['triples'] / elapsed:>9.0f} triples/s"
+            )
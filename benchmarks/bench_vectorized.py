@@ -0,0 +1,221 @@
+"""Compare the vectorized cleaners with their former row-wise implementations.
+
+Each case builds a synthetic frame, runs the previous implementation and the
+current cleaner on it, checks that the outputs are identical and prints both
+timings.
+
+Usage: python benchmarks/bench_vectorized.py [--rows 100000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.synthetic import EPITHETS, GENERA
+from slime.cleanse import load_cleaner
+
+
+def cleaner_module(source_id):
+    return sys.modules[load_cleaner(ROOT_DIR / "sources" / source_id).__module__]
+
+
+def legacy_fioredonno_cercozoa(df):
+    cols = list(cleaner_module("fioredonno_cercozoa").NUTRITION_COLUMNS.items())
+    for col, label in cols:
+        df[col] = df[col].where(df[col] != 1, label)
+    df["trophic.group"] = df[[c for c, _ in cols]].apply(
+        lambda x: [s for s in x if not pd.isnull(s)][-1], axis=1
+    )
+    df["Species"] = df["Species"].apply(lambda x: " ".join(x.split("_")))
+    return df
+
+
+def legacy_leptraits(df):
+    df = df.dropna(
+        subset=[
+            "SoleHostplantFamily",
+            "PrimaryHostplantFamily",
+            "SecondaryHostplantFamily",
+        ],
+        how="all",
+    )
+    df["host"] = df[
+        ["SoleHostplantFamily", "PrimaryHostplantFamily", "SecondaryHostplantFamily"]
+    ].apply(lambda x: ",".join(x.dropna().astype(str)).split(","), axis=1)
+    df = df.explode("host")
+    return df
+
+
+def legacy_lavigne_asilidae(df):
+    df["consumer_name"] = df["PREDATOR"].map(str) + " " + df["PREDSPECIS"].map(str)
+    df_res = df[["ORDER", "FAMILY", "GENUS", "SPECIES"]]
+    df_res.loc[:, "ORDER"] = df_res.loc[:, "ORDER"].str.capitalize()
+    df_res.loc[:, "ORDER"] = df_res.loc[:, "ORDER"].str.strip(":")
+    df_res.loc[:, "ORDER"] = df_res.loc[:, "ORDER"].replace(
+        '"other insects"', "Insecta"
+    )
+    for col in ["ORDER", "FAMILY", "GENUS", "SPECIES"]:
+        for word in ["undetermined", "unidentified", "?"]:
+            df_res.loc[
+                df_res[col].str.contains(word, case=False, na=False, regex=False), col
+            ] = np.nan
+        df_res[col] = df_res[col].apply(
+            lambda x: x.split("[")[0].strip(" ") if not pd.isna(x) else x
+        )
+        df_res[col] = df_res[col].apply(
+            lambda x: x if not pd.isna(x) and not x.startswith('"') else np.nan
+        )
+    df_res["GENUS"] = df_res[["FAMILY", "GENUS"]].apply(
+        lambda x: x["GENUS"] if not x.isnull().values.any() else np.nan,
+        axis=1,
+    )
+    df_res["resource_name"] = df_res[["GENUS", "SPECIES"]].apply(
+        lambda x: x.str.cat(sep=" ") if not x.isnull().values.any() else np.nan,
+        axis=1,
+    )
+    df_res["resource_name"] = df_res["resource_name"].replace(
+        r"^\s*$", np.nan, regex=True
+    )
+    df_res["resource_name"] = df_res["resource_name"].combine_first(
+        df_res["GENUS"].combine_first(df_res["FAMILY"].combine_first(df_res["ORDER"]))
+    )
+    df["resource_name"] = df_res["resource_name"].str.capitalize()
+    df["consumer_name"] = df["consumer_name"].replace("\n", " ", regex=False)
+    df["resource_name"] = df["resource_name"].replace("\n", " ", regex=False)
+    return df
+
+
+def legacy_pantheon(df):
+    df["consumer_name"] = df[["Genus", "Species"]].agg(" ".join, axis=1)
+    df = df.drop(df[df["Diet"] == "Not in paper"].index)
+    df["Diet"] = df["Diet"].apply(lambda x: str(x)[:-4])
+    df["Diet"] = df["Diet"].apply(lambda x: str(x).split(" + "))
+    df = df.assign(Diet=df["Diet"]).explode("Diet")
+    df["Diet"] = df["Diet"].str.capitalize()
+    return df
+
+
+def frame_fioredonno_cercozoa(n, rng):
+    cols = list(cleaner_module("fioredonno_cercozoa").NUTRITION_COLUMNS)
+    data = {
+        "Species": [f"{rng.choice(GENERA)}_{rng.choice(EPITHETS)}" for _ in range(n)]
+    }
+    flags = [[rng.random() < 0.3 for _ in range(n)] for _ in cols]
+    flags[-1] = [not any(f[i] for f in flags[:-1]) or flags[-1][i] for i in range(n)]
+    for col, col_flags in zip(cols, flags):
+        data[col] = [1 if f else np.nan for f in col_flags]
+    return pd.DataFrame(data)
+
+
+def frame_leptraits(n, rng):
+    families = ["Fabaceae", "Poaceae", "Rosaceae", "Fabaceae,Poaceae", np.nan]
+    return pd.DataFrame(
+        {
+            "Species": [rng.choice(GENERA) for _ in range(n)],
+            "SoleHostplantFamily": [rng.choice(families) for _ in range(n)],
+            "PrimaryHostplantFamily": [rng.choice(families) for _ in range(n)],
+            "SecondaryHostplantFamily": [rng.choice(families) for _ in range(n)],
+        }
+    )
+
+
+def frame_lavigne_asilidae(n, rng):
+    orders = ["COLEOPTERA:", "DIPTERA:", '"other insects"', "Hymenoptera", np.nan]
+    names = ["Carabidae", "Apis [sp.]", "undetermined", "Musca?", '"larva"', np.nan]
+    return pd.DataFrame(
+        {
+            "PREDATOR": [rng.choice(GENERA) for _ in range(n)],
+            "PREDSPECIS": [rng.choice(EPITHETS) for _ in range(n)],
+            "ORDER": [rng.choice(orders) for _ in range(n)],
+            "FAMILY": [rng.choice(names) for _ in range(n)],
+            "GENUS": [rng.choice(names) for _ in range(n)],
+            "SPECIES": [
+                rng.choice(EPITHETS + [np.nan, "unidentified"]) for _ in range(n)
+            ],
+        }
+    )
+
+
+def frame_pantheon(n, rng):
+    diets = ["fungivore", "predator", "herbivore", "detritivore"]
+    return pd.DataFrame(
+        {
+            "Genus": [rng.choice(GENERA) for _ in range(n)],
+            "Species": [rng.choice(EPITHETS) for _ in range(n)],
+            "Diet": [
+                (
+                    "Not in paper"
+                    if rng.random() < 0.05
+                    else " + ".join(rng.sample(diets, rng.randint(1, 3))) + " (1)"
+                )
+                for _ in range(n)
+            ],
+        }
+    )
+
+
+def run_excel_cleaner(source_id, df):
+    module = cleaner_module(source_id)
+    with mock.patch.object(module, "read_excel", return_value=df.copy()):
+        return module.clean(None)
+
+
+CASES = {
+    "fioredonno_cercozoa": (
+        frame_fioredonno_cercozoa,
+        legacy_fioredonno_cercozoa,
+        lambda df: run_excel_cleaner("fioredonno_cercozoa", df),
+    ),
+    "leptraits": (
+        frame_leptraits,
+        legacy_leptraits,
+        lambda df: cleaner_module("leptraits").clean_chunk(df),
+    ),
+    "lavigne_asilidae": (
+        frame_lavigne_asilidae,
+        legacy_lavigne_asilidae,
+        lambda df: run_excel_cleaner("lavigne_asilidae", df),
+    ),
+    "pantheon": (
+        frame_pantheon,
+        legacy_pantheon,
+        lambda df: load_cleaner(ROOT_DIR / "sources" / "pantheon").clean_chunk(df),
+    ),
+    "global_ants": (
+        frame_pantheon,
+        legacy_pantheon,
+        lambda df: load_cleaner(ROOT_DIR / "sources" / "global_ants").clean_chunk(df),
+    ),
+}
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    result = func(df.copy())
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    pd.options.mode.chained_assignment = None
+    for source_id, (make_frame, legacy, current) in CASES.items():
+        df = make_frame(args.rows, random.Random(0))
+        expected, t_legacy = timed(legacy, df)
+        result, t = timed(current, df)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+        print(
+            f"{source_id:<20} row-wise: {t_legacy:7.3f}s  vectorized: {t:7.3f}s  "
+            f"speed-up: x{t_legacy / t:.1f}"
+        )
@@ -0,0 +1,463 @@
+"""Synthetic raw inputs shaped like the files the source cleaners expect.
+
+Every generator takes an output path and a number of rows and writes a file
+that the matching ``sources/<id>/clean.py`` can process.
+"""
+
+import random
+import struct
+
+GENERA = [
+    "Nothrus",
+    "Arcella",
+    "Lumbricus",
+    "Carabus",
+    "Lithobius",
+    "Glomeris",
+    "Porcellio",
+    "Folsomia",
+    "Formica",
+    "Myrmica",
+    "Pieris",
+    "Bombus",
+]
+EPITHETS = ["silvestris", "vulgaris", "terrestris", "nemoralis", "major", "minor"]
+DIETS = ["detritivorous", "fungivorous", "predator", "phytophagous", "omnivorous"]
+
+
+def species(rng):
+    return f"{rng.choice(GENERA)} {rng.choice(EPITHETS)}"
+
+
+def write_betsi(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    traits = ["Diet", "Body length", "Habitat", "Locomotion"]
+    with open(path, "w") as f:
+        f.write("taxon_name;trait_name;attribute_trait;source_fauna;comment\n")
+        for i in range(n_rows):
+            f.write(
+                f"{species(rng)};{rng.choice(traits)};{rng.choice(DIETS)};ref{i % 97};\n"
+            )
+
+
+def write_bactotraits(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    traits = [
+        "TT_heterotroph",
+        "TT_autotroph",
+        "TT_organotroph",
+        "TT_lithotroph",
+        "TT_chemotroph",
+        "TT_phototroph",
+        "TT_copiotroph_diazotroph",
+        "TT_methylotroph",
+        "TT_oligotroph",
+    ]
+    with open(path, "w") as f:
+        f.write("BactoTraits;;\n;;\n")
+        f.write(";".join(["Bacdive_ID", "Full_name"] + traits) + "\n")
+        for i in range(n_rows):
+            # A few missing values, so that blocks of rows infer int or float
+            values = [
+                "" if rng.random() < 0.0005 else str(rng.randint(0, 1)) for _ in traits
+            ]
+            f.write(";".join([str(i), species(rng)] + values) + "\n")
+
+
+def write_gossner_arthropoda(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    guilds = ["h", "c", "f", "d", "o", "h-(c)", "c-d", "(f)-d"]
+    with open(path, "w") as f:
+        f.write("SpeciesID\tFeeding_guild\n")
+        for i in range(n_rows):
+            f.write(f"{species(rng)}\t{rng.choice(guilds)}\n")
+
+
+def write_adl_protista(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    groups = [
+        "bacterivor",
+        "eukaryvor",
+        "fungivor|bacterivor",
+        "osmotroph",
+        "phagotroph|eukaryvor",
+    ]
+    with open(path, "w") as f:
+        f.write("taxid\tfull.taxonomic.path\ttrophic.group\n")
+        for i in range(n_rows):
+            genus = rng.choice(GENERA + ["Incertae Sedis"])
+            f.write(
+                f"NCBI_{1000 + i}\tEukaryota;Amoebozoa;{genus};{genus} sp.\t{rng.choice(groups)}\n"
+            )
+
+
+def write_leptraits(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    families = ["Fabaceae", "Poaceae", "Rosaceae", "Brassicaceae", ""]
+    with open(path, "w") as f:
+        f.write(
+            "Species,SoleHostplantFamily,PrimaryHostplantFamily,SecondaryHostplantFamily\n"
+        )
+        for i in range(n_rows):
+            hosts = [rng.choice(families) for _ in range(3)]
+            if rng.random() < 0.3:
+                hosts[1] = f'"{hosts[1]},{rng.choice(families[:-1])}"'
+            f.write(",".join([species(rng)] + hosts) + "\n")
+
+
+def write_pantheon(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    diets = ["Fungivore", "Predator", "Herbivore", "Detritivore", "Saproxylic"]
+    with open(path, "w", encoding="latin1") as f:
+        f.write("Genus,Species,Diet\n")
+        for i in range(n_rows):
+            if rng.random() < 0.05:
+                diet = "Not in paper"
+            else:
+                diet = " + ".join(rng.sample(diets, rng.randint(1, 3))) + " (1)"
+            f.write(f"{rng.choice(GENERA)},{rng.choice(EPITHETS)},{diet}\n")
+
+
+write_global_ants = write_pantheon
+
+
+def write_faprotax(
+    path, n_groups, members_per_group=50, seed=0, forward=False, cycle=False
+):
+    """Write FAPROTAX-style blocks with add_group/subtract_group lines.
+
+    By default groups only reference earlier groups. With ``forward``, they
+    also reference later ones, and most add several groups that overlap (a
+    group together with groups it adds itself). ``cycle`` makes group_0 and
+    group_1 add each other.
+    """
+    rng = random.Random(seed)
+    # Groups may reference the groups before them in this order
+    order = rng.sample(range(n_groups), n_groups) if forward else range(n_groups)
+    rank = {g: i for i, g in enumerate(order)}
+    adds, subtracts = {}, {}
+    for g in order:
+        earlier = order[: rank[g]]
+        adds[g], subtracts[g] = [], []
+        if forward and earlier:
+            adds[g] = rng.sample(earlier, min(len(earlier), rng.randint(1, 3)))
+            nested = [a for h in adds[g] for a in adds[h] if a not in adds[g]]
+            if nested:
+                adds[g].append(rng.choice(nested))
+        elif earlier and rng.random() < 0.5:
+            adds[g].append(rng.choice(earlier))
+        if len(earlier) > 1 and rng.random() < 0.3:
+            subtracts[g].append(rng.choice(earlier))
+    if cycle:
+        adds[0].append(1)
+        adds[1].append(0)
+
+    with open(path, "w") as f:
+        f.write("# FAPROTAX (synthetic)\n# - - - - - - - - - - - - - - -\n\n")
+        for g in range(n_groups):
+            f.write(
+                f"group_{g}\t\telements:C; main_element:C; aerobic:variable; exclusively_prokaryotic:yes\n"
+            )
+            for m in range(members_per_group):
+                taxon = f"*Bacteria*Proteobacteria*Genus{g}x{m}*"
+                f.write(f"{taxon}\t\t# Reference {rng.randint(0, 9)}\n")
+            for a in adds[g]:
+                f.write(f"add_group:group_{a}\n")
+            for s in subtracts[g]:
+                f.write(f"subtract_group:group_{s}\n")
+            f.write("\n")
+
+
+def write_betsi_annotated(path, n_rows, seed=0):
+    """Write an integraph_data.tsv as annotated for betsi's trait mapping."""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("occurrenceID\tmeasurementID\ttraitID\ttaxonID\tsource_fauna\n")
+        for i in range(n_rows):
+            trait = f"http://purl.org/sfwo/SFWO_{rng.randrange(470, 520):07d}"
+            taxon = f"http://purl.obolibrary.org/obo/NCBITaxon_{rng.randrange(10**6)}"
+            f.write(f"{i // 3}\t{i}\t{trait}\t{taxon}\tref{i % 97}\n")
+
+
+def biff_record(rtype, data=b""):
+    return struct.pack("<HH", rtype, len(data)) + data
+
+
+def write_xls(path, sheet_name, rows):
+    """Write rows of text and numbers to a one-sheet BIFF8 .xls workbook.
+
+    The records are written as a bare BIFF stream, without the compound
+    document around them, which xlrd reads like a saved workbook. Empty
+    strings are left as blank cells.
+    """
+
+    def bof(kind):
+        return biff_record(
+            0x0809, struct.pack("<HHHHII", 0x0600, kind, 0, 1997, 0, 0x0600)
+        )
+
+    cells = []
+    for i, row in enumerate(rows):
+        for j, value in enumerate(row):
+            if isinstance(value, str) and value:
+                # LABEL with an uncompressed UTF-16 string
+                data = struct.pack("<HHHHB", i, j, 0, len(value), 1)
+                cells.append(biff_record(0x0204, data + value.encode("utf-16-le")))
+            elif not isinstance(value, str):
+                cells.append(biff_record(0x0203, struct.pack("<HHHd", i, j, 0, value)))
+    n_cols = max(map(len, rows), default=0)
+    dimensions = struct.pack("<IIHHH", 0, len(rows), 0, n_cols, 0)
+    sheet = bof(0x10) + biff_record(0x0200, dimensions) + b"".join(cells)
+    sheet += biff_record(0x000A)
+    name = sheet_name.encode("latin-1")
+    # CODEPAGE 1200 (UTF-16), then BOUNDSHEET with the offset of the sheet
+    book = bof(0x05) + biff_record(0x0042, struct.pack("<H", 1200))
+    offset = len(book) + 4 + 8 + len(name) + 4
+    boundsheet = struct.pack("<IBBBB", offset, 0, 0, len(name), 0) + name
+    book += biff_record(0x0085, boundsheet) + biff_record(0x000A)
+    with open(path, "wb") as f:
+        f.write(book + sheet)
+
+
+def write_sheets(path, sheets, **kwargs):
+    """Write {sheet name: DataFrame} to an .xlsx workbook."""
+    import pandas as pd
+
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False, **kwargs)
+
+
+def write_butterflytraits(path, n_rows, seed=0):
+    import pandas as pd
+
+    rng = random.Random(seed)
+    codes = ["Hf", "Er", "Sf", "Hd", "Sa", "Dp", "An", "Mi"]
+    df = pd.DataFrame(
+        {
+            "ID": range(n_rows),
+            "Taxon": [species(rng) for _ in range(n_rows)],
+            "Family": [f"Family{rng.randrange(20)}" for _ in range(n_rows)],
+            "ADF": [
+                (
+                    "".join(rng.sample(codes, rng.randint(1, 3)))
+                    if rng.random() < 0.9
+                    else None
+                )
+                for _ in range(n_rows)
+            ],
+            "Notes": ["" for _ in range(n_rows)],
+        }
+    )
+    # The traits are on the second sheet
+    write_sheets(path, {"README": pd.DataFrame({"About": ["synthetic"]}), "Traits": df})
+
+
+def write_fioredonno_cercozoa(path, n_rows, seed=0):
+    import pandas as pd
+
+    rng = random.Random(seed)
+    columns = [
+        "nutrition bacterivore",
+        "nutrition omnivore",
+        "nutrition eukaryvore",
+        "nutrition plant parasite",
+        "nutrition parasite (not plant)",
+        "nutrition unknown",
+    ]
+    df = pd.DataFrame(
+        {"Species": [species(rng).replace(" ", "_") for _ in range(n_rows)]}
+    )
+    for column in columns:
+        df[column] = [1 if rng.random() < 0.3 else None for _ in range(n_rows)]
+    df.loc[df[columns].isna().all(axis=1), "nutrition unknown"] = 1
+    # The table header is on the second row of the sheet
+    write_sheets(path, {"Database": df}, startrow=1)
+
+
+def write_fungaltraits(path, n_rows, seed=0):
+    import pandas as pd
+
+    rng = random.Random(seed)
+    lifestyles = [
+        "soil_saprotroph",
+        "wood_saprotroph",
+        "ectomycorrhizal",
+        "plant_pathogen",
+        "animal_parasite",
+        "lichenized",
+    ]
+    df = pd.DataFrame(
+        {
+            "GENUS": [f"{rng.choice(GENERA)}{i}" for i in range(n_rows)],
+            "Phylum": [
+                rng.choice(["Ascomycota", "Basidiomycota"]) for _ in range(n_rows)
+            ],
+            "primary_lifestyle": [rng.choice(lifestyles) for _ in range(n_rows)],
+            "Secondary_lifestyle": [
+                rng.choice(lifestyles) if rng.random() < 0.4 else None
+                for _ in range(n_rows)
+            ],
+        }
+    )
+    write_sheets(path, {"V.1.2": df})
+
+
+def write_giachello_protista(path, n_rows, seed=0):
+    import pandas as pd
+
+    rng = random.Random(seed)
+    feeding = ["bacterivore", "eukaryvore", "fungivore", "omnivore"]
+    n_references = max(n_rows // 10, 1)
+    data = pd.DataFrame(
+        {
+            "scientific_ncbi": [species(rng) for _ in range(n_rows)],
+            "feeding": [
+                "_or_".join(rng.sample(feeding, rng.randint(1, 2)))
+                for _ in range(n_rows)
+            ],
+            "reference": [
+                "; ".join(
+                    f"R{rng.randrange(n_references)}" for _ in range(rng.randint(1, 3))
+                )
+                for _ in range(n_rows)
+            ],
+        }
+    )
+    references = pd.DataFrame(
+        {
+            "reference_id": [f"R{i}" for i in range(n_references)],
+            "reference_full": [
+                f"Author {i} et al. (2000)" for i in range(n_references)
+            ],
+        }
+    )
+    write_sheets(
+        path,
+        {"TabS1B_complete_dataset": data, "TabS1C_references_used": references},
+    )
+
+
+def write_rainford_hexapoda(path, n_rows, seed=0):
+    import pandas as pd
+
+    rng = random.Random(seed)
+
+    def diet():
+        codes = "&".join(str(c) for c in rng.sample(range(1, 9), rng.randint(1, 2)))
+        return codes + (" (uncertain)" if rng.random() < 0.1 else "")
+
+    df = pd.DataFrame(
+        {
+            "Taxon": [f"Order Family{i}" for i in range(n_rows)],
+            "Tip name": [f"tip_{i}" for i in range(n_rows)],
+            "Extant richness": [rng.randint(1, 5000) for _ in range(n_rows)],
+            "Larval diet": [diet() for _ in range(n_rows)],
+            "PS State": [diet() for _ in range(n_rows)],
+            "Adult diet": [diet() for _ in range(n_rows)],
+        }
+    )
+    # The first data row holds the units of the published table
+    units = pd.DataFrame(
+        [["", "", "species", "code", "code", "code"]], columns=df.columns
+    )
+    write_sheets(path, {"Sheet1": pd.concat([units, df], ignore_index=True)})
+
+
+def write_lavigne_asilidae(path, n_rows, seed=0):
+    """Write the prey catalogue as a BIFF .xls workbook."""
+    rng = random.Random(seed)
+    orders = [
+        "DIPTERA",
+        "Coleoptera:",
+        '"other insects"',
+        "HYMENOPTERA",
+        "undetermined",
+    ]
+    rows = [["PREDATOR", "PREDSPECIS", "ORDER", "FAMILY", "GENUS", "SPECIES"]]
+    for _ in range(n_rows):
+        row = [
+            rng.choice(GENERA),
+            rng.choice(EPITHETS),
+            rng.choice(orders),
+            f"Family{rng.randrange(30)}" if rng.random() < 0.8 else "?",
+            rng.choice(GENERA + ["unidentified [sp.]"]),
+            rng.choice(EPITHETS + ['"sp."', ""]),
+        ]
+        rows.append(row)
+    write_xls(path, "prey", rows)
+
+
+GENERATORS = {
+    "adl_protista": (write_adl_protista, "trophic_groups.tsv"),
+    "bactotraits": (write_bactotraits, "BactoTraits.csv"),
+    "betsi": (write_betsi, "BETSI.csv"),
+    "faprotax": (write_faprotax, "FAPROTAX.txt"),
+    "global_ants": (write_global_ants, "GlobalAnts.csv"),
+    "gossner_arthropoda": (write_gossner_arthropoda, "gossner.tsv"),
+    "leptraits": (write_leptraits, "leptraits.csv"),
+    "pantheon": (write_pantheon, "Pantheon.csv"),
+}
+
+# Workbook sources, kept apart because openpyxl writes them slowly
+WORKBOOK_GENERATORS = {
+    "butterflytraits": (write_butterflytraits, "ButterflyTraits.xlsx"),
+    "fioredonno_cercozoa": (write_fioredonno_cercozoa, "TableS3Database.xlsx"),
+    "fungaltraits": (write_fungaltraits, "FungalTraits.xlsx"),
+    "giachello_protista": (write_giachello_protista, "mmc1.xlsx"),
+    "lavigne_asilidae": (write_lavigne_asilidae, "prey.xls"),
+    "rainford_hexapoda": (write_rainford_hexapoda, "rainford.xlsx"),
+}
+
+
+def write_globi_dump(path, queries, n_rows, seed=0):
+    """Write a GloBI interactions.tsv.gz for the taxa of the globi_* queries.
+
+    Lineages come from NCBI (matched on ids) or GBIF (matched on names only),
+    some hold the taxa of two sources (e.g. Oribatida and Astigmata), some
+    none. Interaction types vary, and text has commas and stray quotes.
+    """
+    import gzip
+
+    from slime.globi import API_COLUMNS
+
+    rng = random.Random(seed)
+    taxa = sorted(
+        (q["taxon_id"], q["taxon_name"].capitalize()) for q in queries.values()
+    )
+    columns = list(API_COLUMNS.values()) + ["sourceTaxonPathIds", "sourceTaxonRank"]
+    types = ["eats"] * 6 + ["preysOn", "interactsWith"]
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write("\t".join(columns) + "\n")
+        for i in range(n_rows):
+            lineage = rng.sample(taxa, rng.choice([0, 1, 1, 1, 2]))
+            genus = rng.choice(GENERA)
+            if rng.random() < 0.2:
+                ids = ["GBIF:1", "GBIF:54"] + [
+                    f"GBIF:{rng.randrange(10**6)}" for _ in lineage
+                ]
+            else:
+                ids = ["NCBI:33208", "NCBI:6656"] + [
+                    taxon_id for taxon_id, _ in lineage
+                ]
+            names = ["Animalia", "Arthropoda"] + [name for _, name in lineage]
+            # Lineages are not always spaced the same way
+            sep = rng.choice([" | ", "|"])
+            row = {
+                "sourceTaxonId": ids[-1],
+                "sourceTaxonName": f"{genus} {rng.choice(EPITHETS)}",
+                "sourceTaxonPathNames": sep.join(names + [genus]),
+                "sourceTaxonPathIds": sep.join(ids + [f"NCBI:{rng.randrange(10**6)}"]),
+                "sourceTaxonRank": "species",
+                "sourceLifeStageName": rng.choice(["", "adult", "larva"]),
+                "interactionTypeName": rng.choice(types),
+                "targetTaxonId": f"NCBI:{rng.randrange(10**6)}",
+                "targetTaxonName": species(rng),
+                "targetTaxonPathNames": "Animalia | Arthropoda",
+                "decimalLatitude": f"{rng.uniform(-90, 90):.4f}",
+                "decimalLongitude": rng.choice(["", f"{rng.uniform(-180, 180):.4f}"]),
+                "referenceCitation": f'Smith, J. "Diets, {i % 50}" (19{i % 90:02d})',
+                "referenceUrl": f"https://doi.org/10.{i % 500}/x",
+                "sourceCitation": "O'Brien, Synthetic GloBI",
+            }
+            f.write("\t".join(row.get(c, "") for c in columns) + "\n")
@@ -0,0 +1 @@
+"""Python helpers for building SLIME with inteGraph."""
@@ -0,0 +1,431 @@
+"""Fetch the ``[extract.api]`` of sources page by page, several at a time.
+
+An ``[extract.api]`` source asks one connection of *connections.json*
+(``globi``, ``bacdive``) for a whole table in a single request, which a
+large answer makes slow to time out and costly to retry. :func:`fetch_all`
+splits these requests into pages instead: ``offset``/``limit`` parameters
+for REST endpoints such as GloBI's ``interaction``, and ``LIMIT``/``OFFSET``
+clauses (after an ``ORDER BY`` on the selected variables, so that pages are
+stable) for SPARQL ``SELECT`` queries such as BacDive's. Pages of a source
+are requested ahead of the one being written, until a page comes back
+empty.
+
+Requests run on an asyncio event loop. Each connection has a pool of
+keep-alive HTTP connections shared by all its sources, and each host a
+limit on the number of requests in flight and on the rate at which they
+start, from the ``extra`` of the connection (``{"concurrency": 4, "rate":
+4}``) or the defaults below. Failed requests are retried with exponential
+backoff.
+
+Each page is written to ``<outputdir>/<source_id>/pages/`` as soon as it
+arrives and recorded in a checkpoint next to it; running the extraction
+again resumes from the missing pages. Once all pages are in, they are
+joined into ``<outputdir>/<source_id>/<endpoint>.csv``. ``page_size`` sets
+the number of records per page for all sources, or for one source in its
+``[extract.api]`` section.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import http.client
+import io
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from slime import metrics
+from slime.cleanse import ROOT_DIR, SOURCES_DIR, read_source_config
+from slime.load import ConnectionPool, read_checkpoint, write_checkpoint
+
+CONNECTIONS = ROOT_DIR / "connections.json"
+PAGE_SIZE = 5000
+CONCURRENCY = 4
+RATE = 4.0
+RETRIES = 5
+BACKOFF = 0.5
+TIMEOUT = 300
+
+_SELECT = re.compile(
+    r"\bSELECT\s+(?:DISTINCT\s+|REDUCED\s+)?(.*?)\s*(?:WHERE\b|{)", re.I | re.S
+)
+_MODIFIERS = re.compile(r"\b(?:ORDER\s+BY|LIMIT|OFFSET)\b", re.I)
+
+
+class ExtractError(RuntimeError):
+    pass
+
+
+def load_connections(path=CONNECTIONS):
+    with open(path) as f:
+        return json.load(f)
+
+
+def connection_url(connection):
+    host = connection["host"]
+    if "://" not in host:
+        host = f"{connection.get('schema') or 'https'}://{host}"
+    if connection.get("port"):
+        parts = urlsplit(host)
+        host = parts._replace(netloc=f"{parts.hostname}:{connection['port']}").geturl()
+    return host.rstrip("/")
+
+
+def connection_limits(connection):
+    """Return the (concurrency, rate) of a connection, from its ``extra``."""
+    extra = connection.get("extra") or {}
+    if isinstance(extra, str):
+        extra = json.loads(extra)
+    return extra.get("concurrency", CONCURRENCY), extra.get("rate", RATE)
+
+
+def sparql_pages(query):
+    """Return a function giving the SPARQL query of a page of ``query``."""
+    if _MODIFIERS.search(query.rsplit("}", 1)[-1]):
+        raise ExtractError("cannot page a query with its own ORDER BY/LIMIT/OFFSET")
+    match = _SELECT.search(query)
+    variables = re.findall(r"\?\w+", match.group(1)) if match else []
+    order = f"\nORDER BY {' '.join(variables)}" if variables else ""
+    base = query.rstrip() + order
+    return lambda offset, limit: f"{base}\nLIMIT {limit} OFFSET {offset}"
+
+
+def api_request(source_dir, page_size=None):
+    """Read the ``[extract.api]`` of a source.
+
+    Returns a dict with its connection, endpoint, headers and page size, and
+    a ``page`` function giving the query parameters of a page.
+    """
+    config = read_source_config(Path(source_dir) / "source.cfg")
+    if not config.has_section("extract.api"):
+        raise ExtractError(f"{source_dir} has no [extract.api] section")
+    section = config["extract.api"]
+    params = parse_qsl(section.get("query", "").strip('"'), keep_blank_values=True)
+    headers = (
+        dict(config["extract.api.headers"])
+        if config.has_section("extract.api.headers")
+        else {}
+    )
+    if page_size is None:
+        page_size = section.getint("page_size", PAGE_SIZE)
+    query = dict(params).get("query", "")
+    if re.search(r"\bSELECT\b", query, re.I):
+        paged = sparql_pages(query)
+        others = [(k, v) for k, v in params if k != "query"]
+
+        def page(offset, limit):
+            return others + [("query", paged(offset, limit))]
+
+    else:
+        others = [(k, v) for k, v in params if k not in ("offset", "limit")]
+
+        def page(offset, limit):
+            return others + [("offset", str(offset)), ("limit", str(limit))]
+
+    return {
+        "conn_id": section["conn_id"],
+        "endpoint": section.get("endpoint", "").strip("/"),
+        "params": params,
+        # configparser lowercases keys, header names are case insensitive
+        "headers": (
+            headers if "accept" in headers else {"accept": "text/csv", **headers}
+        ),
+        "page_size": page_size,
+        "page": page,
+    }
+
+
+def count_records(content):
+    """Number of CSV records of a page, without its header."""
+    rows = csv.reader(io.StringIO(content.decode("utf-8", errors="replace")))
+    return max(sum(1 for row in rows if row) - 1, 0)
+
+
+def write_page(path, content):
+    tmp = path.with_suffix(".part")
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+    return count_records(content)
+
+
+def join_pages(pages, output_path):
+    """Concatenate CSV pages into one file, keeping the header of the first."""
+    tmp = output_path.with_suffix(".part")
+    with open(tmp, "wb") as out:
+        for i, path in enumerate(pages):
+            with open(path, "rb") as f:
+                if i:
+                    f.readline()
+                shutil.copyfileobj(f, out, 2**20)
+    os.replace(tmp, output_path)
+    return output_path
+
+
+class HostLimits:
+    """Bound the requests in flight to a host and the rate at which they start."""
+
+    def __init__(self, concurrency=CONCURRENCY, rate=RATE):
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1 / rate if rate else 0
+        self.next_start = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def get(pool, limits, path, headers, retries=RETRIES):
+    """GET a path, retrying connection errors and 5xx/429 answers."""
+    for attempt in range(retries + 1):
+        async with limits.semaphore:
+            await limits.wait()
+            try:
+                status, content = await asyncio.to_thread(
+                    pool.request, "GET", path, None, headers
+                )
+            except (OSError, http.client.HTTPException) as e:
+                status, content = None, str(e).encode()
+        if status is not None and status < 300:
+            return content
+        if status is not None and status < 500 and status != 429:
+            break
+        if attempt < retries:
+            await asyncio.sleep(BACKOFF * 2**attempt)
+    raise ExtractError(
+        f"GET {path[:200]} failed ({status}): "
+        f"{content[:200].decode(errors='replace')}"
+    )
+
+
+def request_digest(request):
+    key = [request["url"], request["endpoint"], request["params"], request["page_size"]]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+def prepare_pages(pages_dir, digest):
+    """Return the checkpoint of a source, starting over if its request changed."""
+    checkpoint = read_checkpoint(pages_dir / "checkpoint.json")
+    if (
+        checkpoint is not None
+        and checkpoint["request"] == digest
+        and all((pages_dir / f"{int(i):06d}.csv").exists() for i in checkpoint["pages"])
+    ):
+        checkpoint["pages"] = {int(i): n for i, n in checkpoint["pages"].items()}
+        return checkpoint
+    shutil.rmtree(pages_dir, ignore_errors=True)
+    pages_dir.mkdir(parents=True)
+    return {"request": digest, "pages": {}}
+
+
+async def fetch_source(source_id, request, pool, limits, outputdir, retries=RETRIES):
+    """Fetch the pages of a source, then join them. Returns its stats."""
+    start = time.perf_counter()
+    source_dir = Path(outputdir) / source_id
+    pages_dir = source_dir / "pages"
+    checkpoint = prepare_pages(pages_dir, request_digest(request))
+    done = checkpoint["pages"]
+    resumed = len(done)
+    size = request["page_size"]
+    prefix = f"/{request['endpoint']}" if request["endpoint"] else ""
+
+    def last_page():
+        # The first empty page ends the table
+        empty = [i for i, n in done.items() if n == 0]
+        return min(empty) if empty else None
+
+    async def fetch_page(i):
+        nonlocal fetched
+        path = f"{prefix}?{urlencode(request['page'](i * size, size))}"
+        content = await get(pool, limits, path, request["headers"], retries)
+        done[i] = await asyncio.to_thread(
+            write_page, pages_dir / f"{i:06d}.csv", content
+        )
+        fetched += 1
+        # Record each page as it lands, whatever happens to the other ones
+        write_checkpoint(pages_dir / "checkpoint.json", checkpoint)
+
+    tasks, page, fetched, error = set(), 0, 0, None
+    try:
+        while True:
+            # Keep as many pages in flight as the host allows
+            while (
+                error is None
+                and len(tasks) < limits.concurrency
+                and (last_page() is None or page < last_page())
+            ):
+                if page not in done:
+                    tasks.add(asyncio.ensure_future(fetch_page(page)))
+                page += 1
+            if not tasks:
+                break
+            finished, tasks = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in finished:
+                # Stop there, but let the pages in flight reach the checkpoint
+                if task.exception() is not None and error is None:
+                    error = task.exception()
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    if error is not None:
+        raise error
+
+    last = last_page()
+    short = [i for i in range(last - 1) if done[i] < size]
+    if short:
+        raise ExtractError(
+            f"{source_id}: page {short[0]} has {done[short[0]]} records out of "
+            f"{size}, the server may cap the page size"
+        )
+    pages = [pages_dir / f"{i:06d}.csv" for i in range(max(last, 1))]
+    output_path = source_dir / f"{request['endpoint'] or source_id}.csv"
+    await asyncio.to_thread(join_pages, pages, output_path)
+    shutil.rmtree(pages_dir)
+    stats = {
+        "path": output_path,
+        "rows": sum(done[i] for i in range(last)),
+        "pages": len(pages),
+        "fetched": fetched,
+        "resumed": resumed,
+        "bytes": output_path.stat().st_size,
+        "seconds": time.perf_counter() - start,
+    }
+    # Sources share the event loop, so only their wall time is known
+    metrics.emit(
+        metrics.stage_record(
+            source_id,
+            "extract",
+            stats["seconds"],
+            rows_out=stats["rows"],
+            pages=stats["pages"],
+            resumed=resumed,
+            bytes=stats["bytes"],
+        )
+    )
+    return stats
+
+
+async def fetch_sources(
+    source_ids,
+    outputdir,
+    sources_dir=SOURCES_DIR,
+    connections=None,
+    page_size=None,
+    concurrency=None,
+    rate=None,
+    retries=RETRIES,
+):
+    connections = load_connections() if connections is None else connections
+    requests = {
+        source_id: api_request(Path(sources_dir) / source_id, page_size)
+        for source_id in source_ids
+    }
+    # One pool of connections per connection id, one set of limits per host
+    pools, limits = {}, {}
+    for request in requests.values():
+        conn_id = request["conn_id"]
+        if conn_id not in connections:
+            raise ExtractError(f"unknown connection {conn_id}")
+        request["url"] = url = connection_url(connections[conn_id])
+        request["host"] = host = urlsplit(url).netloc
+        if conn_id in pools:
+            continue
+        host_concurrency, host_rate = connection_limits(connections[conn_id])
+        host_concurrency = concurrency or host_concurrency
+        if host not in limits:
+            limits[host] = HostLimits(
+                host_concurrency, host_rate if rate is None else rate
+            )
+        pools[conn_id] = ConnectionPool(url, size=host_concurrency, timeout=TIMEOUT)
+    # Requests block a thread each: enough threads for every host at its limit,
+    # shut down by asyncio.run
+    executor = ThreadPoolExecutor(sum(h.concurrency for h in limits.values()) + 1)
+    asyncio.get_running_loop().set_default_executor(executor)
+    try:
+        results = await asyncio.gather(
+            *(
+                fetch_source(
+                    source_id,
+                    request,
+                    pools[request["conn_id"]],
+                    limits[request["host"]],
+                    outputdir,
+                    retries,
+                )
+                for source_id, request in requests.items()
+            ),
+            return_exceptions=True,
+        )
+    finally:
+        for pool in pools.values():
+            pool.close()
+    # A failed source does not stop the others, which keep their pages
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return dict(zip(requests, results))
+
+
+def fetch_all(source_ids, outputdir, **kwargs):
+    """Fetch the ``[extract.api]`` of several sources concurrently.
+
+    Keyword arguments are those of :func:`fetch_sources`; ``connections``
+    maps connection ids to entries of *connections.json* (e.g. to point one
+    at a stand-in of :mod:`slime.testing`). Returns the stats of each source.
+    """
+    return asyncio.run(fetch_sources(source_ids, outputdir, **kwargs))
+
+
+def api_sources(sources_dir=SOURCES_DIR):
+    return [
+        path.parent.name
+        for path in sorted(Path(sources_dir).glob("*/source.cfg"))
+        if read_source_config(path).has_section("extract.api")
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fetch the [extract.api] of sources in concurrent pages."
+    )
+    parser.add_argument("sources", nargs="*", help="default: all API sources")
+    parser.add_argument("--outputdir", required=True)
+    parser.add_argument("--page-size", type=int)
+    parser.add_argument("--concurrency", type=int, help="requests in flight per host")
+    parser.add_argument("--rate", type=float, help="requests per second per host")
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    parser.add_argument("--connections", default=CONNECTIONS)
+    parser.add_argument("--sources-dir", default=SOURCES_DIR)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+
+    stats = fetch_all(
+        args.sources or api_sources(args.sources_dir),
+        args.outputdir,
+        sources_dir=args.sources_dir,
+        connections=load_connections(args.connections),
+        page_size=args.page_size,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        retries=args.retries,
+    )
+    for source_id, s in stats.items():
+        resumed = f"\t{s['resumed']} resumed" if s["resumed"] else ""
+        print(
+            f"{source_id}\t{s['rows']} rows\t{s['pages']} pages{resumed}"
+            f"\t{s['seconds']:.1f}s\t{s['path']}"
+        )
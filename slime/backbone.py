@@ -0,0 +1,480 @@
+"""Offline taxonomy backbones, for name resolution and rank filters.
+
+The taxonomy annotators resolve names against NCBI, GBIF and OTT, and
+``filter_on_ranks`` keeps the taxa that sit under one of the given
+ancestors (``["Bacteria", "Archaea"]``, ``["Coleoptera"]``...), which takes
+the lineage of every match. :func:`build_backbone` turns a local dump of
+one of these taxonomies (NCBI ``taxdump``, the OTT ``taxonomy.tsv`` and
+``synonyms.tsv``, the GBIF backbone ``Taxon.tsv``) into arrays stored under
+``<cache>/backbone/<target>``:
+
+- nodes in pre-order, with their id, parent, depth and the pre-order
+  position of their last descendant, so that a node is under an ancestor
+  when its position falls in the ancestor's ``[position, end]`` interval
+  (the nested set of the ancestor);
+- the normalized scientific names and synonyms, as sorted 64-bit hashes
+  with the nodes they name.
+
+The arrays are ``.npy`` files and the strings Arrow IPC files, all
+memory-mapped, so loading a backbone reads nothing up front. Names of a
+whole column are resolved with one ``searchsorted`` and the rank filter is
+one interval comparison per ancestor. Nothing goes over the network.
+
+The name hashes come from ``pd.util.hash_pandas_object``, which pandas does
+not promise to keep stable across releases, so the pandas version is stored
+with them: :func:`load_backbones` rebuilds a backbone from its dump when it
+was built with another version.
+"""
+
+import argparse
+import csv
+import json
+import tarfile
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from slime.cache import CACHE_ROOT
+from slime.taxa import normalize_names
+
+BACKBONE_DIR = CACHE_ROOT / "backbone"
+TARGETS = ("NCBI", "GBIF", "OTT")
+# Name classes of names.dmp read as synonyms of the scientific name
+NCBI_SYNONYMS = {
+    "synonym",
+    "equivalent name",
+    "genbank synonym",
+    "anamorph",
+    "genbank anamorph",
+    "teleomorph",
+    "misspelling",
+    "misnomer",
+}
+GBIF_ACCEPTED = {"accepted", "doubtful"}
+ARRAYS = ("id", "id_order", "parent", "end", "depth")
+NAME_ARRAYS = ("name_hash", "name_start", "candidate", "synonym")
+
+
+@contextmanager
+def open_member(path, name):
+    """Open a file of a dump directory or .tar.gz archive."""
+    path = Path(path)
+    if path.is_dir():
+        with open(path / name, "rb") as f:
+            yield f
+    else:
+        with tarfile.open(path) as archive:
+            yield archive.extractfile(name)
+
+
+def read_fields(f, columns, header=None):
+    """Read the given fields of a ``\\t|\\t``-delimited dump (every other field)."""
+    return pd.read_csv(
+        f,
+        sep="\t",
+        header=header,
+        usecols=[2 * c for c in columns],
+        dtype=str,
+        keep_default_na=False,
+        quoting=csv.QUOTE_NONE,
+        engine="c",
+    ).set_axis(range(len(columns)), axis=1)
+
+
+def read_ncbi(path):
+    """Read ``nodes.dmp`` and ``names.dmp`` of an NCBI taxdump."""
+    with open_member(path, "nodes.dmp") as f:
+        nodes = read_fields(f, [0, 1, 2])
+    nodes.columns = ["id", "parent", "rank"]
+    with open_member(path, "names.dmp") as f:
+        names = read_fields(f, [0, 1, 3])
+    names.columns = ["id", "name", "kind"]
+    scientific = names[names["kind"] == "scientific name"]
+    nodes = nodes.merge(
+        scientific.drop_duplicates("id")[["id", "name"]], on="id", how="left"
+    )
+    synonyms = names[names["kind"].isin(NCBI_SYNONYMS)]
+    return nodes, pd.DataFrame({"id": synonyms["id"], "name": synonyms["name"]})
+
+
+def read_ott(path):
+    """Read ``taxonomy.tsv`` and ``synonyms.tsv`` of an OTT release."""
+    with open_member(path, "taxonomy.tsv") as f:
+        nodes = read_fields(f, [0, 1, 2, 3], header=0)
+    nodes.columns = ["id", "parent", "name", "rank"]
+    with open_member(path, "synonyms.tsv") as f:
+        synonyms = read_fields(f, [0, 1], header=0)
+    synonyms.columns = ["name", "id"]
+    return nodes, synonyms
+
+
+def read_gbif(path):
+    """Read the ``Taxon.tsv`` of the GBIF backbone (or a directory holding it)."""
+    path = Path(path)
+    if path.is_dir():
+        path = path / "Taxon.tsv"
+    df = pd.read_csv(
+        path,
+        sep="\t",
+        usecols=[
+            "taxonID",
+            "parentNameUsageID",
+            "acceptedNameUsageID",
+            "canonicalName",
+            "scientificName",
+            "taxonRank",
+            "taxonomicStatus",
+        ],
+        dtype=str,
+        keep_default_na=False,
+        quoting=csv.QUOTE_NONE,
+    )
+    name = df["canonicalName"].where(df["canonicalName"] != "", df["scientificName"])
+    accepted = df["taxonomicStatus"].isin(GBIF_ACCEPTED)
+    nodes = pd.DataFrame(
+        {
+            "id": df["taxonID"][accepted],
+            "parent": df["parentNameUsageID"][accepted],
+            "rank": df["taxonRank"][accepted],
+            "name": name[accepted],
+        }
+    )
+    synonyms = pd.DataFrame(
+        {"id": df["acceptedNameUsageID"][~accepted], "name": name[~accepted]}
+    )
+    return nodes, synonyms[synonyms["id"] != ""]
+
+
+READERS = {"NCBI": read_ncbi, "GBIF": read_gbif, "OTT": read_ott}
+
+
+def nested_sets(parent):
+    """Number a forest in pre-order, level by level.
+
+    ``parent`` gives the row of each node's parent (-1 for roots). Returns
+    the pre-order position, last descendant position and depth of each row.
+    Children are numbered in row order.
+    """
+    n = len(parent)
+    depth = np.full(n, -1, dtype=np.int64)
+    frontier = np.flatnonzero(parent < 0)
+    depth[frontier] = 0
+    levels = [frontier]
+    has_parent = parent >= 0
+    while len(frontier):
+        in_frontier = np.zeros(n, dtype=bool)
+        in_frontier[frontier] = True
+        frontier = np.flatnonzero(
+            has_parent & (depth < 0) & in_frontier[np.where(has_parent, parent, 0)]
+        )
+        depth[frontier] = len(levels)
+        if len(frontier):
+            levels.append(frontier)
+    if (depth < 0).any():
+        raise ValueError(f"{(depth < 0).sum()} nodes are not connected to a root")
+
+    size = np.ones(n, dtype=np.int64)
+    for level in reversed(levels[1:]):
+        size += np.bincount(parent[level], weights=size[level], minlength=n).astype(
+            np.int64
+        )
+
+    # Offset of each node among its siblings: sizes of the siblings before it
+    order = np.lexsort((np.arange(n), parent))
+    sizes = size[order]
+    before = np.cumsum(sizes) - sizes
+    group_start = np.r_[True, parent[order][1:] != parent[order][:-1]]
+    before -= np.maximum.accumulate(np.where(group_start, before, 0))
+    offset = np.empty(n, dtype=np.int64)
+    offset[order] = before
+
+    pre = np.empty(n, dtype=np.int64)
+    pre[levels[0]] = offset[levels[0]]
+    for level in levels[1:]:
+        pre[level] = pre[parent[level]] + 1 + offset[level]
+    return pre, pre + size - 1, depth
+
+
+def hash_keys(keys):
+    return pd.util.hash_pandas_object(
+        pd.Series(keys, dtype=object), index=False
+    ).to_numpy()
+
+
+def compile_backbone(nodes, synonyms):
+    """Compile node and synonym tables into the arrays of a backbone."""
+    nodes = nodes.drop_duplicates("id").reset_index(drop=True)
+    ids = pd.Index(nodes["id"])
+    parent = ids.get_indexer(nodes["parent"])
+    # NCBI's root is its own parent
+    parent[parent == np.arange(len(nodes))] = -1
+    pre, end, depth = nested_sets(parent)
+
+    order = np.argsort(pre)
+    arrays = {
+        "id": pd.to_numeric(nodes["id"]).to_numpy(np.int64)[order],
+        "parent": np.where(parent >= 0, pre[np.maximum(parent, 0)], -1)[order],
+        "end": end[order],
+        "depth": depth[order],
+    }
+    arrays["id_order"] = np.argsort(arrays["id"], kind="stable")
+    for name in ("parent", "end", "id_order"):
+        arrays[name] = arrays[name].astype(np.int32)
+    arrays["depth"] = arrays["depth"].astype(np.int16)
+    node_table = pd.DataFrame(
+        {
+            "name": nodes["name"].to_numpy()[order],
+            "rank": nodes["rank"].to_numpy()[order],
+        }
+    )
+
+    # One candidate per (name, node); scientific names before synonyms
+    names = pd.concat(
+        [
+            pd.DataFrame({"node": pre, "name": nodes["name"], "synonym": False}),
+            pd.DataFrame(
+                {
+                    "node": pre[ids.get_indexer(synonyms["id"])],
+                    "name": synonyms["name"].to_numpy(),
+                    "synonym": True,
+                }
+            )[ids.get_indexer(synonyms["id"]) >= 0],
+        ],
+        ignore_index=True,
+    )
+    names = names[names["name"].fillna("") != ""]
+    names["key"] = normalize_names(names["name"]).to_numpy()
+    names["hash"] = hash_keys(names["key"])
+    names = names.sort_values(["hash", "synonym", "node"], kind="stable")
+    names = names.drop_duplicates(["key", "node"])
+    keys = names.drop_duplicates("hash")
+    if keys["key"].nunique() != len(keys) or names["key"].nunique() != len(keys):
+        raise ValueError("two names share a hash, cannot index them")
+    first = np.r_[True, names["hash"].to_numpy()[1:] != names["hash"].to_numpy()[:-1]]
+    arrays["name_hash"] = keys["hash"].to_numpy(np.uint64)
+    arrays["name_start"] = np.r_[np.flatnonzero(first), len(names)].astype(np.int64)
+    arrays["candidate"] = names["node"].to_numpy(np.int32)
+    arrays["synonym"] = names["synonym"].to_numpy(bool)
+    return arrays, node_table, keys["key"].tolist()
+
+
+def write_backbone(directory, arrays, node_table, keys, metadata):
+    import pyarrow as pa
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(directory / f"{name}.npy", array)
+    tables = {
+        "nodes.arrow": pa.table(
+            {
+                "name": pa.array(node_table["name"].tolist(), pa.string()),
+                "rank": pa.array(node_table["rank"].tolist()).dictionary_encode(),
+            }
+        ),
+        "names.arrow": pa.table({"key": pa.array(keys, pa.string())}),
+    }
+    for name, table in tables.items():
+        with pa.OSFile(str(directory / name), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    with open(directory / "backbone.json", "w") as f:
+        json.dump(metadata, f, indent=1)
+
+
+def build_backbone(target, dump, backbone_dir=BACKBONE_DIR):
+    """Build the backbone of ``target`` (NCBI, GBIF or OTT) from a local dump."""
+    nodes, synonyms = READERS[target](dump)
+    arrays, node_table, keys = compile_backbone(nodes, synonyms)
+    directory = Path(backbone_dir) / target
+    metadata = {
+        "target": target,
+        "dump": str(Path(dump).resolve()),
+        "nodes": len(node_table),
+        "names": len(keys),
+        "pandas": pd.__version__,
+    }
+    write_backbone(directory, arrays, node_table, keys, metadata)
+    return directory
+
+
+class Backbone:
+    """Name lookups and ancestor checks over the memory-mapped arrays of a taxonomy."""
+
+    def __init__(self, directory):
+        import pyarrow as pa
+
+        self.directory = Path(directory)
+        self.metadata = read_metadata(self.directory)
+        self.target = self.metadata["target"]
+        for name in ARRAYS + NAME_ARRAYS:
+            setattr(self, name, np.load(self.directory / f"{name}.npy", mmap_mode="r"))
+        tables = {}
+        for name in ("nodes", "names"):
+            with pa.memory_map(str(self.directory / f"{name}.arrow")) as source:
+                tables[name] = pa.ipc.open_file(source).read_all()
+        self.names = tables["nodes"].column("name")
+        self.ranks = tables["nodes"].column("rank")
+        self.keys = tables["names"].column("key")
+
+    def __len__(self):
+        return len(self.id)
+
+    def candidates(self, keys):
+        """Return the candidate nodes of normalized names.
+
+        Returns the row of the name, the node and whether the name is a
+        synonym of the node, for every candidate, best candidates first.
+        """
+        keys = np.asarray(list(keys), dtype=object)
+        if not len(self.name_hash):
+            empty = np.array([], dtype=np.int64)
+            return empty, empty.astype(np.int32), empty.astype(bool)
+        hashes = hash_keys(keys)
+        k = np.minimum(np.searchsorted(self.name_hash, hashes), len(self.name_hash) - 1)
+        found = np.flatnonzero(self.name_hash[k] == hashes) if len(keys) else k
+        # The hash only finds the name, check that it is the same one
+        stored = np.asarray(self.keys.take(k[found]).to_pylist(), dtype=object)
+        found = found[stored == keys[found]]
+        start, stop = self.name_start[k[found]], self.name_start[k[found] + 1]
+        counts = stop - start
+        rows = np.repeat(found, counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(start, counts) + within
+        return rows, self.candidate[positions], self.synonym[positions]
+
+    def find(self, names, include_synonym=True, under=None):
+        """Return the node of each name, -1 when none matches.
+
+        Names are normalized; scientific names win over synonyms. ``under``
+        is a list of ancestor names: the node must sit under one of them,
+        which also chooses among homonyms.
+        """
+        values = pd.Series(list(names), dtype=object)
+        notna = values.notna().to_numpy()
+        # Resolve each distinct name once
+        codes, uniques = pd.factorize(values[notna])
+        rows, nodes, synonym = self.candidates(normalize_names(uniques))
+        keep = np.ones(len(rows), dtype=bool)
+        if not include_synonym:
+            keep &= ~synonym
+        if under:
+            keep &= self.is_under(nodes, self.ancestors(under))
+        rows, nodes = rows[keep], nodes[keep]
+        # Candidates are stored best first: keep the first one of each name
+        rows, first = np.unique(rows, return_index=True)
+        found = np.full(len(uniques), -1, dtype=np.int64)
+        found[rows] = nodes[first]
+        result = np.full(len(values), -1, dtype=np.int64)
+        result[notna] = found[codes]
+        return result
+
+    def ancestors(self, names):
+        """Nodes whose scientific name is one of ``names`` (all homonyms)."""
+        keys = normalize_names(names).tolist()
+        rows, nodes, synonym = self.candidates(keys)
+        return np.unique(nodes[~synonym])
+
+    def is_under(self, nodes, ancestors):
+        """Whether each node is one of ``ancestors`` or one of their descendants."""
+        nodes = np.asarray(nodes)
+        result = np.zeros(len(nodes), dtype=bool)
+        for ancestor in ancestors:
+            result |= (nodes >= ancestor) & (nodes <= self.end[ancestor])
+        return result & (nodes >= 0)
+
+    def nodes_of(self, taxon_ids):
+        """Return the node of each taxon id, -1 when unknown."""
+        ids = np.asarray(taxon_ids, dtype=np.int64)
+        sorted_ids = self.id[self.id_order]
+        k = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[k] == ids, self.id_order[k], -1)
+
+    def lineage(self, node):
+        """Names from the root down to ``node``."""
+        path = []
+        while node >= 0:
+            path.append(self.names[int(node)].as_py())
+            node = self.parent[node]
+        return path[::-1]
+
+    def matches(self, names, include_synonym=True, ranks=None):
+        """Resolve names like :func:`slime.taxa.verify_names`, offline.
+
+        Returns {name: match} for the names that matched a node under one of
+        ``ranks`` (when given).
+        """
+        names = list(names)
+        nodes = self.find(names, include_synonym, ranks or None)
+        hit = np.flatnonzero(nodes >= 0)
+        current = self.names.take(nodes[hit]).to_pylist()
+        rank = self.ranks.take(nodes[hit]).to_pylist()
+        return {
+            names[i]: {
+                "id": f"{self.target}:{self.id[nodes[i]]}",
+                "matched_name": names[i],
+                "current_name": current[j],
+                "rank": rank[j] or None,
+                "lineage": None,
+            }
+            for j, i in enumerate(hit)
+        }
+
+
+def read_metadata(directory):
+    with open(Path(directory) / "backbone.json") as f:
+        return json.load(f)
+
+
+def load_backbones(backbone_dir=BACKBONE_DIR, targets=TARGETS):
+    """Return the backbones built under ``backbone_dir``, by target.
+
+    A backbone built with another version of pandas is built again from its
+    dump, since its name hashes may not match those of this version.
+    """
+    backbones = {}
+    for target in targets:
+        directory = Path(backbone_dir) / target
+        if not (directory / "backbone.json").exists():
+            continue
+        metadata = read_metadata(directory)
+        version, dump = metadata.get("pandas"), metadata["dump"]
+        if version != pd.__version__:
+            if not Path(dump).exists():
+                raise ValueError(
+                    f"{directory} was built with pandas {version}, not "
+                    f"{pd.__version__}, and its dump {dump} is gone: build it again"
+                )
+            warnings.warn(
+                f"{directory} was built with pandas {version}; building it again"
+            )
+            build_backbone(target, dump, backbone_dir)
+        backbones[target] = Backbone(directory)
+    return backbones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build offline taxonomy backbones from local dumps."
+    )
+    parser.add_argument(
+        "dumps",
+        nargs="+",
+        help="<target>=<dump>: NCBI=taxdump(.tar.gz), OTT=ott directory, "
+        "GBIF=Taxon.tsv",
+    )
+    parser.add_argument("--backbone-dir", default=BACKBONE_DIR)
+    args = parser.parse_args()
+
+    for value in args.dumps:
+        target, _, dump = value.partition("=")
+        if target not in READERS:
+            parser.error(f"unknown target {target}, expected one of {TARGETS}")
+        directory = build_backbone(target, dump, args.backbone_dir)
+        backbone = Backbone(directory)
+        print(
+            f"{target}\t{len(backbone)} nodes\t{len(backbone.keys)} names\t{directory}"
+        )
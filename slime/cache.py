@@ -0,0 +1,74 @@
+"""Shared location and housekeeping of the on-disk caches."""
+
+import fcntl
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+CACHE_ROOT = Path(os.environ.get("SLIME_CACHE_DIR", Path.home() / ".cache" / "slime"))
+
+
+def file_digest(path, block_size=2**20):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on ``path`` (created if needed) across processes."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def pin(path):
+    """Open ``path`` for reading with a shared lock that :func:`evict` respects.
+
+    The file stays readable through the returned handle even if it is
+    removed, and is not evicted while the handle is open.
+    """
+    f = open(path, "rb")
+    fcntl.flock(f, fcntl.LOCK_SH)
+    return f
+
+
+def evict(directory, max_bytes):
+    """Remove the least recently used files until ``directory`` fits max_bytes.
+
+    Cache hits are expected to refresh the mtime of the files they use.
+    Files still being written (``*.part``) are neither counted nor removed,
+    and pinned files (see :func:`pin`) are kept. Returns the removed paths.
+    """
+    entries = [
+        (p, p.stat())
+        for p in Path(directory).iterdir()
+        if p.is_file() and ".part" not in p.suffixes
+    ]
+    total = sum(st.st_size for _, st in entries)
+    removed = []
+    for path, st in sorted(entries, key=lambda e: e[1].st_mtime):
+        if total <= max_bytes:
+            break
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            continue
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            path.unlink(missing_ok=True)
+        removed.append(path)
+        total -= st.st_size
+    return removed
@@ -0,0 +1,304 @@
+"""Run source cleaners in-process.
+
+Each ``sources/<id>/clean.py`` defines ``clean(f_in, **kwargs)``. The scripts
+keep their inteGraph command line (``--integraph_filepath`` and
+``--integraph_outputdir``) through :func:`main`, while :func:`run_all` imports
+the cleaners as plain functions and runs many sources in a single interpreter
+or a worker pool, so pandas is only imported once.
+
+Sources may declare their cleansing in source.cfg rather than code: their
+clean.py then only runs the plan compiled from that spec (see
+:mod:`slime.spec`).
+
+Cleaners of CSV sources can also be streamed: when a clean.py module (or a
+compiled spec) defines ``READ_OPTIONS`` (keyword arguments for
+``pd.read_csv``) and a row-local ``clean_chunk(df)``, the chunked mode reads
+the raw file in blocks of ``[transform] chunksize`` rows from the source's
+source.cfg, cleans each block and appends it to the output, so memory use does
+not grow with the input. The file is read twice: a first pass infers the
+dtype of each column over all the blocks, the way a single read of the whole
+file would, and the second pass reads every block with those dtypes, so the
+output does not depend on the chunksize. Asking for the chunked mode for a
+source without ``clean_chunk`` or a chunksize warns and runs it in one go.
+
+Cleansed tables are written as CSV by default. :func:`run_all` can also
+write Parquet or Arrow IPC files (see :mod:`slime.tables`) for the slime
+stages that read them with :func:`slime.tables.read_table`; the inteGraph
+entry point always writes CSV, since inteGraph's annotate stage reads the
+cleansed file as CSV.
+"""
+
+import argparse
+import configparser
+import importlib.util
+import multiprocessing
+import os
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from slime import metrics
+from slime.tables import FORMATS, TableWriter, output_name, write_table
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SOURCES_DIR = ROOT_DIR / "sources"
+GRAPH_CFG = ROOT_DIR / "graph.cfg"
+
+
+def discover_sources(sources_dir=SOURCES_DIR):
+    """Return the ids of the sources that ship a clean.py script."""
+    return sorted(p.parent.name for p in Path(sources_dir).glob("*/clean.py"))
+
+
+@lru_cache(maxsize=None)
+def load_cleaner(source_dir):
+    """Import ``<source_dir>/clean.py`` and return its ``clean`` function."""
+    source_dir = Path(source_dir)
+    module_name = f"_slime_cleaner_{source_dir.name}"
+    spec = importlib.util.spec_from_file_location(module_name, source_dir / "clean.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module.clean
+
+
+def get_output_filepath(filepath, outputdir, output_format="csv"):
+    output_filepath = Path(outputdir) / output_name(filepath, output_format)
+    output_filepath.parent.mkdir(parents=True, exist_ok=True)
+    return output_filepath
+
+
+def read_source_config(path):
+    config = configparser.ConfigParser(interpolation=None)
+    config.read(path)
+    return config
+
+
+def read_chunksize(source_dir):
+    """Return the ``[transform] chunksize`` declared in a source.cfg, if any."""
+    config = read_source_config(Path(source_dir) / "source.cfg")
+    return config.getint("transform", "chunksize", fallback=None)
+
+
+def cleaner_dir(clean):
+    """Return the source directory of a clean.py function or compiled spec."""
+    if hasattr(clean, "source_dir"):
+        return clean.source_dir
+    return Path(sys.modules[clean.__module__].__file__).parent
+
+
+def get_chunk_cleaner(clean):
+    """Return the clean.py module of ``clean``, or the compiled spec itself, if it
+    supports chunked reads."""
+    if hasattr(clean, "source_dir"):
+        module = clean
+    else:
+        module = sys.modules.get(clean.__module__)
+    if getattr(module, "READ_OPTIONS", None) is None:
+        return None
+    return module if hasattr(module, "clean_chunk") else None
+
+
+def common_dtype(a, b):
+    """Return the dtype pandas infers for a column whose blocks have ``a`` and ``b``."""
+    import numpy as np
+
+    if a is None or a == b:
+        return b
+    if a.kind in "iuf" and b.kind in "iuf":
+        return np.result_type(a, b)
+    return np.dtype(object)
+
+
+def infer_dtypes(filepath, chunksize, read_options):
+    """Infer the dtypes of a CSV file block by block, in constant memory."""
+    import pandas as pd
+
+    dtypes = {}
+    with pd.read_csv(filepath, chunksize=chunksize, **read_options) as reader:
+        for chunk in reader:
+            for column, dtype in chunk.dtypes.items():
+                dtypes[column] = common_dtype(dtypes.get(column), dtype)
+    return dtypes
+
+
+def clean_file_chunked(
+    module, filepath, output_filepath, chunksize, output_format="csv"
+):
+    import pandas as pd
+
+    read_options = dict(module.READ_OPTIONS)
+    if "dtype" not in read_options:
+        read_options["dtype"] = infer_dtypes(filepath, chunksize, read_options)
+    reader = pd.read_csv(filepath, chunksize=chunksize, **read_options)
+    with reader, TableWriter(output_filepath, output_format) as writer:
+        for chunk in reader:
+            metrics.count("rows_in", len(chunk))
+            df = module.clean_chunk(chunk)
+            metrics.count("rows_out", len(df))
+            writer.write(df)
+
+
+def clean_table(clean, filepath, record):
+    """Run a cleaner on a whole file, recording the rows of the table it reads.
+
+    Cleaners with ``READ_OPTIONS`` and ``clean_chunk`` are run as the read
+    followed by ``clean_chunk``, so ``rows_in`` is the length of the frame
+    passed in; others read their file themselves and only report the rows
+    of the workbook sheets they read through :mod:`slime.excel`.
+    """
+    import pandas as pd
+
+    module = get_chunk_cleaner(clean)
+    if module is None:
+        return clean(filepath)
+    df = pd.read_csv(filepath, **module.READ_OPTIONS)
+    record["rows_in"] = len(df)
+    return module.clean_chunk(df)
+
+
+def clean_file(clean, filepath, outputdir, chunked=False, output_format="csv"):
+    """Clean one raw file and write the result next to inteGraph's other outputs.
+
+    With ``chunked=True``, cleaners that support it are streamed in blocks of
+    the chunksize configured for their source; others are run in one go, with
+    a warning.
+    """
+    filepath = Path(filepath)
+    output_filepath = get_output_filepath(filepath, outputdir, output_format)
+    module = get_chunk_cleaner(clean) if chunked else None
+    chunksize = read_chunksize(cleaner_dir(clean)) if module else None
+    if chunked and not chunksize:
+        missing = "a chunksize" if module else "clean_chunk and READ_OPTIONS"
+        warnings.warn(
+            f"{cleaner_dir(clean).name}: no chunked mode without {missing};"
+            " cleaning the whole file at once",
+            stacklevel=2,
+        )
+    with metrics.stage(
+        cleaner_dir(clean).name, "cleanse", chunked=bool(chunksize)
+    ) as record:
+        if chunksize:
+            clean_file_chunked(
+                module, filepath, output_filepath, chunksize, output_format
+            )
+        else:
+            df = clean_table(clean, filepath, record)
+            record["rows_out"] = len(df)
+            write_table(df, output_filepath, output_format)
+    return output_filepath
+
+
+def run_source(
+    source_id,
+    filepath,
+    outputdir,
+    sources_dir=SOURCES_DIR,
+    chunked=False,
+    output_format="csv",
+):
+    clean = load_cleaner(Path(sources_dir) / source_id)
+    return clean_file(
+        clean, filepath, outputdir, chunked=chunked, output_format=output_format
+    )
+
+
+def run_all(
+    jobs,
+    outputdir,
+    workers=1,
+    sources_dir=SOURCES_DIR,
+    chunked=False,
+    output_format="csv",
+):
+    """Clean several sources in this process or in a pool of warm workers.
+
+    ``jobs`` maps source ids to raw file paths. Each source writes to
+    ``<outputdir>/<source_id>/``. Returns a dict of source ids to output paths.
+    """
+    outputdir = Path(outputdir)
+    args = [
+        (
+            source_id,
+            filepath,
+            outputdir / source_id,
+            sources_dir,
+            chunked,
+            output_format,
+        )
+        for source_id, filepath in jobs.items()
+    ]
+    if workers <= 1:
+        return {a[0]: run_source(*a) for a in args}
+
+    # Import pandas before forking so that workers inherit it already loaded
+    import pandas  # noqa: F401
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {a[0]: executor.submit(run_source, *a) for a in args}
+        return {source_id: f.result() for source_id, f in futures.items()}
+
+
+def main(clean, argv=None):
+    """Command line entry point shared by the clean.py scripts.
+
+    Setting the ``SLIME_CLEANSE_CHUNKED`` environment variable to 1 enables the
+    chunked mode when the scripts are run by inteGraph. The output is always
+    CSV, under the name of the raw file, which is what inteGraph reads next.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--integraph_filepath")
+    parser.add_argument("--integraph_outputdir")
+    parser.add_argument(
+        "--chunked",
+        action="store_true",
+        default=os.environ.get("SLIME_CLEANSE_CHUNKED") == "1",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics.configure_from_args(args)
+
+    output_filepath = clean_file(
+        clean,
+        args.integraph_filepath,
+        args.integraph_outputdir,
+        chunked=args.chunked,
+    )
+    print(output_filepath)
+
+
+def parse_job(value):
+    source_id, sep, filepath = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected <source_id>=<path>, got {value}")
+    return source_id, filepath
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Clean several sources in a single process."
+    )
+    parser.add_argument("jobs", nargs="+", type=parse_job, help="<source_id>=<path>")
+    parser.add_argument("--outputdir", required=True)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunked", action="store_true")
+    parser.add_argument("--output-format", choices=FORMATS, default="csv")
+    parser.add_argument("--sources-dir", default=SOURCES_DIR)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+
+    outputs = run_all(
+        dict(args.jobs),
+        args.outputdir,
+        workers=args.workers,
+        sources_dir=args.sources_dir,
+        chunked=args.chunked,
+        output_format=args.output_format,
+    )
+    for output_filepath in outputs.values():
+        print(output_filepath)
@@ -0,0 +1,253 @@
+"""Drop the records repeated within and across the sources of a build.
+
+The globi_* sources overlap: a record of the GloBI ``interaction`` endpoint
+comes back from the query of every source taxon in its lineage. Before
+annotation and materialization, :func:`dedup_all` reads the cleansed (or
+extracted) table of each source in turn and keeps the records whose
+canonical key, the values of their consumer, interaction, resource,
+reference and source columns, has not been seen in that source or in an
+earlier one. Keys are 128-bit hashes of the stripped values, computed for a
+whole chunk at once, and the set of seen keys is a SQLite table on disk, so
+memory use is bounded by the chunk size whatever the size of the build.
+
+The columns of each role are listed in ``[transform.dedup]`` of a source's
+source.cfg, as JSON lists (missing columns read as empty values):
+
+    [transform.dedup]
+    consumer=["scientific_ncbi"]
+    interaction=["feeding"]
+    reference=["reference"]
+
+Sources extracted from GloBI use the columns of its CSV output by default.
+Sources without a key are copied as they are.
+"""
+
+import argparse
+import json
+import sqlite3
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from slime import metrics
+from slime.cleanse import SOURCES_DIR, parse_job, read_source_config
+from slime.tables import TableWriter, format_of, iter_table
+
+ROLES = ("consumer", "interaction", "resource", "reference", "source")
+# Defaults per [extract.api] connection
+DEFAULT_KEYS = {
+    "globi": {
+        "consumer": ["source_taxon_external_id", "source_taxon_name"],
+        "interaction": ["interaction_type"],
+        "resource": ["target_taxon_external_id", "target_taxon_name"],
+        "reference": ["study_citation", "study_external_id"],
+        "source": ["study_source_citation"],
+    }
+}
+CHUNK_ROWS = 100_000
+# Two independent 64-bit hashes make a 128-bit key
+HASH_KEYS = ("slime-dedup-0001", "slime-dedup-0002")
+
+
+def dedup_key(source_dir):
+    """Return the key columns of a source, in role order, or None."""
+    config = read_source_config(Path(source_dir) / "source.cfg")
+    if config.has_section("transform.dedup"):
+        section = config["transform.dedup"]
+        return [c for role in ROLES for c in json.loads(section.get(role, "[]"))]
+    conn_id = config.get("extract.api", "conn_id", fallback=None)
+    if conn_id in DEFAULT_KEYS:
+        return [c for role in ROLES for c in DEFAULT_KEYS[conn_id].get(role, [])]
+    return None
+
+
+def column_values(df, name):
+    """Return a column of a chunk as stripped strings, empty where missing.
+
+    CSV tables are read with their first column as the index, which may be
+    one of the key columns.
+    """
+    if name in df.columns:
+        values = df[name]
+    elif name == df.index.name:
+        values = df.index
+    else:
+        return np.full(len(df), "", dtype=object)
+    # Labels repeat a lot: strip each distinct value once
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    uniques = pd.Series(uniques, dtype=object).fillna("").astype(str).str.strip()
+    return uniques.to_numpy()[codes]
+
+
+def record_keys(df, columns):
+    """Hash the key columns of each row into two uint64 arrays."""
+    frame = pd.DataFrame({str(i): column_values(df, c) for i, c in enumerate(columns)})
+    return tuple(
+        pd.util.hash_pandas_object(frame, index=False, hash_key=key).to_numpy()
+        for key in HASH_KEYS
+    )
+
+
+class SeenKeys:
+    """SQLite set of record keys, with the source that first had each one."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen (hi INTEGER, lo INTEGER, owner TEXT,"
+            " PRIMARY KEY (hi, lo)) WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TEMP TABLE chunk (pos INTEGER PRIMARY KEY, hi INTEGER, lo INTEGER)"
+        )
+
+    def add(self, hi, lo, owner):
+        """Add distinct keys; return the owners of those seen before, by position."""
+        # SQLite integers are signed
+        rows = zip(
+            range(len(hi)), hi.view(np.int64).tolist(), lo.view(np.int64).tolist()
+        )
+        with self.conn:
+            self.conn.execute("DELETE FROM chunk")
+            self.conn.executemany("INSERT INTO chunk VALUES (?, ?, ?)", rows)
+            seen = dict(
+                self.conn.execute(
+                    "SELECT pos, owner FROM chunk JOIN seen USING (hi, lo)"
+                )
+            )
+            self.conn.execute(
+                "INSERT OR IGNORE INTO seen SELECT hi, lo, ? FROM chunk", (owner,)
+            )
+        return seen
+
+    def forget(self, owner):
+        """Drop the keys of a source, which is deduplicated again."""
+        with self.conn:
+            self.conn.execute("DELETE FROM seen WHERE owner = ?", (owner,))
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM seen").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def dedup_source(source_id, path, output_path, seen, columns, chunksize=CHUNK_ROWS):
+    """Copy the records of a table whose key is not in ``seen`` yet.
+
+    Returns the number of rows, of duplicates within the source and of
+    duplicates of earlier sources, with the sources they repeat.
+    """
+    stats = {"rows": 0, "within": 0, "across": 0, "overlaps": Counter()}
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with TableWriter(output_path, format_of(path)) as writer:
+        for chunk in iter_table(path, chunksize):
+            stats["rows"] += len(chunk)
+            if columns is None:
+                writer.write(chunk)
+                continue
+            if not any(c in chunk.columns or c == chunk.index.name for c in columns):
+                raise ValueError(f"{path} has none of the key columns {columns}")
+            hi, lo = record_keys(chunk, columns)
+            repeated = pd.DataFrame({"hi": hi, "lo": lo}).duplicated().to_numpy()
+            first = np.flatnonzero(~repeated)
+            owners = seen.add(hi[first], lo[first], source_id)
+            keep = np.ones(len(first), dtype=bool)
+            keep[list(owners)] = False
+            earlier = Counter(owners.values())
+            stats["within"] += int(repeated.sum()) + earlier.pop(source_id, 0)
+            stats["across"] += sum(earlier.values())
+            stats["overlaps"].update(earlier)
+            writer.write(chunk.take(first[keep]))
+    stats["kept"] = stats["rows"] - stats["within"] - stats["across"]
+    return stats
+
+
+def dedup_all(
+    jobs, outputdir, seen_path=None, sources_dir=SOURCES_DIR, chunksize=CHUNK_ROWS
+):
+    """Deduplicate the tables of several sources against each other.
+
+    ``jobs`` maps source ids to tables, in the order in which they claim
+    records: a record repeated across sources is kept in the first one only.
+    Each table is written to ``<outputdir>/<source_id>/`` under its own
+    name. ``seen_path`` keeps the keys of the build in a file (to
+    deduplicate a build over several runs); by default they go to a
+    temporary file. Returns the stats of each source.
+    """
+    tmpdir = None
+    if seen_path is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        seen_path = Path(tmpdir.name) / "seen.sqlite"
+    stats = {}
+    try:
+        with SeenKeys(seen_path) as seen:
+            for source_id, path in jobs.items():
+                path = Path(path)
+                columns = dedup_key(Path(sources_dir) / source_id)
+                output_path = Path(outputdir) / source_id / path.name
+                seen.forget(source_id)
+                with metrics.stage(source_id, "dedup") as record:
+                    stats[source_id] = s = dedup_source(
+                        source_id, path, output_path, seen, columns, chunksize
+                    )
+                    s["path"] = output_path
+                    record.update(
+                        rows_in=s["rows"],
+                        rows_out=s["kept"],
+                        duplicates_within=s["within"],
+                        duplicates_across=s["across"],
+                    )
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+    return stats
+
+
+def duplicate_rate(stats):
+    return (stats["within"] + stats["across"]) / stats["rows"] if stats["rows"] else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drop the records repeated within and across sources."
+    )
+    parser.add_argument(
+        "jobs", nargs="+", type=parse_job, help="<source_id>=<table>, in priority order"
+    )
+    parser.add_argument("--outputdir", required=True)
+    parser.add_argument("--seen", help="SQLite file of the keys seen in this build")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--sources-dir", default=SOURCES_DIR)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+
+    stats = dedup_all(
+        dict(args.jobs),
+        args.outputdir,
+        seen_path=args.seen,
+        sources_dir=args.sources_dir,
+        chunksize=args.chunksize,
+    )
+    print("source\trows\tkept\twithin\tacross\trate\toverlaps most with")
+    for source_id, s in stats.items():
+        top = ", ".join(f"{o} ({n})" for o, n in s["overlaps"].most_common(3))
+        print(
+            f"{source_id}\t{s['rows']}\t{s['kept']}\t{s['within']}\t{s['across']}"
+            f"\t{duplicate_rate(s):.1%}\t{top or '-'}"
+        )
+    total = sum(s["rows"] for s in stats.values())
+    kept = sum(s["kept"] for s in stats.values())
+    print(f"total\t{total}\t{kept}\t\t\t{1 - kept / total if total else 0:.1%}")
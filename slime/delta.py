@@ -0,0 +1,300 @@
+"""Send only the triples that changed since the last load of a source.
+
+The statements of every loaded source are kept, sorted and deduplicated, as
+a snapshot under ``<cache>/snapshots``. When a source is loaded again, its
+new N-Quads file is sorted the same way with an external merge sort (runs
+of at most ``run_bytes`` are sorted in memory, written to disk and merged),
+and a merge walk over the old and new snapshots yields the statements to
+delete and to insert. These are sent as ``DELETE DATA``/``INSERT DATA``
+updates on the source's named graph, so memory use stays bounded by the run
+size and the store only rewrites what changed.
+
+Blank nodes cannot be addressed by ``DELETE DATA`` and get new identities
+when inserted, so statements are skolemized like :mod:`slime.load` does
+before they are sorted: the blank nodes of the mappings get the same IRIs
+in every build, and their statements are diffed like any other. Sources
+without a snapshot, whose delta is larger than ``max_ratio`` of their
+statements, or whose snapshot still has blank nodes (written before
+skolemization) are replaced whole with :func:`slime.load.load_all`.
+"""
+
+import argparse
+import gzip
+import heapq
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from slime.cache import CACHE_ROOT
+from slime.cleanse import GRAPH_CFG, parse_job
+from slime.load import (
+    BATCH_BYTES,
+    ConnectionPool,
+    checkpoint_dir,
+    load_all,
+    skolem_base,
+    skolemize,
+    split_quad,
+    update,
+)
+from slime.rebuild import graph_iri, store_headers, store_url
+
+SNAPSHOT_DIR = CACHE_ROOT / "snapshots"
+RUN_BYTES = 64 * 2**20
+MAX_RATIO = 0.5
+
+
+def read_statements(rdf_path, base=None):
+    """Yield the N-Triples statements of a file, without the final dot.
+
+    Blank nodes are skolemized under ``base`` when it is given.
+    """
+    opener = gzip.open if Path(rdf_path).suffix == ".gz" else open
+    quads = ".nq" in Path(rdf_path).suffixes
+    with opener(rdf_path, "rt", encoding="utf-8") as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            if quads:
+                line = split_quad(line)[0]
+            statement = line.rstrip()[:-1].rstrip()
+            yield statement if base is None else skolemize(statement, base)
+
+
+def write_run(statements, run_dir):
+    fd, path = tempfile.mkstemp(dir=run_dir, suffix=".nt.gz")
+    with gzip.open(os.fdopen(fd, "wb"), "wt", encoding="utf-8", compresslevel=1) as f:
+        f.writelines(f"{s}\n" for s in sorted(statements))
+    return path
+
+
+def read_run(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield line[:-1]
+
+
+def sort_statements(rdf_path, output_path, run_bytes=RUN_BYTES, base=None):
+    """Write the distinct statements of a file, sorted, to a gzipped file.
+
+    Blank nodes are skolemized under ``base`` when it is given. Returns the
+    number of distinct statements.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with tempfile.TemporaryDirectory(dir=output_path.parent) as run_dir:
+        runs, run, size = [], set(), 0
+        for statement in read_statements(rdf_path, base):
+            if statement not in run:
+                run.add(statement)
+                size += len(statement) + 50
+            if size >= run_bytes:
+                runs.append(write_run(run, run_dir))
+                run, size = set(), 0
+        if run or not runs:
+            runs.append(write_run(run, run_dir))
+        tmp = output_path.with_suffix(".part")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=1) as out:
+            previous = None
+            for statement in heapq.merge(*map(read_run, runs)):
+                if statement != previous:
+                    out.write(f"{statement}\n")
+                    previous = statement
+                    n += 1
+        os.replace(tmp, output_path)
+    return n
+
+
+def diff_sorted(old_path, new_path):
+    """Yield ("-", statement) and ("+", statement) between two sorted files."""
+    old, new = read_run(old_path), read_run(new_path)
+    a, b = next(old, None), next(new, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a < b):
+            yield "-", a
+            a = next(old, None)
+        elif a is None or b < a:
+            yield "+", b
+            b = next(new, None)
+        else:
+            a, b = next(old, None), next(new, None)
+
+
+def has_blank_node(statement):
+    subject, _, rest = statement.partition(" ")
+    return subject.startswith("_:") or rest.partition(" ")[2].startswith("_:")
+
+
+def write_changes(old_path, new_path, work_dir):
+    """Split the diff of two snapshots into a deletes and an inserts file.
+
+    Returns the paths, the number of deleted and inserted statements and
+    whether a changed statement has a blank node (only snapshots written
+    before skolemization have some).
+    """
+    paths = {"-": work_dir / "deletes.nt", "+": work_dir / "inserts.nt"}
+    counts = {"-": 0, "+": 0}
+    blank = False
+    files = {op: open(path, "w", encoding="utf-8") for op, path in paths.items()}
+    try:
+        for op, statement in diff_sorted(old_path, new_path):
+            files[op].write(f"{statement} .\n")
+            counts[op] += 1
+            blank = blank or has_blank_node(statement)
+    finally:
+        for f in files.values():
+            f.close()
+    return paths, counts, blank
+
+
+def data_updates(path, operation, graph, batch_bytes=BATCH_BYTES):
+    """Yield ``INSERT DATA``/``DELETE DATA`` updates of at most batch_bytes."""
+    head = f"{operation} DATA {{ GRAPH <{graph}> {{\n"
+    lines, size = [], 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if lines and size + len(line) > batch_bytes:
+                yield head + "".join(lines) + "} }"
+                lines, size = [], 0
+            lines.append(line)
+            size += len(line)
+    if lines:
+        yield head + "".join(lines) + "} }"
+
+
+def snapshot_dir(url, snapshot_dir=SNAPSHOT_DIR):
+    return checkpoint_dir(url, snapshot_dir)
+
+
+def delta_all(
+    jobs,
+    url=None,
+    full=False,
+    max_ratio=MAX_RATIO,
+    run_bytes=RUN_BYTES,
+    batch_bytes=BATCH_BYTES,
+    headers=None,
+    graph_cfg=GRAPH_CFG,
+    snapshots=SNAPSHOT_DIR,
+    **load_options,
+):
+    """Bring the named graphs of several sources up to date with their files.
+
+    Sources are updated with their delta when possible and reloaded with
+    :func:`slime.load.load_all` otherwise (or with ``full=True``). The
+    snapshot of a source is replaced once the store has its new triples.
+    Returns the stats of each source.
+    """
+    url = url or store_url(graph_cfg)
+    headers = store_headers(graph_cfg) if headers is None else headers
+    snapshot_root = snapshot_dir(url, snapshots)
+    snapshot_root.mkdir(parents=True, exist_ok=True)
+    pool = ConnectionPool(url, size=1, headers=headers)
+    stats, reload = {}, {}
+    try:
+        for source_id, rdf_path in jobs.items():
+            start = time.perf_counter()
+            graph = graph_iri(source_id, graph_cfg)
+            snapshot = snapshot_root / f"{source_id}.nt.gz"
+            with tempfile.TemporaryDirectory(dir=snapshot_root) as tmpdir:
+                work_dir = Path(tmpdir)
+                sorted_path = work_dir / "new.nt.gz"
+                n = sort_statements(
+                    rdf_path, sorted_path, run_bytes, skolem_base(graph)
+                )
+                s = stats[source_id] = {"statements": n, "deleted": 0, "inserted": 0}
+                if full or not snapshot.exists():
+                    s["mode"] = "full" if full else "new"
+                else:
+                    paths, counts, blank = write_changes(
+                        snapshot, sorted_path, work_dir
+                    )
+                    s["deleted"], s["inserted"] = counts["-"], counts["+"]
+                    if blank:
+                        s["mode"] = "blank nodes"
+                    elif counts["-"] + counts["+"] > max_ratio * max(n, 1):
+                        s["mode"] = "large delta"
+                    else:
+                        s["mode"] = "delta"
+                        s["bytes"] = 0
+                        for op, operation in (("-", "DELETE"), ("+", "INSERT")):
+                            for query in data_updates(
+                                paths[op], operation, graph, batch_bytes
+                            ):
+                                update(pool, query)
+                                s["bytes"] += len(query.encode())
+                s["written"] = s["deleted"] + s["inserted"]
+                if s["mode"] != "delta":
+                    s["written"] = n
+                    reload[source_id] = rdf_path
+                    pending = snapshot_root / f"{source_id}.pending.nt.gz"
+                    os.replace(sorted_path, pending)
+                else:
+                    os.replace(sorted_path, snapshot)
+            s["seconds"] = time.perf_counter() - start
+    finally:
+        pool.close()
+
+    if reload:
+        loaded = load_all(
+            reload,
+            url=url,
+            headers=headers,
+            graph_cfg=graph_cfg,
+            batch_bytes=batch_bytes,
+            **load_options,
+        )
+        for source_id, s in loaded.items():
+            os.replace(
+                snapshot_root / f"{source_id}.pending.nt.gz",
+                snapshot_root / f"{source_id}.nt.gz",
+            )
+            stats[source_id]["bytes"] = s["bytes"]
+            stats[source_id]["seconds"] += s["seconds"]
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Update the named graphs of several sources with the "
+        "triples that changed since their last load."
+    )
+    parser.add_argument(
+        "jobs", nargs="+", type=parse_job, help="<source_id>=<.nq.gz/.nt.gz file>"
+    )
+    parser.add_argument("--url", help="repository URL (default: [load] of graph.cfg)")
+    parser.add_argument(
+        "--full", action="store_true", help="reload whole graphs and reset snapshots"
+    )
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=MAX_RATIO,
+        help="reload a graph when its delta is larger than this share of it",
+    )
+    parser.add_argument(
+        "--memory-mb",
+        type=float,
+        default=RUN_BYTES / 2**20,
+        help="size of the sorted runs",
+    )
+    parser.add_argument("--graph-cfg", default=GRAPH_CFG)
+    args = parser.parse_args()
+
+    stats = delta_all(
+        dict(args.jobs),
+        url=args.url,
+        full=args.full,
+        max_ratio=args.max_ratio,
+        run_bytes=int(args.memory_mb * 2**20),
+        graph_cfg=args.graph_cfg,
+    )
+    for source_id, s in stats.items():
+        print(
+            f"{source_id}\t{s['mode']}\t{s['statements']} statements"
+            f"\t-{s['deleted']} +{s['inserted']}\t{s['written']} written"
+            f"\t{s['bytes'] / 2**20:.1f} MiB sent"
+            f"\t{s['seconds']:.1f}s"
+        )
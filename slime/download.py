@@ -0,0 +1,290 @@
+"""Content-addressed cache for the files downloaded by ``[extract.file]``.
+
+Downloads are stored once under their SHA-256 in ``<cache>/downloads/blobs``
+and an index maps each URL to its blob together with the ``ETag`` and
+``Last-Modified`` headers of the response. Later fetches send a conditional
+request and reuse the blob when the server answers 304 Not Modified. When the
+server is unreachable or answers 429 or 5xx, the cached copy is used with a
+warning. Blobs are evicted least recently used first once the cache exceeds
+its size limit. :func:`fetch` returns the blob opened and pinned, so that
+another process evicting it cannot pull it away from the caller.
+:func:`extract_member` copies a single member out of a zip archive without
+unpacking the rest of it.
+
+A download is written to ``blobs/<url key>.part``, with the validators of
+the response next to it, so an interrupted download is resumed with a
+``Range``/``If-Range`` request. Fetches of the same URL are serialized by a
+lock per URL, and the index is read, updated and written under a lock of
+its own, so concurrent processes do not lose each other's entries.
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import warnings
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from slime import metrics
+from slime.cache import CACHE_ROOT, evict, file_lock, pin
+from slime.cleanse import SOURCES_DIR, read_source_config
+
+CACHE_DIR = CACHE_ROOT / "downloads"
+MAX_CACHE_BYTES = int(os.environ.get("SLIME_DOWNLOAD_CACHE_BYTES", 20 * 2**30))
+TIMEOUT = 60
+
+
+def load_index(cache_dir):
+    try:
+        with open(cache_dir / "index.json") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_index(cache_dir, index):
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, cache_dir / "index.json")
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def read_partial(part):
+    """Return the validators of a partial download, or None."""
+    try:
+        with open(part.with_name(part.name + ".json")) as f:
+            validators = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if not part.exists() or not (validators["etag"] or validators["last_modified"]):
+        return None
+    return validators
+
+
+def discard_partial(part):
+    part.unlink(missing_ok=True)
+    part.with_name(part.name + ".json").unlink(missing_ok=True)
+
+
+def store_response(response, part, blobs_dir):
+    """Stream a response body into the blob store and return its digest.
+
+    A 206 answer is appended to the partial download ``part``, any other
+    answer replaces it. A short body leaves the part to be resumed.
+    """
+    digest = hashlib.sha256()
+    if response.status == 206:
+        with open(part, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                digest.update(block)
+        mode = "ab"
+    else:
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        with open(part.with_name(part.name + ".json"), "w") as f:
+            json.dump(validators, f)
+        mode = "wb"
+    received = 0
+    with open(part, mode) as f:
+        for block in iter(lambda: response.read(2**20), b""):
+            digest.update(block)
+            f.write(block)
+            received += len(block)
+    expected = response.headers.get("Content-Length")
+    if expected is not None and received < int(expected):
+        # http.client returns a short body instead of raising; keep the part
+        raise http.client.IncompleteRead(b"", int(expected) - received)
+    os.replace(part, blobs_dir / digest.hexdigest())
+    discard_partial(part)
+    return digest.hexdigest()
+
+
+def open_url(url, entry, part, timeout):
+    """Send a conditional request, resuming the partial download if any."""
+    request = urllib.request.Request(url)
+    if entry and entry.get("etag"):
+        request.add_header("If-None-Match", entry["etag"])
+    if entry and entry.get("last_modified"):
+        request.add_header("If-Modified-Since", entry["last_modified"])
+    validators, size = read_partial(part), 0
+    if validators is not None:
+        size = part.stat().st_size
+        request.add_header("Range", f"bytes={size}-")
+        request.add_header(
+            "If-Range", validators["etag"] or validators["last_modified"]
+        )
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code != 416 or validators is None:
+            raise
+        # The partial download does not fit the file any more
+        discard_partial(part)
+        return open_url(url, entry, part, timeout)
+    content_range = response.headers.get("Content-Range") or ""
+    if response.status == 206 and (
+        validators is None or not content_range.startswith(f"bytes {size}-")
+    ):
+        response.close()
+        if validators is None:
+            raise urllib.error.URLError(f"unexpected partial content from {url}")
+        discard_partial(part)
+        return open_url(url, entry, part, timeout)
+    if response.status == 206:
+        metrics.count("resumed_bytes", size)
+    return response
+
+
+def fetch(url, cache_dir=None, max_bytes=None, timeout=TIMEOUT):
+    """Return a cached copy of ``url``, downloading it if needed.
+
+    The copy is returned as a binary file opened on its blob (``.name`` is
+    the path), which is not evicted until the file is closed. Use
+    :func:`fetched` for a path.
+    """
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    blobs_dir = cache_dir / "blobs"
+    blobs_dir.mkdir(parents=True, exist_ok=True)
+    key = url_key(url)
+    part = blobs_dir / f"{key}.part"
+
+    with file_lock(cache_dir / "locks" / key):
+        entry = load_index(cache_dir).get(url)
+        cached = blobs_dir / entry["sha256"] if entry else None
+        if cached is not None and not cached.exists():
+            entry = cached = None
+
+        try:
+            with open_url(url, entry, part, timeout) as response:
+                metrics.count("cache_misses")
+                sha256 = store_response(response, part, blobs_dir)
+                entry = {
+                    "sha256": sha256,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "size": (blobs_dir / sha256).stat().st_size,
+                }
+        except urllib.error.HTTPError as e:
+            if cached is None or not (e.code == 304 or is_unavailable(e)):
+                raise
+            if e.code != 304:
+                warn_stale(url, e)
+            metrics.count("cache_hits")
+        except (
+            urllib.error.URLError,
+            http.client.IncompleteRead,
+            TimeoutError,
+            ConnectionError,
+        ) as e:
+            # Keep building from the cached copy when the server is unreachable
+            if cached is None:
+                raise
+            warn_stale(url, e)
+            metrics.count("cache_hits")
+
+        entry["checked"] = time.time()
+        path = blobs_dir / entry["sha256"]
+        with file_lock(cache_dir / "index.lock"):
+            # Other processes may have added entries since it was read
+            index = load_index(cache_dir)
+            try:
+                blob = pin(path)
+            except FileNotFoundError:
+                # Evicted by another process since it was stored or checked
+                blob = None
+                index.pop(url, None)
+            else:
+                os.utime(path)
+                index[url] = entry
+            removed = {p.name for p in evict(blobs_dir, max_bytes)}
+            index = {u: e for u, e in index.items() if e["sha256"] not in removed}
+            save_index(cache_dir, index)
+    if blob is None:
+        return fetch(url, cache_dir, max_bytes, timeout)
+    return blob
+
+
+@contextmanager
+def fetched(url, **kwargs):
+    """Yield the path of a cached copy of ``url``, kept until the block exits."""
+    with fetch(url, **kwargs) as blob:
+        yield Path(blob.name)
+
+
+def is_unavailable(error):
+    """Whether an HTTP error says to come back later rather than the URL is wrong."""
+    return error.code == 429 or error.code >= 500
+
+
+def warn_stale(url, error):
+    warnings.warn(f"{url}: {error}; using the cached copy", stacklevel=3)
+
+
+def extract_member(archive_path, member, output_path):
+    """Copy one member of a zip archive to ``output_path`` by streaming it."""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(archive_path) as archive, archive.open(member) as src:
+        with open(output_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 2**20)
+    return output_path
+
+
+def fetch_source_file(source_id, outputdir, sources_dir=SOURCES_DIR, **kwargs):
+    """Fetch the ``[extract.file]`` of a source into ``outputdir``.
+
+    When the source names a ``file`` inside a downloaded archive, only that
+    member is extracted. Local paths are resolved against the source
+    directory and returned as they are.
+    """
+    source_dir = Path(sources_dir) / source_id
+    config = read_source_config(source_dir / "source.cfg")
+    file_path = config.get("extract.file", "file_path")
+    member = config.get("extract.file", "file", fallback=None)
+    if "://" not in file_path:
+        return source_dir / file_path
+
+    with metrics.stage(source_id, "extract") as record:
+        with fetched(file_path, **kwargs) as path:
+            if member is None:
+                output_path = Path(outputdir) / Path(file_path).name
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(path, output_path)
+            else:
+                output_path = Path(outputdir) / Path(member).name
+                extract_member(path, member, output_path)
+        record["bytes"] = output_path.stat().st_size
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Download the [extract.file] of sources through the cache."
+    )
+    parser.add_argument("sources", nargs="+")
+    parser.add_argument("--outputdir", required=True)
+    parser.add_argument("--sources-dir", default=SOURCES_DIR)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+
+    for source_id in args.sources:
+        path = fetch_source_file(
+            source_id, Path(args.outputdir) / source_id, args.sources_dir
+        )
+        print(f"{source_id}\t{path}")
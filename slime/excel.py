@@ -0,0 +1,127 @@
+"""Cache parsed spreadsheet sheets keyed by workbook content.
+
+``pd.read_excel`` is the slowest step of most spreadsheet cleaners. The
+:func:`read_excel` wrapper parses each sheet once, stores it as an Arrow IPC
+file named after the SHA-256 of the workbook, the sheet and the read options,
+and memory-maps that file on later runs. Sheets that Arrow cannot represent
+(e.g. columns mixing numbers and text) are pickled instead. Entries are
+written to a temporary file and renamed, and an entry that cannot be read
+(left truncated by an older version, say) is parsed again like a miss. The
+least recently used entries are evicted once the cache grows past its size
+limit.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from slime import metrics
+from slime.cache import CACHE_ROOT, evict, file_digest
+
+CACHE_DIR = CACHE_ROOT / "excel"
+MAX_CACHE_BYTES = int(os.environ.get("SLIME_EXCEL_CACHE_BYTES", 2 * 2**30))
+
+
+def cache_key(digest, sheet_name, kwargs):
+    options = json.dumps([sheet_name, sorted(kwargs.items())], default=str)
+    return hashlib.sha256(f"{digest}:{options}".encode()).hexdigest()
+
+
+def save_sheet(df, path):
+    import pyarrow as pa
+
+    try:
+        table = pa.Table.from_pandas(df)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        table = None
+        path = path.with_suffix(".pkl")
+    # Readers only ever see complete entries
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if table is None:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                with pa.ipc.new_file(f, table.schema) as writer:
+                    writer.write_table(table)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def load_sheet(path):
+    import numpy as np
+    import pyarrow as pa
+
+    if path.suffix == ".pkl":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    with pa.memory_map(str(path)) as source:
+        df = pa.ipc.open_file(source).read_all().to_pandas()
+    # Arrow nulls come back as None, read_excel gives NaN for empty cells
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+def find_entry(cache_dir, key):
+    for suffix in (".arrow", ".pkl"):
+        path = cache_dir / f"{key}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def read_sheet(path, digest, sheet_name, cache_dir, max_bytes, **kwargs):
+    import pandas as pd
+    import pyarrow as pa
+
+    key = cache_key(digest, sheet_name, kwargs)
+    entry = find_entry(cache_dir, key)
+    if entry is not None:
+        try:
+            df = load_sheet(entry)
+        except (
+            OSError,
+            EOFError,
+            ValueError,
+            pickle.UnpicklingError,
+            pa.ArrowException,
+        ):
+            # A damaged entry is parsed again and replaced
+            entry.unlink(missing_ok=True)
+        else:
+            os.utime(entry)
+            metrics.count("cache_hits")
+            metrics.count("rows_in", len(df))
+            return df
+    metrics.count("cache_misses")
+    df = pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+    metrics.count("rows_in", len(df))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    save_sheet(df, cache_dir / f"{key}.arrow")
+    evict(cache_dir, max_bytes)
+    return df
+
+
+def read_excel(path, sheet_name=0, cache_dir=None, max_bytes=None, **kwargs):
+    """Cached replacement for ``pd.read_excel`` on a workbook file.
+
+    ``sheet_name`` may be a sheet name or position, or a list of them, in
+    which case a dict of DataFrames is returned as with pandas. Other keyword
+    arguments are passed to ``pd.read_excel`` and are part of the cache key.
+    """
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    digest = file_digest(path)
+    if isinstance(sheet_name, list):
+        return {
+            name: read_sheet(path, digest, name, cache_dir, max_bytes, **kwargs)
+            for name in sheet_name
+        }
+    return read_sheet(path, digest, sheet_name, cache_dir, max_bytes, **kwargs)
@@ -0,0 +1,286 @@
+"""Reconstruct local food webs from a sites × taxa occurrence matrix.
+
+SLIME is meant to infer the food web of each site of a co-occurrence or
+co-abundance survey from the metaweb of all known interactions. Here the
+metaweb is the edge list of a :mod:`slime.query` snapshot (observed and,
+by default, potential interactions). Each taxon of the matrix is mapped to
+the metaweb nodes at or below it in the snapshot lineage, as the SLIMER
+functions match taxa, so that the whole taxon-level metaweb is one sparse
+product ``W = M A Mᵀ``. The food web of a site is then the submatrix of
+``W`` on the taxa present there; sites are processed in chunks by a process
+pool.
+
+The matrix is read from CSV, Parquet or Arrow, either wide (one row per
+site, one column per taxon, the first column holding the site ids) or long
+(``site``, ``taxon`` and optionally ``value`` columns). A taxon is present
+where its value is above zero. Taxa are given as CURIEs or IRIs (e.g.
+``NCBI:55786``) or as scientific names. scipy is an optional dependency.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from slime.query import Snapshot, expand
+from slime.tables import FORMATS, TableWriter, output_name, read_table
+
+QUESTIONS = ("interactions", "potential_interactions")
+CHUNK_SITES = 1000
+LONG_COLUMNS = {"site", "taxon"}
+
+_web = None
+
+
+def read_occurrences(path):
+    """Return the site ids, taxa and sites × taxa presence matrix (CSR) of a file."""
+    from scipy import sparse
+
+    df = read_table(path)
+    if not isinstance(df.index, pd.RangeIndex):
+        # CSV tables are read with their first column as the index
+        df = df.reset_index()
+    if LONG_COLUMNS <= set(df.columns):
+        if "value" in df:
+            df = df[df["value"].fillna(0) > 0]
+        sites = pd.Categorical(df["site"].astype(str))
+        taxa = pd.Categorical(df["taxon"].astype(str))
+        matrix = sparse.csr_matrix(
+            (np.ones(len(df), dtype=bool), (sites.codes, taxa.codes)),
+            shape=(len(sites.categories), len(taxa.categories)),
+        )
+        return pd.Index(sites.categories), pd.Index(taxa.categories), matrix
+    df = df.set_index(df.columns[0])
+    rows, columns = [], []
+    for j, column in enumerate(df.columns):
+        present = np.flatnonzero(pd.to_numeric(df[column]).fillna(0).to_numpy() > 0)
+        rows.append(present)
+        columns.append(np.full(len(present), j))
+    rows, columns = np.concatenate(rows), np.concatenate(columns)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=bool), (rows, columns)), shape=df.shape
+    )
+    return df.index.astype(str), df.columns.astype(str), matrix
+
+
+def metaweb_edges(snapshot, questions=QUESTIONS, interactions=None):
+    """Return the distinct (consumer, resource) pairs of the snapshot tables.
+
+    ``interactions`` optionally restricts the edges to some interaction
+    types (CURIEs or IRIs).
+    """
+    frames = []
+    for question in questions:
+        table = snapshot.tables[question]
+        frames.append(
+            table.select(["matchId", "interactionId", "resourceId"])
+            .to_pandas()
+            .astype(str)
+        )
+    edges = pd.concat(frames, ignore_index=True)
+    if interactions is not None:
+        wanted = {expand(i) for i in interactions}
+        edges = edges[edges["interactionId"].isin(wanted)]
+    edges = edges.rename(columns={"matchId": "consumer", "resourceId": "resource"})
+    return edges[["consumer", "resource"]].drop_duplicates(ignore_index=True)
+
+
+def taxon_nodes(snapshot, taxa):
+    """Return the (taxon, node) rows mapping the taxa to metaweb nodes.
+
+    ``taxon`` is the position of the taxon in ``taxa``; ``node`` a taxon of
+    the snapshot at or below it.
+    """
+    taxa = pd.Series(list(taxa), dtype=object)
+    is_id = taxa.str.contains(":", regex=False)
+    iris = pd.DataFrame(
+        {"taxon": taxa.index[is_id], "ancestor": taxa[is_id].map(expand)}
+    )
+    names = snapshot.lookup("labels", "label", taxa[~is_id])
+    names = pd.DataFrame({"taxon": taxa.index[~is_id], "label": taxa[~is_id]}).merge(
+        names, on="label"
+    )
+    iris = pd.concat(
+        [iris, names[["taxon", "iri"]].rename(columns={"iri": "ancestor"})],
+        ignore_index=True,
+    )
+    lineage = snapshot.lookup("lineage", "ancestor", iris["ancestor"].unique())
+    nodes = iris.merge(lineage, on="ancestor")[["taxon", "matchId"]]
+    return nodes.rename(columns={"matchId": "node"}).drop_duplicates(ignore_index=True)
+
+
+def taxon_web(nodes, edges, n_taxa):
+    """Project the metaweb on the taxa: W = M A Mᵀ, as a boolean CSR matrix.
+
+    ``nodes`` holds (taxon, node) rows and ``edges`` (consumer, resource)
+    rows, with the same node IRIs.
+    """
+    from scipy import sparse
+
+    index = pd.Index(pd.unique(np.concatenate([edges["consumer"], edges["resource"]])))
+    adjacency = sparse.csr_matrix(
+        (
+            np.ones(len(edges), dtype=np.float32),
+            (
+                index.get_indexer(edges["consumer"]),
+                index.get_indexer(edges["resource"]),
+            ),
+        ),
+        shape=(len(index), len(index)),
+    )
+    positions = index.get_indexer(nodes["node"])
+    nodes = nodes[positions >= 0]
+    mapping = sparse.csr_matrix(
+        (
+            np.ones(len(nodes), dtype=np.float32),
+            (nodes["taxon"].to_numpy(), positions[positions >= 0]),
+        ),
+        shape=(n_taxa, len(index)),
+    )
+    web = (mapping @ adjacency @ mapping.T).tocsr()
+    web.data[:] = 1
+    web.eliminate_zeros()
+    return web.astype(bool)
+
+
+def init_worker(web):
+    global _web
+    _web = web
+
+
+def chunk_webs(occurrences, offset):
+    """Return the (site, consumer, resource) positions of the food webs of a
+    chunk of sites, using the taxon web of the worker."""
+    sites, consumers, resources = [], [], []
+    for i in range(occurrences.shape[0]):
+        present = occurrences.indices[occurrences.indptr[i] : occurrences.indptr[i + 1]]
+        links = _web[present][:, present].tocoo()
+        sites.append(np.full(links.nnz, offset + i, dtype=np.int64))
+        consumers.append(present[links.row])
+        resources.append(present[links.col])
+    if not sites:
+        return [np.array([], dtype=np.int64)] * 3
+    return [np.concatenate(a) for a in (sites, consumers, resources)]
+
+
+def site_webs(occurrences, web, workers=1, chunk_sites=CHUNK_SITES):
+    """Yield the (site, consumer, resource) positions of each chunk of sites."""
+    chunks = [
+        (occurrences[start : start + chunk_sites], start)
+        for start in range(0, occurrences.shape[0], chunk_sites)
+    ]
+    if workers <= 1:
+        init_worker(web)
+        for chunk in chunks:
+            yield chunk_webs(*chunk)
+        return
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(web,),
+    ) as executor:
+        yield from executor.map(chunk_webs, *zip(*chunks))
+
+
+def reconstruct(
+    occurrence_path,
+    snapshot_path,
+    outputdir,
+    workers=1,
+    output_format="parquet",
+    questions=QUESTIONS,
+    interactions=None,
+    chunk_sites=CHUNK_SITES,
+):
+    """Write the food web of every site of an occurrence matrix.
+
+    ``<outputdir>/foodwebs.<format>`` gets the (site, consumer, resource)
+    links and ``<outputdir>/sites.csv`` the number of taxa, links and the
+    connectance of each site. Returns stats of the run.
+    """
+    start = time.perf_counter()
+    snapshot = Snapshot(snapshot_path)
+    sites, taxa, occurrences = read_occurrences(occurrence_path)
+    nodes = taxon_nodes(snapshot, taxa)
+    edges = metaweb_edges(snapshot, questions, interactions)
+    web = taxon_web(nodes, edges, len(taxa))
+
+    outputdir = Path(outputdir)
+    outputdir.mkdir(parents=True, exist_ok=True)
+    links = np.zeros(len(sites), dtype=np.int64)
+    path = outputdir / output_name("foodwebs.csv", output_format)
+    columns = ["site", "consumer", "resource"]
+    with TableWriter(path, output_format, columns) as writer:
+        for site, consumer, resource in site_webs(
+            occurrences, web, workers, chunk_sites
+        ):
+            links += np.bincount(site, minlength=len(sites))
+            writer.write(
+                pd.DataFrame(
+                    {
+                        "site": pd.Categorical.from_codes(site, sites),
+                        "consumer": pd.Categorical.from_codes(consumer, taxa),
+                        "resource": pd.Categorical.from_codes(resource, taxa),
+                    }
+                )
+            )
+    richness = np.diff(occurrences.indptr)
+    summary = pd.DataFrame(
+        {
+            "taxa": richness,
+            "links": links,
+            "connectance": links / np.maximum(richness, 1) ** 2,
+        },
+        index=pd.Index(sites, name="site"),
+    )
+    summary.to_csv(outputdir / "sites.csv")
+    return {
+        "sites": len(sites),
+        "taxa": len(taxa),
+        "mapped": nodes["taxon"].nunique(),
+        "metaweb": len(edges),
+        "taxon_links": web.nnz,
+        "links": int(links.sum()),
+        "path": path,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reconstruct the food web of each site of an occurrence "
+        "matrix from the metaweb of a slime.query snapshot."
+    )
+    parser.add_argument("occurrences", help="sites × taxa matrix (wide or long)")
+    parser.add_argument("--snapshot", required=True)
+    parser.add_argument("--outputdir", required=True)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--questions", nargs="+", choices=QUESTIONS, default=QUESTIONS)
+    parser.add_argument("--interactions", nargs="+", help="e.g. RO:0002470")
+    parser.add_argument("--chunk-sites", type=int, default=CHUNK_SITES)
+    args = parser.parse_args()
+
+    stats = reconstruct(
+        args.occurrences,
+        args.snapshot,
+        args.outputdir,
+        workers=args.workers,
+        output_format=args.format,
+        questions=args.questions,
+        interactions=args.interactions,
+        chunk_sites=args.chunk_sites,
+    )
+    print(
+        f"{stats['sites']} sites, {stats['mapped']}/{stats['taxa']} taxa in the"
+        f" metaweb ({stats['metaweb']} edges, {stats['taxon_links']} between taxa):"
+        f" {stats['links']} links in {stats['seconds']:.1f}s -> {stats['path']}"
+    )
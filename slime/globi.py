@@ -0,0 +1,216 @@
+"""Extract every globi_* source from a single pass over a GloBI dump.
+
+Each globi_* source queries the GloBI ``interaction`` endpoint for one
+source taxon (``sourceTaxon=NCBI:...&interactionType=eats``). Instead of
+one request per source, :func:`split_dump` streams a GloBI interactions dump
+(``interactions.tsv.gz`` or a CSV export of the API) once, and appends each
+record to the output of every source whose taxon appears in the lineage of
+the record's source taxon. Records are matched on lineage identifiers and,
+since lineages may come from GBIF or OTT rather than NCBI, on the source's
+``subject`` name as well. Rows are written as they are read, so memory use
+does not depend on the size of the dump. Every source gets a table with the
+header of the API, even when no record of the dump matches it.
+
+To check the split against the API itself, record the tables of a few
+sources with ``python -m slime.api`` on the day the dump was downloaded and
+pass their directory to ``--compare``: :func:`compare_tables` reports, for
+each recorded source, the rows found only in the API table or only in the
+table from the dump.
+"""
+
+import argparse
+import csv
+import gzip
+import sys
+from collections import Counter
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from slime.cleanse import SOURCES_DIR, read_source_config
+
+# Columns of the API's CSV output, with the matching GloBI dump columns
+API_COLUMNS = {
+    "source_taxon_external_id": "sourceTaxonId",
+    "source_taxon_name": "sourceTaxonName",
+    "source_taxon_path": "sourceTaxonPathNames",
+    "source_specimen_life_stage": "sourceLifeStageName",
+    "source_specimen_basis_of_record": "sourceBasisOfRecordName",
+    "interaction_type": "interactionTypeName",
+    "target_taxon_external_id": "targetTaxonId",
+    "target_taxon_name": "targetTaxonName",
+    "target_taxon_path": "targetTaxonPathNames",
+    "target_specimen_life_stage": "targetLifeStageName",
+    "target_specimen_basis_of_record": "targetBasisOfRecordName",
+    "latitude": "decimalLatitude",
+    "longitude": "decimalLongitude",
+    "study_citation": "referenceCitation",
+    "study_external_id": "referenceUrl",
+    "study_source_citation": "sourceCitation",
+}
+LINEAGE_IDS = ("sourceTaxonPathIds", "source_taxon_path_ids")
+LINEAGE_NAMES = ("sourceTaxonPathNames", "source_taxon_path")
+INTERACTION_TYPE = ("interactionTypeName", "interaction_type")
+
+
+def globi_sources(sources_dir=SOURCES_DIR, conn_id="globi"):
+    """Return the GloBI query of every source extracted from ``conn_id``.
+
+    The result maps source ids to dicts with the queried taxon id, the
+    source's subject (used as taxon name) and the queried interaction types.
+    """
+    queries = {}
+    for path in sorted(Path(sources_dir).glob("*/source.cfg")):
+        config = read_source_config(path)
+        if config.get("extract.api", "conn_id", fallback=None) != conn_id:
+            continue
+        query = parse_qs(config.get("extract.api", "query").strip('"'))
+        queries[path.parent.name] = {
+            "taxon_id": query["sourceTaxon"][0],
+            "taxon_name": config.get("source.metadata", "subject", fallback=None),
+            "interaction_types": set(query.get("interactionType", [])),
+        }
+    return queries
+
+
+def open_dump(path):
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    f = opener(path, "rt", newline="", encoding="utf-8")
+    if ".tsv" in path.suffixes:
+        # GloBI dumps are unquoted, a stray quote must not swallow the line
+        return f, csv.DictReader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+    return f, csv.DictReader(f)
+
+
+def first_column(fieldnames, candidates):
+    return next((c for c in candidates if c in fieldnames), None)
+
+
+def split_lineage(value):
+    return {v.strip().lower() for v in (value or "").split("|") if v.strip()}
+
+
+def build_index(queries):
+    """Map lowercased lineage ids and names to the sources that select them."""
+    index = {}
+    for source_id, query in queries.items():
+        for key in (query["taxon_id"], query["taxon_name"]):
+            if key:
+                index.setdefault(key.lower(), set()).add(source_id)
+    return index
+
+
+def split_dump(dump_path, outputdir, queries, filename="interactions.csv"):
+    """Partition a GloBI dump into one CSV file per source in a single pass.
+
+    Returns a dict mapping source ids to their output path and row count.
+    """
+    index = build_index(queries)
+    outputdir = Path(outputdir)
+    f, reader = open_dump(dump_path)
+    with f:
+        fieldnames = reader.fieldnames
+        ids_col = first_column(fieldnames, LINEAGE_IDS)
+        names_col = first_column(fieldnames, LINEAGE_NAMES)
+        type_col = first_column(fieldnames, INTERACTION_TYPE)
+        if ids_col is None and names_col is None:
+            raise ValueError(f"{dump_path} has no source taxon lineage column")
+        # Dumps use GloBI's own column names, API exports already use ours
+        columns = {
+            api: (dump if dump in fieldnames else api)
+            for api, dump in API_COLUMNS.items()
+            if dump in fieldnames or api in fieldnames
+        }
+
+        files, writers, counts = {}, {}, {}
+        try:
+            for source_id in queries:
+                path = outputdir / source_id / filename
+                path.parent.mkdir(parents=True, exist_ok=True)
+                files[source_id] = open(path, "w", newline="")
+                writers[source_id] = csv.writer(files[source_id])
+                writers[source_id].writerow(columns)
+                counts[source_id] = 0
+            for row in reader:
+                lineage = split_lineage(row.get(ids_col)) | split_lineage(
+                    row.get(names_col)
+                )
+                matches = set()
+                for key in lineage & index.keys():
+                    matches |= index[key]
+                for source_id in matches:
+                    types = queries[source_id]["interaction_types"]
+                    if types and row.get(type_col) not in types:
+                        continue
+                    writers[source_id].writerow(
+                        [row.get(col, "") for col in columns.values()]
+                    )
+                    counts[source_id] += 1
+        finally:
+            for out in files.values():
+                out.close()
+    return {
+        source_id: (outputdir / source_id / filename, counts[source_id])
+        for source_id in counts
+    }
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames or [], list(reader)
+
+
+def compare_tables(api_path, dump_path):
+    """Compare the table of a source from the API with the one from the dump.
+
+    Rows are compared as multisets on the columns both tables have. Returns
+    a dict with the row counts and the rows found only in either table.
+    """
+    api_columns, api_rows = read_rows(api_path)
+    dump_columns, dump_rows = read_rows(dump_path)
+    columns = [c for c in api_columns if c in dump_columns]
+    api = Counter(tuple(row[c] for c in columns) for row in api_rows)
+    dump = Counter(tuple(row[c] for c in columns) for row in dump_rows)
+    return {
+        "columns": columns,
+        "api_rows": len(api_rows),
+        "dump_rows": len(dump_rows),
+        "only_api": list((api - dump).elements()),
+        "only_dump": list((dump - api).elements()),
+    }
+
+
+def recorded_tables(recorded_dir):
+    """Map source ids to the CSV tables recorded by slime.api in ``recorded_dir``."""
+    return {
+        path.parent.name: path for path in sorted(Path(recorded_dir).glob("*/*.csv"))
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract all GloBI sources from one interactions dump."
+    )
+    parser.add_argument("dump", help="interactions.tsv(.gz) or a CSV API export")
+    parser.add_argument("--outputdir", required=True)
+    parser.add_argument("--sources-dir", default=SOURCES_DIR)
+    parser.add_argument(
+        "--compare", help="tables recorded from the API with python -m slime.api"
+    )
+    args = parser.parse_args()
+
+    queries = globi_sources(args.sources_dir)
+    outputs = split_dump(args.dump, args.outputdir, queries)
+    for source_id, (path, count) in outputs.items():
+        print(f"{source_id}\t{count}\t{path}", file=sys.stdout)
+    if args.compare:
+        print("source\tapi rows\tdump rows\tonly api\tonly dump")
+        for source_id, api_path in recorded_tables(args.compare).items():
+            if source_id not in outputs:
+                continue
+            diff = compare_tables(api_path, outputs[source_id][0])
+            print(
+                f"{source_id}\t{diff['api_rows']}\t{diff['dump_rows']}"
+                f"\t{len(diff['only_api'])}\t{len(diff['only_dump'])}"
+            )
@@ -0,0 +1,271 @@
+"""Prebuilt label and synonym index of the ontologies of graph.cfg.
+
+The ``SFWO`` annotator of every source matches labels (``functionalGroup``,
+``trophic.group``, ``Diet``, ``interaction_type``...) against the sfwo.owl
+release of ``[ontologies]`` in graph.cfg. :func:`build_label_index` parses
+that release and the ontologies it ``owl:imports`` once, and writes the
+labels and synonyms of their terms to an Arrow IPC file under
+``<cache>/labels``, keyed by the ontology URL (the URL pins the release;
+local files are keyed by their content). Keys are normalized like the
+mapping files of :mod:`slime.terms` and sorted, so that the memory-mapped
+key column answers both exact lookups and prefix searches without loading
+the index in memory.
+
+When a key is the label of a term and the synonym of another, the label
+wins, then exact synonyms, then narrow, broad and related ones; deprecated
+terms come last. :func:`match_labels` looks a whole column up at once, one
+distinct label at a time.
+"""
+
+import argparse
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from slime.cache import CACHE_ROOT, file_digest
+from slime.ontology import local_copy, ontology_location, parse_ontology
+from slime.terms import normalize_terms
+
+INDEX_DIR = CACHE_ROOT / "labels"
+OBO_IN_OWL = "http://www.geneontology.org/formats/oboInOwl#"
+SKOS = "http://www.w3.org/2004/02/skos/core#"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+OWL_IMPORTS = "http://www.w3.org/2002/07/owl#imports"
+OWL_DEPRECATED = "http://www.w3.org/2002/07/owl#deprecated"
+# Annotation properties, with the kind of label they give and its rank
+LABEL_PROPERTIES = {
+    RDFS_LABEL: ("label", 0),
+    SKOS + "prefLabel": ("label", 0),
+    OBO_IN_OWL + "hasExactSynonym": ("exact", 1),
+    SKOS + "altLabel": ("exact", 1),
+    "http://purl.obolibrary.org/obo/IAO_0000118": ("exact", 1),
+    OBO_IN_OWL + "hasNarrowSynonym": ("narrow", 2),
+    OBO_IN_OWL + "hasBroadSynonym": ("broad", 3),
+    OBO_IN_OWL + "hasRelatedSynonym": ("related", 4),
+}
+DEPRECATED_RANK = 10
+
+
+def index_path(location, index_dir=INDEX_DIR, name="sfwo"):
+    """Return the index file of an ontology URL or local file."""
+    key = str(location)
+    if "://" not in key or key.startswith("file://"):
+        # Local files change in place, release URLs do not
+        with local_copy(key) as path:
+            key = file_digest(path)
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return Path(index_dir) / f"{name}-{digest}.arrow"
+
+
+def parse_with_imports(location):
+    """Parse an ontology and, transitively, the ontologies it imports."""
+    import rdflib
+
+    graph, seen, pending = rdflib.Graph(), set(), [str(location)]
+    while pending:
+        location = pending.pop()
+        if location in seen:
+            continue
+        seen.add(location)
+        with local_copy(location) as path:
+            graph += parse_ontology(path)
+        pending.extend(str(o) for o in graph.objects(None, rdflib.URIRef(OWL_IMPORTS)))
+    return graph, sorted(seen)
+
+
+def label_entries(graph):
+    """Return one row per (normalized key, label, IRI, kind, rank) of a graph."""
+    import rdflib
+
+    deprecated = {
+        s
+        for s, o in graph.subject_objects(rdflib.URIRef(OWL_DEPRECATED))
+        if str(o).lower() == "true"
+    }
+    rows = []
+    for predicate, (kind, rank) in LABEL_PROPERTIES.items():
+        for s, o in graph.subject_objects(rdflib.URIRef(predicate)):
+            if isinstance(s, rdflib.URIRef) and isinstance(o, rdflib.Literal):
+                rank_s = rank + DEPRECATED_RANK if s in deprecated else rank
+                rows.append((str(o), str(s), kind, rank_s))
+    df = pd.DataFrame(rows, columns=["label", "iri", "kind", "rank"])
+    df["key"] = normalize_terms(df["label"]).values
+    df = df[df["key"] != ""]
+    # Sorted keys make prefixes contiguous; the best entry of a key comes first
+    return (
+        df.drop_duplicates(["key", "iri", "kind"])
+        .sort_values(["key", "rank", "iri"], kind="stable")
+        .reset_index(drop=True)[["key", "label", "iri", "kind", "rank"]]
+    )
+
+
+def write_label_index(path, entries, location, imports):
+    import pyarrow as pa
+
+    table = pa.table(
+        {
+            "key": pa.array(entries["key"].tolist(), pa.string()),
+            "label": pa.array(entries["label"].tolist(), pa.string()),
+            "iri": pa.array(entries["iri"].tolist()).dictionary_encode(),
+            "kind": pa.array(entries["kind"].tolist()).dictionary_encode(),
+            "rank": pa.array(entries["rank"].to_numpy(), pa.int8()),
+        }
+    ).replace_schema_metadata(
+        {"location": str(location), "imports": "\n".join(imports)}
+    )
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    tmp.replace(path)
+
+
+def build_label_index(location=None, index_dir=INDEX_DIR, name="sfwo", path=None):
+    """Index the labels of an ontology of graph.cfg (or any OWL file or URL)."""
+    location = location or ontology_location(name=name)
+    graph, imports = parse_with_imports(location)
+    path = path or index_path(location, index_dir, name)
+    write_label_index(path, label_entries(graph), location, imports)
+    return path
+
+
+class LabelIndex:
+    """Normalized label → IRI lookups over a memory-mapped index file."""
+
+    def __init__(self, path):
+        import pyarrow as pa
+
+        self.path = Path(path)
+        with pa.memory_map(str(path)) as source:
+            self.table = pa.ipc.open_file(source).read_all()
+        self.keys = self.table.column("key").combine_chunks()
+        metadata = self.table.schema.metadata or {}
+        self.location = metadata.get(b"location", b"").decode()
+        # Hash the distinct keys once, here rather than on each lookup; the
+        # first row of a key is its best entry, since keys are sorted
+        keys = self.keys.to_numpy(zero_copy_only=False)
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        self.first_rows = np.flatnonzero(first)
+        self.distinct_keys = pd.Index(keys[first])
+        self.distinct_keys.get_indexer(self.distinct_keys[:1])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def positions(self, keys):
+        """Row of the best entry of each normalized key, -1 when missing."""
+        found = self.distinct_keys.get_indexer(pd.Index(list(keys), dtype=object))
+        return np.where(found >= 0, self.first_rows[found], -1)
+
+    def lookup(self, keys, columns=("iri",)):
+        """Return the given columns of the best entry of each normalized key."""
+        found = self.positions(keys)
+        hit = found >= 0
+        rows = self.table.take(found[hit]).select(list(columns))
+        result = pd.DataFrame(
+            {c: np.full(len(found), None, dtype=object) for c in columns}
+        )
+        for column in columns:
+            result.loc[hit, column] = np.asarray(
+                rows.column(column).to_pylist(), dtype=object
+            )
+        return result
+
+    def prefix(self, text, limit=10):
+        """Return the entries whose key starts with ``text``, best ranks first.
+
+        Shorter keys (closer to ``text``) come first within a rank.
+        """
+        import pyarrow.compute as pc
+
+        start, stop = self.prefix_range(normalize_terms([text]).iloc[0])
+        rows = self.table.slice(start, stop - start)
+        lengths = pc.utf8_length(rows.column("key")).to_numpy()
+        ranks = rows.column("rank").to_numpy()
+        # Keys are sorted, so a stable sort keeps equal keys in key order
+        order = np.lexsort((lengths, ranks))[:limit]
+        # Not to_pandas(), which would turn the whole IRI dictionary into categories
+        return pd.DataFrame(rows.take(order).to_pylist(), columns=rows.column_names)
+
+    def prefix_range(self, prefix):
+        """Return the rows whose key starts with ``prefix``, as a range."""
+        return self.bisect(prefix), self.bisect(prefix + "\U0010ffff")
+
+    def bisect(self, key):
+        # Compare Python strings, in the order the keys were sorted in
+        lo, hi = 0, len(self.keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.keys[mid].as_py() < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+@lru_cache(maxsize=None)
+def load_label_index(location=None, index_dir=INDEX_DIR, name="sfwo"):
+    """Return the index of an ontology, building it the first time."""
+    location = location or ontology_location(name=name)
+    path = index_path(location, index_dir, name)
+    if not path.exists():
+        build_label_index(location, index_dir, name, path)
+    return LabelIndex(path)
+
+
+def match_labels(values, index=None, columns=("iri",)):
+    """Match a column of labels against the index; unmatched labels give None.
+
+    Returns a Series of IRIs, or a DataFrame with several ``columns``
+    (``iri``, ``label``, ``kind``, ``rank``).
+    """
+    if index is None:
+        index = load_label_index()
+    values = pd.Series(values)
+    notna = values.notna().to_numpy()
+    # Look each distinct label up once
+    codes, uniques = pd.factorize(values[notna])
+    found = index.lookup(normalize_terms(uniques), columns)
+    result = pd.DataFrame(
+        {c: np.full(len(values), None, dtype=object) for c in columns},
+        index=values.index,
+    )
+    for column in columns:
+        result.loc[notna, column] = found[column].to_numpy()[codes]
+    if list(columns) == ["iri"]:
+        return result["iri"].rename(values.name)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the label index of an ontology of graph.cfg and "
+        "match labels against it."
+    )
+    parser.add_argument("labels", nargs="*", help="labels to match")
+    parser.add_argument("--prefix", action="append", default=[])
+    parser.add_argument("--name", default="sfwo", help="ontology of graph.cfg")
+    parser.add_argument("--ontology", help="OWL file or URL instead")
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    args = parser.parse_args()
+
+    location = args.ontology or ontology_location(name=args.name)
+    if args.rebuild:
+        build_label_index(location, args.index_dir, args.name)
+    index = load_label_index(location, args.index_dir, args.name)
+    print(f"{len(index)} labels\t{index.path}")
+    if args.labels:
+        matches = match_labels(
+            args.labels, index, columns=("iri", "label", "kind")
+        ).assign(query=args.labels)
+        print(matches[["query", "iri", "label", "kind"]].to_csv(sep="\t", index=False))
+    for text in args.prefix:
+        rows = index.prefix(text).assign(prefix=text)
+        print(rows[["prefix", "label", "iri", "kind"]].to_csv(sep="\t", index=False))
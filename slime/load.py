@@ -0,0 +1,410 @@
+"""Load the N-Quads of several sources into the triplestore in parallel batches.
+
+Each source file written by :mod:`slime.materialize` is split into gzipped
+N-Triples batches of at most ``batch_bytes`` uncompressed bytes. The batches
+are appended with the SPARQL Graph Store protocol to a staging graph next to
+the source's named graph, several at a time over a pool of keep-alive
+connections, and a single ``MOVE`` update then swaps the staging graph in
+place of the named graph, so queries never see a half-loaded source.
+
+Failed requests are retried with exponential backoff. Batches that were
+acknowledged are recorded in a checkpoint under ``<cache>/loads``; running
+the loader again on the same file resumes from the missing batches and
+reuses the staging graph of the interrupted run.
+
+The store scopes blank node labels to one request, so a blank node whose
+statements land in two batches would become two nodes. Blank nodes are
+therefore skolemized: ``_:label`` becomes
+``<graph/.well-known/genid/label>``, so the same label gets the same IRI in
+every batch of a file. A label ends at the first whitespace. The plans of
+:mod:`slime.triplify` build labels from the mapping templates with encoded
+row values, which holds for them and keeps the IRIs of a row the same from
+one build to the next; labels written by morph-kgc hold template values as
+they are and may be cut short. The store is the ``[load]`` repository of
+``graph.cfg``, or any URL with ``--url`` (e.g. the stand-in of
+:mod:`slime.testing`).
+"""
+
+import argparse
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+from slime import metrics
+from slime.cache import CACHE_ROOT, file_digest
+from slime.cleanse import GRAPH_CFG, parse_job
+from slime.rebuild import graph_iri, store_headers, store_url
+
+LOAD_DIR = CACHE_ROOT / "loads"
+BATCH_BYTES = 32 * 2**20
+RETRIES = 5
+BACKOFF = 0.5
+TIMEOUT = 300
+
+_BLANK_NODE = re.compile(r"_:[^\s]*[^\s.]")
+
+
+class LoadError(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections to one store, shared by the upload threads."""
+
+    def __init__(self, url, size=4, headers=None, timeout=TIMEOUT):
+        parts = urlsplit(url)
+        self.path = parts.path.rstrip("/")
+        self.headers = headers or {}
+        factory = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.connect = lambda: factory(parts.hostname, parts.port, timeout=timeout)
+        self.idle = queue.LifoQueue()
+        self.size = size
+
+    def request(self, method, path, body=None, headers=None):
+        """Send one request and return (status, body), reusing a connection."""
+        try:
+            connection = self.idle.get_nowait()
+        except queue.Empty:
+            connection = self.connect()
+        try:
+            connection.request(
+                method, self.path + path, body, {**self.headers, **(headers or {})}
+            )
+            response = connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            raise
+        if response.will_close or self.idle.qsize() >= self.size:
+            connection.close()
+        else:
+            self.idle.put(connection)
+        return response.status, content
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+
+
+def send(pool, method, path, body=None, headers=None, retries=RETRIES):
+    """Send a request, retrying connection errors and 5xx/429 answers."""
+    for attempt in range(retries + 1):
+        try:
+            status, content = pool.request(method, path, body, headers)
+        except (OSError, http.client.HTTPException) as e:
+            status, content = None, str(e).encode()
+        if status is not None and status < 300:
+            return status
+        if status is not None and status < 500 and status != 429:
+            break
+        if attempt < retries:
+            time.sleep(BACKOFF * 2**attempt)
+    raise LoadError(
+        f"{method} {path} failed ({status}): {content[:200].decode(errors='replace')}"
+    )
+
+
+def graph_path(graph):
+    return f"/rdf-graphs/service?graph={quote(graph, safe='')}"
+
+
+def update(pool, query, retries=RETRIES):
+    """Run a SPARQL update on the repository."""
+    headers = {"Content-Type": "application/sparql-update; charset=utf-8"}
+    return send(pool, "POST", "/statements", query.encode(), headers, retries)
+
+
+def split_quad(line):
+    """Split an N-Quads statement into its N-Triples statement and graph IRI."""
+    body = line.rstrip()[:-1].rstrip()
+    if not body.endswith(">"):
+        return body + " .\n", None
+    # IRIs cannot contain spaces, so the last " <" starts the graph term
+    start = body.rfind(" <")
+    return body[:start] + " .\n", body[start + 2 : -1]
+
+
+def rename_blank_nodes(statement, rename):
+    """Apply ``rename`` to the blank node subject and object of a statement."""
+    if "_:" not in statement:
+        return statement
+    subject, predicate, rest = statement.split(" ", 2)
+    if subject.startswith("_:"):
+        subject = rename(subject)
+    match = _BLANK_NODE.match(rest)
+    if match:
+        rest = rename(match.group()) + rest[match.end() :]
+    return f"{subject} {predicate} {rest}"
+
+
+def skolem_base(graph):
+    return f"{graph}/.well-known/genid/"
+
+
+def skolemize(statement, base):
+    """Replace the blank nodes of an N-Triples statement with IRIs under base."""
+    return rename_blank_nodes(
+        statement, lambda label: f"<{base}{quote(label[2:], safe='')}>"
+    )
+
+
+def split_batches(rdf_path, batch_dir, graph, batch_bytes=BATCH_BYTES):
+    """Split an N-Quads/N-Triples file into gzipped N-Triples batches.
+
+    The split only depends on the file and ``batch_bytes``, so an interrupted
+    load finds the same batches again. Quads must be in ``graph``, and blank
+    nodes are skolemized under it. Returns the batches and their number of
+    triples.
+    """
+    base = skolem_base(graph)
+    batch_dir = Path(batch_dir)
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    opener = gzip.open if Path(rdf_path).suffix == ".gz" else open
+    quads = ".nq" in Path(rdf_path).suffixes
+    batches, out, size = [], None, 0
+    with opener(rdf_path, "rt", encoding="utf-8") as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            if quads:
+                line, quad_graph = split_quad(line)
+                if quad_graph != graph:
+                    raise LoadError(f"{rdf_path} has triples in {quad_graph}")
+            line = skolemize(line, base)
+            if out is None or size + len(line) > batch_bytes:
+                if out is not None:
+                    out.close()
+                path = batch_dir / f"{len(batches):06d}.nt.gz"
+                out = gzip.open(path, "wt", encoding="utf-8", compresslevel=1)
+                batches.append([path, 0])
+                size = 0
+            out.write(line)
+            batches[-1][1] += 1
+            size += len(line)
+    if out is not None:
+        out.close()
+    return [(path, n) for path, n in batches]
+
+
+def checkpoint_dir(url, load_dir=LOAD_DIR):
+    return Path(load_dir) / hashlib.sha256(url.encode()).hexdigest()[:16]
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, checkpoint):
+    fd, tmp = tempfile.mkstemp(dir=Path(path).parent, suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def prepare_source(pool, source_id, rdf_path, graph, work_dir, batch_bytes):
+    """Split a source into batches, or resume the checkpoint of a previous run."""
+    digest = file_digest(rdf_path)
+    path = work_dir / f"{source_id}.json"
+    checkpoint = read_checkpoint(path)
+    if (
+        checkpoint is not None
+        and checkpoint["sha256"] == digest
+        and checkpoint["batch_bytes"] == batch_bytes
+        and checkpoint["graph"] == graph
+        and checkpoint.get("genid") == skolem_base(graph)
+        and all(
+            (work_dir / source_id / name).exists() for name, _ in checkpoint["batches"]
+        )
+    ):
+        return path, checkpoint
+    shutil.rmtree(work_dir / source_id, ignore_errors=True)
+    batches = split_batches(rdf_path, work_dir / source_id, graph, batch_bytes)
+    checkpoint = {
+        "sha256": digest,
+        "batch_bytes": batch_bytes,
+        "graph": graph,
+        "genid": skolem_base(graph),
+        "staging": f"{graph}/staging/{digest[:16]}",
+        "batches": [(batch.name, n) for batch, n in batches],
+        "done": [],
+    }
+    # A staging graph left by an older version of the file must not leak in
+    update(pool, f"DROP SILENT GRAPH <{checkpoint['staging']}>")
+    write_checkpoint(path, checkpoint)
+    return path, checkpoint
+
+
+def upload_batch(pool, staging, batch_path, retries=RETRIES):
+    headers = {
+        "Content-Type": "application/n-triples",
+        "Content-Encoding": "gzip",
+    }
+    body = Path(batch_path).read_bytes()
+    send(pool, "POST", graph_path(staging), body, headers, retries)
+    return len(body)
+
+
+def swap_graph(pool, staging, graph, empty=False):
+    """Replace ``graph`` with ``staging`` in one update."""
+    if empty:
+        return update(pool, f"DROP SILENT GRAPH <{graph}>")
+    return update(pool, f"MOVE GRAPH <{staging}> TO GRAPH <{graph}>")
+
+
+def load_all(
+    jobs,
+    url=None,
+    workers=4,
+    batch_bytes=BATCH_BYTES,
+    headers=None,
+    graph_cfg=GRAPH_CFG,
+    load_dir=LOAD_DIR,
+    retries=RETRIES,
+):
+    """Load several sources, replacing the named graph of each one.
+
+    ``jobs`` maps source ids to their N-Quads/N-Triples files (gzipped or
+    not). Batches of all sources are uploaded by ``workers`` threads; a
+    source's named graph is swapped as soon as all its batches are in.
+    Returns the stats of each source.
+    """
+    url = url or store_url(graph_cfg)
+    headers = store_headers(graph_cfg) if headers is None else headers
+    work_dir = checkpoint_dir(url, load_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    pool = ConnectionPool(url, size=workers, headers=headers)
+    lock = threading.Lock()
+    sources, stats = {}, {}
+    try:
+        for source_id, rdf_path in jobs.items():
+            graph = graph_iri(source_id, graph_cfg)
+            path, checkpoint = prepare_source(
+                pool, source_id, rdf_path, graph, work_dir, batch_bytes
+            )
+            sources[source_id] = path, checkpoint
+            stats[source_id] = {
+                "triples": sum(n for _, n in checkpoint["batches"]),
+                "batches": len(checkpoint["batches"]),
+                "resumed": len(checkpoint["done"]),
+                "bytes": 0,
+                "start": time.perf_counter(),
+            }
+
+        def finish(source_id):
+            path, checkpoint = sources[source_id]
+            swap_graph(
+                pool,
+                checkpoint["staging"],
+                checkpoint["graph"],
+                empty=not checkpoint["batches"],
+            )
+            os.unlink(path)
+            shutil.rmtree(work_dir / source_id, ignore_errors=True)
+            s = stats[source_id]
+            s["seconds"] = time.perf_counter() - s.pop("start")
+            # Sources share the upload threads, so only their wall time is known
+            metrics.emit(
+                metrics.stage_record(
+                    source_id,
+                    "load",
+                    s["seconds"],
+                    rows_in=s["triples"],
+                    batches=s["batches"],
+                    resumed=s["resumed"],
+                    bytes=s["bytes"],
+                )
+            )
+
+        def upload(source_id, index):
+            path, checkpoint = sources[source_id]
+            name = checkpoint["batches"][index][0]
+            size = upload_batch(
+                pool, checkpoint["staging"], work_dir / source_id / name, retries
+            )
+            with lock:
+                checkpoint["done"].append(index)
+                write_checkpoint(path, checkpoint)
+                stats[source_id]["bytes"] += size
+                complete = len(checkpoint["done"]) == len(checkpoint["batches"])
+            if complete:
+                finish(source_id)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for source_id, (_, checkpoint) in sources.items():
+                pending = set(range(len(checkpoint["batches"])))
+                pending -= set(checkpoint["done"])
+                if not pending:
+                    futures.append(executor.submit(finish, source_id))
+                futures.extend(
+                    executor.submit(upload, source_id, i) for i in sorted(pending)
+                )
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # Stop early, the checkpoint keeps the batches already sent
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        pool.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replace the named graphs of several sources with "
+        "their N-Quads files, uploaded in parallel batches."
+    )
+    parser.add_argument(
+        "jobs", nargs="+", type=parse_job, help="<source_id>=<.nq.gz/.nt.gz file>"
+    )
+    parser.add_argument("--url", help="repository URL (default: [load] of graph.cfg)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--batch-mb", type=float, default=BATCH_BYTES / 2**20, help="uncompressed"
+    )
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    parser.add_argument("--graph-cfg", default=GRAPH_CFG)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+
+    start = time.perf_counter()
+    stats = load_all(
+        dict(args.jobs),
+        url=args.url,
+        workers=args.workers,
+        batch_bytes=int(args.batch_mb * 2**20),
+        graph_cfg=args.graph_cfg,
+        retries=args.retries,
+    )
+    elapsed = time.perf_counter() - start
+    for source_id, s in stats.items():
+        resumed = f"\t{s['resumed']} resumed" if s["resumed"] else ""
+        print(
+            f"{source_id}\t{s['triples']} triples\t{s['batches']} batches{resumed}"
+            f"\t{s['seconds']:.1f}s\t{s['triples'] / s['seconds']:.0f} triples/s"
+        )
+    total = sum(s["triples"] for s in stats.values())
+    print(f"total\t{total} triples\t{elapsed:.1f}s\t{total / elapsed:.0f} triples/s")
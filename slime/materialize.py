@@ -0,0 +1,297 @@
+"""Materialize the RDF of several sources in parallel, streaming to gzip files.
+
+inteGraph materializes one source at a time with the global settings of
+``config-morph.ini`` and serializes the whole graph at the end. Here each
+source runs in a worker of a process pool: its annotated table
+(``integraph_data.tsv``) is read ``chunksize`` rows at a time, each chunk is
+materialized by morph-kgc and the triples are appended to a gzipped
+N-Quads (or N-Triples) file in the source's named graph, so memory use is
+bounded by the chunk size rather than by the size of the source.
+
+Splitting the rows does not change the output because every triplify
+mapping in this repository reads a single table and only joins a table with
+itself on the same columns, which morph-kgc resolves row by row. Triples
+repeated in several chunks are written once per chunk; the triplestore keeps
+one copy.
+
+Workbooks that :mod:`slime.triplify` can compile are applied directly to
+each chunk. The others go through morph-kgc with the RML translation of the
+workbook (``<mapping>.rml.ttl`` next to it, or converted with ``mapeathor``
+when it is installed). morph-kgc and mapeathor are optional dependencies.
+"""
+
+import argparse
+import configparser
+import gzip
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from slime import metrics
+from slime.cleanse import (
+    GRAPH_CFG,
+    ROOT_DIR,
+    SOURCES_DIR,
+    parse_job,
+    read_source_config,
+)
+from slime.metrics import RssSampler
+from slime.rebuild import graph_iri
+from slime.triplify import load_plan, triples
+
+MORPH_CFG = ROOT_DIR / "config-morph.ini"
+DATA_FILENAME = "integraph_data.tsv"
+SUFFIXES = {"nquads": ".nq.gz", "ntriples": ".nt.gz"}
+
+
+def default_chunksize(morph_cfg=MORPH_CFG):
+    config = configparser.ConfigParser()
+    config.read(morph_cfg)
+    return config.getint("CONFIGURATION", "chunksize", fallback=100000)
+
+
+def na_values(morph_cfg=MORPH_CFG):
+    config = configparser.ConfigParser()
+    config.read(morph_cfg)
+    return config.get("CONFIGURATION", "na_values", fallback=",nan").split(",")
+
+
+def workbook_path(source_id, sources_dir=SOURCES_DIR):
+    source_dir = Path(sources_dir) / source_id
+    config = read_source_config(source_dir / "source.cfg")
+    return source_dir / config.get("transform.triplify", "mapping")
+
+
+def rml_mapping(source_id, sources_dir=SOURCES_DIR, workdir=None):
+    """Return the RML mapping of a source, converting its workbook if needed."""
+    workbook = workbook_path(source_id, sources_dir)
+    converted = workbook.with_suffix(".rml.ttl")
+    if converted.exists():
+        return converted
+    # mapeathor appends .rml.ttl to the output name
+    output = Path(workdir or tempfile.mkdtemp()) / source_id
+    subprocess.run(
+        [sys.executable, "-m", "mapeathor"]
+        + ["-i", workbook, "-l", "rml", "-o", output],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    output = output.with_name(f"{source_id}.rml.ttl")
+    # morph-kgc reads the RML core namespace as http://w3id.org/rml/
+    rml = output.read_text().replace("https://w3id.org/rml/", "http://w3id.org/rml/")
+    output.write_text(rml)
+    return output
+
+
+def morph_config(mapping_path, morph_cfg=MORPH_CFG):
+    """Build the morph-kgc configuration used for every chunk of a source."""
+    config = configparser.ConfigParser()
+    config.read(morph_cfg)
+    if not config.has_section("CONFIGURATION"):
+        config.add_section("CONFIGURATION")
+    # Parallelism comes from the pool, a worker must not fork its own
+    config.set("CONFIGURATION", "number_of_processes", "1")
+    if not config.has_option("CONFIGURATION", "logging_level"):
+        config.set("CONFIGURATION", "logging_level", "WARNING")
+    config["DataSource"] = {"mappings": str(Path(mapping_path).resolve())}
+    lines = []
+    for section in config.sections():
+        lines.append(f"[{section}]")
+        lines.extend(f"{k} = {v}" for k, v in config.items(section, raw=True))
+    return "\n".join(lines)
+
+
+def to_statement(triple, graph):
+    if triple.endswith(" ."):
+        triple = triple[:-2]
+    return f"{triple} {graph} .\n" if graph else f"{triple} .\n"
+
+
+def write_statements(data_path, output_path, chunksize, graph, chunk_triples):
+    """Stream the triples of each chunk of a table to a gzipped N-Quads file.
+
+    ``chunk_triples`` returns the N-Triples statements of a DataFrame chunk.
+    ``graph`` is the named graph IRI written with each triple (N-Triples
+    when None). Returns a dict with the number of rows and triples, the
+    elapsed time and the peak RSS of the worker while writing them.
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    graph = f"<{graph}>" if graph else None
+    n_rows = n_triples = 0
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    reader = pd.read_csv(
+        data_path, sep="\t", dtype=str, keep_default_na=False, chunksize=chunksize
+    )
+    with RssSampler() as sampler, gzip.open(output_path, "wt", compresslevel=6) as out:
+        for chunk in reader:
+            triples = chunk_triples(chunk)
+            out.writelines(to_statement(t, graph) for t in triples)
+            n_rows += len(chunk)
+            n_triples += len(triples)
+    return {
+        "rows": n_rows,
+        "triples": n_triples,
+        "seconds": time.perf_counter() - start,
+        "peak_rss": sampler.peak,
+        "path": output_path,
+    }
+
+
+def materialize_source(
+    source_id,
+    data_path,
+    output_path,
+    mapping_path,
+    chunksize,
+    graph=None,
+    morph_cfg=MORPH_CFG,
+):
+    """Materialize one source with morph-kgc, chunk by chunk."""
+    import morph_kgc
+
+    config = morph_config(mapping_path, morph_cfg)
+    with tempfile.TemporaryDirectory() as tmpdir:
+
+        def chunk_triples(chunk):
+            # The mappings read ./integraph_data.tsv
+            chunk.to_csv(Path(tmpdir) / DATA_FILENAME, sep="\t", index=False)
+            cwd = os.getcwd()
+            os.chdir(tmpdir)
+            try:
+                return morph_kgc.materialize_set(config)
+            finally:
+                os.chdir(cwd)
+
+        stats = write_statements(
+            data_path, output_path, chunksize, graph, chunk_triples
+        )
+    return {**stats, "engine": "morph-kgc"}
+
+
+def triplify_source(
+    source_id,
+    data_path,
+    output_path,
+    plan,
+    chunksize,
+    graph=None,
+    morph_cfg=MORPH_CFG,
+):
+    """Materialize one source with the compiled plan of its workbook."""
+    na = na_values(morph_cfg)
+    stats = write_statements(
+        data_path, output_path, chunksize, graph, lambda df: triples(df, plan, na)
+    )
+    return {**stats, "engine": "plan"}
+
+
+def run_task(func, args):
+    """Run one materialization task inside its ``triplify`` metrics stage."""
+    with metrics.stage(args[0], "triplify") as record:
+        stats = func(*args)
+        record.update(
+            rows_in=stats["rows"], rows_out=stats["triples"], engine=stats["engine"]
+        )
+    return stats
+
+
+def materialize_all(
+    jobs,
+    outputdir,
+    workers=1,
+    chunksize=None,
+    output_format="nquads",
+    mappings=None,
+    engine="auto",
+    sources_dir=SOURCES_DIR,
+    graph_cfg=GRAPH_CFG,
+):
+    """Materialize several sources in a process pool.
+
+    ``jobs`` maps source ids to their annotated tables and ``mappings``
+    optionally maps them to RML files. With ``engine="auto"``, sources whose
+    workbook compiles to a plan (see :mod:`slime.triplify`) skip morph-kgc.
+    Each source is written to ``<outputdir>/<source_id>.nq.gz``. Returns the
+    stats of each source.
+    """
+    chunksize = chunksize or default_chunksize()
+    mappings = dict(mappings or {})
+    workdir = tempfile.mkdtemp()
+    tasks = []
+    for source_id, data_path in jobs.items():
+        graph = graph_iri(source_id, graph_cfg) if output_format == "nquads" else None
+        output_path = Path(outputdir) / f"{source_id}{SUFFIXES[output_format]}"
+        args = (source_id, data_path, output_path)
+        plan = None
+        if engine == "auto" and source_id not in mappings:
+            plan = load_plan(workbook_path(source_id, sources_dir))
+        if plan and "rules" in plan:
+            tasks.append((triplify_source, args + (plan, chunksize, graph)))
+            continue
+        mapping = mappings.get(source_id) or rml_mapping(
+            source_id, sources_dir, workdir
+        )
+        tasks.append((materialize_source, args + (mapping, chunksize, graph)))
+    if workers <= 1:
+        return {args[0]: run_task(func, args) for func, args in tasks}
+
+    import pandas  # noqa: F401
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {
+            args[0]: executor.submit(run_task, func, args) for func, args in tasks
+        }
+        return {source_id: f.result() for source_id, f in futures.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Materialize several sources in parallel to gzipped N-Quads."
+    )
+    parser.add_argument(
+        "jobs", nargs="+", type=parse_job, help="<source_id>=<integraph_data.tsv>"
+    )
+    parser.add_argument("--outputdir", required=True)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunksize", type=int)
+    parser.add_argument("--format", choices=SUFFIXES, default="nquads")
+    parser.add_argument(
+        "--engine",
+        choices=("auto", "morph-kgc"),
+        default="auto",
+        help="auto uses compiled workbook plans when possible",
+    )
+    parser.add_argument("--sources-dir", default=SOURCES_DIR)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+
+    start = time.perf_counter()
+    stats = materialize_all(
+        dict(args.jobs),
+        args.outputdir,
+        workers=args.workers,
+        chunksize=args.chunksize,
+        output_format=args.format,
+        engine=args.engine,
+        sources_dir=args.sources_dir,
+    )
+    elapsed = time.perf_counter() - start
+    for source_id, s in stats.items():
+        print(
+            f"{source_id}\t{s['triples']} triples\t{s['seconds']:.1f}s"
+            f"\t{s['triples'] / s['seconds']:.0f} triples/s"
+            f"\tpeak RSS {s['peak_rss'] or 0:.0f} MiB\t{s['engine']}\t{s['path']}"
+        )
+    total = sum(s["triples"] for s in stats.values())
+    print(f"total\t{total} triples\t{elapsed:.1f}s\t{total / elapsed:.0f} triples/s")
@@ -0,0 +1,313 @@
+"""Per-stage metrics of pipeline runs, as JSON lines.
+
+The stages of a source (``extract``, ``cleanse``, ``annotate``, ``triplify``,
+``load``) run inside :func:`stage`, which appends one JSON object per source
+and stage to the file named by the ``SLIME_METRICS`` environment variable, or
+does nothing when it is not set. Records hold the wall and CPU time of the
+stage, the peak RSS during the stage (sampled every few milliseconds,
+``peak_rss_mib``), the high-water mark of the process since it started
+(``max_rss_mib``, cumulative, so it covers earlier stages of the same process
+too), the rows of the table the stage takes in and of the table it returns
+(and their ratio, ``amplification``), counted by the stage itself, and the
+cache hits and misses of the workbook, download and taxon caches. Worker
+processes inherit the environment, so pools write to the same file.
+
+``SLIME_PROFILE`` adds a profile of each stage to ``SLIME_PROFILE_DIR``
+(``profiles`` by default): ``cprofile`` writes ``.prof`` files for
+``pstats``/snakeviz, ``sample`` writes the stacks of the stage's thread,
+sampled every few milliseconds, in the folded format of flame graph tools.
+
+    $ SLIME_METRICS=metrics.jsonl python sources/pantheon/clean.py ...
+    $ python -m slime.metrics metrics.jsonl
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+ENV_METRICS = "SLIME_METRICS"
+ENV_PROFILE = "SLIME_PROFILE"
+ENV_PROFILE_DIR = "SLIME_PROFILE_DIR"
+PROFILERS = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.005
+RSS_INTERVAL = 0.01
+
+_local = threading.local()
+
+
+def configure(path=None, profile=None, profile_dir=None):
+    """Enable metrics (and profiles) for this process and its children."""
+    for name, value in (
+        (ENV_METRICS, path),
+        (ENV_PROFILE, profile),
+        (ENV_PROFILE_DIR, profile_dir),
+    ):
+        if value is None:
+            continue
+        # Absolute paths, so that workers in other directories use the same files
+        os.environ[name] = value if name == ENV_PROFILE else str(Path(value).resolve())
+
+
+def add_arguments(parser):
+    parser.add_argument("--metrics", help=f"JSON-lines file (default: ${ENV_METRICS})")
+    parser.add_argument("--profile", choices=PROFILERS, help="profile each stage")
+    parser.add_argument("--profile-dir", help="default: profiles")
+
+
+def configure_from_args(args):
+    configure(args.metrics, args.profile, args.profile_dir)
+
+
+def enabled():
+    return bool(os.environ.get(ENV_METRICS))
+
+
+def peak_rss():
+    """High-water mark of the resident set size of this process, in MiB.
+
+    It is cumulative: it never goes down, so it also covers whatever the
+    process did before. Use :class:`RssSampler` for the peak of a block.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss():
+    """Current resident set size of this process, in MiB (None off Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+class RssSampler:
+    """Sample the RSS of this process from a background thread.
+
+    ``peak`` is the largest RSS seen between :meth:`start` and :meth:`stop`,
+    or None when it cannot be read.
+    """
+
+    def __init__(self, interval=RSS_INTERVAL):
+        self.interval = interval
+        self.peak = None
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self):
+        current = rss()
+        if current is not None and (self.peak is None or current > self.peak):
+            self.peak = current
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.sample()
+        if self.peak is not None:
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.sample()
+        return self.peak
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def emit(record):
+    path = os.environ.get(ENV_METRICS)
+    if not path:
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    # One write per record, in append mode, so that processes do not interleave
+    with open(path, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+def stage_record(source_id, name, wall, **fields):
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source_id,
+        "stage": name,
+        "wall": wall,
+        "max_rss_mib": peak_rss(),
+        "pid": os.getpid(),
+        **fields,
+    }
+
+
+def count(name, n=1):
+    """Add ``n`` to a counter of the innermost stage of this thread."""
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1][name] = stack[-1].get(name, 0) + n
+
+
+class Sampler:
+    """Sample the stack of one thread from a background thread."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self, path):
+        self.done.set()
+        self.thread.join()
+        with open(path, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+@contextmanager
+def profiled(source_id, name):
+    """Profile the block when SLIME_PROFILE is set; yield the profile path."""
+    profiler = os.environ.get(ENV_PROFILE)
+    if profiler not in PROFILERS:
+        yield None
+        return
+    directory = Path(os.environ.get(ENV_PROFILE_DIR, "profiles"))
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = ".prof" if profiler == "cprofile" else ".folded"
+    path = directory / f"{source_id}-{name}-{os.getpid()}{suffix}"
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield path
+        finally:
+            profile.disable()
+            profile.dump_stats(path)
+    else:
+        sampler = Sampler(threading.get_ident())
+        sampler.start()
+        try:
+            yield path
+        finally:
+            sampler.stop(path)
+
+
+@contextmanager
+def stage(source_id, name, **fields):
+    """Measure a stage of a source and emit its record.
+
+    Yields the record, a dict where the block can set fields such as
+    ``rows_in`` and ``rows_out``; :func:`count` adds to its counters.
+    """
+    record = dict(fields)
+    if not enabled():
+        yield record
+        return
+    stack = _local.__dict__.setdefault("stack", [])
+    outer = not stack
+    stack.append(record)
+    sampler = RssSampler().start()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    error = None
+    try:
+        with profiled(source_id, name) if outer else _nothing() as path:
+            if path is not None:
+                record["profile"] = str(path)
+            yield record
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        stack.pop()
+        record["peak_rss_mib"] = sampler.stop()
+        if record.get("rows_in") and "rows_out" in record:
+            record["amplification"] = record["rows_out"] / record["rows_in"]
+        if error is not None:
+            record["error"] = repr(error)
+        emit(
+            stage_record(
+                source_id,
+                name,
+                time.perf_counter() - start,
+                cpu=time.process_time() - cpu_start,
+                **record,
+            )
+        )
+
+
+@contextmanager
+def _nothing():
+    yield None
+
+
+def read_metrics(path):
+    import pandas as pd
+
+    with open(path) as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def summary(df):
+    """Rank sources by total wall time, with the time of each stage."""
+    import pandas as pd
+
+    if df.empty:
+        return pd.DataFrame()
+    stages = df.pivot_table(
+        index="source", columns="stage", values="wall", aggfunc="sum", fill_value=0
+    )
+    totals = df.groupby("source").agg(
+        wall=("wall", "sum"), cpu=("cpu", "sum"), peak_rss_mib=("peak_rss_mib", "max")
+    )
+    if "max_rss_mib" in df:
+        totals["max_rss_mib"] = df.groupby("source")["max_rss_mib"].max()
+    for column in ("rows_in", "rows_out", "amplification"):
+        if column in df:
+            totals[column] = df.groupby("source")[column].max()
+    return totals.join(stages).sort_values("wall", ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rank the slowest sources of one or more metrics files."
+    )
+    parser.add_argument("paths", nargs="+", help="JSON-lines metrics files")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    df = pd.concat([read_metrics(p) for p in args.paths], ignore_index=True)
+    report = summary(df).head(args.top)
+    print(report.round(3).to_csv(sep="\t"), end="")
+    if "error" in df:
+        for row in df[df["error"].notna()].itertuples():
+            print(f"failed\t{row.source}\t{row.stage}\t{row.error}", file=sys.stderr)
@@ -0,0 +1,46 @@
+"""Locate and parse the ontologies of graph.cfg.
+
+``[ontologies]`` in graph.cfg names each ontology by a release URL or a
+local path. :func:`local_copy` gives a path for either, downloading URLs
+through :mod:`slime.download`, and :func:`parse_ontology` reads it with
+rdflib in the format guessed from its name.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from slime.cleanse import GRAPH_CFG, read_source_config
+
+
+def ontology_location(graph_cfg=GRAPH_CFG, name="sfwo"):
+    return read_source_config(graph_cfg).get("ontologies", name)
+
+
+@contextmanager
+def local_copy(location):
+    """Yield a local path of an ontology, downloaded through the cache if needed."""
+    from slime.download import fetched
+
+    location = str(location)
+    if location.startswith("file://"):
+        yield Path(unquote(urlsplit(location).path))
+    elif "://" in location:
+        with fetched(location) as path:
+            yield path
+    else:
+        yield Path(location)
+
+
+def ontology_path(graph_cfg=GRAPH_CFG, name="sfwo"):
+    """Return :func:`local_copy` of an ontology of graph.cfg."""
+    return local_copy(ontology_location(graph_cfg, name))
+
+
+def parse_ontology(path):
+    import rdflib
+    from rdflib.util import guess_format
+
+    graph = rdflib.Graph()
+    graph.parse(path, format=guess_format(str(path)) or "xml")
+    return graph
@@ -0,0 +1,298 @@
+"""Materialize the potential interactions of every organism once per build.
+
+``get.potential.interactions`` (SLIMER) finds, at query time, the trophic
+restrictions (``owl:Restriction`` on a sub-property of ``obo:RO_0002437``)
+that the diet classes of an organism inherit in SFWO, and the resources or
+taxa they point to, directly or through an ``owl:unionOf`` list. Here the
+ontology is read once, each class is mapped to the (interaction, resource)
+pairs of its restrictions and of those of its superclasses, and the
+organisms of the materialized N-Quads of each source are joined with it.
+
+The result is a flat edge table with the columns ``consumer`` (the taxon of
+the organism), ``interaction``, ``resource``, ``reference``, ``source``
+(named graph) and ``inferred`` (the restriction comes from a superclass of
+the diet class given by the source). It is written as a Parquet file sorted
+by consumer, so that row group statistics prune lookups, and as N-Quads for
+the ``potential_interactions`` named graph, where each edge is a
+``<consumer> <interaction> <resource>`` triple described by an
+``rdf:Statement`` carrying its provenance.
+"""
+
+import argparse
+import gzip
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+from slime.cleanse import GRAPH_CFG, parse_job
+from slime.delta import read_statements
+from slime.ontology import ontology_path, parse_ontology
+from slime.rebuild import graph_iri
+from slime.tables import to_arrow
+
+OBO = "http://purl.obolibrary.org/obo/"
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+RDF_TYPE = RDF + "type"
+ORGANISM = OBO + "CARO_0001010"
+TAXON_NODE = OBO + "PCO_0000059"
+MEMBER_OF = OBO + "RO_0002350"
+HAS_INPUT = OBO + "OBI_0000293"
+REFERENCES = "http://rs.tdwg.org/dwc/terms/associatedReferences"
+TROPHIC = OBO + "RO_0002437"
+MATERIAL = OBO + "BFO_0000040"
+CELLULAR = OBO + "NCBITaxon_131567"
+EXCLUDED_RESOURCES = {TAXON_NODE, CELLULAR, MATERIAL}
+PROV_SOURCE = "http://www.w3.org/ns/prov#wasDerivedFrom"
+INFERRED = "https://purl.slime.org/vocab/inferred"
+GRAPH_ID = "potential_interactions"
+COLUMNS = ["consumer", "interaction", "resource", "reference", "source", "inferred"]
+ROW_GROUP_SIZE = 100_000
+
+
+def ancestors(parents, node):
+    """Return node and all its ancestors in a {child: parents} graph."""
+    seen, stack = {node}, [node]
+    while stack:
+        for parent in parents.get(stack.pop(), ()):
+            if parent not in seen:
+                seen.add(parent)
+                stack.append(parent)
+    return seen
+
+
+def read_ontology(path):
+    """Map each class of an OWL file to the targets of its trophic restrictions.
+
+    Returns a {class: [(interaction, resource, restriction owner)]} dict,
+    where the owner is the class or superclass the restriction is stated on.
+    ``path`` can also be an rdflib graph already parsed.
+    """
+    import rdflib
+    from rdflib.collection import Collection
+    from rdflib.namespace import OWL, RDFS
+
+    graph = path if isinstance(path, rdflib.Graph) else parse_ontology(path)
+
+    def parents_of(predicate):
+        parents = {}
+        for child, parent in graph.subject_objects(predicate):
+            parents.setdefault(child, set()).add(parent)
+        return parents
+
+    classes, properties = parents_of(RDFS.subClassOf), parents_of(RDFS.subPropertyOf)
+    labelled = set(graph.subjects(RDFS.label, None))
+    trophic = rdflib.URIRef(TROPHIC)
+    material, cellular = rdflib.URIRef(MATERIAL), rdflib.URIRef(CELLULAR)
+    is_a = lru_cache(maxsize=None)(lambda node: frozenset(ancestors(classes, node)))
+
+    def resources(restriction):
+        found = set()
+        for target in graph.objects(restriction, OWL.someValuesFrom):
+            for members in graph.objects(target, OWL.unionOf):
+                for item in Collection(graph, members):
+                    found.update(graph.objects(item, OWL.someValuesFrom))
+                    if material in is_a(item):
+                        found.add(item)
+            if material in is_a(target):
+                found.add(target)
+            for taxon in graph.objects(target, OWL.someValuesFrom):
+                if cellular in is_a(taxon):
+                    found.add(taxon)
+        return {
+            str(r)
+            for r in found
+            if isinstance(r, rdflib.URIRef)
+            and r in labelled
+            and str(r) not in EXCLUDED_RESOURCES
+        }
+
+    stated = {}
+    for owner, restriction in graph.subject_objects(RDFS.subClassOf):
+        if (restriction, rdflib.RDF.type, OWL.Restriction) not in graph:
+            continue
+        for interaction in graph.objects(restriction, OWL.onProperty):
+            if trophic not in ancestors(properties, interaction):
+                continue
+            if interaction not in labelled:
+                continue
+            for resource in resources(restriction):
+                stated.setdefault(owner, set()).add((str(interaction), resource))
+
+    closure = {}
+    for cls in {c for c in classes if isinstance(c, rdflib.URIRef)}:
+        edges = [
+            (interaction, resource, str(owner))
+            for owner in is_a(cls)
+            for interaction, resource in stated.get(owner, ())
+        ]
+        if edges:
+            closure[str(cls)] = edges
+    return closure
+
+
+def diet_table(closure):
+    """Flatten a closure into a (class, interaction, resource, inferred) frame."""
+    rows = [
+        (cls, interaction, resource, owner != cls)
+        for cls, edges in closure.items()
+        for interaction, resource, owner in edges
+    ]
+    df = pd.DataFrame(rows, columns=["class", "interaction", "resource", "inferred"])
+    # A pair stated on the class itself is not inferred
+    return df.groupby(["class", "interaction", "resource"], as_index=False).min()
+
+
+def literal_value(term):
+    value = term[1 : term.rindex('"')]
+    return (
+        value.replace('\\"', '"')
+        .replace("\\n", "\n")
+        .replace("\\r", "\r")
+        .replace("\\\\", "\\")
+    )
+
+
+def node_term(term, source_id):
+    if term.startswith("<"):
+        return term[1:-1]
+    # Blank node labels are only unique within a source
+    return f"_:{source_id}/{term[2:]}"
+
+
+def read_organisms(rdf_path, source_id):
+    """Return the (organism, consumer, class, reference) rows of a source.
+
+    ``class`` lists the types of each organism, ``consumer`` the taxa it is
+    a member of and ``reference`` the references of its occurrences.
+    """
+    wanted = {RDF_TYPE, MEMBER_OF, HAS_INPUT, REFERENCES}
+    rows = {p: [] for p in wanted}
+
+    def node(term):
+        return node_term(term, source_id)
+
+    for statement in read_statements(rdf_path):
+        subject, predicate, obj = statement.split(" ", 2)
+        predicate = predicate[1:-1]
+        if predicate not in wanted:
+            continue
+        if predicate == REFERENCES:
+            rows[predicate].append((node(subject), literal_value(obj)))
+        elif not obj.startswith('"'):
+            rows[predicate].append((node(subject), node(obj)))
+
+    types = pd.DataFrame(rows[RDF_TYPE], columns=["node", "class"])
+    organisms = types.loc[types["class"] == ORGANISM, "node"].unique()
+    classes = types[types["node"].isin(organisms) & (types["class"] != ORGANISM)]
+    classes = classes.rename(columns={"node": "organism"})
+    members = pd.DataFrame(rows[MEMBER_OF], columns=["organism", "taxon_node"])
+    taxa = types[~types["class"].isin([ORGANISM, TAXON_NODE])].rename(
+        columns={"node": "taxon_node", "class": "consumer"}
+    )
+    consumers = members.merge(taxa, on="taxon_node")[["organism", "consumer"]]
+    inputs = pd.DataFrame(rows[HAS_INPUT], columns=["occurrence", "organism"])
+    references = pd.DataFrame(rows[REFERENCES], columns=["occurrence", "reference"])
+    references = inputs.merge(references, on="occurrence")[["organism", "reference"]]
+    return (
+        consumers.merge(classes, on="organism")
+        .merge(references, on="organism", how="left")
+        .drop_duplicates()
+    )
+
+
+def potential_interactions(jobs, closure, graph_cfg=GRAPH_CFG):
+    """Return the edge table of the sources in ``jobs`` ({source_id: file})."""
+    diets = diet_table(closure)
+    frames = []
+    for source_id, rdf_path in jobs.items():
+        organisms = read_organisms(rdf_path, source_id)
+        edges = organisms.merge(diets, on="class")
+        edges["source"] = graph_iri(source_id, graph_cfg)
+        frames.append(edges)
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    edges = pd.concat(frames, ignore_index=True)
+    keys = [c for c in COLUMNS if c != "inferred"]
+    edges = edges.groupby(keys, as_index=False, dropna=False)["inferred"].min()
+    return edges[COLUMNS].sort_values(COLUMNS[:3], ignore_index=True)
+
+
+def write_parquet(edges, path, row_group_size=ROW_GROUP_SIZE):
+    import pyarrow.parquet as pq
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(to_arrow(edges), path, row_group_size=row_group_size)
+
+
+def read_edges(path, consumers=None, columns=None):
+    """Read the edges of some consumers (all edges when None) from Parquet."""
+    import pyarrow.parquet as pq
+
+    filters = [("consumer", "in", list(consumers))] if consumers is not None else None
+    table = pq.read_table(path, columns=columns, filters=filters)
+    return table.to_pandas()
+
+
+def nquads(edges, graph):
+    """Yield the N-Quads statements of the edge table in ``graph``."""
+    g = f"<{graph}>"
+    for row in edges.itertuples(index=False):
+        c, i, r = f"<{row.consumer}>", f"<{row.interaction}>", f"<{row.resource}>"
+        yield f"{c} {i} {r} {g} .\n"
+        key = "\0".join(str(v) for v in row)
+        statement = f"<{graph}/edge/{hashlib.sha1(key.encode()).hexdigest()}>"
+        yield f"{statement} <{RDF_TYPE}> <{RDF}Statement> {g} .\n"
+        yield f"{statement} <{RDF}subject> {c} {g} .\n"
+        yield f"{statement} <{RDF}predicate> {i} {g} .\n"
+        yield f"{statement} <{RDF}object> {r} {g} .\n"
+        yield f"{statement} <{PROV_SOURCE}> <{row.source}> {g} .\n"
+        inferred = "true" if row.inferred else "false"
+        yield (
+            f'{statement} <{INFERRED}> "{inferred}"'
+            f"^^<http://www.w3.org/2001/XMLSchema#boolean> {g} .\n"
+        )
+        if not pd.isna(row.reference):
+            reference = (
+                str(row.reference)
+                .replace("\\", "\\\\")
+                .replace('"', '\\"')
+                .replace("\n", "\\n")
+                .replace("\r", "\\r")
+            )
+            yield f'{statement} <{REFERENCES}> "{reference}" {g} .\n'
+
+
+def write_nquads(edges, path, graph_cfg=GRAPH_CFG):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.writelines(nquads(edges, graph_iri(GRAPH_ID, graph_cfg)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compute the potential interactions of the organisms of "
+        "several sources and write them as Parquet and N-Quads."
+    )
+    parser.add_argument(
+        "jobs", nargs="+", type=parse_job, help="<source_id>=<.nq.gz file>"
+    )
+    parser.add_argument("--outputdir", required=True)
+    parser.add_argument("--ontology", help="OWL file (default: sfwo of graph.cfg)")
+    parser.add_argument("--graph-cfg", default=GRAPH_CFG)
+    args = parser.parse_args()
+
+    if args.ontology:
+        closure = read_ontology(args.ontology)
+    else:
+        with ontology_path(args.graph_cfg) as path:
+            closure = read_ontology(path)
+    edges = potential_interactions(dict(args.jobs), closure, args.graph_cfg)
+    outputdir = Path(args.outputdir)
+    write_parquet(edges, outputdir / f"{GRAPH_ID}.parquet")
+    write_nquads(edges, outputdir / f"{GRAPH_ID}.nq.gz", args.graph_cfg)
+    print(
+        f"{len(edges)} edges\t{edges['consumer'].nunique()} consumers"
+        f"\t{int(edges['inferred'].sum())} inferred"
+    )
@@ -0,0 +1,605 @@
+"""Answer the SLIMER questions for large batches of taxa from a local snapshot.
+
+``get.diets``, ``get.guilds``, ``get.trophic.groups``, ``get.interactions``
+and ``get.potential.interactions`` send one SPARQL query per call. Here the
+materialized N-Quads of the sources, the ontology and optional extra graphs
+(e.g. the taxonomy with the labels and ``rdfs:subClassOf`` lineage of the
+taxa) are exported once to a snapshot directory of Arrow IPC files: one flat
+table per question, keyed by the matched taxon (``matchId``), the taxon
+lineage and the labels. The RDFS inferences GraphDB makes for these queries
+(superclasses of asserted types, restrictions inherited by a class) are
+done at export time.
+
+:class:`Snapshot` memory-maps the files and keeps hash indexes on taxon IRIs
+and scientific names and on the ``matchId`` of each table, so a batch of
+thousands of taxa is a few index lookups. Results have the columns of the R
+functions, with IRIs shortened with the prefixes of ``SLIMER/R/common.R``
+and ``matchId``/``reference`` grouped into lists as ``format.result.df``
+does.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from slime.cleanse import GRAPH_CFG, parse_job
+from slime.delta import read_statements
+from slime.potential import (
+    HAS_INPUT,
+    MEMBER_OF,
+    OBO,
+    ORGANISM,
+    RDF_TYPE,
+    REFERENCES,
+    ancestors,
+    literal_value,
+    node_term,
+    potential_interactions,
+    read_ontology,
+)
+from slime.ontology import parse_ontology
+from slime.rebuild import graph_iri
+from slime.tables import to_arrow
+
+# SLIMER/R/common.R
+PREFIXES = {
+    "obo": "http://purl.obolibrary.org/obo/",
+    "dwc": "http://rs.tdwg.org/dwc/terms/",
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
+    "xsd": "http://www.w3.org/2001/XMLSchema#",
+    "onto": "http://www.ontotext.com/",
+    "NCBITaxon": "http://purl.obolibrary.org/obo/NCBITaxon_",
+    "NCBI": "https://www.ncbi.nlm.nih.gov/Taxonomy/Browser/wwwtax.cgi?id=",
+    "RO": "http://purl.obolibrary.org/obo/RO_",
+    "SFWO": "http://purl.org/sfwo/SFWO_",
+    "EOL": "http://eol.org/pages/",
+    "ECOCORE": "http://purl.obolibrary.org/obo/ECOCORE_",
+    "OBI": "http://purl.obolibrary.org/obo/OBI_",
+    "BFO": "http://purl.obolibrary.org/obo/BFO_",
+    "GBIF": "http://www.gbif.org/species/",
+    "ITIS": "http://www.itis.gov/servlet/SingleRpt/SingleRpt?search_topic=TSN&search_value=",
+    "SILVA": "https://www.arb-silva.de/",
+    "IF": "http://www.indexfungorum.org/names/NamesRecord.asp?RecordID=",
+    "sesame": "http://www.openrdf.org/schema/sesame#",
+    "SLIME": "https://purl.slime.org/",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+RDFS = PREFIXES["rdfs"]
+LABEL = RDFS + "label"
+SUBCLASS = RDFS + "subClassOf"
+HAS_QUALITY = OBO + "RO_0000086"
+PARTICIPANT = OBO + "RO_0002233"
+IS_ABOUT = OBO + "IAO_0000136"
+TAXON_NODE = OBO + "PCO_0000059"
+MATERIAL = OBO + "BFO_0000040"
+DIET = OBO + "PATO_0000056"
+TROPHIC_GROUP = PREFIXES["SFWO"] + "0000127"
+EXCLUDED = {
+    "diets": {DIET, PREFIXES["SFWO"] + "0000475"},
+    "guilds": {ORGANISM, OBO + "OBI_0100026"},
+    "trophic_groups": {TROPHIC_GROUP},
+    "interactions": {TAXON_NODE, MATERIAL},
+}
+# Name of the result column of each table, as in the R functions
+TARGETS = {
+    "diets": ["dietId"],
+    "guilds": ["guildId"],
+    "trophic_groups": ["trophicGroupId"],
+    "interactions": ["interactionId", "resourceId"],
+    "potential_interactions": ["interactionId", "resourceId"],
+}
+QUERY_COLUMNS = ["queryName", "queryId", "matchName", "matchId"]
+PROVENANCE = ["reference", "source", "inferred"]
+STRUCTURE = {RDF_TYPE, MEMBER_OF, HAS_INPUT, HAS_QUALITY, PARTICIPANT, IS_ABOUT}
+
+
+def expand(curie):
+    """Expand a CURIE with the SLIMER prefixes (IRIs are returned as they are)."""
+    prefix, sep, local = curie.partition(":")
+    if sep and prefix in PREFIXES and not local.startswith("//"):
+        return PREFIXES[prefix] + local
+    return curie.strip("<>")
+
+
+def to_short_iris(values):
+    """Shorten IRIs with the longest matching SLIMER prefix, like to.short.iri."""
+    values = pd.Series(values, dtype=object)
+    uniques = values.dropna().unique()
+    by_length = sorted(PREFIXES.items(), key=lambda item: -len(item[1]))
+    short = {}
+    for iri in uniques:
+        short[iri] = next(
+            (f"{p}:{iri[len(ns):]}" for p, ns in by_length if iri.startswith(ns)), iri
+        )
+    return values.map(short).where(values.notna(), values)
+
+
+def read_graph(rdf_path, source_id):
+    """Read the statements of a file into {predicate: [(s, o)]} lists.
+
+    Only labels and references are kept among literals; the statements with
+    other predicates are kept in ``other`` as (s, p, o) rows.
+    """
+    rows = {p: [] for p in STRUCTURE | {LABEL, REFERENCES, SUBCLASS}}
+    rows["other"] = []
+    for statement in read_statements(rdf_path):
+        subject, predicate, obj = statement.split(" ", 2)
+        predicate = predicate[1:-1]
+        subject = node_term(subject, source_id)
+        if obj.startswith('"'):
+            if predicate in (LABEL, REFERENCES):
+                rows[predicate].append((subject, literal_value(obj)))
+            continue
+        obj = node_term(obj, source_id)
+        if predicate in rows:
+            rows[predicate].append((subject, obj))
+        else:
+            rows["other"].append((subject, predicate, obj))
+    return rows
+
+
+def frame(rows, *columns):
+    return pd.DataFrame(rows, columns=list(columns))
+
+
+class Hierarchy:
+    """Reflexive-transitive rdfs:subClassOf closure, cached per class."""
+
+    def __init__(self, subclasses):
+        self.parents = {}
+        for child, parent in subclasses:
+            self.parents.setdefault(child, set()).add(parent)
+        self.cache = {}
+
+    def is_a(self, node):
+        if node not in self.cache:
+            self.cache[node] = frozenset(ancestors(self.parents, node))
+        return self.cache[node]
+
+    def closure(self, types, under, excluded=()):
+        """Expand (node, class) rows to the superclasses of class below ``under``.
+
+        Returns (node, class, inferred) rows, inferred being True for the
+        superclasses that are not asserted.
+        """
+        expansion = frame(
+            [
+                (cls, parent, parent != cls)
+                for cls in types["class"].unique()
+                for parent in self.is_a(cls)
+                if parent not in excluded and under in self.is_a(parent)
+            ],
+            "asserted",
+            "class",
+            "inferred",
+        )
+        df = types.rename(columns={"class": "asserted"}).merge(expansion, on="asserted")
+        return df.groupby(["node", "class"], as_index=False)["inferred"].min()
+
+    def direct_types(self, types):
+        """Keep the most specific types of each node, like sesame:directType."""
+        multiple = types["node"].duplicated(keep=False)
+        keep = [types[~multiple]]
+        for node, classes in types[multiple].groupby("node")["class"]:
+            classes = set(classes)
+            keep.append(
+                frame(
+                    [
+                        (node, cls)
+                        for cls in classes
+                        if not any(
+                            cls != other and cls in self.is_a(other)
+                            for other in classes
+                        )
+                    ],
+                    "node",
+                    "class",
+                )
+            )
+        return pd.concat(keep, ignore_index=True)
+
+
+def ontology_axioms(graph):
+    """Return the labels, subclass axioms and (owner, diet) restrictions of
+    an rdflib graph."""
+    import rdflib
+    from rdflib.namespace import OWL
+    from rdflib.namespace import RDFS as NS
+
+    labels = [
+        (str(s), str(o))
+        for s, o in graph.subject_objects(NS.label)
+        if isinstance(s, rdflib.URIRef)
+    ]
+    subclasses = [
+        (str(s), str(o))
+        for s, o in graph.subject_objects(NS.subClassOf)
+        if isinstance(s, rdflib.URIRef) and isinstance(o, rdflib.URIRef)
+    ]
+    quality = rdflib.URIRef(HAS_QUALITY)
+    restrictions = []
+    for owner, restriction in graph.subject_objects(NS.subClassOf):
+        if (restriction, OWL.onProperty, quality) not in graph:
+            continue
+        for diet in graph.objects(restriction, OWL.someValuesFrom):
+            if isinstance(owner, rdflib.URIRef) and isinstance(diet, rdflib.URIRef):
+                restrictions.append((str(owner), str(diet)))
+    return labels, subclasses, restrictions
+
+
+def source_tables(rows, source, hierarchy, restrictions):
+    """Build the question tables of one source, keyed by matchId.
+
+    ``inferred`` follows GraphDB: a row is inferred when the statement
+    matched in the source graph is only in the implicit graph, and then
+    has no reference (the occurrence is matched in the same graph).
+    """
+    types = frame(rows[RDF_TYPE], "node", "class")
+    organisms = types.loc[types["class"] == ORGANISM, "node"].unique()
+    organism_types = types[types["node"].isin(organisms)].rename(
+        columns={"node": "organism"}
+    )
+    members = frame(rows[MEMBER_OF], "organism", "member")
+    taxa = hierarchy.direct_types(types[types["class"] != TAXON_NODE])
+    matches = members.merge(taxa, left_on="member", right_on="node")
+    matches = matches.loc[
+        matches["organism"].isin(organisms) & (matches["class"] != ORGANISM),
+        ["organism", "class"],
+    ].rename(columns={"class": "matchId"})
+    matches = matches.drop_duplicates()
+    inputs = frame(rows[HAS_INPUT], "occurrence", "organism")
+    references = frame(rows[REFERENCES], "node", "reference")
+    organism_references = inputs.merge(
+        references, left_on="occurrence", right_on="node"
+    )[["organism", "reference"]]
+
+    def keyed(df):
+        df = matches.merge(df, on="organism")
+        if "reference" not in df:
+            inferred = df["inferred"].astype(bool)
+            explicit = df[~inferred].merge(
+                organism_references, on="organism", how="left"
+            )
+            df = pd.concat([explicit, df[inferred]], ignore_index=True)
+        df["source"] = source
+        return df.drop(columns="organism")
+
+    tables = {}
+    # get.diets: the types of the qualities of organisms with an occurrence,
+    # and the diets of the restrictions their classes inherit
+    qualities = frame(rows[HAS_QUALITY], "organism", "node")
+    qualities = qualities[qualities["organism"].isin(inputs["organism"])]
+    diets = hierarchy.closure(
+        qualities.merge(types, on="node")[["organism", "class"]]
+        .drop_duplicates()
+        .rename(columns={"organism": "node"}),
+        DIET,
+        EXCLUDED["diets"],
+    )
+    diets["inferred"] = False
+    inherited = frame(
+        [
+            (organism, diet)
+            for organism, cls in organism_types.drop_duplicates().itertuples(
+                index=False
+            )
+            for owner in hierarchy.is_a(cls)
+            for diet in restrictions.get(owner, ())
+            if diet not in EXCLUDED["diets"] and DIET in hierarchy.is_a(diet)
+        ],
+        "node",
+        "class",
+    )
+    diets = pd.concat([diets, inherited.assign(inferred=True)], ignore_index=True)
+    tables["diets"] = keyed(
+        diets.rename(columns={"node": "organism", "class": "dietId"})
+    )
+    # get.guilds: the types of organisms below CARO_0001010
+    guilds = hierarchy.closure(
+        organism_types.rename(columns={"organism": "node"}),
+        ORGANISM,
+        EXCLUDED["guilds"],
+    )
+    tables["guilds"] = keyed(
+        guilds.rename(columns={"node": "organism", "class": "guildId"})
+    )
+    # get.trophic.groups: the types of the groups organisms are members of
+    groups = members.merge(types, left_on="member", right_on="node")
+    groups = hierarchy.closure(
+        groups[["organism", "class"]]
+        .drop_duplicates()
+        .rename(columns={"organism": "node"}),
+        TROPHIC_GROUP,
+        EXCLUDED["trophic_groups"],
+    )
+    groups = groups.rename(columns={"node": "organism", "class": "trophicGroupId"})
+    tables["trophic_groups"] = keyed(groups.assign(inferred=False, reference=None))
+    # get.interactions: the predicates between two participants of an
+    # interaction, with the asserted taxa or types of the target
+    participants = frame(rows[PARTICIPANT], "interaction", "organism")
+    pairs = participants.merge(participants, on="interaction", suffixes=("", "_t"))
+    pairs = pairs[pairs["organism"] != pairs["organism_t"]]
+    links = pairs.merge(
+        frame(rows["other"], "organism", "interactionId", "organism_t"),
+        on=["organism", "organism_t"],
+    )
+    resources = pd.concat(
+        [
+            members.merge(types, left_on="member", right_on="node")[
+                ["organism", "class"]
+            ],
+            types.rename(columns={"node": "organism"}),
+        ]
+    )
+    resources = resources[~resources["class"].isin(EXCLUDED["interactions"])]
+    links = links.merge(
+        resources.rename(columns={"organism": "organism_t", "class": "resourceId"}),
+        on="organism_t",
+    )
+    data = frame(rows[IS_ABOUT], "data", "interaction")
+    data = data.merge(references, left_on="data", right_on="node", how="left")
+    links = links.merge(data[["interaction", "reference"]], on="interaction")
+    tables["interactions"] = keyed(
+        links[["organism", "interactionId", "resourceId", "reference"]].assign(
+            inferred=False
+        )
+    )
+    return tables
+
+
+def export_snapshot(jobs, outputdir, ontology, extra=(), graph_cfg=GRAPH_CFG):
+    """Export the snapshot of the sources in ``jobs`` ({source_id: N-Quads}).
+
+    ``ontology`` is an OWL file (or rdflib graph) and ``extra`` more RDF
+    files, such as the taxonomy, read for their labels and lineage.
+    """
+    import pyarrow as pa
+
+    graph = parse_ontology(ontology) if not hasattr(ontology, "triples") else ontology
+    labels, subclasses, axioms = ontology_axioms(graph)
+    sources = {}
+    for source_id, rdf_path in jobs.items():
+        sources[source_id] = read_graph(rdf_path, source_id)
+    for i, rdf_path in enumerate(extra):
+        rows = read_graph(rdf_path, f"extra{i}")
+        labels += rows[LABEL]
+        subclasses += rows[SUBCLASS]
+    for rows in sources.values():
+        labels += rows[LABEL]
+        subclasses += rows[SUBCLASS]
+    hierarchy = Hierarchy(subclasses)
+    restrictions = {}
+    for owner, diet in axioms:
+        restrictions.setdefault(owner, set()).add(diet)
+
+    tables = {name: [] for name in TARGETS if name != "potential_interactions"}
+    for source_id, rows in sources.items():
+        source = graph_iri(source_id, graph_cfg)
+        for name, df in source_tables(rows, source, hierarchy, restrictions).items():
+            tables[name].append(df)
+    tables = {
+        name: (
+            pd.concat(frames, ignore_index=True)
+            if frames
+            else frame([], "matchId", *TARGETS[name], *PROVENANCE)
+        )
+        for name, frames in tables.items()
+    }
+    potential = potential_interactions(jobs, read_ontology(graph), graph_cfg)
+    tables["potential_interactions"] = potential.rename(
+        columns={
+            "consumer": "matchId",
+            "interaction": "interactionId",
+            "resource": "resourceId",
+        }
+    )
+    for name, df in tables.items():
+        df = df[["matchId", *TARGETS[name], *PROVENANCE]]
+        tables[name] = df.assign(inferred=df["inferred"].astype(bool))
+
+    # The lineage of the resources is kept for slime.foodweb
+    nodes = pd.unique(
+        np.concatenate(
+            [
+                df[column].to_numpy(dtype=object)
+                for df in tables.values()
+                for column in ("matchId", "resourceId")
+                if column in df
+            ]
+        )
+    )
+    tables["lineage"] = frame(
+        [(taxon, a) for taxon in nodes for a in hierarchy.is_a(taxon)],
+        "matchId",
+        "ancestor",
+    )
+    tables["labels"] = frame(labels, "iri", "label").drop_duplicates()
+
+    outputdir = Path(outputdir)
+    outputdir.mkdir(parents=True, exist_ok=True)
+    for name, df in tables.items():
+        columns = list(df.columns)
+        df = df.drop_duplicates().sort_values(columns[0], ignore_index=True)
+        table = to_arrow(df).combine_chunks()
+        with pa.OSFile(str(outputdir / f"{name}.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    return {name: len(df) for name, df in tables.items()}
+
+
+class KeyIndex:
+    """Hash index from the values of a column to the rows holding them."""
+
+    def __init__(self, column):
+        import pyarrow as pa
+
+        column = (
+            column.combine_chunks() if hasattr(column, "combine_chunks") else column
+        )
+        if not pa.types.is_dictionary(column.type):
+            column = column.dictionary_encode()
+        codes = column.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+        self.keys = pd.Index(column.dictionary.to_pylist())
+        self.order = np.argsort(codes, kind="stable")
+        self.bounds = np.searchsorted(codes[self.order], np.arange(len(self.keys) + 1))
+
+    def rows(self, keys):
+        positions = self.keys.get_indexer(pd.Index(keys).unique())
+        positions = positions[positions >= 0]
+        if not len(positions):
+            return np.array([], dtype=np.int64)
+        return np.concatenate(
+            [self.order[self.bounds[p] : self.bounds[p + 1]] for p in positions]
+        )
+
+
+class Snapshot:
+    """Memory-mapped snapshot with batch versions of the SLIMER functions."""
+
+    def __init__(self, path):
+        import pyarrow as pa
+
+        self.path = Path(path)
+        self.tables = {}
+        for file in sorted(self.path.glob("*.arrow")):
+            source = pa.memory_map(str(file))
+            self.tables[file.stem] = pa.ipc.open_file(source).read_all()
+        self.indexes = {}
+
+    def index(self, table, column):
+        key = (table, column)
+        if key not in self.indexes:
+            self.indexes[key] = KeyIndex(self.tables[table].column(column))
+        return self.indexes[key]
+
+    def lookup(self, table, column, keys, columns=None):
+        rows = self.index(table, column).rows(keys)
+        table = self.tables[table]
+        df = table.take(rows).select(columns or table.column_names).to_pandas()
+        for name in df.select_dtypes("category"):
+            df[name] = df[name].astype(object).where(df[name].notna(), None)
+        return df
+
+    def labels(self, iris):
+        labels = self.lookup("labels", "iri", iris)
+        return labels.drop_duplicates("iri").set_index("iri")["label"]
+
+    def matches(self, taxid=None, sci_name=None):
+        """Return the (queryName, queryId, matchName, matchId) of the taxa queried.
+
+        Matches are the taxa below the queried ones; as in SLIMER, queryName
+        is only set for names and queryId for ids.
+        """
+        if sci_name is not None:
+            named = self.lookup("labels", "label", list(sci_name))
+            queries = pd.DataFrame(
+                {"queryName": named["label"], "queryId": None, "ancestor": named["iri"]}
+            )
+        else:
+            iris = [expand(t) for t in taxid or []]
+            queries = pd.DataFrame(
+                {"queryName": None, "queryId": iris, "ancestor": iris}
+            )
+        lineage = self.lookup("lineage", "ancestor", queries["ancestor"])
+        matches = queries.merge(lineage, on="ancestor").drop(columns="ancestor")
+        names = self.labels(matches["matchId"].unique())
+        matches["matchName"] = matches["matchId"].map(names)
+        return matches.dropna(subset=["matchName"])[QUERY_COLUMNS]
+
+    def answer(self, table, taxid=None, sci_name=None):
+        """Answer one SLIMER question for a batch of taxa."""
+        matches = self.matches(taxid, sci_name)
+        facts = self.lookup(table, "matchId", matches["matchId"].unique())
+        df = matches.merge(facts, on="matchId")
+        names = []
+        for column in TARGETS[table]:
+            name = column[:-2] + "Name"
+            df[name] = df[column].map(self.labels(df[column].unique()))
+            names.append(name)
+        df = df.dropna(subset=names)
+        df["inferred"] = np.where(df["inferred"].astype(bool), "true", "false")
+        columns = QUERY_COLUMNS + [
+            c for column in TARGETS[table] for c in (column, column[:-2] + "Name")
+        ]
+        return format_result(
+            df[columns + PROVENANCE],
+            ["queryId", "matchId", *TARGETS[table], "source"],
+        )
+
+    def diets(self, taxid=None, sci_name=None):
+        return self.answer("diets", taxid, sci_name)
+
+    def guilds(self, taxid=None, sci_name=None):
+        return self.answer("guilds", taxid, sci_name)
+
+    def trophic_groups(self, taxid=None, sci_name=None):
+        return self.answer("trophic_groups", taxid, sci_name)
+
+    def interactions(self, taxid=None, sci_name=None):
+        return self.answer("interactions", taxid, sci_name)
+
+    def potential_interactions(self, taxid=None, sci_name=None):
+        return self.answer("potential_interactions", taxid, sci_name)
+
+
+def format_result(df, iri_columns):
+    """Shorten IRIs, list the matchIds and references of each row, deduplicate."""
+    df = df.copy()
+    if df.empty:
+        return df
+    for column in iri_columns:
+        df[column] = to_short_iris(df[column]).to_numpy()
+    for column in ("matchId", "reference"):
+        keys = df.drop(columns=column).astype(str)
+        groups = keys.groupby(list(keys.columns), sort=False).ngroup()
+        values = df[column].groupby(groups).agg(lambda v: tuple(pd.unique(v)))
+        df[column] = groups.map(values)
+    df = df.drop_duplicates(ignore_index=True)
+    for column in ("matchId", "reference"):
+        df[column] = df[column].map(list)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export a query snapshot of several sources, or answer "
+        "SLIMER questions for a batch of taxa from one."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export")
+    export.add_argument(
+        "jobs", nargs="+", type=parse_job, help="<source_id>=<.nq.gz file>"
+    )
+    export.add_argument("--outputdir", required=True)
+    export.add_argument("--ontology", required=True)
+    export.add_argument("--extra", nargs="*", default=[], help="taxonomy, ...")
+    export.add_argument("--graph-cfg", default=GRAPH_CFG)
+    ask = commands.add_parser("ask")
+    ask.add_argument("question", choices=sorted(TARGETS))
+    ask.add_argument("--snapshot", required=True)
+    group = ask.add_mutually_exclusive_group(required=True)
+    group.add_argument("--taxid", nargs="+", help="e.g. NCBI:55786 GBIF:2130185")
+    group.add_argument("--sci-name", nargs="+")
+    group.add_argument("--taxa-file", help="one taxon id per line")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        sizes = export_snapshot(
+            dict(args.jobs), args.outputdir, args.ontology, args.extra, args.graph_cfg
+        )
+        for name, size in sizes.items():
+            print(f"{name}\t{size} rows")
+    else:
+        taxid = args.taxid
+        if args.taxa_file:
+            taxid = Path(args.taxa_file).read_text().split()
+        df = Snapshot(args.snapshot).answer(args.question, taxid, args.sci_name)
+        for column in ("matchId", "reference"):
+            df[column] = df[column].map(
+                lambda values: "|".join(v for v in values if v is not None)
+            )
+        df.to_csv(sys.stdout, index=False)
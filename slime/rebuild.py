@@ -0,0 +1,250 @@
+"""Fingerprint sources to rebuild and reload only the ones that changed.
+
+A source's fingerprint covers its configuration (``source.cfg``, ``clean.py``
+and the mapping YAML/XLSX files), the hash of its raw data, the
+``[graph]`` and ``[ontologies]`` sections of ``graph.cfg`` and the code of
+the slime modules that extract, cleanse, annotate and triplify sources. The fingerprints
+of the last successful build are kept in a state file per repository;
+:func:`plan` compares them with the current tree to list the sources to run
+again and the sources that no longer exist. After a source has been rebuilt,
+``--load`` replaces its named graph in the triplestore with
+:func:`slime.load.load_all`, leaving the graphs of the other sources alone.
+
+Raw data is hashed from local ``[extract.file]`` paths, from the download
+cache for remote files, or from the paths given with ``--raw``. Sources
+extracted from an API have no raw hash unless one is given, so they are only
+rebuilt when their configuration changes.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import urllib.request
+from base64 import b64encode
+from pathlib import Path
+from urllib.parse import quote
+
+from slime.cache import CACHE_ROOT, file_digest
+from slime.cleanse import GRAPH_CFG, ROOT_DIR, SOURCES_DIR, read_source_config
+from slime.download import CACHE_DIR as DOWNLOAD_DIR
+from slime.download import load_index as load_download_index
+
+STATE_DIR = CACHE_ROOT / "fingerprints"
+CONFIG_PATTERNS = ("source.cfg", "clean.py", "*.yml", "*.yaml", "*.xlsx")
+# Modules whose code shapes the triples of a source
+PIPELINE_MODULES = (
+    "api.py",
+    "backbone.py",
+    "cleanse.py",
+    "dedup.py",
+    "excel.py",
+    "globi.py",
+    "labels.py",
+    "load.py",
+    "materialize.py",
+    "spec.py",
+    "tables.py",
+    "taxa.py",
+    "terms.py",
+    "triplify.py",
+)
+
+
+def files_digest(paths):
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(path.name.encode() + b"\0")
+        digest.update(bytes.fromhex(file_digest(path)))
+    return digest.hexdigest()
+
+
+def config_digest(source_dir):
+    """Hash the configuration and mapping files of a source."""
+    return files_digest(
+        {p for pattern in CONFIG_PATTERNS for p in source_dir.glob(pattern)}
+    )
+
+
+def code_digest():
+    """Hash the slime modules used to build sources."""
+    package_dir = Path(__file__).resolve().parent
+    return files_digest(package_dir / name for name in PIPELINE_MODULES)
+
+
+def graph_digest(graph_cfg=GRAPH_CFG):
+    """Hash the settings of graph.cfg that change every source's triples."""
+    config = read_source_config(graph_cfg)
+    settings = {
+        section: dict(config.items(section))
+        for section in ("graph", "ontologies")
+        if config.has_section(section)
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def raw_digest(source_dir, raw_path=None, download_dir=DOWNLOAD_DIR):
+    """Return the hash of a source's raw data, or None if it is unknown."""
+    if raw_path is not None:
+        return file_digest(raw_path)
+    config = read_source_config(source_dir / "source.cfg")
+    file_path = config.get("extract.file", "file_path", fallback=None)
+    if file_path is None:
+        return None
+    if "://" in file_path:
+        entry = load_download_index(Path(download_dir)).get(file_path)
+        return entry["sha256"] if entry else None
+    path = source_dir / file_path
+    return file_digest(path) if path.exists() else None
+
+
+def fingerprint(source_dir, graph=None, raw_path=None, code=None):
+    """Return the fingerprint components of a source and their combined hash."""
+    source_dir = Path(source_dir)
+    components = {
+        "config": config_digest(source_dir),
+        "raw": raw_digest(source_dir, raw_path),
+        "graph": graph if graph is not None else graph_digest(),
+        "code": code if code is not None else code_digest(),
+    }
+    combined = json.dumps(components, sort_keys=True).encode()
+    return hashlib.sha256(combined).hexdigest(), components
+
+
+def state_path(graph_cfg=GRAPH_CFG):
+    config = read_source_config(graph_cfg)
+    repository = config.get("load", "repository", fallback="default")
+    return STATE_DIR / f"{repository}.json"
+
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(path, state):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def plan(state, sources_dir=SOURCES_DIR, graph_cfg=GRAPH_CFG, raw=None):
+    """Compare the current fingerprints with ``state``.
+
+    Returns the fingerprints of all current sources, a {source: changed
+    components} dict of the sources to rebuild and the list of sources that
+    were removed from the tree.
+    """
+    raw = raw or {}
+    graph, code = graph_digest(graph_cfg), code_digest()
+    current, changed = {}, {}
+    for path in sorted(Path(sources_dir).glob("*/source.cfg")):
+        source_dir, source_id = path.parent, path.parent.name
+        digest, components = fingerprint(source_dir, graph, raw.get(source_id), code)
+        current[source_id] = {"fingerprint": digest, **components}
+        previous = state.get(source_id)
+        if previous is None:
+            changed[source_id] = ["new"]
+        elif previous["fingerprint"] != digest:
+            changed[source_id] = [
+                key for key, value in components.items() if previous.get(key) != value
+            ]
+    removed = sorted(set(state) - set(current))
+    return current, changed, removed
+
+
+def graph_iri(source_id, graph_cfg=GRAPH_CFG):
+    """Return the named graph of a source, e.g. https://purl.slime.org/betsi."""
+    config = read_source_config(graph_cfg)
+    return f"{config.get('graph', 'id').rstrip('/')}/{source_id}"
+
+
+def store_url(graph_cfg=GRAPH_CFG):
+    config = read_source_config(graph_cfg)
+    host = config.get("load", "host")
+    port = config.get("load", "port")
+    repository = config.get("load", "repository")
+    return f"http://{host}:{port}/repositories/{repository}"
+
+
+def store_headers(graph_cfg=GRAPH_CFG):
+    config = read_source_config(graph_cfg)
+    user = config.get("load", "user", fallback=None)
+    if not user:
+        return {}
+    password = config.get("load", "password", fallback="")
+    token = b64encode(f"{user}:{password}".encode()).decode()
+    return {"Authorization": f"Basic {token}"}
+
+
+def graph_request(url, graph, method, headers=None):
+    target = f"{url}/rdf-graphs/service?graph={quote(graph, safe='')}"
+    request = urllib.request.Request(target, method=method, headers=headers or {})
+    with urllib.request.urlopen(request) as response:
+        return response.status
+
+
+def drop_graph(url, graph, headers=None):
+    return graph_request(url, graph, "DELETE", headers=headers)
+
+
+def parse_pairs(values):
+    return dict(value.split("=", 1) for value in values or [])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="List the sources whose fingerprint changed since the last "
+        "build, and replace the named graphs of rebuilt sources."
+    )
+    parser.add_argument("--raw", nargs="*", help="<source_id>=<raw file>")
+    parser.add_argument(
+        "--load", nargs="*", help="<source_id>=<.nq/.nt(.gz) file> to load"
+    )
+    parser.add_argument(
+        "--record", nargs="*", help="mark sources as built without loading them"
+    )
+    parser.add_argument(
+        "--drop-removed", action="store_true", help="drop graphs of removed sources"
+    )
+    parser.add_argument("--sources-dir", default=SOURCES_DIR)
+    parser.add_argument("--graph-cfg", default=GRAPH_CFG)
+    parser.add_argument("--state", help="fingerprint state file")
+    args = parser.parse_args()
+
+    path = args.state or state_path(args.graph_cfg)
+    state = load_state(path)
+    current, changed, removed = plan(
+        state, args.sources_dir, args.graph_cfg, parse_pairs(args.raw)
+    )
+    url, headers = store_url(args.graph_cfg), store_headers(args.graph_cfg)
+
+    built = set(args.record or [])
+    if args.load:
+        from slime.load import load_all
+
+        jobs = parse_pairs(args.load)
+        load_all(jobs, url=url, headers=headers, graph_cfg=args.graph_cfg)
+        built.update(jobs)
+    for source_id in built:
+        state[source_id] = current[source_id]
+        changed.pop(source_id, None)
+    if args.drop_removed:
+        for source_id in removed:
+            drop_graph(url, graph_iri(source_id, args.graph_cfg), headers)
+            state.pop(source_id)
+        removed = []
+    save_state(path, state)
+
+    for source_id, components in sorted(changed.items()):
+        print(f"{source_id}\t{','.join(components)}", file=sys.stdout)
+    for source_id in removed:
+        print(f"{source_id}\tremoved", file=sys.stdout)
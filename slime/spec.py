@@ -0,0 +1,310 @@
+"""Declarative cleansing of sources, from their ``[transform.cleanse]`` spec.
+
+Most cleaners read a table, then select, rename and filter columns, split a
+label column on a delimiter and explode it, recode values through a dict or
+melt wide columns to long. Rather than in a clean.py function, a source can
+declare these operations next to inteGraph's ``script`` key:
+
+    [transform.cleanse]
+    script="clean.py"
+    read={"sep": "\\t", "encoding_errors": "replace"}
+    steps=[
+        {"replace": {"Feeding_guild": ["[()]", ""]}},
+        {"split": {"Feeding_guild": "-"}},
+        {"map": {"Feeding_guild": {"h": "herbivore", "c": "carnivore"}}}]
+
+``read`` holds the keyword arguments of ``pd.read_csv``, or of
+:func:`slime.excel.read_excel` with ``"format": "excel"``. ``steps`` is a
+JSON list of operations applied in order, each an object with one key:
+
+``select`` [columns]
+    keep these columns, in the order of the table
+``rename`` {column: name} or [names]
+    rename some columns, or all of them by position
+``keep``, ``drop`` {column: [values]}
+    keep or drop the rows whose value is listed
+``dropna`` [columns]
+    drop the rows missing a value in one of the columns
+``copy`` {new: column}, ``format`` {new: template}
+    add a copy of a column, or the concatenation of columns and text of a
+    template such as ``"{Genus} {Species}"``
+``astype`` {column: dtype}
+    convert a column, e.g. to ``"str"``
+``replace`` {column: [pattern, replacement]}
+    substitute a regular expression
+``extract`` {new: [column, pattern]}
+    the group of a regular expression with one group
+``slice`` {column: [start, stop]}
+    characters of the values, e.g. ``[null, -4]`` drops the last four
+``str`` {column: method}
+    one of strip, lower, upper, capitalize and title
+``split`` {column: separator}
+    split the values on a literal separator and give each item its own row
+``map``, ``recode`` {column: {value: new}}
+    replace values; ``map`` empties the values not listed, ``recode``
+    keeps them
+``melt`` {"columns": {column: label}, "var_name": ..., "value_name": ...}
+    one row per listed column, with its label in ``var_name``
+
+Specs are compiled once into a plan of vectorized column operations on a
+single frame: a leading ``select`` is read with ``usecols``, consecutive
+row filters are fused into one mask applied once, and columns are renamed
+in place. The plan is called like a ``clean`` function, and the plans of
+CSV sources without ``melt`` also work chunk by chunk (see
+:mod:`slime.cleanse`). Anything else (several sheets joined together,
+deduplication...) stays in a clean.py script.
+"""
+
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from slime.cleanse import read_source_config
+from slime.triplify import split_template
+
+STR_METHODS = {"strip", "lower", "upper", "capitalize", "title"}
+
+
+class InvalidSpec(ValueError):
+    pass
+
+
+def select(df, columns):
+    wanted = set(columns)
+    return df.drop(columns=[c for c in df.columns if c not in wanted])
+
+
+def rename(df, names):
+    if isinstance(names, list):
+        if len(names) != len(df.columns):
+            raise InvalidSpec(f"{len(names)} names for {len(df.columns)} columns")
+        df.columns = names
+    else:
+        df.columns = [names.get(c, c) for c in df.columns]
+    return df
+
+
+def filter_rows(df, conditions):
+    mask = None
+    for kind, column, values in conditions:
+        if kind == "keep":
+            selected = df[column].isin(values)
+        elif kind == "drop":
+            selected = ~df[column].isin(values)
+        else:
+            selected = df[column].notna()
+        mask = selected if mask is None else mask & selected
+    # take() returns a frame of its own, which later steps can assign to
+    return df.take(np.flatnonzero(mask.to_numpy()))
+
+
+def copy(df, columns):
+    for new, column in columns.items():
+        df[new] = df[column]
+    return df
+
+
+def format_columns(df, templates):
+    for new, parts in templates.items():
+        values = None
+        for kind, piece in parts:
+            value = df[piece] if kind == "col" else piece
+            values = value if values is None else values + value
+        df[new] = values
+    return df
+
+
+def astype(df, dtypes):
+    for column, dtype in dtypes.items():
+        df[column] = df[column].astype(dtype)
+    return df
+
+
+def replace(df, patterns):
+    for column, (pattern, replacement) in patterns.items():
+        df[column] = df[column].str.replace(pattern, replacement, regex=True)
+    return df
+
+
+def extract(df, patterns):
+    for new, (column, pattern) in patterns.items():
+        df[new] = df[column].str.extract(pattern, expand=False)
+    return df
+
+
+def slice_values(df, bounds):
+    for column, (start, stop) in bounds.items():
+        df[column] = df[column].str[start:stop]
+    return df
+
+
+def str_method(df, methods):
+    for column, method in methods.items():
+        df[column] = getattr(df[column].str, method)()
+    return df
+
+
+def split(df, separators):
+    # Each column is exploded in turn, so the rows get every combination
+    for column, separator in separators.items():
+        df[column] = df[column].str.split(separator, regex=False)
+        df = df.explode(column)
+    return df
+
+
+def map_values(df, mappings):
+    for column, mapping in mappings.items():
+        df[column] = df[column].map(mapping)
+    return df
+
+
+def recode(df, mappings):
+    for column, mapping in mappings.items():
+        df[column] = df[column].replace(mapping)
+    return df
+
+
+def melt(df, spec):
+    labels = spec["columns"]
+    df = df.melt(
+        id_vars=[c for c in df.columns if c not in labels],
+        value_vars=list(labels),
+        var_name=spec["var_name"],
+        value_name=spec["value_name"],
+    )
+    df[spec["var_name"]] = df[spec["var_name"]].map(labels)
+    return df
+
+
+FILTERS = {"keep", "drop", "dropna"}
+OPERATIONS = {
+    "select": select,
+    "rename": rename,
+    "copy": copy,
+    "format": format_columns,
+    "astype": astype,
+    "replace": replace,
+    "extract": extract,
+    "slice": slice_values,
+    "str": str_method,
+    "split": split,
+    "map": map_values,
+    "recode": recode,
+    "melt": melt,
+}
+
+
+def check(condition, message):
+    if not condition:
+        raise InvalidSpec(message)
+
+
+def compile_step(name, args):
+    """Validate the arguments of a step; return them in the form its function takes."""
+    if name in ("select", "dropna"):
+        check(isinstance(args, list), f"{name} takes a list of columns")
+        return args
+    if name == "rename":
+        check(isinstance(args, (list, dict)), "rename takes a dict or a list")
+        return args
+    if name == "melt":
+        check(
+            isinstance(args, dict)
+            and isinstance(args.get("columns"), dict)
+            and {"var_name", "value_name"} <= set(args),
+            "melt takes columns, var_name and value_name",
+        )
+        return args
+    check(isinstance(args, dict), f"{name} takes an object")
+    if name in ("keep", "drop"):
+        check(all(isinstance(v, list) for v in args.values()), f"{name} needs lists")
+    elif name == "format":
+        return {new: split_template(template) for new, template in args.items()}
+    elif name in ("replace", "slice"):
+        check(
+            all(isinstance(v, list) and len(v) == 2 for v in args.values()),
+            f"{name} takes pairs",
+        )
+    elif name == "extract":
+        for column, pattern in args.values():
+            check(re.compile(pattern).groups == 1, f"{pattern} needs one group")
+    elif name == "str":
+        check(
+            set(args.values()) <= STR_METHODS, f"str methods are {sorted(STR_METHODS)}"
+        )
+    elif name in ("map", "recode"):
+        check(all(isinstance(v, dict) for v in args.values()), f"{name} needs dicts")
+    return args
+
+
+def compile_steps(steps):
+    """Compile the steps of a spec into a list of (function, argument) pairs.
+
+    Consecutive row filters become a single mask.
+    """
+    check(isinstance(steps, list), "steps must be a list")
+    plan = []
+    for step in steps:
+        check(isinstance(step, dict) and len(step) == 1, f"invalid step {step}")
+        [(name, args)] = step.items()
+        check(name in OPERATIONS or name in FILTERS, f"unknown operation {name}")
+        args = compile_step(name, args)
+        if name in FILTERS:
+            if name == "dropna":
+                conditions = [(name, column, None) for column in args]
+            else:
+                conditions = [(name, c, values) for c, values in args.items()]
+            if plan and plan[-1][0] is filter_rows:
+                plan[-1][1].extend(conditions)
+            else:
+                plan.append((filter_rows, conditions))
+        else:
+            plan.append((OPERATIONS[name], args))
+    return plan
+
+
+class CleansePlan:
+    """A compiled spec, called like the ``clean`` function of a clean.py."""
+
+    def __init__(self, source_dir, read=None, steps=()):
+        self.source_dir = Path(source_dir)
+        self.read_options = dict(read or {})
+        self.reader = self.read_options.pop("format", "csv")
+        check(self.reader in ("csv", "excel"), f"unknown format {self.reader}")
+        self.steps = compile_steps(list(steps))
+        if self.reader == "csv" and self.steps and self.steps[0][0] is select:
+            self.read_options["usecols"] = self.steps.pop(0)[1]
+        # Same interface as the clean.py modules that support chunked reads
+        row_local = self.reader == "csv" and all(f is not melt for f, _ in self.steps)
+        self.READ_OPTIONS = self.read_options if row_local else None
+
+    def read(self, f_in):
+        if self.reader == "excel":
+            from slime.excel import read_excel
+
+            return read_excel(f_in, **self.read_options)
+        return pd.read_csv(f_in, **self.read_options)
+
+    def clean_chunk(self, df):
+        for function, args in self.steps:
+            df = function(df, args)
+        return df
+
+    def __call__(self, f_in, **kwargs):
+        return self.clean_chunk(self.read(f_in))
+
+
+def load_spec(source_dir):
+    """Compile the ``[transform.cleanse]`` spec of a source, or return None."""
+    config = read_source_config(Path(source_dir) / "source.cfg")
+    if not config.has_option("transform.cleanse", "steps"):
+        return None
+    section = config["transform.cleanse"]
+    try:
+        read = json.loads(section.get("read", "{}"))
+        return CleansePlan(source_dir, read, json.loads(section["steps"]))
+    except (json.JSONDecodeError, InvalidSpec) as e:
+        raise InvalidSpec(f"{source_dir}/source.cfg: {e}") from e
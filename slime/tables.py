@@ -0,0 +1,189 @@
+"""Read and write cleansed tables as CSV, Parquet or Arrow IPC stream files.
+
+CSV output matches what the clean.py scripts have always written (including
+the pandas index as an unnamed first column). The columnar formats drop the
+index, store numbers with their own Arrow type and dictionary-encode string
+columns, which keeps label-heavy columns (diets, trophic groups, trait names)
+small and lets later stages load them without re-parsing text. Arrow output
+uses the IPC stream format, which allows each chunk to carry its own
+dictionaries.
+
+Columnar files are named with their own suffix (``.parquet``, ``.arrows``)
+and only CSV files keep the name of their raw file, so a file is always
+read in the format its name says.
+"""
+
+from pathlib import Path
+
+FORMATS = {"csv": None, "parquet": ".parquet", "arrow": ".arrows"}
+
+
+def output_name(filename, output_format="csv"):
+    """Return the name of the cleansed file for a raw file name."""
+    suffix = FORMATS[output_format]
+    return Path(filename).name if suffix is None else Path(filename).stem + suffix
+
+
+def format_of(path):
+    suffix = Path(path).suffix
+    return next((fmt for fmt, s in FORMATS.items() if s == suffix), "csv")
+
+
+def arrow_schema(df):
+    """Build the Arrow schema used for a cleansed DataFrame.
+
+    Object, string and categorical columns become dictionary-encoded strings;
+    other columns keep the Arrow type matching their NumPy dtype.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    fields = []
+    for name, dtype in df.dtypes.items():
+        if (
+            isinstance(dtype, pd.CategoricalDtype)
+            or pd.api.types.is_object_dtype(dtype)
+            or pd.api.types.is_string_dtype(dtype)
+        ):
+            type_ = pa.dictionary(pa.int32(), pa.string())
+        else:
+            type_ = pa.from_numpy_dtype(dtype)
+        fields.append(pa.field(str(name), type_))
+    return pa.schema(fields)
+
+
+def to_arrow(df, schema=None):
+    """Convert a DataFrame to an Arrow table, dropping its index."""
+    import pyarrow as pa
+
+    df = df.rename(columns=str)
+    schema = schema or arrow_schema(df)
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            col = df[field.name]
+            # Spreadsheet columns can mix numbers and text
+            df[field.name] = col.where(col.isna(), col.astype(str))
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+class TableWriter:
+    """Write one or more DataFrames to a single CSV, Parquet or Arrow file.
+
+    Every DataFrame written after the first must have the same columns; with
+    columnar formats they are cast to the schema of the first one. When
+    nothing was written, closing writes a table with no rows and the
+    ``columns`` given (as strings), so that every output exists.
+    """
+
+    def __init__(self, path, output_format="csv", columns=None):
+        self.path = Path(path)
+        self.output_format = output_format
+        self.columns = list(columns or [])
+        self.schema = None
+        self._file = None
+        self._writer = None
+
+    def write(self, df):
+        if self.output_format == "csv":
+            header = self._file is None
+            if header:
+                self._file = open(self.path, "w", newline="")
+            df.to_csv(self._file, sep=",", header=header)
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = to_arrow(df, self.schema)
+        if self._writer is None:
+            self.schema = table.schema
+            if self.output_format == "parquet":
+                self._writer = pq.ParquetWriter(self.path, self.schema)
+            else:
+                self._file = pa.OSFile(str(self.path), "wb")
+                self._writer = pa.ipc.new_stream(self._file, self.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._file is None and self._writer is None:
+            import pandas as pd
+
+            self.write(pd.DataFrame(columns=self.columns, dtype=object))
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_table(df, path, output_format="csv"):
+    with TableWriter(path, output_format) as writer:
+        writer.write(df)
+
+
+def iter_table(path, chunksize=100_000):
+    """Yield a table written in any of the supported formats in chunks.
+
+    CSV values are read as the strings they were written as, so that writing
+    the chunks back with :class:`TableWriter` reproduces the same text. A
+    table without rows yields one empty chunk with its columns.
+    """
+    import pandas as pd
+
+    output_format = format_of(path)
+    if output_format == "csv":
+        reader = pd.read_csv(
+            path, index_col=0, chunksize=chunksize, dtype=str, keep_default_na=False
+        )
+        with reader:
+            yield from reader
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if output_format == "parquet":
+        parquet = pq.ParquetFile(path)
+        batches = parquet.iter_batches(batch_size=chunksize)
+        yield from _chunks(batches, parquet.schema_arrow)
+        return
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_stream(source)
+        yield from _chunks(reader, reader.schema)
+
+
+def _chunks(batches, schema):
+    empty = True
+    for batch in batches:
+        empty = False
+        yield batch.to_pandas()
+    if empty:
+        yield schema.empty_table().to_pandas()
+
+
+def read_table(path, columns=None):
+    """Load a cleansed table written in any of the supported formats.
+
+    Dictionary-encoded columns are returned as pandas categoricals. Arrow
+    files are memory-mapped rather than read into memory.
+    """
+    import pandas as pd
+
+    output_format = format_of(path)
+    if output_format == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    if output_format == "arrow":
+        import pyarrow as pa
+
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_stream(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        return table.to_pandas()
+    df = pd.read_csv(path, index_col=0)
+    return df if columns is None else df[columns]
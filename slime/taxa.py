@@ -0,0 +1,440 @@
+"""Persistent taxon-name resolution cache shared by all sources.
+
+The taxonomy annotators resolve the same names (prey names especially) in
+many sources. :func:`resolve_names` deduplicates the names of a chunk,
+answers what it can from a SQLite cache keyed by normalized name, target
+taxonomy and synonym policy, and only sends the remaining names to the
+resolver. Entries older than the TTL are resolved again. Rank filters
+(``filter_on_ranks``) are applied to the cached lineages after lookup, so
+they do not split the cache. Targets with an offline backbone (see
+:mod:`slime.backbone`) are resolved locally instead.
+
+This module warms the cache and reports hit rates and the taxa each source
+resolves to (``taxa.csv``). inteGraph's annotate stage does not read either:
+it still resolves names with its own annotators, and wiring these results
+into annotation is out of scope.
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import urllib.request
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+from slime import metrics
+from slime.cache import CACHE_ROOT
+from slime.cleanse import SOURCES_DIR, read_chunksize, read_source_config
+from slime.tables import read_table
+
+CACHE_PATH = CACHE_ROOT / "taxa.sqlite"
+TTL = float(os.environ.get("SLIME_TAXA_TTL_DAYS", 30)) * 86400
+
+VERIFIER_URL = "https://verifier.globalnames.org/api/v1/verifications"
+# Global Names data source ids of the annotators' targets
+DATA_SOURCES = {"NCBI": 4, "IF": 5, "GBIF": 11, "OTT": 179}
+BATCH_SIZE = 1000
+TIMEOUT = 60
+# Decoded entries kept in memory by a TaxonCache
+MEMO_SIZE = 200_000
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_names(names):
+    """Collapse whitespace and case so that spelling variants share a key."""
+    return (
+        pd.Series(list(names), dtype=object)
+        .dropna()
+        .astype(str)
+        .str.replace(_SPACES, " ", regex=True)
+        .str.strip()
+        .str.lower()
+    )
+
+
+def new_stats():
+    return {"lookups": 0, "hits": 0, "misses": 0, "time_saved": 0.0, "time_spent": 0.0}
+
+
+def hit_rate(stats):
+    return stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+
+
+class TaxonCache:
+    """SQLite store of resolutions, one row per (name, target, synonym policy).
+
+    ``result`` is the JSON-encoded match, or null for names the resolver
+    did not find, so that unknown names are not looked up again either.
+    ``elapsed`` is the time it took to resolve the name, which is what a
+    later hit saves. Entries read or written are also kept decoded in
+    memory, since the chunks of a source share most of their names.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            " name TEXT NOT NULL, target TEXT NOT NULL, synonym INTEGER NOT NULL,"
+            " result TEXT, elapsed REAL NOT NULL, resolved_at REAL NOT NULL,"
+            " PRIMARY KEY (name, target, synonym))"
+        )
+        self.memo = {}
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_many(self, names, target, include_synonym):
+        """Return {name: (result, elapsed)} for the fresh entries of ``names``."""
+        found = {}
+        oldest = time.time() - self.ttl
+        memo = self.memo.setdefault((target, bool(include_synonym)), {})
+        names = list(names)
+        unknown = []
+        for name in names:
+            entry = memo.get(name)
+            if entry is not None and entry[2] >= oldest:
+                found[name] = entry[:2]
+            else:
+                unknown.append(name)
+        for i in range(0, len(unknown), 500):
+            batch = unknown[i : i + 500]
+            rows = self.db.execute(
+                "SELECT name, result, elapsed, resolved_at FROM resolutions"
+                f" WHERE target = ? AND synonym = ? AND resolved_at >= ?"
+                f" AND name IN ({','.join('?' * len(batch))})",
+                [target, int(include_synonym), oldest, *batch],
+            )
+            for name, result, elapsed, resolved_at in rows:
+                found[name] = (json.loads(result) if result else None, elapsed)
+                self.remember(memo, name, found[name], resolved_at)
+        return found
+
+    def remember(self, memo, name, entry, resolved_at):
+        if sum(map(len, self.memo.values())) >= MEMO_SIZE:
+            for table in self.memo.values():
+                table.clear()
+        memo[name] = (*entry, resolved_at)
+
+    def put_many(self, results, target, include_synonym, elapsed):
+        now = time.time()
+        memo = self.memo.setdefault((target, bool(include_synonym)), {})
+        for name, result in results.items():
+            self.remember(memo, name, (result, elapsed), now)
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        name,
+                        target,
+                        int(include_synonym),
+                        json.dumps(result) if result else None,
+                        elapsed,
+                        now,
+                    )
+                    for name, result in results.items()
+                ],
+            )
+
+    def purge(self):
+        """Delete expired entries and return how many were removed."""
+        with self.db:
+            cursor = self.db.execute(
+                "DELETE FROM resolutions WHERE resolved_at < ?",
+                (time.time() - self.ttl,),
+            )
+        return cursor.rowcount
+
+
+def verify_names(names, target, include_synonym, timeout=TIMEOUT):
+    """Resolve names against one taxonomy with the Global Names verifier.
+
+    Returns {name: match} where match has the taxon ``id`` (prefixed with the
+    target), the matched and current names and the lineage; names without a
+    match are left out.
+    """
+    body = json.dumps(
+        {
+            "nameStrings": [name.capitalize() for name in names],
+            "dataSources": [DATA_SOURCES[target]],
+            "withAllMatches": False,
+        }
+    ).encode()
+    request = urllib.request.Request(
+        VERIFIER_URL, data=body, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = json.load(response)
+    matches = {}
+    for name, item in zip(names, payload.get("names", [])):
+        best = item.get("bestResult")
+        if not best or (best.get("isSynonym") and not include_synonym):
+            continue
+        matches[name] = {
+            "id": f"{target}:{best['currentRecordId']}",
+            "matched_name": best.get("matchedCanonicalSimple"),
+            "current_name": best.get("currentCanonicalSimple"),
+            "rank": (best.get("classificationRanks") or "").split("|")[-1] or None,
+            "lineage": best.get("classificationPath"),
+        }
+    return matches
+
+
+def resolve_names(
+    names,
+    target,
+    include_synonym=True,
+    cache=None,
+    resolver=verify_names,
+    stats=None,
+    batch_size=BATCH_SIZE,
+    normalized=False,
+):
+    """Resolve ``names`` against ``target`` and return {normalized name: match}.
+
+    Names are normalized and deduplicated first, unless ``normalized`` says
+    they already are; only names missing from the cache (or expired) are
+    passed to ``resolver(names, target, include_synonym)``, in batches of
+    ``batch_size``. ``stats`` is updated with hits, misses, and the time
+    spent and saved.
+    """
+    if normalized:
+        unique = list(names)
+    else:
+        unique = normalize_names(names).unique().tolist()
+    stats = stats if stats is not None else new_stats()
+    stats["lookups"] += len(unique)
+    if cache is None:
+        cached = {}
+    else:
+        cached = cache.get_many(unique, target, include_synonym)
+    stats["hits"] += len(cached)
+    stats["time_saved"] += sum(elapsed for _, elapsed in cached.values())
+    resolved = {name: result for name, (result, _) in cached.items()}
+
+    missing = [name for name in unique if name not in cached]
+    stats["misses"] += len(missing)
+    for i in range(0, len(missing), batch_size):
+        batch = missing[i : i + batch_size]
+        start = time.perf_counter()
+        matches = resolver(batch, target, include_synonym)
+        elapsed = time.perf_counter() - start
+        results = {name: matches.get(name) for name in batch}
+        if cache is not None:
+            cache.put_many(results, target, include_synonym, elapsed / len(batch))
+        stats["time_spent"] += elapsed
+        resolved.update(results)
+    return resolved
+
+
+@lru_cache(maxsize=4096)
+def lineage_names(lineage):
+    return frozenset(n.strip().lower() for n in (lineage or "").split("|"))
+
+
+def in_ranks(match, ranks):
+    if not ranks:
+        return True
+    lineage = lineage_names(match.get("lineage"))
+    return any(rank.lower() in lineage for rank in ranks)
+
+
+def resolve_column(
+    values, targets, include_synonym=True, ranks=None, backbones=None, **kwargs
+):
+    """Return the first match of each value among ``targets``, in order.
+
+    Each target is only queried for the names the previous ones did not
+    resolve. Targets of ``backbones`` ({target: Backbone}) are resolved
+    offline. Values without a match map to None.
+    """
+    values = pd.Series(values)
+    stats = kwargs.get("stats")
+    keys = normalize_names(values).set_axis(values.dropna().index)
+    keys = keys.reindex(values.index)
+    pending = set(keys.dropna())
+    found = {}
+    for target in targets:
+        if not pending:
+            break
+        if backbones and target in backbones:
+            found.update(
+                resolve_offline(
+                    pending, backbones[target], include_synonym, ranks, stats
+                )
+            )
+            pending -= found.keys()
+            continue
+        matches = resolve_names(
+            pending, target, include_synonym, normalized=True, **kwargs
+        )
+        for name, match in matches.items():
+            if match and in_ranks(match, ranks):
+                found[name] = match
+        pending -= found.keys()
+    return keys.map(found)
+
+
+def resolve_offline(names, backbone, include_synonym=True, ranks=None, stats=None):
+    """Resolve normalized names against a backbone; rank filters included.
+
+    Names that match count as hits in ``stats``, the others as misses.
+    """
+    names = list(names)
+    matches = backbone.matches(names, include_synonym, ranks)
+    if stats is not None:
+        stats["lookups"] += len(names)
+        stats["hits"] += len(matches)
+        stats["misses"] += len(names) - len(matches)
+    return matches
+
+
+def parse_ranks(value):
+    """Parse ``filter_on_ranks``: a JSON list, or one name, quoted or not."""
+    try:
+        ranks = json.loads(value)
+    except json.JSONDecodeError:
+        ranks = value.strip()
+    if isinstance(ranks, str):
+        return [ranks] if ranks else []
+    return list(ranks)
+
+
+def taxon_annotations(source_dir):
+    """Return (column, annotator options) for the taxonomy annotations of a source."""
+    config = read_source_config(Path(source_dir) / "source.cfg")
+    annotations = []
+    for section in config.sections():
+        if not section.startswith("transform.annotate."):
+            continue
+        label = config.get(section, "label", fallback=None)
+        for name in json.loads(config.get(section, "annotators", fallback="[]")):
+            annotator = f"annotators.{name}"
+            if config.get(annotator, "type", fallback=None) != "taxonomy":
+                continue
+            options = {
+                "targets": json.loads(config.get(annotator, "targets", fallback="[]")),
+                "include_synonym": config.getboolean(
+                    annotator, "include_synonym", fallback=True
+                ),
+                "ranks": parse_ranks(
+                    config.get(annotator, "filter_on_ranks", fallback="[]")
+                ),
+            }
+            annotations.append((label, options))
+    return annotations
+
+
+def resolve_source(source_id, filepath, cache, sources_dir=SOURCES_DIR, **kwargs):
+    """Resolve every taxonomy-annotated column of a cleansed table.
+
+    Columns are resolved ``[transform] chunksize`` rows at a time. Returns
+    the source's stats and a table of the distinct names of each column with
+    the id and current name they resolved to.
+    """
+    with metrics.stage(source_id, "annotate") as record:
+        df = read_table(filepath)
+        stats, taxa = resolve_table(Path(sources_dir) / source_id, df, cache, **kwargs)
+        record.update(
+            rows_in=len(df),
+            rows_out=len(taxa),
+            lookups=stats["lookups"],
+            cache_hits=stats["hits"],
+            cache_misses=stats["misses"],
+        )
+    return stats, taxa
+
+
+def match_field(matches, field):
+    """Return one field of each match, None where a value did not resolve."""
+    # Not .str.get: a chunk without any match is an all-NaN float Series
+    return matches.map(lambda m: m.get(field) if isinstance(m, dict) else None)
+
+
+def resolve_table(source_dir, df, cache, **kwargs):
+    step = read_chunksize(source_dir) or max(len(df), 1)
+    stats = new_stats()
+    tables = []
+    for column, options in taxon_annotations(source_dir):
+        if column not in df:
+            continue
+        for i in range(0, len(df), step):
+            names = df[column].iloc[i : i + step].dropna().drop_duplicates()
+            matches = resolve_column(
+                names, cache=cache, stats=stats, **options, **kwargs
+            )
+            tables.append(
+                pd.DataFrame(
+                    {
+                        "column": column,
+                        "name": names.values,
+                        "taxon_id": match_field(matches, "id"),
+                        "current_name": match_field(matches, "current_name"),
+                    }
+                )
+            )
+    if not tables:
+        return stats, pd.DataFrame(
+            columns=["column", "name", "taxon_id", "current_name"]
+        )
+    taxa = pd.concat(tables)
+    return stats, taxa.drop_duplicates(["column", "name"], ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Resolve the taxon names of cleansed tables through the cache."
+    )
+    parser.add_argument("jobs", nargs="+", help="<source_id>=<cleansed table>")
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--sources-dir", default=SOURCES_DIR)
+    parser.add_argument("--outputdir", help="write <source_id>/taxa.csv files")
+    parser.add_argument("--purge", action="store_true", help="drop expired entries")
+    parser.add_argument(
+        "--backbone-dir",
+        help="resolve the targets built there by slime.backbone offline",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+    kwargs = {}
+    if args.backbone_dir:
+        from slime.backbone import load_backbones
+
+        kwargs["backbones"] = load_backbones(args.backbone_dir)
+
+    with TaxonCache(args.cache) as cache:
+        if args.purge:
+            cache.purge()
+        print("source\tlookups\thit_rate\ttime_spent\ttime_saved")
+        for job in args.jobs:
+            source_id, filepath = job.split("=", 1)
+            stats, taxa = resolve_source(
+                source_id, filepath, cache, sources_dir=args.sources_dir, **kwargs
+            )
+            print(
+                f"{source_id}\t{stats['lookups']}\t{hit_rate(stats):.1%}"
+                f"\t{stats['time_spent']:.1f}s\t{stats['time_saved']:.1f}s",
+                file=sys.stdout,
+            )
+            if args.outputdir:
+                out = Path(args.outputdir) / source_id / "taxa.csv"
+                out.parent.mkdir(parents=True, exist_ok=True)
+                taxa.to_csv(out, index=False)
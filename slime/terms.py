@@ -0,0 +1,261 @@
+"""Compiled term index for the YAMLMap and YAMLTaxonMap annotators.
+
+The ``mapping.yml`` (trait terms) and ``taxon_mapping.yml`` (taxon names)
+files of all sources are compiled into one index keyed by normalized term
+(case, whitespace, ``_`` and ``-`` are ignored), so that ``Dead organic
+material`` and ``dead organic material`` share one entry. Terms and taxa
+are kept apart, and the entries of each source are kept as its own table:
+mapping a source's column only uses its own file, like its annotator, and a
+label that only another source maps stays unmapped. The terms of all
+sources are also merged, keeping the IRI most files agree on. Labels mapped
+to different IRIs are reported as conflicts, whether by several sources or
+by variants of one label in the same file.
+
+The index is stored as an Arrow IPC file and rebuilt when a mapping file
+changes. :func:`map_terms` looks up a whole column at once.
+"""
+
+import argparse
+import hashlib
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from slime.cache import CACHE_ROOT
+from slime.cleanse import SOURCES_DIR
+
+INDEX_PATH = CACHE_ROOT / "terms.arrow"
+INDEX_FORMAT = "2"
+# The kind of labels of each mapping file
+MAPPING_FILES = {"mapping.yml": "term", "taxon_mapping.yml": "taxon"}
+
+_SEPARATORS = re.compile(r"[\s_-]+")
+
+
+def normalize_terms(values):
+    return (
+        pd.Series(values, dtype=object)
+        .astype(str)
+        .str.replace(_SEPARATORS, " ", regex=True)
+        .str.strip()
+        .str.casefold()
+    )
+
+
+def mapping_files(sources_dir=SOURCES_DIR):
+    return sorted(
+        path for name in MAPPING_FILES for path in Path(sources_dir).glob(f"*/{name}")
+    )
+
+
+def mapping_digest(paths):
+    # Indexes of another layout are rebuilt too
+    digest = hashlib.sha256(INDEX_FORMAT.encode())
+    for path in map(Path, paths):
+        digest.update(f"{path.parent.name}/{path.name}".encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def read_entries(paths, sources_dir=SOURCES_DIR):
+    """Return one row per (source, file, kind, term, normalized key, IRI).
+
+    Terms mapped to nothing (``term:`` with an empty value) are dropped.
+    """
+    columns = ["source", "file", "kind", "term", "iri", "key"]
+    frames = []
+    for path in paths:
+        with open(path) as f:
+            mapping = yaml.safe_load(f) or {}
+        entries = {k: v for k, v in mapping.items() if v is not None}
+        if not entries:
+            continue
+        frames.append(
+            pd.DataFrame(
+                {
+                    "source": path.parent.name,
+                    "file": path.name,
+                    "kind": MAPPING_FILES[path.name],
+                    "term": [str(k) for k in entries],
+                    "iri": [str(v).strip() for v in entries.values()],
+                }
+            )
+        )
+    if not frames:
+        return pd.DataFrame(columns=columns, dtype=object)
+    df = pd.concat(frames, ignore_index=True)
+    df["key"] = normalize_terms(df["term"]).values
+    return df[columns]
+
+
+def compile_index(entries):
+    """Split mapping entries into per-source tables, a merged table and conflicts.
+
+    Within a source, the first variant of a key in its file is kept; across
+    sources the IRI used by the most sources wins in the merged table (ties
+    are broken by IRI order). The conflicts table lists the entries of every
+    key mapped to several IRIs, with ``scope`` "source" for the entries of a
+    source that maps the key to several IRIs itself and "sources" for the
+    others.
+    """
+    per_source = entries.drop_duplicates(["source", "kind", "key"])[
+        ["source", "kind", "key", "iri"]
+    ].reset_index(drop=True)
+    votes = (
+        entries.drop_duplicates(["source", "kind", "key", "iri"])
+        .groupby(["kind", "key", "iri"])
+        .size()
+        .rename("votes")
+        .reset_index()
+    )
+    merged = (
+        votes.sort_values(
+            ["kind", "key", "votes", "iri"], ascending=[True, True, False, True]
+        )
+        .drop_duplicates(["kind", "key"])[["kind", "key", "iri"]]
+        .reset_index(drop=True)
+    )
+
+    conflicting = votes[votes.duplicated(["kind", "key"])][["kind", "key"]]
+    conflicts = (
+        entries.merge(conflicting.drop_duplicates(), on=["kind", "key"])
+        .sort_values(["kind", "key", "iri", "source", "term"])
+        .reset_index(drop=True)
+    )
+    n_iris = conflicts.groupby(["source", "kind", "key"])["iri"].transform("nunique")
+    conflicts["scope"] = np.where(n_iris > 1, "source", "sources")
+    return merged, per_source, conflicts
+
+
+def write_index(path, merged, per_source, digest):
+    import pyarrow as pa
+
+    df = pd.concat([merged.assign(source=""), per_source], ignore_index=True)
+    table = pa.table(
+        {
+            "source": pa.array(df["source"].tolist(), pa.string()),
+            "kind": pa.array(df["kind"].tolist(), pa.string()).dictionary_encode(),
+            "key": pa.array(df["key"].tolist(), pa.string()),
+            "iri": pa.array(df["iri"].tolist(), pa.string()).dictionary_encode(),
+        }
+    ).replace_schema_metadata({"digest": digest})
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    tmp.replace(path)
+
+
+def index_digest(path):
+    """Return the digest of the files a compiled index was built from."""
+    import pyarrow as pa
+
+    with pa.memory_map(str(path)) as source:
+        schema = pa.ipc.open_file(source).schema
+    return (schema.metadata or {}).get(b"digest", b"").decode()
+
+
+def read_index(path):
+    """Load a compiled index and the digest of the files it was built from."""
+    import pyarrow as pa
+
+    with pa.memory_map(str(path)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    digest = (table.schema.metadata or {}).get(b"digest", b"").decode()
+    return TermIndex(table.to_pandas()), digest
+
+
+class TermIndex:
+    """Normalized label → IRI lookups, per source or merged, per kind."""
+
+    def __init__(self, df):
+        self.tables = {
+            (source, kind): pd.Series(
+                group["iri"].astype(object).values, index=pd.Index(group["key"])
+            )
+            for (source, kind), group in df.groupby(
+                ["source", df["kind"].astype(str)], sort=False
+            )
+        }
+
+    def __len__(self):
+        return sum(len(t) for (source, _), t in self.tables.items() if not source)
+
+    def lookup(self, keys, source=None, kind="term"):
+        """Return the IRIs of ``keys`` (None when unmapped).
+
+        With ``source``, only its own mapping file of that kind is used.
+        """
+        table = self.tables.get((source or "", kind))
+        if table is None:
+            return np.full(len(keys), None, dtype=object)
+        positions = table.index.get_indexer(keys)
+        return np.where(positions >= 0, table.values[positions], None)
+
+
+def build_index(path=INDEX_PATH, sources_dir=SOURCES_DIR):
+    """Compile every mapping file into ``path``; return the conflicts table."""
+    paths = mapping_files(sources_dir)
+    merged, per_source, conflicts = compile_index(read_entries(paths, sources_dir))
+    write_index(path, merged, per_source, mapping_digest(paths))
+    return conflicts
+
+
+@lru_cache(maxsize=None)
+def load_index(path=INDEX_PATH, sources_dir=SOURCES_DIR):
+    """Return the compiled index, rebuilding it if a mapping file changed."""
+    digest = mapping_digest(mapping_files(sources_dir))
+    if not Path(path).exists() or index_digest(path) != digest:
+        build_index(path, sources_dir)
+    return read_index(path)[0]
+
+
+def map_terms(values, source=None, kind="term", index=None):
+    """Map a column of labels to IRIs; unmapped labels give None.
+
+    ``kind`` is "term" for the labels of mapping.yml and "taxon" for the
+    names of taxon_mapping.yml. With ``source``, only the source's own file
+    is used, as by its annotator; without, the merged mappings of all
+    sources.
+    """
+    if index is None:
+        index = load_index()
+    values = pd.Series(values)
+    notna = values.notna().to_numpy()
+    found = np.full(len(values), None, dtype=object)
+    # Look each distinct label up once
+    codes, uniques = pd.factorize(values[notna])
+    found[notna] = index.lookup(normalize_terms(uniques), source, kind)[codes]
+    return pd.Series(found, index=values.index, name=values.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compile all mapping.yml files into one term index."
+    )
+    parser.add_argument("--output", default=INDEX_PATH)
+    parser.add_argument("--sources-dir", default=SOURCES_DIR)
+    parser.add_argument("--conflicts", help="write the conflicts report as CSV")
+    args = parser.parse_args()
+
+    conflicts = build_index(args.output, args.sources_dir)
+    index, _ = read_index(args.output)
+    n_conflicts = len(conflicts.drop_duplicates(["kind", "key"]))
+    within = conflicts[conflicts["scope"] == "source"]
+    n_within = len(within.drop_duplicates(["source", "kind", "key"]))
+    print(
+        f"{len(index)} terms, {n_conflicts} conflicts"
+        f" ({n_within} within a source's own file)"
+    )
+    if args.conflicts:
+        conflicts.to_csv(args.conflicts, index=False)
+    else:
+        columns = ["kind", "key", "iri", "source", "term", "scope"]
+        conflicts[columns].to_csv(sys.stdout, index=False)
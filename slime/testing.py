@@ -0,0 +1,461 @@
+"""In-process stand-ins for the GraphDB repository and the source APIs.
+
+:class:`StandInStore` serves the part of the SPARQL 1.1 Graph Store protocol
+and Update language (``INSERT DATA``/``DELETE DATA`` on one graph, graph
+management operations) the loaders use, at the same paths as GraphDB
+(``/repositories/<id>/rdf-graphs/service`` and ``/repositories/<id>/statements``).
+Graphs are kept as sets of N-Triples statements, one per line, so it only
+accepts line-based N-Triples. Like a real store, it scopes blank node labels
+to the request that sent them: ``_:b`` sent twice becomes two nodes.
+``fail_every`` makes every n-th Graph Store
+upload answer 503 (``drop_every`` closes the connection instead) to check
+retries and resumption.
+
+    with StandInStore() as store:
+        load_all(jobs, url=store.url)
+        assert store.graphs["https://purl.slime.org/betsi"]
+
+:class:`StandInAPI` serves a table as CSV pages, like the GloBI API and a
+SPARQL endpoint, to exercise :mod:`slime.api`; :class:`StandInGloBI` answers
+the per-taxon queries of the globi_* sources from the records of a dump.
+:class:`StandInFiles` serves files like a dataset host, to exercise
+:mod:`slime.download`.
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from slime.load import rename_blank_nodes
+
+_GRAPH = r"(?:GRAPH\s+)?<([^>]*)>"
+_DROP = re.compile(rf"(DROP|CLEAR)\s+(?:SILENT\s+)?{_GRAPH}", re.I)
+_DATA = re.compile(
+    rf"\s*(INSERT|DELETE)\s+DATA\s*{{\s*GRAPH\s+<([^>]*)>\s*{{(.*)}}\s*}}\s*",
+    re.I | re.S,
+)
+_TRANSFER = re.compile(
+    rf"(MOVE|COPY|ADD)\s+(?:SILENT\s+)?{_GRAPH}\s+TO\s+{_GRAPH}", re.I
+)
+
+
+def parse_ntriples(text, scope=""):
+    """Parse statements, prefixing blank node labels with the request ``scope``."""
+    statements = set()
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            line = line[:-1].rstrip() if line.endswith(".") else line
+            statements.add(
+                rename_blank_nodes(line, lambda label: f"_:{scope}{label[2:]}")
+            )
+    return statements
+
+
+class StandInStore:
+    """A Graph Store served by a thread of this process."""
+
+    def __init__(self, repository="slime", fail_every=0, drop_every=0):
+        self.repository = repository
+        self.graphs = {}
+        self.fail_every = fail_every
+        self.drop_every = drop_every
+        self.requests = {}
+        self.uploads = 0
+        self.scopes = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/repositories/{self.repository}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def update(self, query):
+        """Apply a SPARQL update: one INSERT DATA/DELETE DATA on a graph, or
+        DROP/CLEAR/MOVE/COPY/ADD operations."""
+        data = _DATA.fullmatch(query)
+        with self.lock:
+            if data:
+                op, graph, body = data.groups()
+                self.scopes += 1
+                statements = parse_ntriples(body, f"r{self.scopes}")
+                if op.upper() == "INSERT":
+                    self.graphs.setdefault(graph, set()).update(statements)
+                elif "_:" in body and statements != parse_ntriples(body):
+                    raise ValueError("blank nodes are not allowed in DELETE DATA")
+                elif graph in self.graphs:
+                    self.graphs[graph] -= statements
+                return
+            for operation in filter(str.strip, query.split(";")):
+                match = _DROP.fullmatch(operation.strip())
+                if match:
+                    self.graphs.pop(match.group(2), None)
+                    continue
+                match = _TRANSFER.fullmatch(operation.strip())
+                if match is None:
+                    raise ValueError(f"unsupported update: {operation.strip()}")
+                op, source, target = match.groups()
+                if source == target:
+                    continue
+                statements = self.graphs.get(source, set())
+                if op.upper() == "ADD":
+                    self.graphs.setdefault(target, set()).update(statements)
+                else:
+                    self.graphs[target] = set(statements)
+                if op.upper() == "MOVE":
+                    self.graphs.pop(source, None)
+
+    def handler(self):
+        store = self
+        prefix = f"/repositories/{self.repository}"
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def body(self):
+                data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    data = gzip.decompress(data)
+                return data.decode("utf-8")
+
+            def reply(self, status, content=b"", content_type="text/plain"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def graph_store(self, method):
+                url = urlsplit(self.path)
+                if url.path == f"{prefix}/statements" and method == "POST":
+                    try:
+                        store.update(self.body())
+                    except ValueError as e:
+                        return self.reply(400, str(e).encode())
+                    return self.reply(204)
+                if url.path != f"{prefix}/rdf-graphs/service":
+                    return self.reply(404)
+                graph = parse_qs(url.query).get("graph", [None])[0]
+                if graph is None:
+                    return self.reply(400, b"graph parameter is required")
+                if method in ("PUT", "POST"):
+                    text = self.body()
+                    with store.lock:
+                        store.uploads += 1
+                        n = store.uploads
+                    if store.drop_every and n % store.drop_every == 0:
+                        self.close_connection = True
+                        return self.connection.shutdown(2)
+                    if store.fail_every and n % store.fail_every == 0:
+                        return self.reply(503, b"try again")
+                    with store.lock:
+                        store.scopes += 1
+                        statements = parse_ntriples(text, f"r{store.scopes}")
+                        if method == "PUT":
+                            store.graphs[graph] = statements
+                        else:
+                            store.graphs.setdefault(graph, set()).update(statements)
+                    return self.reply(204)
+                with store.lock:
+                    if graph not in store.graphs:
+                        return self.reply(404)
+                    if method == "DELETE":
+                        del store.graphs[graph]
+                        return self.reply(204)
+                    text = "".join(f"{s} .\n" for s in store.graphs[graph])
+                return self.reply(200, text.encode(), "application/n-triples")
+
+            def dispatch(self, method):
+                with store.lock:
+                    store.requests[method] = store.requests.get(method, 0) + 1
+                self.graph_store(method)
+
+            def do_GET(self):
+                self.dispatch("GET")
+
+            def do_PUT(self):
+                self.dispatch("PUT")
+
+            def do_POST(self):
+                self.dispatch("POST")
+
+            def do_DELETE(self):
+                self.dispatch("DELETE")
+
+        return Handler
+
+
+_LIMIT = re.compile(r"\bLIMIT\s+(\d+)\s+OFFSET\s+(\d+)\s*$", re.I)
+
+
+class StandInAPI:
+    """A table served as CSV pages by a thread of this process.
+
+    Requests with a ``query`` parameter are answered like a SPARQL endpoint,
+    with the rows given by the ``LIMIT``/``OFFSET`` at the end of the query
+    (the table stands for the ordered solutions), other requests like the
+    GloBI API, with the rows given by the ``offset`` and ``limit``
+    parameters. Without them, the whole table is sent. ``max_limit`` caps
+    the rows of an answer, ``latency`` and ``row_seconds`` delay answers,
+    and ``fail_every`` makes every n-th request answer 503.
+    ``max_in_flight`` is the most requests served at once.
+    """
+
+    def __init__(
+        self, columns, rows, max_limit=None, latency=0, row_seconds=0, fail_every=0
+    ):
+        self.columns = list(columns)
+        self.rows = rows
+        self.max_limit = max_limit
+        self.latency = latency
+        self.row_seconds = row_seconds
+        self.fail_every = fail_every
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def select(self, params):
+        """Return the rows a request pages through."""
+        return self.rows
+
+    def page(self, params):
+        """Return the CSV answer to a request."""
+        offset, limit = 0, None
+        if "query" in params:
+            match = _LIMIT.search(params["query"][0])
+            if match:
+                limit, offset = int(match.group(1)), int(match.group(2))
+        else:
+            offset = int(params.get("offset", ["0"])[0])
+            if "limit" in params:
+                limit = int(params["limit"][0])
+        if self.max_limit is not None:
+            limit = self.max_limit if limit is None else min(limit, self.max_limit)
+        rows = self.select(params)
+        rows = rows[offset : None if limit is None else offset + limit]
+        time.sleep(self.latency + self.row_seconds * len(rows))
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(self.columns)
+        writer.writerows(rows)
+        return out.getvalue().encode("utf-8")
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, content=b"", content_type="text/plain"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                with api.lock:
+                    api.requests += 1
+                    n = api.requests
+                    api.in_flight += 1
+                    api.max_in_flight = max(api.max_in_flight, api.in_flight)
+                try:
+                    if api.fail_every and n % api.fail_every == 0:
+                        return self.reply(503, b"try again")
+                    params = parse_qs(urlsplit(self.path).query)
+                    self.reply(200, api.page(params), "text/csv")
+                finally:
+                    with api.lock:
+                        api.in_flight -= 1
+
+        return Handler
+
+
+class StandInGloBI(StandInAPI):
+    """The GloBI ``interaction`` endpoint over the records of a dump.
+
+    ``records`` are dicts with the dump's columns. ``sourceTaxon`` selects
+    the records with the taxon in the lineage of their source taxon, by id
+    or by the name in ``names`` (GloBI links the ids of other taxonomies to
+    the same taxon), and ``interactionType`` the records of these types.
+    Answers have the columns of the API.
+    """
+
+    def __init__(self, records, names, **kwargs):
+        from slime.globi import API_COLUMNS
+
+        super().__init__(API_COLUMNS, [], **kwargs)
+        self.records = records
+        self.names = {k.lower(): v.lower() for k, v in names.items()}
+        self.dump_columns = list(API_COLUMNS.values())
+        self.selected = {}
+
+    def select(self, params):
+        taxon = params.get("sourceTaxon", [""])[0].lower()
+        types = tuple(params.get("interactionType", []))
+        key = taxon, types
+        with self.lock:
+            if key not in self.selected:
+                self.selected[key] = [
+                    [record.get(c, "") for c in self.dump_columns]
+                    for record in self.records
+                    if self.matches(record, taxon, types)
+                ]
+            return self.selected[key]
+
+    def matches(self, record, taxon, types):
+        if types and record["interactionTypeName"] not in types:
+            return False
+        lineage = record["sourceTaxonPathIds"] + "|" + record["sourceTaxonPathNames"]
+        lineage = {v.strip().lower() for v in lineage.split("|")}
+        return taxon in lineage or self.names.get(taxon) in lineage
+
+
+class StandInFiles:
+    """Files served over HTTP with validators and byte ranges.
+
+    ``files`` maps paths (``/name.zip``) to their content and may be changed
+    while serving. Answers carry an ``ETag`` (the digest of the content) and
+    honour ``If-None-Match`` with 304 and ``Range``/``If-Range`` with 206.
+    A path added to ``cut`` has its next answer closed halfway through the
+    body, and a path mapped to a status in ``errors`` gets that status (e.g.
+    503) as its next answer. ``log`` records the path, status and body bytes
+    of every answer.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.cut = set()
+        self.errors = {}
+        self.log = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handler(self):
+        host = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, content=b"", headers=()):
+                with host.lock:
+                    cut = self.path in host.cut and status in (200, 206)
+                    host.cut.discard(self.path)
+                    sent = len(content) // 2 if cut else len(content)
+                    host.log.append((self.path, status, sent))
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                if cut:
+                    self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(content[:sent])
+                self.close_connection = cut
+
+            def do_GET(self):
+                with host.lock:
+                    error = host.errors.pop(self.path, None)
+                if error is not None:
+                    return self.reply(error)
+                content = host.files.get(self.path)
+                if content is None:
+                    return self.reply(404)
+                etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+                headers = [("ETag", etag)]
+                if self.headers.get("If-None-Match") == etag:
+                    return self.reply(304, headers=headers)
+                match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+                if match and self.headers.get("If-Range", etag) == etag:
+                    start = int(match.group(1))
+                    if start >= len(content):
+                        return self.reply(416, headers=headers)
+                    headers.append(
+                        (
+                            "Content-Range",
+                            f"bytes {start}-{len(content) - 1}/{len(content)}",
+                        )
+                    )
+                    return self.reply(206, content[start:], headers)
+                self.reply(200, content, headers)
+
+        return Handler
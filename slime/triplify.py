@@ -0,0 +1,268 @@
+"""Vectorized triplifier for the Mapeathor workbooks of ``[transform.triplify]``.
+
+The workbooks follow a few fixed patterns (organism–trait, consumer–
+interaction–resource, reference provenance): subjects built from a template
+over one row, constant or column predicates, and objects that are a column,
+a constant or the subject of another triples map of the same row. A
+workbook using only these patterns is compiled once into a plan, cached as
+JSON under the workbook's SHA-256, and :func:`triples` applies the plan to a
+whole table with vectorized string building. The output is the set of
+N-Triples statements morph-kgc produces from the mapeathor RML translation
+of the workbook, except for blank nodes: morph-kgc inserts template values
+in blank node labels as they are, so a value with a space breaks the
+statement, while the plan encodes them like the values of IRI templates
+(see :func:`encode_label`). Workbooks using anything else (functions, templated
+objects, language tags, typed literals, joins on different columns...)
+raise :class:`UnsupportedMapping` and are left to morph-kgc.
+"""
+
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from slime.cache import CACHE_ROOT, file_digest
+from slime.excel import read_excel
+
+PLAN_DIR = CACHE_ROOT / "plans"
+PLAN_VERSION = 1
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+# Values mapeathor reads as empty cells
+EMPTY = {"", "nan", "NaN", "NAN", " "}
+
+_REFERENCE = re.compile(r"\{([^{}]+)\}")
+_UNRESERVED = re.compile(r"[^A-Za-z0-9\-._~]")
+_LABEL_UNSAFE = re.compile(r"[^A-Za-z0-9]")
+
+
+class UnsupportedMapping(ValueError):
+    pass
+
+
+def cell(value):
+    value = str(value)
+    return None if value in EMPTY else value.strip()
+
+
+def split_template(template):
+    """Split a template into literal text and column references."""
+    parts = []
+    for i, piece in enumerate(_REFERENCE.split(template)):
+        if piece:
+            parts.append(("col" if i % 2 else "text", piece))
+    return parts
+
+
+def single_reference(value):
+    match = _REFERENCE.fullmatch(value)
+    return match.group(1) if match else None
+
+
+def expand(curie, prefixes):
+    if "{" in curie or "}" in curie:
+        raise UnsupportedMapping(f"templated constant {curie}")
+    if curie.startswith("http://") or curie.startswith("https://"):
+        return curie
+    prefix, sep, local = curie.partition(":")
+    if not sep or prefix not in prefixes:
+        raise UnsupportedMapping(f"unknown prefix in {curie}")
+    return prefixes[prefix] + local
+
+
+def subject_kind(uri):
+    # mapeathor only types subjects that look like IRIs as IRIs
+    return "iri" if len(uri.split(":")) == 2 or "http" in uri else "bnode"
+
+
+def compile_workbook(path):
+    """Compile a Mapeathor workbook into a plan, or raise UnsupportedMapping."""
+    sheets = {
+        name: read_excel(path, sheet_name=name, dtype=str)
+        for name in ("Prefix", "Subject", "Source", "Predicate_Object", "Function")
+    }
+    if len(sheets["Function"].dropna(how="all")):
+        raise UnsupportedMapping("Function sheet is not empty")
+    prefixes = {
+        cell(p): cell(u)
+        for p, u in zip(sheets["Prefix"]["Prefix"], sheets["Prefix"]["URI"])
+    }
+
+    sources = sheets["Source"].astype(str)
+    files = set(sources.loc[sources["Feature"] == "source", "Value"].str.strip())
+    formats = set(sources.loc[sources["Feature"] == "format", "Value"].str.strip())
+    if len(files) != 1 or formats - {"csv"}:
+        raise UnsupportedMapping("mapping reads more than one CSV table")
+
+    subjects, rules = {}, []
+    for _, row in sheets["Subject"].astype(str).iterrows():
+        uri, klass = cell(row["URI"]), cell(row["Class"])
+        if uri is None:
+            raise UnsupportedMapping(f"subject {row['ID']} has no URI")
+        term = {"kind": subject_kind(uri), "parts": split_template(uri)}
+        if subjects.setdefault(row["ID"], term) != term:
+            raise UnsupportedMapping(f"subject {row['ID']} has several URIs")
+        if klass is not None:
+            obj = {"kind": "iri", "parts": [("text", expand(klass, prefixes))]}
+            rules.append(
+                {"subject": term, "predicate": ("text", RDF_TYPE), "object": obj}
+            )
+
+    for _, row in sheets["Predicate_Object"].astype(str).iterrows():
+        if row["ID"] not in subjects:
+            raise UnsupportedMapping(f"unknown subject {row['ID']}")
+        if cell(row["Language"]) is not None:
+            raise UnsupportedMapping("language tags")
+        predicate = cell(row["Predicate"])
+        column = single_reference(predicate)
+        predicate = ("col", column) if column else ("text", expand(predicate, prefixes))
+
+        value, datatype = cell(row["Object"]), (cell(row["DataType"]) or "string")
+        inner, outer = cell(row["InnerRef"]), cell(row["OuterRef"])
+        if value is None and inner is not None and outer is not None:
+            parent = cell(row["ReferenceID"])
+            if parent not in subjects or inner != outer:
+                raise UnsupportedMapping(f"join of {row['ID']} on different columns")
+            # morph-kgc turns joins of a table with itself into the parent subject
+            obj = subjects[parent]
+        elif value is None or datatype.lower() not in ("iri", "string"):
+            raise UnsupportedMapping(f"object {value} of type {datatype}")
+        elif single_reference(value):
+            kind = "iri_ref" if datatype.lower() == "iri" else "literal"
+            obj = {"kind": kind, "parts": [("col", single_reference(value))]}
+        elif "{" in value or "}" in value:
+            raise UnsupportedMapping(f"templated object {value}")
+        elif datatype.lower() == "iri":
+            obj = {"kind": "iri", "parts": [("text", expand(value, prefixes))]}
+        else:
+            raise UnsupportedMapping(f"constant literal {value}")
+        rules.append(
+            {"subject": subjects[row["ID"]], "predicate": predicate, "object": obj}
+        )
+    return {"version": PLAN_VERSION, "source": files.pop(), "rules": rules}
+
+
+@lru_cache(maxsize=None)
+def load_plan(path, plan_dir=PLAN_DIR):
+    """Return the cached plan of a workbook, compiling it on first use.
+
+    Workbooks that cannot be compiled give a plan with an ``unsupported``
+    reason instead of rules.
+    """
+    plan_path = Path(plan_dir) / f"{file_digest(path)}.json"
+    if plan_path.exists():
+        with open(plan_path) as f:
+            plan = json.load(f)
+        if plan.get("version") == PLAN_VERSION:
+            return plan
+    try:
+        plan = compile_workbook(path)
+    except UnsupportedMapping as e:
+        plan = {"version": PLAN_VERSION, "unsupported": str(e)}
+    plan_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(plan_path, "w") as f:
+        json.dump(plan, f)
+    return plan
+
+
+def references(term):
+    return [value for kind, value in term["parts"] if kind == "col"]
+
+
+def encode_iri(values):
+    """Percent-encode template values like morph-kgc (everything but unreserved)."""
+    needs = values.str.contains(_UNRESERVED).to_numpy()
+    if not needs.any():
+        return values
+    values = values.copy()
+    values[needs] = [quote(v, safe="") for v in values[needs]]
+    return values
+
+
+def encode_label(values):
+    """Encode template values for blank node labels, like :func:`encode_iri`.
+
+    Every character but ASCII letters and digits is percent-encoded, with
+    ``_`` in place of ``%`` since N-Triples labels cannot hold it, so that
+    distinct values give distinct labels without whitespace.
+    """
+    needs = values.str.contains(_LABEL_UNSAFE).to_numpy()
+    if not needs.any():
+        return values
+    values = values.copy()
+    values[needs] = [
+        _LABEL_UNSAFE.sub(lambda m: "".join(f"_{b:02X}" for b in m.group().encode()), v)
+        for v in values[needs]
+    ]
+    return values
+
+
+def escape_literal(values):
+    return (
+        values.str.replace("\\", "\\\\", regex=False)
+        .str.replace("\n", "\\n", regex=False)
+        .str.replace("\r", "\\r", regex=False)
+        .str.replace('"', '\\"', regex=False)
+    )
+
+
+def build_term(rows, term, encoded):
+    kind = term["kind"]
+    out = np.full(len(rows), "", dtype=object)
+    for part, value in term["parts"]:
+        if part == "text":
+            out = out + value
+        elif kind == "iri":
+            out = out + encoded(value)
+        elif kind == "bnode":
+            out = out + encoded(value, encode_label)
+        elif kind == "literal":
+            out = out + escape_literal(rows[value]).to_numpy()
+        else:
+            out = out + rows[value].to_numpy()
+    if kind == "bnode":
+        return "_:" + out
+    if kind == "literal":
+        return '"' + out + '"'
+    return "<" + out + ">"
+
+
+def triples(df, plan, na_values=("", "nan")):
+    """Return the distinct N-Triples statements (without the final dot) of df.
+
+    ``df`` holds the annotated table as strings; cells equal to one of
+    ``na_values`` are treated as missing, and rows missing a value used by a
+    rule produce no triple for that rule.
+    """
+    missing = df.isin(list(na_values)) | df.isna()
+    statements = []
+    for rule in plan["rules"]:
+        cols = (
+            references(rule["subject"])
+            + ([rule["predicate"][1]] if rule["predicate"][0] == "col" else [])
+            + references(rule["object"])
+        )
+        for col in cols:
+            if col not in df:
+                raise KeyError(f"column {col} used by the mapping is missing")
+        rows = df[~missing[cols].any(axis=1)] if cols else df
+        if rows.empty:
+            continue
+        cache = {}
+
+        def encoded(col, encode=encode_iri):
+            if (col, encode) not in cache:
+                cache[col, encode] = encode(rows[col]).to_numpy()
+            return cache[col, encode]
+
+        s = build_term(rows, rule["subject"], encoded)
+        kind, value = rule["predicate"]
+        p = "<" + (rows[value].to_numpy() if kind == "col" else value) + ">"
+        o = build_term(rows, rule["object"], encoded)
+        statements.append(s + " " + p + " " + o)
+    if not statements:
+        return np.array([], dtype=object)
+    return pd.unique(np.concatenate(statements))
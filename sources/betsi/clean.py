@@ -1,35 +1,14 @@
-import os
-import pandas as pd
-
-
-def clean(f_in, **kwargs):
-    df = pd.read_csv(
-        f_in,
-        sep=";",
-        usecols=["taxon_name", "trait_name", "attribute_trait", "source_fauna"],
-        encoding_errors="ignore",
-    )
-    df = df[df["trait_name"] == "Diet"]
-    return df
-
-
-import argparse
+import sys
 from pathlib import Path
 
-parser = argparse.ArgumentParser()
-
-parser.add_argument("--integraph_filepath")
-parser.add_argument("--integraph_outputdir")
-
-args = parser.parse_args()
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
-filepath = Path(args.integraph_filepath)
-outputdir = Path(args.integraph_outputdir)
-output_filepath = outputdir / filepath.name
-output_filepath.parent.mkdir(parents=True, exist_ok=True)
+from slime.cleanse import main
+from slime.spec import load_spec
 
-df = clean(filepath)
+# The cleansing is declared in [transform.cleanse] of source.cfg
+clean = load_spec(Path(__file__).parent)
 
-df.to_csv(output_filepath, sep=",")
 
-print(output_filepath)
+if __name__ == "__main__":
+    main(clean)
@@ -1,6 +1,13 @@
-import os
 import pandas as pd
 import re
+import sys
+from collections import Counter
+from graphlib import TopologicalSorter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from slime.cleanse import main
 
 
 def split_blocks(lines):
@@ -18,6 +25,41 @@ def split_blocks(lines):
     return block_start_indices
 
 
+def resolve_groups(group_members, add_groups, subtract_groups):
+    """Expand add_group/subtract_group references into each group's members.
+
+    Members are (scientificName, reference) keys and the rules are those of
+    the file-order resolution this replaces: added groups come after the
+    group's own members, duplicates are kept, and each subtracted member
+    removes one occurrence, the first. Groups are resolved in dependency
+    order instead of file order, so a group referencing a group defined
+    after it gets that group fully expanded, not only the members listed in
+    its block. This is the one intended difference in the output. A cycle of
+    references raises graphlib.CycleError.
+    """
+    dependencies = {
+        group: add_groups[group] + subtract_groups[group] for group in group_members
+    }
+    resolved = {}
+    for group in TopologicalSorter(dependencies).static_order():
+        members = [(m["scientificName"], m["reference"]) for m in group_members[group]]
+        for addgroup in add_groups[group]:
+            members += resolved[addgroup]
+        removed = Counter()
+        for subtractgroup in subtract_groups[group]:
+            removed.update(resolved[subtractgroup])
+        if removed:
+            kept = []
+            for member in members:
+                if removed[member] > 0:
+                    removed[member] -= 1
+                else:
+                    kept.append(member)
+            members = kept
+        resolved[group] = members
+    return resolved
+
+
 def clean(f_in, **kwargs):
     def is_subtract_group_line(line):
         return line.startswith("subtract_group:")
@@ -88,40 +130,17 @@ def clean(f_in, **kwargs):
         group_members[group] = members
         groups[group] = group_definition
 
-    for group in groups:
-        for addgroup in add_groups[group]:
-            group_members[group] += group_members[addgroup]
-        for subtractgroup in subtract_groups[group]:
-            for member in group_members[subtractgroup]:
-                if member in group_members[group]:
-                    print("Remove", member, "member of", subtractgroup, "from", group)
-                    group_members[group].remove(member)
+    resolved = resolve_groups(group_members, add_groups, subtract_groups)
 
     for group in groups:
-        for member in group_members[group]:
-            functional_table.append(dict(groups[group], **member))
+        for scientific_name, reference in resolved[group]:
+            functional_table.append(
+                dict(groups[group], scientificName=scientific_name, reference=reference)
+            )
 
     df = pd.DataFrame(functional_table)
     return df
 
 
-import argparse
-from pathlib import Path
-
-parser = argparse.ArgumentParser()
-
-parser.add_argument("--integraph_filepath")
-parser.add_argument("--integraph_outputdir")
-
-args = parser.parse_args()
-
-filepath = Path(args.integraph_filepath)
-outputdir = Path(args.integraph_outputdir)
-output_filepath = outputdir / filepath.name
-output_filepath.parent.mkdir(parents=True, exist_ok=True)
-
-df = clean(filepath)
-
-df.to_csv(output_filepath, sep=",")
-
-print(output_filepath)
+if __name__ == "__main__":
+    main(clean)
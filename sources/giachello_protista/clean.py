@@ -1,8 +1,15 @@
 import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from slime.cleanse import main
+from slime.excel import read_excel
 
 
 def clean(f_in, **kwargs):
-    df = pd.read_excel(
+    df = read_excel(
         f_in, sheet_name=["TabS1B_complete_dataset", "TabS1C_references_used"]
     )
     df_data = df["TabS1B_complete_dataset"]
@@ -25,23 +32,5 @@ def clean(f_in, **kwargs):
     return df_data
 
 
-import argparse
-from pathlib import Path
-
-parser = argparse.ArgumentParser()
-
-parser.add_argument("--integraph_filepath")
-parser.add_argument("--integraph_outputdir")
-
-args = parser.parse_args()
-
-filepath = Path(args.integraph_filepath)
-outputdir = Path(args.integraph_outputdir)
-output_filepath = outputdir / filepath.name
-output_filepath.parent.mkdir(parents=True, exist_ok=True)
-
-df = clean(filepath)
-
-df.to_csv(output_filepath, sep=",")
-
-print(output_filepath)
+if __name__ == "__main__":
+    main(clean)
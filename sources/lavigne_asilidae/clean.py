@@ -1,11 +1,17 @@
 import os
 import pandas as pd
-import xlrd
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from slime.cleanse import main
+from slime.excel import read_excel
 
 
 def clean(f_in, **kwargs):
-    df = pd.read_excel(xlrd.open_workbook(f_in))
+    df = read_excel(f_in, engine="xlrd")
     df["consumer_name"] = df["PREDATOR"].map(str) + " " + df["PREDSPECIS"].map(str)
 
     df_res = df[["ORDER", "FAMILY", "GENUS", "SPECIES"]]
@@ -16,32 +22,14 @@ def clean(f_in, **kwargs):
     )
 
     for col in ["ORDER", "FAMILY", "GENUS", "SPECIES"]:
-        df_res.loc[
-            df_res[col].str.contains("undetermined", case=False, na=False, regex=False),
-            col,
-        ] = np.NaN
-        df_res.loc[
-            df_res[col].str.contains("unidentified", case=False, na=False, regex=False),
-            col,
-        ] = np.NaN
-        df_res.loc[
-            df_res[col].str.contains("?", case=False, na=False, regex=False), col
-        ] = np.NaN
-        df_res[col] = df_res[col].apply(
-            lambda x: x.split("[")[0].strip(" ") if not pd.isna(x) else x
-        )
-        df_res[col] = df_res[col].apply(
-            lambda x: x if not pd.isna(x) and not x.startswith('"') else np.NaN
+        unknown = df_res[col].str.contains(
+            r"undetermined|unidentified|\?", case=False, na=False
         )
+        values = df_res[col].mask(unknown).str.split("[", n=1).str[0].str.strip(" ")
+        df_res[col] = values.mask(values.str.startswith('"', na=False))
 
-    df_res["GENUS"] = df_res[["FAMILY", "GENUS"]].apply(
-        lambda x: x["GENUS"] if not x.isnull().values.any() else np.nan,
-        axis=1,
-    )
-    df_res["resource_name"] = df_res[["GENUS", "SPECIES"]].apply(
-        lambda x: x.str.cat(sep=" ") if not x.isnull().values.any() else np.nan,
-        axis=1,
-    )
+    df_res["GENUS"] = df_res["GENUS"].where(df_res["FAMILY"].notna())
+    df_res["resource_name"] = df_res["GENUS"] + " " + df_res["SPECIES"]
     df_res["resource_name"] = df_res["resource_name"].replace(
         r"^\s*$", np.nan, regex=True
     )
@@ -58,23 +46,5 @@ def clean(f_in, **kwargs):
     return df
 
 
-import argparse
-from pathlib import Path
-
-parser = argparse.ArgumentParser()
-
-parser.add_argument("--integraph_filepath")
-parser.add_argument("--integraph_outputdir")
-
-args = parser.parse_args()
-
-filepath = Path(args.integraph_filepath)
-outputdir = Path(args.integraph_outputdir)
-output_filepath = outputdir / filepath.name
-output_filepath.parent.mkdir(parents=True, exist_ok=True)
-
-df = clean(filepath)
-
-df.to_csv(output_filepath, sep=",")
-
-print(output_filepath)
+if __name__ == "__main__":
+    main(clean)
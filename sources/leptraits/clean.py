@@ -1,40 +1,30 @@
 import pandas as pd
+import sys
+from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
-def clean(f_in, **kwargs):
-    df = pd.read_csv(f_in)
-    df = df.dropna(
-        subset=[
-            "SoleHostplantFamily",
-            "PrimaryHostplantFamily",
-            "SecondaryHostplantFamily",
-        ],
-        how="all",
-    )
-    df["host"] = df[
-        ["SoleHostplantFamily", "PrimaryHostplantFamily", "SecondaryHostplantFamily"]
-    ].apply(lambda x: ",".join(x.dropna().astype(str)).split(","), axis=1)
-    df = df.explode("host")
-    return df
-
-
-import argparse
-from pathlib import Path
+from slime.cleanse import main
 
-parser = argparse.ArgumentParser()
+READ_OPTIONS = dict()
+HOST_COLUMNS = [
+    "SoleHostplantFamily",
+    "PrimaryHostplantFamily",
+    "SecondaryHostplantFamily",
+]
 
-parser.add_argument("--integraph_filepath")
-parser.add_argument("--integraph_outputdir")
 
-args = parser.parse_args()
+def clean_chunk(df):
+    df = df.dropna(subset=HOST_COLUMNS, how="all")
+    host = df[HOST_COLUMNS].stack().astype(str).str.split(",").explode().droplevel(-1)
+    df = df.loc[host.index].assign(host=host.to_numpy())
+    return df
 
-filepath = Path(args.integraph_filepath)
-outputdir = Path(args.integraph_outputdir)
-output_filepath = outputdir / filepath.name
-output_filepath.parent.mkdir(parents=True, exist_ok=True)
 
-df = clean(filepath)
+def clean(f_in, **kwargs):
+    df = pd.read_csv(f_in, **READ_OPTIONS)
+    return clean_chunk(df)
 
-df.to_csv(output_filepath, sep=",")
 
-print(output_filepath)
+if __name__ == "__main__":
+    main(clean)